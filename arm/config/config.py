@@ -81,3 +81,11 @@ try:
     apprise_config = _load_config(apprise_config_path)
 except OSError:
     apprise_config = {}
+
+
+def refresh_arm_config():
+    """
+    Re-read the user config into arm_config in place.
+    Long-running processes (the ripper daemon) call this so every job sees the current settings
+    """
+    arm_config.update(_load_config(arm_config_path))
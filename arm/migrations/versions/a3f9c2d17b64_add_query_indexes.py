@@ -0,0 +1,46 @@
+"""Add indexes for the job, track, config, notifications and system_drives lookups
+
+Revision ID: a3f9c2d17b64
+Revises: edf2272c0a9d
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3f9c2d17b64'
+down_revision = 'edf2272c0a9d'
+branch_labels = None
+depends_on = None
+
+# (index name, table, columns) - keep in step with the __table_args__ of the models
+INDEXES = [
+    # active jobs (home page, joblist, clean_old_jobs)
+    ('ix_job_status', 'job', ['status']),
+    # duplicate_run_check
+    ('ix_job_devpath_status', 'job', ['devpath', 'status']),
+    # job_dupe_check
+    ('ix_job_label_status', 'job', ['label', 'status']),
+    # ui search for previous rips of a disc
+    ('ix_job_crc_id_status', 'job', ['crc_id', 'status']),
+    # job.tracks filtered by filename (transcode) or main_feature
+    ('ix_track_job_id_filename', 'track', ['job_id', 'filename']),
+    ('ix_track_job_id_main_feature', 'track', ['job_id', 'main_feature']),
+    # job.config
+    ('ix_config_job_id', 'config', ['job_id']),
+    ('ix_notifications_seen', 'notifications', ['seen']),
+    ('ix_notifications_cleared', 'notifications', ['cleared']),
+    ('ix_system_drives_mount', 'system_drives', ['mount']),
+    ('ix_system_drives_serial_id', 'system_drives', ['serial_id']),
+]
+
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, unique=False)
+
+
+def downgrade():
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
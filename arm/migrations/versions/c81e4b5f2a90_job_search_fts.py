@@ -0,0 +1,100 @@
+"""Add job_search, an FTS5 index of the job titles, labels, years, imdb ids, types and track filenames
+
+The index is kept up to date by triggers on job and track, so the ripper and the ui don't
+need to do anything when they write jobs. SQLite drops the triggers of a table that a
+batch_alter_table migration recreates, so such a migration of job or track has to run
+TRIGGERS again.
+
+When SQLite is built without FTS5 nothing is created and the search falls back to LIKE.
+
+Revision ID: c81e4b5f2a90
+Revises: a3f9c2d17b64
+Create Date: 2026-10-18
+
+"""
+import logging
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'c81e4b5f2a90'
+down_revision = 'a3f9c2d17b64'
+branch_labels = None
+depends_on = None
+
+# Filenames of a job's tracks, separated by spaces
+FILENAMES = "(SELECT group_concat(filename, ' ') FROM track WHERE track.job_id = {job_id})"
+
+CREATE_TABLE = """
+CREATE VIRTUAL TABLE job_search USING fts5(
+    title, title_manual, label, year, imdb_id, video_type, filenames,
+    prefix='2 3'
+)
+"""
+
+TRIGGERS = [
+    ("job_search_job_insert", f"""
+CREATE TRIGGER job_search_job_insert AFTER INSERT ON job BEGIN
+    INSERT INTO job_search(rowid, title, title_manual, label, year, imdb_id, video_type, filenames)
+    VALUES (new.job_id, new.title, new.title_manual, new.label, new.year, new.imdb_id, new.video_type,
+            {FILENAMES.format(job_id="new.job_id")});
+END
+"""),
+    # only when a searched column is set, not on the frequent status and progress updates
+    ("job_search_job_update", """
+CREATE TRIGGER job_search_job_update AFTER UPDATE OF title, title_manual, label, year, imdb_id, video_type ON job
+BEGIN
+    UPDATE job_search SET title = new.title, title_manual = new.title_manual, label = new.label,
+        year = new.year, imdb_id = new.imdb_id, video_type = new.video_type
+    WHERE rowid = new.job_id;
+END
+"""),
+    ("job_search_job_delete", """
+CREATE TRIGGER job_search_job_delete AFTER DELETE ON job BEGIN
+    DELETE FROM job_search WHERE rowid = old.job_id;
+END
+"""),
+    ("job_search_track_insert", f"""
+CREATE TRIGGER job_search_track_insert AFTER INSERT ON track BEGIN
+    UPDATE job_search SET filenames = {FILENAMES.format(job_id="new.job_id")} WHERE rowid = new.job_id;
+END
+"""),
+    ("job_search_track_update", f"""
+CREATE TRIGGER job_search_track_update AFTER UPDATE OF filename ON track BEGIN
+    UPDATE job_search SET filenames = {FILENAMES.format(job_id="new.job_id")} WHERE rowid = new.job_id;
+END
+"""),
+    ("job_search_track_delete", f"""
+CREATE TRIGGER job_search_track_delete AFTER DELETE ON track BEGIN
+    UPDATE job_search SET filenames = {FILENAMES.format(job_id="old.job_id")} WHERE rowid = old.job_id;
+END
+"""),
+]
+
+BACKFILL = f"""
+INSERT INTO job_search(rowid, title, title_manual, label, year, imdb_id, video_type, filenames)
+SELECT job_id, title, title_manual, label, year, imdb_id, video_type, {FILENAMES.format(job_id="job.job_id")}
+FROM job
+"""
+
+
+def fts5_available(connection):
+    """True if SQLite was built with FTS5"""
+    return bool(connection.exec_driver_sql("SELECT sqlite_compileoption_used('ENABLE_FTS5')").scalar())
+
+
+def upgrade():
+    if not fts5_available(op.get_bind()):
+        logging.getLogger("alembic.env").warning("SQLite has no FTS5, job search will use LIKE")
+        return
+    op.execute(CREATE_TABLE)
+    for _, trigger in TRIGGERS:
+        op.execute(trigger)
+    op.execute(BACKFILL)
+
+
+def downgrade():
+    for name, _ in TRIGGERS:
+        op.execute(f"DROP TRIGGER IF EXISTS {name}")
+    op.execute("DROP TABLE IF EXISTS job_search")
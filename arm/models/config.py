@@ -14,7 +14,7 @@ class Config(db.Model):
     """ Holds all the config settings for each job
     as these may change between each job """
     CONFIG_ID = db.Column(db.Integer, primary_key=True)
-    job_id = db.Column(db.Integer, db.ForeignKey('job.job_id'))
+    job_id = db.Column(db.Integer, db.ForeignKey('job.job_id'), index=True)
     ARM_CHECK_UDF = db.Column(db.Boolean)
     GET_VIDEO_TITLE = db.Column(db.Boolean)
     SKIP_TRANSCODE = db.Column(db.Boolean)
@@ -19,27 +19,6 @@ from arm.models.track import Track  # noqa: F401
 from arm.models.config import Config  # noqa: F401
 
 
-def _disc_dir_exists(mountpoint, name):
-    """Check if a directory name exists in a disc mountpoint.
-
-    Uses os.listdir on the parent rather than os.path.isdir on the target,
-    to handle burned UDF discs where the directory entry is visible in the
-    listing but os.stat() fails with a stale file handle.
-    """
-    try:
-        return name.upper() in [e.upper() for e in os.listdir(mountpoint)]
-    except OSError:
-        return False
-
-
-def _listdir_safe(path):
-    """Return os.listdir(path), or [] if the path is inaccessible."""
-    try:
-        return os.listdir(path)
-    except OSError:
-        return []
-
-
 class JobState(str, enum.Enum):
     """Possible states for Job.status.
 
@@ -88,6 +67,8 @@ JOB_STATUS_FINISHED = {
     JobState.SUCCESS,
     JobState.FAILURE,
 }
+# Every other state, listed so the active jobs can be looked up with the status index
+JOB_STATUS_UNFINISHED = set(JobState) - JOB_STATUS_FINISHED
 JOB_STATUS_RIPPING = {
     JobState.AUDIO_RIPPING,
     JobState.VIDEO_RIPPING,
@@ -153,6 +134,12 @@ class Job(db.Model):
     manual_mode = db.Column(db.Boolean)
     tracks = db.relationship('Track', backref='job', lazy='dynamic')
     config = db.relationship('Config', uselist=False, backref="job")
+    __table_args__ = (
+        db.Index('ix_job_status', 'status'),
+        db.Index('ix_job_devpath_status', 'devpath', 'status'),
+        db.Index('ix_job_label_status', 'label', 'status'),
+        db.Index('ix_job_crc_id_status', 'crc_id', 'status'),
+    )
 
     def __init__(self, devpath):
         """Return a disc object"""
@@ -220,33 +207,23 @@ class Job(db.Model):
         self.pid = pid
         self.pid_hash = hash(process_id)
 
-    def get_disc_type(self, found_hvdvd_ts):
+    def get_disc_type(self, layout):
         """
         Checks/corrects the current disc-type
-        :param found_hvdvd_ts:  gets pushed in from utils - saves importing utils
+        :param layout: DiscLayout of the mounted disc - gets pushed in from identify (disc_layout.probe)
         :return: None
         """
         if self.disctype == "music":
             logging.debug("Disc is music.")
             self.label = music_brainz.main(self)
-        elif _disc_dir_exists(self.mountpoint, "AUDIO_TS") and _listdir_safe(self.mountpoint + "/AUDIO_TS"):
-            logging.debug(f"Found: {self.mountpoint}/AUDIO_TS")
-            self.disctype = "data"
-        elif _disc_dir_exists(self.mountpoint, "VIDEO_TS"):
-            logging.debug(f"Found: {self.mountpoint}/VIDEO_TS")
-            self.disctype = "dvd"
-        elif _disc_dir_exists(self.mountpoint, "BDMV"):
-            logging.debug(f"Found: {self.mountpoint}/BDMV")
-            self.disctype = "bluray"
-        elif _disc_dir_exists(self.mountpoint, "HVDVD_TS"):
-            logging.debug(f"Found: {self.mountpoint}/HVDVD_TS")
-            # do something here
-        elif found_hvdvd_ts:
-            logging.debug("Found file: HVDVD_TS")
-            # do something here too
-        else:
+        elif layout.found is None:
             logging.debug("Did not find valid dvd/bd files. Changing disc-type to 'data'")
             self.disctype = "data"
+        else:
+            logging.debug(f"Found: {self.mountpoint}/{layout.found}")
+            # HD DVD keeps the disc-type it has - do something here
+            if layout.kind != "hddvd":
+                self.disctype = layout.kind
 
     def identify_audio_cd(self):
         """
@@ -315,6 +292,15 @@ class Job(db.Model):
     def finished(cls):
         return cls.status.in_([js.value for js in JOB_STATUS_FINISHED])
 
+    @hybrid_property
+    def unfinished(self):
+        return JobState(self.status) in JOB_STATUS_UNFINISHED
+
+    @unfinished.expression
+    def unfinished(cls):
+        # status IN (...) can use ix_job_status, ~Job.finished (NOT IN) scans every job
+        return cls.status.in_(sorted(js.value for js in JOB_STATUS_UNFINISHED))
+
     @property
     def idle(self):
         return JobState(self.status) == JobState.IDLE
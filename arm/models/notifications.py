@@ -8,13 +8,13 @@ class Notifications(db.Model):
     Class to hold the A.R.M notifications
     """
     id = db.Column(db.Integer, autoincrement=True, primary_key=True)
-    seen = db.Column(db.Boolean)
+    seen = db.Column(db.Boolean, index=True)
     trigger_time = db.Column(db.DateTime)
     dismiss_time = db.Column(db.DateTime)
     title = db.Column(db.String(256))
     message = db.Column(db.String(256))
     diff_time = None
-    cleared = db.Column(db.Boolean, default=False, nullable=False)
+    cleared = db.Column(db.Boolean, default=False, nullable=False, index=True)
     cleared_time = db.Column(db.DateTime)
 
     def __init__(self, title=None, message=None):
@@ -94,7 +94,7 @@ class SystemDrives(db.Model):  # pylint: disable=too-many-instance-attributes
     drive_id = db.Column(db.Integer, index=True, primary_key=True)
 
     # static information:
-    serial_id = db.Column(db.String(100))  # maker+serial (static identification)
+    serial_id = db.Column(db.String(100), index=True)  # maker+serial (static identification)
     maker = db.Column(db.String(25))
     model = db.Column(db.String(50))
     serial = db.Column(db.String(25))
@@ -104,7 +104,7 @@ class SystemDrives(db.Model):  # pylint: disable=too-many-instance-attributes
     read_bd = db.Column(db.Boolean)
 
     # dynamic information (subject to change):
-    mount = db.Column(db.String(100))  # mount point (may change on startup)
+    mount = db.Column(db.String(100), index=True)  # mount point (may change on startup)
     firmware = db.Column(db.String(10))
     location = db.Column(db.String(255))
     stale = db.Column(db.Boolean)  # indicate that this drive was not found.
@@ -21,6 +21,10 @@ class Track(db.Model):
     process = db.Column(db.Boolean)
     chapters = db.Column(db.Integer, default=0)
     filesize = db.Column(db.BigInteger, default=0)
+    __table_args__ = (
+        db.Index('ix_track_job_id_filename', 'job_id', 'filename'),
+        db.Index('ix_track_job_id_main_feature', 'job_id', 'main_feature'),
+    )
 
     def __init__(self, job_id, track_number, length, aspect_ratio,
                  fps, main_feature, source, basename, filename,
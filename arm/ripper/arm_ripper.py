@@ -12,10 +12,14 @@ from pathlib import Path
 if find_spec("arm") is None:
     sys.path.append(str(Path(__file__).parents[2]))
 
-from arm.ripper import utils, makemkv, handbrake, ffmpeg  # noqa E402
+from arm.ripper import utils, makemkv, handbrake, ffmpeg, finalizer, transcode_pipeline, db_writer  # noqa E402
 from arm.ui import app, db, constants  # noqa E402
 from arm.models.job import JobState  # noqa E402
 
+# Called once the job has given the drive back and only has its files left to move,
+# the ripper daemon sets it so a disc inserted in the drive meanwhile starts a new job
+on_drive_released = None
+
 
 def rip_visual_media(have_dupes, job, logfile, protection):
     """
@@ -41,25 +45,33 @@ def rip_visual_media(have_dupes, job, logfile, protection):
     # If dupes rips is disabled this might kill the run
     final_directory = utils.check_for_dupe_folder(have_dupes, final_directory, job)
 
-    # Update the job.path with the final directory
-    utils.database_updater({'path': final_directory}, job)
+    # Do we need to use MakeMKV - Blu-rays, protected dvd's, and dvd with mainfeature off
+    use_make_mkv = rip_with_mkv(job, protection)
+    logging.debug(f"Using MakeMKV: [{use_make_mkv}]")
+    with db_writer.batch():
+        # Update the job.path with the final directory
+        utils.database_updater({'path': final_directory}, job)
+        if use_make_mkv:
+            utils.database_updater({'status': JobState.VIDEO_RIPPING.value}, job)
     # Save poster image from disc if enabled
     utils.save_disc_poster(final_directory, job)
 
     logging.info(f"Processing files to: {transcode_out_path}")
     makemkv_out_path = None
     transcode_in_path = str(job.devpath)
-    # Do we need to use MakeMKV - Blu-rays, protected dvd's, and dvd with mainfeature off
-    use_make_mkv = rip_with_mkv(job, protection)
-    logging.debug(f"Using MakeMKV: [{use_make_mkv}]")
+    # Transcode each title as soon as it is ripped, if MakeMKV rips them one at a time
+    pipeline = None
+    if transcode_pipeline.wanted(job, use_make_mkv):
+        pipeline = transcode_pipeline.TranscodePipeline(job, logfile, transcode_out_path)
     if use_make_mkv:
         logging.info("************* Ripping disc with MakeMKV *************")
         # Run MakeMKV and get path to output
-        job.status = JobState.VIDEO_RIPPING.value
-        db.session.commit()
         try:
-            makemkv_out_path = makemkv.makemkv(job)
+            makemkv_out_path = makemkv.makemkv(job, on_ripped=pipeline.ripped if pipeline else None)
         except Exception as mkv_error:  # noqa: E722
+            if pipeline is not None:
+                # let the title being transcoded finish, the ones still queued aren't transcoded
+                pipeline.abort()
             raise utils.RipperException("Error while running MakeMKV") from mkv_error
 
         if job.config.NOTIFY_RIP:
@@ -68,7 +80,10 @@ def rip_visual_media(have_dupes, job, logfile, protection):
         # point HB/FFMPEG to the path MakeMKV ripped to
         transcode_in_path = makemkv_out_path
     # Begin transcoding section - only transcode if skip_transcode is false
-    start_transcode(job, logfile, transcode_in_path, transcode_out_path, protection)
+    if pipeline is not None and pipeline.started:
+        pipeline.finish()
+    else:
+        start_transcode(job, logfile, transcode_in_path, transcode_out_path, protection)
 
     # --------------- POST PROCESSING ---------------
     # If ripped with MakeMKV remove the 'out' folder and set the raw as the output
@@ -87,14 +102,20 @@ def rip_visual_media(have_dupes, job, logfile, protection):
         # Update the job.path with the final directory
         utils.database_updater({'path': final_directory}, job)
 
-    # Move to final folder
-    move_files_post(transcode_out_path, job)
+    # Give the drive back before moving the files, the next disc can start while they are copied
+    job.eject()
+    db.session.commit()
+    if on_drive_released is not None:
+        on_drive_released()
+    # Move to final folder, FINALIZE_WORKERS files at a time
+    with finalizer.Batch(job.job_id) as finalized:
+        move_files_post(transcode_out_path, job)
     # Movie the movie poster if we have one - no longer needed, now handled by save_movie_poster
     utils.move_movie_poster(final_directory, transcode_out_path)
     # Scan Emby if arm.yaml requires it
     utils.scan_emby()
-    # Set permissions if arm.yaml requires it
-    utils.set_permissions(final_directory)
+    # Set permissions if arm.yaml requires it, on the files this job put there
+    utils.set_permissions(final_directory, finalized.moved + [os.path.join(final_directory, "poster.png")])
     # If set in the arm.yaml remove the raw files
     utils.delete_raw_files([transcode_in_path, transcode_out_path, makemkv_out_path])
     # report errors if any
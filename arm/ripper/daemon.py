@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Long-running ARM ripper daemon
+
+Starting a fresh python process for every udev event imports Flask, SQLAlchemy, apprise, musicbrainz etc.
+and collects the ARM info every time a disc is inserted.
+The daemon does all of that once, then listens on a unix socket (RIPPER_SOCKET) for device names
+and forks a worker for each disc, which runs the normal main.setup()/main.main() flow.
+A worker tells the daemon when it has given the drive back (before moving its files into
+COMPLETED_PATH), from then on a disc inserted in that drive starts a new worker.
+
+Usage:
+    daemon.py                 run the daemon
+    daemon.py --submit sr0    hand a disc to a running daemon (used by the udev wrappers),
+                              exits 1 if no daemon is listening so the caller can fall back to main.py
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import re
+import signal
+import socket
+import sys
+from argparse import Namespace
+from importlib.util import find_spec
+from pathlib import Path
+
+import yaml
+
+# If the arm module can't be found, add the folder this file is in to PYTHONPATH
+# This is a bad workaround for non-existent packaging
+if find_spec("arm") is None:
+    sys.path.append(str(Path(__file__).parents[2]))
+
+# Nothing from arm is imported at module level - importing arm loads the whole ripper and UI,
+# which is exactly the start-up cost --submit is meant to avoid
+
+DEFAULT_SOCKET = "/home/arm/arm_ripper.sock"
+# Seconds between checks for finished workers when no discs arrive
+REAP_INTERVAL = 5
+# Seconds a client waits for the daemon to answer
+SUBMIT_TIMEOUT = 10
+DEVNAME_REGEX = re.compile(r"^[A-Za-z0-9_\-]+$")
+
+shutdown_requested = False
+# Same logger create_early_logger() sets up, so daemon messages end up in arm.log
+arm_log = logging.getLogger("ARM")
+
+
+def entry():
+    """ Entry to program, parses arguments"""
+    parser = argparse.ArgumentParser(description='ARM ripper daemon')
+    parser.add_argument('-s', '--socket', help='Unix socket path, defaults to RIPPER_SOCKET from arm.yaml')
+    parser.add_argument('--submit', metavar='DEVNAME', help='Send a disc (e.g. sr0) to a running daemon and exit')
+    parser.add_argument(
+        "--syslog",
+        help="Log to /dev/log",
+        required=False,
+        default=True,
+        action=argparse.BooleanOptionalAction,
+    )
+    return parser.parse_args()
+
+
+def socket_from_config():
+    """
+    Read RIPPER_SOCKET straight from arm.yaml without importing arm\n
+    :return: socket path
+    """
+    config_path = os.environ.get("ARM_CONFIG_FILE", "/etc/arm/config/arm.yaml")
+    try:
+        with open(config_path, "r") as yaml_file:
+            config = yaml.safe_load(yaml_file) or {}
+    except (OSError, yaml.YAMLError):
+        config = {}
+    return config.get("RIPPER_SOCKET") or DEFAULT_SOCKET
+
+
+def submit(socket_path, devname):
+    """
+    Hand a disc to a running daemon\n
+    :param socket_path: path to the daemon socket
+    :param devname: device name without /dev/ e.g. sr0
+    :return: True if the daemon accepted the disc, False if no daemon is listening or it refused
+    """
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.settimeout(SUBMIT_TIMEOUT)
+            client.connect(socket_path)
+            client.sendall(f"{devname}\n".encode())
+            reply = client.makefile("r").readline().strip()
+    except OSError as error:
+        print(f"ARM ripper daemon not available on {socket_path}: {error}", file=sys.stderr)
+        return False
+    print(reply)
+    return reply.startswith("OK")
+
+
+def _run_worker(devname, syslog, released=None):
+    """
+    Forked child - runs one job using the modules the daemon already loaded\n
+    :param devname: device name without /dev/
+    :param syslog: log to syslog
+    :param released: multiprocessing Event set once the job has given the drive back
+    """
+    import arm.config.config as cfg
+    from arm.ripper import arm_ripper, main as ripper_main, notifier
+    from arm.ui import app, db
+
+    # Go back to the default signal handlers, ripper_main.setup() installs its own SIGTERM handler
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    # Pick up any settings changed since the daemon started
+    cfg.refresh_arm_config()
+    # SQLite connections must not be shared across a fork, drop the ones inherited from the daemon
+    with app.app_context():
+        db.engine.dispose(close=False)
+    db.session.remove()
+    # The job sets up its own logging, don't double up on the daemon's handlers
+    logging.getLogger("ARM").handlers.clear()
+    if released is not None:
+        arm_ripper.on_drive_released = released.set
+    try:
+        ripper_main.run(Namespace(devpath=devname, syslog=syslog))
+    finally:
+        # The worker leaves with os._exit, atexit handlers don't run
+        notifier.flush()
+
+
+def _reap(workers):
+    """Remove finished workers, logging how they exited"""
+    for pid, worker in list(workers.items()):
+        if not worker.is_alive():
+            worker.join()
+            arm_log.info(f"Job on {worker.devname} finished (pid {pid}, exit code {worker.exitcode})")
+            del workers[pid]
+
+
+def _drive_worker(workers, devname):
+    """The worker still using the drive, None if there is none (or it has given the drive back)"""
+    for worker in workers.values():
+        if worker.devname == devname and not worker.released.is_set():
+            return worker
+    return None
+
+
+def _handle_client(conn, workers, syslog):
+    """Read one device name from a client and start a worker for it"""
+    conn.settimeout(SUBMIT_TIMEOUT)
+    devname = conn.makefile("r").readline().strip()
+    if not DEVNAME_REGEX.match(devname):
+        arm_log.error(f"Ignoring invalid device name from client: {devname!r}")
+        conn.sendall(b"ERROR invalid device name\n")
+        return
+    _reap(workers)
+    if running := _drive_worker(workers, devname):
+        # Sometimes drives trigger twice, this stops multi runs from 1 udev trigger
+        arm_log.info(f"Job already running on {devname} (pid {running.pid}), ignoring")
+        conn.sendall(f"OK already running {running.pid}\n".encode())
+        return
+    context = multiprocessing.get_context("fork")
+    released = context.Event()
+    worker = context.Process(target=_run_worker, args=(devname, syslog, released), name=f"arm-{devname}")
+    worker.devname = devname
+    worker.released = released
+    worker.start()
+    workers[worker.pid] = worker
+    arm_log.info(f"Started job on {devname} (pid {worker.pid})")
+    conn.sendall(f"OK started {worker.pid}\n".encode())
+
+
+def handle_shutdown(signum, frame):
+    """ARM handle SIGTERM/SIGINT for graceful shutdown"""
+    global shutdown_requested
+    shutdown_requested = True
+    arm_log.info(f"Received shutdown signal ({signum}). Stopping ARM ripper daemon.")
+
+
+def serve(socket_path, syslog=True):
+    """
+    Load ARM once, then start a worker for every device name sent to the socket\n
+    :param socket_path: path of the unix socket to listen on, None to use RIPPER_SOCKET
+    :param syslog: log to syslog
+    """
+    # Everything a job needs is imported here, once, so every forked worker starts warm
+    import arm.config.config as cfg
+    from arm.ripper import main as ripper_main, utils, logger
+    from arm.ripper.ARMInfo import ARMInfo
+
+    logger.create_early_logger(syslog=syslog)
+    utils.arm_setup(arm_log)
+    ripper_main.arm_info = ARMInfo(cfg.arm_config["INSTALLPATH"], cfg.arm_config['DBFILE'])
+
+    signal.signal(signal.SIGTERM, handle_shutdown)
+    signal.signal(signal.SIGINT, handle_shutdown)
+
+    socket_path = socket_path or cfg.arm_config.get("RIPPER_SOCKET") or DEFAULT_SOCKET
+    workers = {}
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+        server.bind(socket_path)
+        os.chmod(socket_path, 0o660)
+        server.listen()
+        server.settimeout(REAP_INTERVAL)
+        arm_log.info(f"ARM ripper daemon listening on {socket_path}")
+        while not shutdown_requested:
+            _reap(workers)
+            try:
+                conn, _ = server.accept()
+            except (socket.timeout, InterruptedError):
+                continue
+            with conn:
+                try:
+                    _handle_client(conn, workers, syslog)
+                except OSError as error:
+                    arm_log.error(f"Error handling ripper daemon client: {error}")
+    os.unlink(socket_path)
+
+    # Let running jobs finish their clean up (eject, job status) the same as a standalone ripper would
+    for worker in workers.values():
+        arm_log.info(f"Stopping job on {worker.devname} (pid {worker.pid})")
+        worker.terminate()
+    for worker in workers.values():
+        worker.join()
+
+
+if __name__ == "__main__":
+    arguments = entry()
+    if arguments.submit:
+        sys.exit(0 if submit(arguments.socket or socket_from_config(), arguments.submit) else 1)
+    serve(arguments.socket, syslog=arguments.syslog)
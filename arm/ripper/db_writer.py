@@ -0,0 +1,168 @@
+"""
+Database write layer shared by the ripper and the UI
+
+Every write is a list of operations (callables that make their change on db.session).
+If SQLite reports the database is locked the session is rolled back, the operations are
+re-applied and the commit is retried with exponential backoff.
+Inside batch() writes are only applied to the session and committed together when the
+with block exits, so a run of small updates costs one transaction. The ripper batches the
+writes that come in a run with nothing slow between them: the drive and config of a new job
+(main.setup), the title lookups of a DVD (identify) and the path and status before a rip
+(arm_ripper).
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from arm.ui import db
+
+# Give up on a locked database after this many seconds
+MAX_WAIT = 90
+# First retry delay, doubled after every locked attempt up to MAX_BACKOFF
+FIRST_BACKOFF = 0.05
+MAX_BACKOFF = 2.0
+
+_local = threading.local()
+_metrics_lock = threading.Lock()
+_metrics = {
+    "writes": 0,
+    "commits": 0,
+    "retries": 0,
+    "failures": 0,
+    "lock_wait": 0.0,
+}
+
+
+def commit(*operations, max_wait=MAX_WAIT):
+    """
+    Apply operations to the session and commit them, retrying while the database is locked\n
+    Inside batch() the operations are applied now and committed when the batch ends\n
+    Every attempt first waits inside SQLite for up to busy_timeout (db_engine.BUSY_TIMEOUT, 30s)
+    before it reports the database locked. max_wait and the lock_wait metric are measured on the
+    clock, so they include that time, but a write can be given up on up to busy_timeout after
+    max_wait has passed.\n
+    :param operations: callables that make a change on db.session
+    :param int max_wait: seconds to keep retrying a locked database
+    :return: True if written (or batched), False if the database stayed locked
+    """
+    _count("writes", len(operations))
+    pending = getattr(_local, "batch", None)
+    if pending is not None:
+        for operation in operations:
+            operation()
+        pending.extend(operations)
+        return True
+    return _commit(list(operations), max_wait)
+
+
+def add(obj_class, max_wait=MAX_WAIT):
+    """
+    Add a model instance to the session and commit\n
+    :param obj_class: Job/Config/Track/ etc
+    :param int max_wait: seconds to keep retrying a locked database
+    :return: True if written (or batched), False if the database stayed locked
+    """
+    return commit(lambda: db.session.add(obj_class), max_wait=max_wait)
+
+
+def update(obj_class, values, max_wait=MAX_WAIT):
+    """
+    Set attributes on a model instance and commit\n
+    :param obj_class: Job/Config/Track/ etc
+    :param dict values: attribute name and new value
+    :param int max_wait: seconds to keep retrying a locked database
+    :return: True if written (or batched), False if the database stayed locked
+    """
+    def apply():
+        for key, value in values.items():
+            setattr(obj_class, key, value)
+    return commit(apply, max_wait=max_wait)
+
+
+@contextmanager
+def batch(max_wait=MAX_WAIT):
+    """
+    Collect every write made in the with block into one transaction\n
+    Nested batches join the outer one. If the block raises, the batched changes are rolled back.\n
+    Objects added inside a batch only get their primary key when the batch commits.
+    :param int max_wait: seconds to keep retrying a locked database
+    """
+    if getattr(_local, "batch", None) is not None:
+        yield
+        return
+    _local.batch = []
+    try:
+        yield
+        operations = _local.batch
+    except BaseException:
+        db.session.rollback()
+        raise
+    finally:
+        _local.batch = None
+    if operations:
+        _commit(operations, max_wait, applied=True)
+
+
+def metrics():
+    """
+    :return: dict of write counters for this process -
+     writes requested, commits made, locked retries, writes given up on and seconds spent waiting on locks
+    """
+    with _metrics_lock:
+        return dict(_metrics)
+
+
+def log_metrics():
+    """Log the write counters, called at the end of a job"""
+    stats = metrics()
+    logging.info(f"Database writes: {stats['writes']} writes in {stats['commits']} commits, "
+                 f"{stats['retries']} locked retries ({stats['lock_wait']:.2f}s waiting), "
+                 f"{stats['failures']} failed")
+
+
+def _commit(operations, max_wait, applied=False):
+    """
+    Apply and commit operations, backing off exponentially while the database is locked\n
+    :param bool applied: the operations are already applied to the session (batch()), they are
+                         only applied again after a rollback
+    """
+    backoff = FIRST_BACKOFF
+    started = time.monotonic()
+    attempt = 0
+    while True:
+        attempt_started = time.monotonic()
+        try:
+            if not applied:
+                for operation in operations:
+                    operation()
+            applied = False
+            db.session.commit()
+            _count("commits")
+            # the locked attempts and the sleeps between them
+            _count("lock_wait", attempt_started - started)
+            return True
+        except Exception as error:
+            # A failed flush leaves the session unusable until rolled back,
+            # the rollback also drops our changes so they are applied again on the next try
+            db.session.rollback()
+            if "locked" not in str(error):
+                logging.error(f"Error: {error}")
+                _count("failures")
+                raise RuntimeError(str(error)) from error
+            waited = time.monotonic() - started
+            if waited >= max_wait:
+                logging.error(f"Database still locked after {waited:.1f}s - giving up")
+                _count("failures")
+                _count("lock_wait", waited)
+                return False
+            attempt += 1
+            _count("retries")
+            logging.debug(f"database is locked - try {attempt}, waiting {backoff:.2f}s")
+            time.sleep(backoff)
+            backoff = min(backoff * 2, MAX_BACKOFF)
+
+
+def _count(key, value=1):
+    with _metrics_lock:
+        _metrics[key] += value
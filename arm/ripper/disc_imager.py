@@ -0,0 +1,184 @@
+"""
+Imaging data discs to an ISO
+
+Reads the disc in CHUNK_SIZE blocks, aligned to the 2048 byte sectors of an optical disc,
+telling the kernel to read ahead sequentially. The SHA-256 of the image is worked out as it
+is read, and the read speed and percent done are published as the job's progress.
+
+A chunk that can't be read is tried again READ_RETRIES times, then read a sector at a
+time so only the sectors that really are bad are lost. With skip_bad_sectors those
+sectors are written as zeros (like dd conv=noerror,sync) and listed in a map next to the
+image, otherwise imaging stops.
+"""
+import errno
+import hashlib
+import logging
+import os
+import time
+
+from arm.ripper import progress
+
+SECTOR_SIZE = 2048
+# Bytes read at a time, a multiple of SECTOR_SIZE
+CHUNK_SIZE = 1024 * SECTOR_SIZE
+# Times an unreadable chunk or sector is read again
+READ_RETRIES = 3
+# Seconds to wait before reading an unreadable chunk again, the drive may need to spin up
+RETRY_WAIT = 1
+
+
+class ImagingError(OSError):
+    """The disc couldn't be imaged"""
+
+
+class ImageResult:
+    """
+    What imaging a disc produced
+    """
+
+    def __init__(self, size, sha256, bad_sectors):
+        """
+        :param int size: bytes in the image
+        :param str sha256: hex SHA-256 of the image
+        :param list bad_sectors: (first sector, count) of the runs of sectors written as zeros
+        """
+        self.size = size
+        self.sha256 = sha256
+        self.bad_sectors = bad_sectors
+
+
+def image_disc(device, destination, job_id=None, skip_bad_sectors=False):
+    """
+    Copy a disc to an image file\n
+    :param str device: block device (or file) to read
+    :param str destination: image file to write, replaced if it exists
+    :param job_id: job to publish progress for, None for no progress
+    :param bool skip_bad_sectors: write sectors that can't be read as zeros instead of failing
+    :return: ImageResult
+    :raises ImagingError: if the disc can't be read, or a sector can't be read and skip_bad_sectors is False
+    :raises OSError: if the image can't be written
+    """
+    try:
+        source_fd = os.open(device, os.O_RDONLY)
+    except OSError as error:
+        raise ImagingError(f"Couldn't open {device}: {error}") from error
+    try:
+        size = os.lseek(source_fd, 0, os.SEEK_END)
+        _advise(source_fd, 0, 0, "POSIX_FADV_SEQUENTIAL")
+        logging.info(f"Imaging {size} bytes from {device} to {destination}")
+        with open(destination, "wb") as image:
+            _preallocate(image.fileno(), size)
+            result = _copy(source_fd, image, size, job_id, skip_bad_sectors)
+            # a disc that ended early leaves preallocated space after the image
+            image.truncate(result.size)
+            image.flush()
+            os.fsync(image.fileno())
+    finally:
+        os.close(source_fd)
+    if result.bad_sectors:
+        logging.warning(f"{sum(count for _, count in result.bad_sectors)} sectors of {device} couldn't be read "
+                        f"and were written as zeros")
+    return result
+
+
+def _copy(source_fd, image, size, job_id, skip_bad_sectors):
+    """Copy size bytes from source_fd to image, hashing as it goes"""
+    sha256 = hashlib.sha256()
+    bad_sectors = []
+    run = progress.Progress(job_id, "imager") if job_id is not None else None
+    started = time.monotonic()
+    offset = 0
+    try:
+        while offset < size:
+            length = min(CHUNK_SIZE, size - offset)
+            # start reading the next chunk while this one is hashed and written
+            _advise(source_fd, offset + length, CHUNK_SIZE, "POSIX_FADV_WILLNEED")
+            data = _read_chunk(source_fd, offset, length, skip_bad_sectors, bad_sectors)
+            if not data:
+                # the disc ended before its reported size
+                logging.warning(f"Disc ended at {offset} of {size} bytes")
+                break
+            sha256.update(data)
+            image.write(data)
+            offset += len(data)
+            if run is not None:
+                elapsed = max(time.monotonic() - started, 0.001)
+                run.update(offset * 100 / size, stage=f"Imaging {offset / elapsed / 1024 / 1024:.1f} MB/s")
+    finally:
+        if run is not None:
+            run.finish()
+    return ImageResult(offset, sha256.hexdigest(), bad_sectors)
+
+
+def _read_chunk(source_fd, offset, length, skip_bad_sectors, bad_sectors):
+    """Read a chunk, trying again and then sector by sector if it can't be read"""
+    for attempt in range(READ_RETRIES + 1):
+        try:
+            return os.pread(source_fd, length, offset)
+        except OSError as error:
+            logging.debug(f"Read of {length} bytes at {offset} failed ({attempt + 1}): {error}")
+            if attempt < READ_RETRIES:
+                time.sleep(RETRY_WAIT)
+    logging.info(f"Reading the sectors at {offset}-{offset + length} one at a time")
+    sectors = []
+    for sector_offset in range(offset, offset + length, SECTOR_SIZE):
+        sector_length = min(SECTOR_SIZE, offset + length - sector_offset)
+        sectors.append(_read_sector(source_fd, sector_offset, sector_length, skip_bad_sectors, bad_sectors))
+    return b"".join(sectors)
+
+
+def _read_sector(source_fd, offset, length, skip_bad_sectors, bad_sectors):
+    """Read one sector, zeros if it can't be read and skip_bad_sectors"""
+    error = None
+    for _ in range(READ_RETRIES + 1):
+        try:
+            return os.pread(source_fd, length, offset)
+        except OSError as read_error:
+            error = read_error
+    sector = offset // SECTOR_SIZE
+    if not skip_bad_sectors:
+        raise ImagingError(f"Sector {sector} couldn't be read: {error}") from error
+    logging.debug(f"Sector {sector} couldn't be read, writing zeros: {error}")
+    if bad_sectors and sum(bad_sectors[-1]) == sector:
+        bad_sectors[-1] = (bad_sectors[-1][0], bad_sectors[-1][1] + 1)
+    else:
+        bad_sectors.append((sector, 1))
+    return bytes(length)
+
+
+def write_checksum(image_path, result):
+    """
+    Write the SHA-256 of an image next to it, in sha256sum format, and the map of sectors that couldn't be read\n
+    :param str image_path: the image
+    :param ImageResult result: what imaging it produced
+    :return: None
+    """
+    name = os.path.basename(image_path)
+    with open(f"{image_path}.sha256", "w") as checksum_file:
+        checksum_file.write(f"{result.sha256}  {name}\n")
+    if result.bad_sectors:
+        with open(f"{image_path}.badsectors", "w") as map_file:
+            map_file.write(f"# Sectors of {SECTOR_SIZE} bytes in {name} that couldn't be read, written as zeros\n"
+                           f"# first sector, number of sectors\n")
+            map_file.writelines(f"{first} {count}\n" for first, count in result.bad_sectors)
+
+
+def _advise(fd, offset, length, advice):
+    """posix_fadvise, a hint only, ignored where it isn't supported"""
+    try:
+        os.posix_fadvise(fd, offset, length, getattr(os, advice))
+    except (AttributeError, OSError):
+        pass
+
+
+def _preallocate(fd, size):
+    """Reserve the space for the image up front, so it isn't fragmented and a full disk is found straight away"""
+    try:
+        os.posix_fallocate(fd, 0, size)
+    except AttributeError:
+        pass
+    except OSError as error:
+        if error.errno == errno.ENOSPC:
+            raise
+        # not supported by some filesystems
+        logging.debug(f"Couldn't preallocate {size} bytes: {error}")
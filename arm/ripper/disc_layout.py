@@ -0,0 +1,118 @@
+"""
+What kind of disc is mounted, from the folders at its root
+
+The disc type is decided by the folders at the root of the disc (VIDEO_TS, BDMV, AUDIO_TS,
+HVDVD_TS), so probe() reads the root once and keeps the listing. Only a disc with none of them
+is searched deeper for HVDVD_TS, at most SEARCH_DEPTH folders down and SEARCH_ENTRIES entries,
+rather than walking every file of the disc: each folder read is a seek on an optical drive.
+"""
+import logging
+import os
+
+# Folders below the root searched for HVDVD_TS on a disc without any of the known folders
+SEARCH_DEPTH = 2
+# Entries looked at in that search at most
+SEARCH_ENTRIES = 1000
+HDDVD_FOLDER = "HVDVD_TS"
+
+
+class DiscLayout:
+    """
+    Listing of the root of a mounted disc
+    """
+
+    def __init__(self, mountpoint, names, audio_ts=(), hddvd_path=None):
+        """
+        :param str mountpoint: where the disc is mounted
+        :param dict names: names at the root of the disc, keyed by the upper case name
+        :param audio_ts: names in the AUDIO_TS folder
+        :param str hddvd_path: path of HVDVD_TS relative to mountpoint, if it was found below the root
+        """
+        self.mountpoint = mountpoint
+        self.names = names
+        self.audio_ts = list(audio_ts)
+        self.hddvd_path = hddvd_path
+
+    def has(self, name):
+        """True if name (any case) is at the root of the disc"""
+        return name.upper() in self.names
+
+    def path(self, name):
+        """Path of name at the root of the disc, with the case it has on the disc"""
+        return os.path.join(self.mountpoint, self.names.get(name.upper(), name))
+
+    @property
+    def found(self):
+        """The folder the kind was decided by, None if the disc has none of them"""
+        if self.audio_ts:
+            return self.names["AUDIO_TS"]
+        for name in ("VIDEO_TS", "BDMV", HDDVD_FOLDER):
+            if self.has(name):
+                return self.names[name]
+        return self.hddvd_path
+
+    @property
+    def kind(self):
+        """
+        dvd, bluray, hddvd or data\n
+        A disc with files in AUDIO_TS (DVD-Audio) is data, even if it has VIDEO_TS too.
+        """
+        if self.audio_ts or self.found is None:
+            return "data"
+        if self.has("VIDEO_TS"):
+            return "dvd"
+        if self.has("BDMV"):
+            return "bluray"
+        return "hddvd"
+
+
+def probe(mountpoint):
+    """
+    List the root of a mounted disc, searching deeper for HVDVD_TS only if it has none of the known folders\n
+    :param str mountpoint: where the disc is mounted
+    :return: DiscLayout, empty if the disc can't be read
+    """
+    names = _names(mountpoint)
+    layout = DiscLayout(mountpoint, names)
+    if layout.has("AUDIO_TS"):
+        layout.audio_ts = list(_names(layout.path("AUDIO_TS")).values())
+    if layout.found is None and names:
+        layout.hddvd_path = _search(mountpoint, HDDVD_FOLDER)
+    logging.debug(f"Disc root: {sorted(names.values())}, found: {layout.found}")
+    return layout
+
+
+def _names(path):
+    """
+    Names in a folder, keyed by upper case name, {} if it can't be read\n
+    Only the folder is read, nothing in it is stat()ed: burned UDF discs can list an entry
+    whose stat() fails with a stale file handle.
+    """
+    try:
+        with os.scandir(path) as entries:
+            return {entry.name.upper(): entry.name for entry in entries}
+    except OSError:
+        return {}
+
+
+def _search(mountpoint, name):
+    """Path relative to mountpoint of name (any case) in the folders below the root, None if not found"""
+    name = name.upper()
+    folders = [(mountpoint, 0)]
+    looked_at = 0
+    while folders:
+        folder, depth = folders.pop(0)
+        try:
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    looked_at += 1
+                    if looked_at > SEARCH_ENTRIES:
+                        logging.debug(f"Stopped looking for {name} after {SEARCH_ENTRIES} entries")
+                        return None
+                    if entry.name.upper() == name and depth > 0:
+                        return os.path.relpath(entry.path, mountpoint)
+                    if depth < SEARCH_DEPTH and entry.is_dir(follow_symlinks=False):
+                        folders.append((entry.path, depth + 1))
+        except OSError:
+            continue
+    return None
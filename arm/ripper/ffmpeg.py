@@ -5,30 +5,48 @@ import os
 import logging
 import subprocess
 import shlex
+import shutil
 import json
 import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 import arm.config.config as cfg
 
-from arm.ripper import utils
+from arm.ripper import utils, slots, progress, transcode_pool
 from arm.ui import app, db  # noqa E402
 from arm.models.job import JobState
 
 PROCESS_COMPLETE = "FFMPEG processing complete"
-
-
-def ffmpeg_sleep_check(job):
+# Position and speed from ffmpeg's -progress output (key=value) or its status line (time=00:01:02.03 ... fps= 25)
+FFMPEG_OUT_TIME_US = re.compile(r"^out_time_us=(\d+)")
+FFMPEG_TIME = re.compile(r"time=(\d{2}):(\d{2}):(\d{2})\.(\d{2})")
+FFMPEG_FPS = re.compile(r"fps=\s*(\d+(?:\.\d+)?)")
+# Split encode (FFMPEG_SPLIT_ENCODE) - shortest segment worth its own ffmpeg process, in seconds
+MIN_SEGMENT_LENGTH = 120
+# Times a failed segment is encoded again before the transcode fails
+SEGMENT_RETRIES = 2
+# Segments encoded at once when FFMPEG_SPLIT_WORKERS is 0, each ffmpeg already uses several threads
+SPLIT_WORKERS = 4
+
+
+@contextmanager
+def ffmpeg_sleep_check(job, set_status=True):
     """
-    Wait until there is a spot to transcode (FFmpeg variant).
+    Hold a transcode slot for the with block (FFmpeg variant).
 
-    Mirrors handbrake_sleep_check but uses the FFMPEG_CLI token and
-    updates the job state via the database_updater helper.
+    Mirrors handbrake_sleep_check, HandBrake and FFmpeg share the
+    MAX_CONCURRENT_TRANSCODES slots, set_status=False leaves the job status alone.
     """
     logging.debug("FFMPEG starting.")
-    utils.database_updater({"status": JobState.TRANSCODE_WAITING.value}, job)
+    if set_status:
+        utils.database_updater({"status": JobState.TRANSCODE_WAITING.value}, job)
 
-    utils.sleep_check_process(cfg.arm_config["FFMPEG_CLI"], int(cfg.arm_config["MAX_CONCURRENT_TRANSCODES"]))
-    logging.debug(f"Setting job status to '{JobState.TRANSCODE_ACTIVE.value}'")
-    utils.database_updater({"status": JobState.TRANSCODE_ACTIVE.value}, job)
+    with slots.transcode_slots().slot(job.job_id):
+        if set_status:
+            logging.debug(f"Setting job status to '{JobState.TRANSCODE_ACTIVE.value}'")
+            utils.database_updater({"status": JobState.TRANSCODE_ACTIVE.value}, job)
+        yield
 
 
 def correct_ffmpeg_settings(job):
@@ -64,7 +82,7 @@ def probe_source(src_path):
     focus on parsing and error handling.
     """
 
-    cmd = f"ffprobe -v error -print_format json -show_format -show_streams {shlex.quote(src_path)}"
+    cmd = f"ffprobe -v error -print_format json -show_format -show_streams -show_chapters {shlex.quote(src_path)}"
     logging.debug(f"FFProbe command: {cmd}")
     try:
         out = subprocess.check_output(cmd, shell=True, stderr=subprocess.STDOUT).decode('utf-8')
@@ -176,7 +194,7 @@ def _compute_aspect(width, height):
 
 def evaluate_and_register_tracks(tracks, job):
     """
-    Identify the Main Track & register all the tracks with utils.put_track.
+    Identify the Main Track & register all the tracks in one transaction.
 
     This function sets job.no_of_titles and commits once. It marks the
     longest-duration track as the main feature.
@@ -198,15 +216,15 @@ def evaluate_and_register_tracks(tracks, job):
     job.no_of_titles = len(tracks)
     db.session.commit()
 
-    for t in tracks:
-        is_main = (t.get('title') == main_title)
-        utils.put_track(job,
-                        int(t.get('title')),
-                        int(t.get('duration', 0)),
-                        t.get('aspect', 0),
-                        float(t.get('fps', 0.0)),
-                        bool(is_main),
-                        "FFmpeg")
+    with utils.TrackBatch(job) as track_batch:
+        for t in tracks:
+            is_main = (t.get('title') == main_title)
+            track_batch.add(int(t.get('title')),
+                            int(t.get('duration', 0)),
+                            t.get('aspect', 0),
+                            float(t.get('fps', 0.0)),
+                            bool(is_main),
+                            "FFmpeg")
 
 
 def ffmpeg_main_feature(src_path, out_path, job):
@@ -222,52 +240,52 @@ def ffmpeg_main_feature(src_path, out_path, job):
     logging.debug(f"\n\r{job.pretty_table()}")
 
     utils.database_updater({'status': "waiting_transcode"}, job)
-    ffmpeg_sleep_check(job)
-    logging.debug("Setting job status to 'transcoding'")
-    utils.database_updater({'status': "transcoding"}, job)
-
-    # Prepare output filename
-    filename = os.path.join(job.title + "." + cfg.arm_config["DEST_EXT"])
-    out_file_path = os.path.join(out_path, filename)
-    logging.info(f"Ripping title main_feature to {shlex.quote(out_file_path)}")
-
-    # Get info about the tracks on the disk and add that info to the job
-    get_track_info(src_path, job)
-
-    # Getting the main feature track, selecting based on the info just gathered
-    track = job.tracks.filter_by(main_feature=True).first()
-    if track is None:
-        msg = "No main feature found by FFMPEG. Turn main_feature to false in arm.yml and try again."
-        logging.error(msg)
-        raise RuntimeError(msg)
-
-    # Ensuring the filenames are all in sync
-    track.filename = track.orig_filename = filename
-    db.session.commit()
-
-    try:
-        # Create the output directory if it doesn't exist
-        subprocess.check_output((f"mkdir -p {shlex.quote(out_path)} "
-                                 f"&& chmod -R 777 {shlex.quote(out_path)}"), shell=True)
-        # Transcode the main feature
-        run_transcode_cmd(src_path, out_file_path, job)
-        logging.info("FFMPEG call successful")
-        # Update the status of the job as succeeded
-        track.status = "success"
-    except subprocess.CalledProcessError as ffmpeg_error:
-        # If it fails mark the job as failed and log it
-        err = f"Call to FFMPEG failed with code: {ffmpeg_error.returncode}"
-        logging.error(err)
-        track.status = "fail"
-        track.error = job.errors = err
-        job.status = "fail"
+    with ffmpeg_sleep_check(job):
+        logging.debug("Setting job status to 'transcoding'")
+        utils.database_updater({'status': "transcoding"}, job)
+
+        # Prepare output filename
+        filename = os.path.join(job.title + "." + cfg.arm_config["DEST_EXT"])
+        out_file_path = os.path.join(out_path, filename)
+        logging.info(f"Ripping title main_feature to {shlex.quote(out_file_path)}")
+
+        # Get info about the tracks on the disk and add that info to the job
+        get_track_info(src_path, job)
+
+        # Getting the main feature track, selecting based on the info just gathered
+        track = job.tracks.filter_by(main_feature=True).first()
+        if track is None:
+            msg = "No main feature found by FFMPEG. Turn main_feature to false in arm.yml and try again."
+            logging.error(msg)
+            raise RuntimeError(msg)
+
+        # Ensuring the filenames are all in sync
+        track.filename = track.orig_filename = filename
         db.session.commit()
-        raise
 
-    logging.info(PROCESS_COMPLETE)
-    logging.debug(f"\n\r{job.pretty_table()}")
-    track.ripped = True
-    db.session.commit()
+        try:
+            # Create the output directory if it doesn't exist
+            subprocess.check_output((f"mkdir -p {shlex.quote(out_path)} "
+                                     f"&& chmod -R 777 {shlex.quote(out_path)}"), shell=True)
+            # Transcode the main feature
+            run_transcode_cmd(src_path, out_file_path, job)
+            logging.info("FFMPEG call successful")
+            # Update the status of the job as succeeded
+            track.status = "success"
+        except subprocess.CalledProcessError as ffmpeg_error:
+            # If it fails mark the job as failed and log it
+            err = f"Call to FFMPEG failed with code: {ffmpeg_error.returncode}"
+            logging.error(err)
+            track.status = "fail"
+            track.error = job.errors = err
+            job.status = "fail"
+            db.session.commit()
+            raise
+
+        logging.info(PROCESS_COMPLETE)
+        logging.debug(f"\n\r{job.pretty_table()}")
+        track.ripped = True
+        db.session.commit()
 
 
 def ffmpeg_all(src_path, base_path, job):
@@ -279,56 +297,72 @@ def ffmpeg_all(src_path, base_path, job):
     :return: None
     """
     # Wait until there is a spot to transcode, if a limited amount of transcodes can run at once
-    ffmpeg_sleep_check(job)
-    db.session.commit()
-    logging.info("Starting BluRay/DVD transcoding - All titles")
-
-    get_track_info(src_path, job)
-
-    logging.debug(f"Total number of tracks is {job.no_of_titles}")
-
-    for track in job.tracks:
-        # Don't raise error if we past max titles, skip and continue till FFMPEG finishes
-        if int(track.track_number) > job.no_of_titles:
-            continue
-        if track.length < int(cfg.arm_config["MINLENGTH"]):
-            # if track is too short then skip it
-            logging.info(f"Track #{track.track_number} of {job.no_of_titles}. "
-                         f"Length ({track.length}) is less than minimum length ({cfg.arm_config['MINLENGTH']}). "
-                         f"Skipping...")
-        elif track.length > int(cfg.arm_config["MAXLENGTH"]):
-            # If track is too long then skip it
-            logging.info(f"Track #{track.track_number} of {job.no_of_titles}. "
-                         f"Length ({track.length}) is greater than maximum length ({cfg.arm_config['MAXLENGTH']}). "
-                         f"Skipping...")
-        else:
-            logging.info(f"Processing track #{track.track_number} of {job.no_of_titles}. "
-                         f"Length is {track.length} seconds.")
+    with ffmpeg_sleep_check(job):
+        db.session.commit()
+        logging.info("Starting BluRay/DVD transcoding - All titles")
+
+        get_track_info(src_path, job)
+
+        logging.debug(f"Total number of tracks is {job.no_of_titles}")
+
+        titles = []
+        for track in job.tracks:
+            # Don't raise error if we past max titles, skip and continue till FFMPEG finishes
+            if int(track.track_number) > job.no_of_titles:
+                continue
+            if track.length < int(cfg.arm_config["MINLENGTH"]):
+                # if track is too short then skip it
+                logging.info(f"Track #{track.track_number} of {job.no_of_titles}. "
+                             f"Length ({track.length}) is less than minimum length ({cfg.arm_config['MINLENGTH']}). "
+                             f"Skipping...")
+            elif track.length > int(cfg.arm_config["MAXLENGTH"]):
+                # If track is too long then skip it
+                logging.info(f"Track #{track.track_number} of {job.no_of_titles}. "
+                             f"Length ({track.length}) is greater than maximum length ({cfg.arm_config['MAXLENGTH']}). "
+                             f"Skipping...")
+            else:
+                logging.info(f"Processing track #{track.track_number} of {job.no_of_titles}. "
+                             f"Length is {track.length} seconds.")
+                titles.append(track.track_id)
 
-            out_file_name = f"title_{track.track_number}.{cfg.arm_config['DEST_EXT']}"
-            out_file_path = os.path.join(base_path, out_file_name)
+        transcode_pool.run(job, titles, lambda title_job, track_id, _encoders: ffmpeg_title(
+            title_job, track_id, src_path, base_path), src_path)
 
-            logging.info(f"Transcoding title {track.track_number} to {shlex.quote(out_file_path)}")
+        logging.info(PROCESS_COMPLETE)
+        logging.debug(f"\n\r{job.pretty_table()}")
 
-            track.filename = track.orig_filename = out_file_name
-            db.session.commit()
 
-            try:
-                # Transcode the title
-                run_transcode_cmd(src_path, out_file_path, job)
-                track.status = "success"
-            except subprocess.CalledProcessError as ff_error:
-                err = f"FFMPEG encoding of title {track.track_number} failed with code: {ff_error.returncode}"
-                logging.error(err)
-                track.status = "fail"
-                track.error = err
-                db.session.commit()
-                raise
-            track.ripped = True
-            db.session.commit()
+def ffmpeg_title(job, track_id, src_path, base_path):
+    """
+    Transcode one title of the disc, the caller holds a transcode slot\n\n
+    :param job: Disc object\n
+    :param track_id: id of the Track to transcode\n
+    :param src_path: Path to source for FFmpeg (dvd or files)\n
+    :param base_path: Path where FFmpeg will save trancoded files\n
+    :return: None
+    """
+    track = job.tracks.filter_by(track_id=track_id).one()
+    out_file_name = f"title_{track.track_number}.{cfg.arm_config['DEST_EXT']}"
+    out_file_path = os.path.join(base_path, out_file_name)
 
-    logging.info(PROCESS_COMPLETE)
-    logging.debug(f"\n\r{job.pretty_table()}")
+    logging.info(f"Transcoding title {track.track_number} to {shlex.quote(out_file_path)}")
+
+    track.filename = track.orig_filename = out_file_name
+    db.session.commit()
+
+    try:
+        # Transcode the title
+        run_transcode_cmd(src_path, out_file_path, job)
+        track.status = "success"
+    except subprocess.CalledProcessError as ff_error:
+        err = f"FFMPEG encoding of title {track.track_number} failed with code: {ff_error.returncode}"
+        logging.error(err)
+        track.status = "fail"
+        track.error = err
+        db.session.commit()
+        raise
+    track.ripped = True
+    db.session.commit()
 
 
 def ffmpeg_default(src_path, base_path, job):
@@ -342,40 +376,40 @@ def ffmpeg_default(src_path, base_path, job):
     # Wait until there is a spot to transcode (if amount of simultaneous transcodes are limited)
     job.status = "waiting_transcode"
     db.session.commit()
-    ffmpeg_sleep_check(job)
-    job.status = "transcoding"
-    db.session.commit()
+    with ffmpeg_sleep_check(job):
+        job.status = "transcoding"
+        db.session.commit()
 
-    # This will fail if the directory raw gets deleted
-    for file in os.listdir(src_path):
-        src_path_name = os.path.join(src_path, file)
-        dest_file = os.path.splitext(file)[0]
-
-        # MakeMKV always saves in mkv we need to update the db with the new filename
-        logging.debug(dest_file + ".mkv")
-        job_current_track = job.tracks.filter_by(filename=dest_file + ".mkv")
-        track = None
-
-        # Generating the destination filename and updating the db
-        for track in job_current_track:
-            logging.debug("filename: " + track.filename)
-            track.orig_filename = track.filename
-            track.filename = dest_file + "." + cfg.arm_config["DEST_EXT"]
-            logging.debug("UPDATED filename: " + track.filename)
-            db.session.commit()
-        file_name = os.path.join(base_path, dest_file + "." + cfg.arm_config["DEST_EXT"])
-        out_file_path = os.path.join(base_path, file_name)
-        logging.info(f"Transcoding file {shlex.quote(file)} to {shlex.quote(out_file_path)}")
+        # This will fail if the directory raw gets deleted
+        for file in os.listdir(src_path):
+            src_path_name = os.path.join(src_path, file)
+            dest_file = os.path.splitext(file)[0]
+
+            # MakeMKV always saves in mkv we need to update the db with the new filename
+            logging.debug(dest_file + ".mkv")
+            job_current_track = job.tracks.filter_by(filename=dest_file + ".mkv")
+            track = None
+
+            # Generating the destination filename and updating the db
+            for track in job_current_track:
+                logging.debug("filename: " + track.filename)
+                track.orig_filename = track.filename
+                track.filename = dest_file + "." + cfg.arm_config["DEST_EXT"]
+                logging.debug("UPDATED filename: " + track.filename)
+                db.session.commit()
+            file_name = os.path.join(base_path, dest_file + "." + cfg.arm_config["DEST_EXT"])
+            out_file_path = os.path.join(base_path, file_name)
+            logging.info(f"Transcoding file {shlex.quote(file)} to {shlex.quote(out_file_path)}")
 
-        # Actually transcoding the file to the output location
-        try:
-            run_transcode_cmd(src_path_name, out_file_path, job)
-            logging.info("Transcode succeeded")
-        except subprocess.CalledProcessError as e:
-            logging.error(f"Transcode failed: {e}")
+            # Actually transcoding the file to the output location
+            try:
+                run_transcode_cmd(src_path_name, out_file_path, job)
+                logging.info("Transcode succeeded")
+            except subprocess.CalledProcessError as e:
+                logging.error(f"Transcode failed: {e}")
 
-    logging.info(PROCESS_COMPLETE)
-    logging.debug(f"\n\r{job.pretty_table()}")
+        logging.info(PROCESS_COMPLETE)
+        logging.debug(f"\n\r{job.pretty_table()}")
 
 
 def get_track_info(src_path, job):
@@ -415,64 +449,90 @@ def ffmpeg_mkv(src_path, base_path, job):
     # Added to limit number of transcodes
     job.status = "waiting_transcode"
     db.session.commit()
-    ffmpeg_sleep_check(job)
-    job.status = "transcoding"
-    db.session.commit()
+    with ffmpeg_sleep_check(job):
+        job.status = "transcoding"
+        db.session.commit()
 
-    # This will fail if the directory raw gets deleted
-    for files in os.listdir(src_path):
-        src_files_path = os.path.join(src_path, files)
-        dest_file = os.path.splitext(files)[0]
-        # MakeMKV always saves in mkv we need to update the db with the new filename
-        logging.debug(dest_file + ".mkv")
-        job_current_track = job.tracks.filter_by(filename=dest_file + ".mkv")
-        track = None
-        # Generating the destination filename and updating the db
-        for track in job_current_track:
-            logging.debug("filename: " + track.filename)
-            track.orig_filename = track.filename
-            track.filename = dest_file + "." + cfg.arm_config["DEST_EXT"]
-            logging.debug("UPDATED filename: " + track.filename)
-            db.session.commit()
+        # This will fail if the directory raw gets deleted
+        files = [os.path.join(src_path, name) for name in os.listdir(src_path)]
+        transcode_pool.run(job, files, lambda file_job, path, _encoders: ffmpeg_mkv_file(path, base_path, file_job),
+                           src_path)
 
-        # Use filename relative to basepath
-        file_name = dest_file + "." + cfg.arm_config["DEST_EXT"]
-        file_path_name = os.path.join(base_path, file_name)
+        logging.info(PROCESS_COMPLETE)
+        logging.debug(f"\n\r{job.pretty_table()}")
 
-        logging.info(f"Transcoding file {shlex.quote(files)} to {shlex.quote(file_path_name)}")
 
-        try:
-            # Making the output directory if it doesn't exist
-            subprocess.check_output((f"mkdir -p {shlex.quote(base_path)} "
-                                     f"&& chmod -R 777 {shlex.quote(base_path)}"), shell=True)
-
-            # Actually transcoding the file to the output location & updating the db with the status
-            run_transcode_cmd(src_files_path, file_path_name, job)
-            logging.info("FFmpeg call successful")
-            if track is not None:
-                track.status = "success"
-                db.session.commit()
-            else:
-                logging.debug("No matching DB track found to mark success")
-        except subprocess.CalledProcessError as ff_error:
-            # Mark track and job as failed if ffmpeg fails
-            err = f"Call to FFmpeg failed with code: {ff_error.returncode}"
-            logging.error(err)
-            if track is not None:
-                track.status = "fail"
-                track.error = err
-            job.errors = err
-            job.status = "fail"
+def ffmpeg_mkv_file(src_files_path, base_path, job):
+    """
+    Transcode one mkv file ripped by MakeMKV, the caller holds the transcode slot\n\n
+    :param src_files_path: Path to the mkv file\n
+    :param base_path: Path where FFMpeg will save trancoded files\n
+    :param job: Disc object\n
+    :return: None
+    """
+    files = os.path.basename(src_files_path)
+    dest_file = os.path.splitext(files)[0]
+    # MakeMKV always saves in mkv we need to update the db with the new filename
+    logging.debug(dest_file + ".mkv")
+    job_current_track = job.tracks.filter_by(filename=dest_file + ".mkv")
+    track = None
+    # Generating the destination filename and updating the db
+    for track in job_current_track:
+        logging.debug("filename: " + track.filename)
+        track.orig_filename = track.filename
+        track.filename = dest_file + "." + cfg.arm_config["DEST_EXT"]
+        logging.debug("UPDATED filename: " + track.filename)
+        db.session.commit()
+
+    # Use filename relative to basepath
+    file_name = dest_file + "." + cfg.arm_config["DEST_EXT"]
+    file_path_name = os.path.join(base_path, file_name)
+
+    logging.info(f"Transcoding file {shlex.quote(files)} to {shlex.quote(file_path_name)}")
+
+    try:
+        # Making the output directory if it doesn't exist
+        subprocess.check_output((f"mkdir -p {shlex.quote(base_path)} "
+                                 f"&& chmod -R 777 {shlex.quote(base_path)}"), shell=True)
+
+        # Actually transcoding the file to the output location & updating the db with the status
+        run_transcode_cmd(src_files_path, file_path_name, job)
+        logging.info("FFmpeg call successful")
+        if track is not None:
+            track.status = "success"
             db.session.commit()
-            raise
+        else:
+            logging.debug("No matching DB track found to mark success")
+    except subprocess.CalledProcessError as ff_error:
+        # Mark track and job as failed if ffmpeg fails
+        err = f"Call to FFmpeg failed with code: {ff_error.returncode}"
+        logging.error(err)
+        if track is not None:
+            track.status = "fail"
+            track.error = err
+        job.errors = err
+        job.status = "fail"
+        db.session.commit()
+        raise
 
-    logging.info(PROCESS_COMPLETE)
-    logging.debug(f"\n\r{job.pretty_table()}")
+
+def ffmpeg_out_time(line):
+    """
+    Find how far into the source ffmpeg has got
+    :param line: a line of ffmpeg output
+    :return: position in microseconds, None if the line doesn't have it
+    """
+    if out_time_search := FFMPEG_OUT_TIME_US.search(line):
+        return int(out_time_search.group(1))
+    if time_search := FFMPEG_TIME.search(line):
+        hours, minutes, seconds, hundredths = (int(group) for group in time_search.groups())
+        return (hours * 3600 + minutes * 60 + seconds) * 1000000 + hundredths * 10000
+    return None
 
 
 def run_transcode_cmd(src_file, out_file, job, ff_pre_args="", ff_post_args=""):
     """
-    Run the FFmpeg command and capture the progress for the progress bar in the ui
+    Run the FFmpeg command and publish its progress for the progress bar in the ui
     """
     if not ff_pre_args or not ff_post_args:
         ff_pre_args, ff_post_args = correct_ffmpeg_settings(job)
@@ -489,6 +549,9 @@ def run_transcode_cmd(src_file, out_file, job, ff_pre_args="", ff_post_args=""):
         logging.error(f"Could not get duration from ffprobe: {e}")
         # We can continue without progress reporting if this fails
 
+    if split_wanted(src_file, total_duration, job):
+        return run_split_transcode(src_file, out_file, job, ff_pre_args, ff_post_args, total_duration)
+
         # Build the ffmpeg command without progress reporting
     cmd = (f"{cfg.arm_config['FFMPEG_CLI']} {ff_pre_args} -i {shlex.quote(src_file)} "
            f"{'-progress pipe:1 ' if logging.getLogger().isEnabledFor(logging.DEBUG) else ''}"
@@ -500,36 +563,214 @@ def run_transcode_cmd(src_file, out_file, job, ff_pre_args="", ff_post_args=""):
     process = subprocess.Popen(shlex.split(cmd), stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
                                universal_newlines=True, bufsize=1)
 
-    for line in process.stdout:  # type: ignore
-        if logging.getLogger().isEnabledFor(logging.DEBUG):
-            logging.debug(line.strip())
-            if total_duration > 0 and "out_time_us" in line:
-                parts = line.strip().split("=")
-                if len(parts) == 2 and parts[0] == "out_time_us":
-                    try:
-                        out_time_us = int(parts[1])
-                        percentage = (out_time_us / total_duration) * 100
-                        # Clamp percentage between 0 and 100
-                        percentage = max(0, min(100, percentage))
-                        logging.info(f"ARM: Transcoding progress: {percentage:.2f}%")
-                    except ValueError:
-                        pass
-        else:
-            if total_duration > 0 and "time=" in line:
-                time_search = re.search(r'time=(\d{2}):(\d{2}):(\d{2})\.(\d{2})', line)
-                if time_search:
-                    hours = int(time_search.group(1))
-                    minutes = int(time_search.group(2))
-                    seconds = int(time_search.group(3))
-                    milliseconds = int(time_search.group(4))
-                    out_time_us = (hours * 3600 + minutes * 60 + seconds) * 1000000 + milliseconds * 10000
-                    percentage = (out_time_us / total_duration) * 100
-                    percentage = max(0, min(100, percentage))
-                    logging.info(f"ARM: {line.strip()} - {percentage:.2f}%")
-            else:
-                logging.debug(line.strip())
+    with progress.Progress(job.job_id, "ffmpeg", title=os.path.basename(out_file)) as job_progress:
+        fps = None
+        for line in process.stdout:  # type: ignore
+            line = line.strip()
+            logging.debug(line)
+            if fps_search := FFMPEG_FPS.search(line):
+                fps = fps_search.group(1)
+            out_time_us = ffmpeg_out_time(line)
+            if total_duration > 0 and out_time_us is not None:
+                job_progress.update(out_time_us / total_duration * 100, stage="Transcoding", cur_fps=fps)
 
     process.wait()
 
     if process.returncode != 0:
         raise subprocess.CalledProcessError(process.returncode, cmd)
+
+
+def split_workers(job):
+    """
+    Number of segments encoded at once by a split encode\n
+    FFMPEG_SPLIT_WORKERS, or SPLIT_WORKERS but no more than one per core, shared between the titles
+    of the job transcode_pool encodes at the same time.
+    :param job: Job instance
+    :return: int, at least 1
+    """
+    count = int(cfg.arm_config.get("FFMPEG_SPLIT_WORKERS", 0)) or min(SPLIT_WORKERS, os.cpu_count() or 1)
+    return max(1, count // transcode_pool.workers(job))
+
+
+def split_wanted(src_file, total_duration, job):
+    """
+    Whether to encode src_file in segments, see run_split_transcode()\n
+    :param src_file: file to transcode, discs and folders are always encoded in one go
+    :param int total_duration: length of src_file in microseconds, 0 if unknown
+    :param job: Job instance
+    :return: bool
+    """
+    min_length = int(cfg.arm_config.get("FFMPEG_SPLIT_MIN_LENGTH", 1800))
+    return bool(cfg.arm_config.get("FFMPEG_SPLIT_ENCODE", False)) and os.path.isfile(src_file) \
+        and split_workers(job) > 1 and total_duration >= max(min_length, 2 * MIN_SEGMENT_LENGTH) * 1_000_000
+
+
+def split_points(duration, chapters, segments):
+    """
+    Start of each segment, cut at the chapter start nearest to an even split when there are chapters\n
+    >>> split_points(600, [], 3)
+    [0.0, 200.0, 400.0]
+    >>> split_points(600, [0.0, 150.0, 290.0, 310.0, 420.0], 3)
+    [0.0, 150.0, 420.0]
+    >>> split_points(600, [0.0, 590.0], 2)
+    [0.0]
+
+    :param float duration: length of the source in seconds
+    :param list chapters: chapter start times in seconds
+    :param int segments: number of segments wanted
+    :return: list of start times in seconds, starting with 0
+    """
+    points = [0.0]
+    for index in range(1, segments):
+        point = duration * index / segments
+        if chapters:
+            point = min(chapters, key=lambda start: abs(start - point))
+        # Segments too short to be worth a process are merged with the one before
+        if point - points[-1] >= MIN_SEGMENT_LENGTH and duration - point >= MIN_SEGMENT_LENGTH:
+            points.append(float(point))
+    return points
+
+
+def run_split_transcode(src_file, out_file, job, ff_pre_args, ff_post_args, total_duration):
+    """
+    Encode the video of src_file in segments on several ffmpeg processes at once and join them without re-encoding\n
+    The segments are cut at chapter starts (or even intervals without chapters). Each is re-encoded from
+    an input seek, which ffmpeg decodes from the keyframe before the cut, so every segment starts exactly
+    on its cut and the parts join up. A failed segment is encoded again up to SEGMENT_RETRIES times.
+    The audio and subtitles are encoded once over the whole source alongside the segments, cutting
+    them would leave gaps at the joins, and are muxed with the joined video along with the chapters
+    and metadata of the source.\n
+    :param src_file: file to transcode
+    :param out_file: transcoded file
+    :param job: Job instance, the progress of all the segments is published as one
+    :param ff_pre_args: FFmpeg arguments before -i
+    :param ff_post_args: FFmpeg arguments after -i
+    :param int total_duration: length of src_file in microseconds
+    :raises subprocess.CalledProcessError: if a segment fails every try or the segments can't be joined
+    """
+    duration = total_duration / 1_000_000
+    chapters = []
+    # Without a probe the source is taken to have audio, as nearly every title does
+    others = True
+    if probe_json := probe_source(src_file):
+        try:
+            probe = json.loads(probe_json)
+            chapters = [float(chapter["start_time"]) for chapter in probe.get("chapters", [])]
+            others = any(stream.get("codec_type") != "video" for stream in probe.get("streams", []))
+        except (ValueError, KeyError, TypeError, AttributeError) as error:
+            logging.debug(f"Ignoring the chapters of {src_file}: {error}")
+    workers = split_workers(job)
+    points = split_points(duration, chapters, max(1, min(workers, int(duration // MIN_SEGMENT_LENGTH))))
+    segments_path = f"{out_file}.segments"
+    os.makedirs(segments_path, exist_ok=True)
+    others_path = os.path.join(segments_path, "others.mkv") if others else None
+    try:
+        _encode_segments(src_file, out_file, job, (ff_pre_args, ff_post_args), total_duration,
+                         _segments(points, duration, segments_path), others_path, bool(chapters))
+    finally:
+        shutil.rmtree(segments_path, ignore_errors=True)
+
+
+def _segments(points, duration, segments_path):
+    """(path, start, length) of each segment"""
+    segments = []
+    for index, start in enumerate(points):
+        length = (points[index + 1] if index + 1 < len(points) else duration) - start
+        segments.append((os.path.join(segments_path, f"segment_{index:03d}.mkv"), start, length))
+    return segments
+
+
+def _encode_segments(src_file, out_file, job, ff_args, total_duration, segments, others_path, chapters):
+    """
+    Encode the segments on a pool of ffmpeg processes, publishing their combined progress, and join them\n
+    The streams other than video are encoded to others_path (None if the source has none) at the same time.
+    """
+    ff_pre_args, ff_post_args = ff_args
+    workers = min(split_workers(job), len(segments))
+    logging.info(f"Encoding {shlex.quote(src_file)} in {len(segments)} segments, "
+                 f"{workers} at a time ({'at chapters' if chapters else 'even split'})")
+
+    positions = [0] * len(segments)
+    lock = threading.Lock()
+    with progress.Progress(job.job_id, "ffmpeg", title=os.path.basename(out_file)) as job_progress:
+        def report(index, out_time_us):
+            with lock:
+                positions[index] = out_time_us
+                done = sum(positions)
+            job_progress.update(done / total_duration * 100, stage=f"Transcoding {len(segments)} segments")
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = [pool.submit(_encode_segment, index, src_file, segment, ff_pre_args, ff_post_args, report)
+                       for index, segment in enumerate(segments)]
+            if others_path is not None:
+                # Submitted last so the segments start first, it is quick next to a video segment
+                results.append(pool.submit(_encode_others, src_file, others_path, ff_pre_args, ff_post_args))
+            try:
+                for result in results:
+                    result.result()
+            except Exception:
+                # Don't start the segments still waiting, the encode has failed
+                for result in results:
+                    result.cancel()
+                raise
+
+        job_progress.update(100, stage="Joining segments")
+        _concat_segments([path for path, _, _ in segments], others_path, src_file, out_file)
+
+
+def _encode_segment(index, src_file, segment, ff_pre_args, ff_post_args, report):
+    """Encode the video of one segment, trying again if ffmpeg fails"""
+    path, start, length = segment
+    # -t limits what is read from the input: as an output option it counts from the first output timestamp,
+    # which audio priming can push past 0, and the last frame of the segment would be cut.
+    # -an/-sn/-dn after ff_post_args drop the other streams even if it maps them, the chapters come from the source
+    cmd = (f"{cfg.arm_config['FFMPEG_CLI']} -y -nostats {ff_pre_args} -ss {start:.3f} -t {length:.3f} "
+           f"-i {shlex.quote(src_file)} -progress pipe:1 {ff_post_args} -an -sn -dn -map_chapters -1 "
+           f"{shlex.quote(path)}")
+    for attempt in range(SEGMENT_RETRIES + 1):
+        logging.debug(f"FFMPEG segment {index} command: {cmd}")
+        output = []
+        with subprocess.Popen(shlex.split(cmd), stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                              universal_newlines=True, bufsize=1) as process:
+            for line in process.stdout:
+                out_time_us = ffmpeg_out_time(line)
+                if out_time_us is not None:
+                    report(index, out_time_us)
+                elif not line.startswith(("frame=", "fps=", "stream_", "bitrate=", "total_size=", "out_time",
+                                          "dup_frames=", "drop_frames=", "speed=", "progress=")):
+                    output.append(line)
+        if process.returncode == 0:
+            return
+        report(index, 0)
+        logging.warning(f"FFMPEG segment {index} failed with code {process.returncode} "
+                        f"(try {attempt + 1} of {SEGMENT_RETRIES + 1}): {''.join(output[-5:]).strip()}")
+    raise subprocess.CalledProcessError(process.returncode, cmd)
+
+
+def _encode_others(src_file, others_path, ff_pre_args, ff_post_args):
+    """Encode the streams of src_file other than video (audio, subtitles) over its whole length"""
+    cmd = (f"{cfg.arm_config['FFMPEG_CLI']} -y -nostats -loglevel error {ff_pre_args} -i {shlex.quote(src_file)} "
+           f"{ff_post_args} -vn -map_chapters -1 {shlex.quote(others_path)}")
+    logging.debug(f"FFMPEG audio command: {cmd}")
+    subprocess.run(shlex.split(cmd), check=True, capture_output=True)
+
+
+def _concat_segments(paths, others_path, src_file, out_file):
+    """
+    Join the encoded segments into out_file without re-encoding\n
+    Along with the streams in others_path (None for none) and the chapters and metadata of src_file.
+    """
+    list_path = os.path.join(os.path.dirname(paths[0]), "segments.txt")
+    with open(list_path, "w") as list_file:
+        for path in paths:
+            escaped = path.replace("'", "'\\''")
+            list_file.write(f"file '{escaped}'\n")
+    inputs = f"-f concat -safe 0 -i {shlex.quote(list_path)} -i {shlex.quote(src_file)}"
+    maps = "-map 0"
+    if others_path is not None:
+        inputs += f" -i {shlex.quote(others_path)}"
+        maps += " -map 2"
+    cmd = (f"{cfg.arm_config['FFMPEG_CLI']} -y -nostats -loglevel error {inputs} {maps} "
+           f"-map_metadata 1 -map_chapters 1 -c copy {shlex.quote(out_file)}")
+    logging.debug(f"FFMPEG concat command: {cmd}")
+    subprocess.run(shlex.split(cmd), check=True, capture_output=True)
@@ -0,0 +1,283 @@
+"""
+Moving finished files into COMPLETED_PATH
+
+A file on the same filesystem is renamed. One on another filesystem (RAW_PATH or
+TRANSCODE_PATH on local disk, COMPLETED_PATH on a NAS) is copied by the kernel rather than
+through Python: a reflink where the filesystem can share the blocks, otherwise
+copy_file_range (a server side copy on NFS 4.2 and SMB), then sendfile, then pread/pwrite.
+The copy is written next to the destination as <name>.part, checked against the source
+(FINALIZE_VERIFY) and renamed into place, only then is the source removed. A file is never
+moved over one that is already there.
+
+While a Batch is open move() queues the files instead, and FINALIZE_WORKERS of them are
+copied at once. A second file queued for the same destination is refused, as it would be
+once the first had been moved. The bytes copied and the speed are published as the job's progress.
+"""
+import errno
+import fcntl
+import hashlib
+import logging
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import suppress
+
+import arm.config.config as cfg
+from arm.ripper import progress
+
+# Bytes copied by one copy_file_range/sendfile call, progress is published between them
+CHUNK_SIZE = 64 * 1024 * 1024
+# Bytes read at a time when checksumming
+HASH_CHUNK_SIZE = 1024 * 1024
+# ioctl sharing the blocks of one file with another (linux/fs.h)
+FICLONE = 0x40049409
+# Errors meaning a way of copying can't be used for these files, the next one is tried
+UNSUPPORTED = {errno.EXDEV, errno.ENOSYS, errno.EOPNOTSUPP, errno.EINVAL}
+MB = 1024 * 1024
+
+# The open Batch, move() queues files on it
+_batch = None
+
+
+class FinalizeError(OSError):
+    """A copy didn't match its source"""
+
+
+def workers():
+    """Number of files copied at once"""
+    return max(1, int(cfg.arm_config.get("FINALIZE_WORKERS", 2)))
+
+
+def move(source, destination):
+    """
+    Move a file, queued on the open Batch if there is one\n
+    :param str source: file to move
+    :param str destination: where to move it, including the file name
+    :return: None
+    :raises FileExistsError: if destination exists or another file is queued to be moved there
+    :raises OSError: if the file couldn't be moved (or queued)
+    """
+    batch = _batch
+    if batch is not None:
+        batch.add(source, destination)
+    else:
+        move_file(source, destination)
+
+
+class Batch:
+    """
+    Moves the files queued while it is open FINALIZE_WORKERS at a time, use as a context manager\n
+    Leaving it waits for all the files to be moved. A file that can't be moved is logged and
+    left where it was, the same as the other files.
+    """
+
+    def __init__(self, job_id=None):
+        """
+        :param job_id: job to publish progress for, None for no progress
+        """
+        self.job_id = job_id
+        self.pool = None
+        self.moves = []
+        # destinations of the queued files
+        self.destinations = set()
+        # destinations of the files that were moved
+        self.moved = []
+        self.lock = threading.Lock()
+        self.total = 0
+        self.copied = 0
+        self.started = None
+        self.run = None
+
+    def __enter__(self):
+        global _batch
+        self.pool = ThreadPoolExecutor(max_workers=workers(), thread_name_prefix="finalize")
+        self.started = time.monotonic()
+        _batch = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        global _batch
+        _batch = None
+        self.wait()
+        return False
+
+    def add(self, source, destination):
+        """
+        Queue a file to be moved\n
+        :raises FileExistsError: if another file is already queued to be moved to destination
+        """
+        if os.path.abspath(destination) in self.destinations:
+            raise _exists(destination)
+        size = os.path.getsize(source)
+        with self.lock:
+            self.total += size
+        self.destinations.add(os.path.abspath(destination))
+        self.moves.append((source, destination, self.pool.submit(move_file, source, destination, self._copied)))
+
+    def _copied(self, count):
+        """Count bytes copied by a worker and publish the progress"""
+        with self.lock:
+            self.copied += count
+            if self.job_id is None:
+                return
+            if self.run is None:
+                self.run = progress.Progress(self.job_id, "finalizer")
+            rate = self.copied / max(time.monotonic() - self.started, 0.001) / MB
+            self.run.update(self.copied * 100 / max(self.total, 1), stage=f"Moving files {rate:.1f} MB/s")
+
+    def wait(self):
+        """Wait for the queued files to be moved, logging the ones that couldn't be"""
+        try:
+            for source, destination, moved in self.moves:
+                try:
+                    moved.result()
+                    self.moved.append(destination)
+                except Exception as error:  # noqa: E722
+                    logging.error(f"Unable to move '{source}' to '{destination}' - Error: {error}")
+        finally:
+            self.pool.shutdown()
+            if self.run is not None:
+                self.run.finish()
+        if self.moves:
+            elapsed = time.monotonic() - self.started
+            logging.info(f"Moved {len(self.moves)} files ({self.total / MB:.0f} MB) in {elapsed:.1f}s, "
+                         f"{self.copied / MB:.0f} MB copied at {self.copied / max(elapsed, 0.001) / MB:.1f} MB/s")
+
+
+def move_file(source, destination, on_copied=None):
+    """
+    Move a file, renaming it on the same filesystem and otherwise copying, checking and removing it\n
+    :param str source: file to move
+    :param str destination: where to move it, including the file name
+    :param on_copied: callable(bytes) called as the file is copied
+    :return: str, how the file was moved
+    :raises FileExistsError: if destination exists, it is left as it was
+    :raises OSError: if the file couldn't be moved, the source is left where it was
+    """
+    # os.rename and os.replace would overwrite it
+    if os.path.lexists(destination):
+        raise _exists(destination)
+    try:
+        os.rename(source, destination)
+        return "rename"
+    except OSError as error:
+        if error.errno != errno.EXDEV:
+            raise
+    if os.path.isdir(source):
+        shutil.move(source, destination)
+        return "shutil"
+    started = time.monotonic()
+    partial = f"{destination}.part"
+    try:
+        method = copy_file(source, partial, on_copied)
+        verify(source, partial)
+        try:
+            shutil.copystat(source, partial)
+        except OSError as error:
+            # e.g. a NAS share that doesn't allow setting times
+            logging.debug(f"Couldn't copy the times and mode of '{source}': {error}")
+        # it may have been written while the file was copied
+        if os.path.lexists(destination):
+            raise _exists(destination)
+        os.replace(partial, destination)
+    except BaseException:
+        with suppress(OSError):
+            os.unlink(partial)
+        raise
+    os.unlink(source)
+    size = os.path.getsize(destination)
+    elapsed = max(time.monotonic() - started, 0.001)
+    logging.info(f"Copied '{source}' to '{destination}' with {method}, {size / MB:.0f} MB at "
+                 f"{size / elapsed / MB:.1f} MB/s")
+    return method
+
+
+def _exists(destination):
+    return FileExistsError(errno.EEXIST, os.strerror(errno.EEXIST), destination)
+
+
+def copy_file(source, destination, on_copied=None):
+    """
+    Copy a file with the quickest way the filesystems allow\n
+    :param str source: file to copy
+    :param str destination: file to write, replaced if it exists
+    :param on_copied: callable(bytes) called as the file is copied
+    :return: str, the way it was copied: reflink, copy_file_range, sendfile or read/write
+    """
+    with open(source, "rb") as src, open(destination, "wb") as dst:
+        size = os.fstat(src.fileno()).st_size
+        try:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+            method = "reflink"
+            if on_copied is not None:
+                on_copied(size)
+        except OSError:
+            method = _copy_range(src.fileno(), dst.fileno(), size, on_copied)
+        os.fsync(dst.fileno())
+    return method
+
+
+def _copy_range(src_fd, dst_fd, size, on_copied):
+    """Copy size bytes, falling back to the next way of copying when one isn't supported"""
+    copiers = [("copy_file_range", _copy_file_range), ("sendfile", _sendfile), ("read/write", _read_write)]
+    offset = 0
+    while offset < size:
+        name, copier = copiers[0]
+        try:
+            copied = copier(src_fd, dst_fd, offset, min(CHUNK_SIZE, size - offset))
+        except (OSError, AttributeError) as error:
+            # AttributeError: not in this python/platform
+            if len(copiers) == 1 or getattr(error, "errno", errno.ENOSYS) not in UNSUPPORTED:
+                raise
+            logging.debug(f"Can't copy with {name} ({error}), using {copiers[1][0]}")
+            copiers.pop(0)
+            continue
+        if not copied:
+            raise FinalizeError(f"Source ended at {offset} of {size} bytes")
+        offset += copied
+        if on_copied is not None:
+            on_copied(copied)
+    return copiers[0][0]
+
+
+def _copy_file_range(src_fd, dst_fd, offset, count):
+    return os.copy_file_range(src_fd, dst_fd, count, offset, offset)
+
+
+def _sendfile(src_fd, dst_fd, offset, count):
+    os.lseek(dst_fd, offset, os.SEEK_SET)
+    return os.sendfile(dst_fd, src_fd, offset, count)
+
+
+def _read_write(src_fd, dst_fd, offset, count):
+    return os.pwrite(dst_fd, os.pread(src_fd, count, offset), offset)
+
+
+def verify(source, copy):
+    """
+    Check a copy against its source, by size or with FINALIZE_VERIFY: "checksum" by SHA-256\n
+    :raises FinalizeError: if they differ
+    """
+    source_size, copy_size = os.path.getsize(source), os.path.getsize(copy)
+    if source_size != copy_size:
+        raise FinalizeError(f"'{copy}' is {copy_size} bytes, '{source}' is {source_size}")
+    if str(cfg.arm_config.get("FINALIZE_VERIFY", "size")).lower() == "checksum" \
+            and file_sha256(source) != file_sha256(copy, drop_cache=True):
+        raise FinalizeError(f"'{copy}' doesn't match '{source}'")
+
+
+def file_sha256(path, drop_cache=False):
+    """
+    Hex SHA-256 of a file\n
+    :param bool drop_cache: read it back from the disk rather than the page cache
+    """
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as file:
+        if drop_cache:
+            with suppress(AttributeError, OSError):
+                os.posix_fadvise(file.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+        while data := file.read(HASH_CHUNK_SIZE):
+            sha256.update(data)
+    return sha256.hexdigest()
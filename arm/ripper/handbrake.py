@@ -6,47 +6,62 @@ import logging
 import subprocess
 import re
 import shlex
+from contextlib import contextmanager
 import arm.config.config as cfg
 
-from arm.ripper import utils
+from arm.ripper import utils, slots, progress, scan_cache, transcode_pool
 from arm.ui import app, db  # noqa E402
 from arm.models.job import JobState
 
 PROCESS_COMPLETE = "Handbrake processing complete"
+# HandBrakeCLI progress on stdout, fps and ETA are only there once encoding is under way
+HANDBRAKE_PROGRESS = re.compile(r"Encoding: task (\d+ of \d+), (\d{1,3}\.\d{2}) %"
+                                r"(?: \((\d+\.\d+) fps, avg (\d+\.\d+) fps, ETA (\w+)\))?")
 
 
-def run_handbrake_command(cmd, track=None, track_number=None):
+def run_handbrake_command(cmd, job, track=None, track_number=None, title=None):
     """
     Execute a HandBrake command and handle errors consistently.
+    The encoding progress HandBrake writes to stdout is published for the UI.
 
     :param cmd: The HandBrake command to execute
+    :param job: The job being transcoded
     :param track: Optional track object to update status
     :param track_number: Optional track number for error messages
-    :return: Output from HandBrake command
+    :param title: Optional title shown with the progress, e.g. "Track 2/5"
+    :return: Output from HandBrake command, without the progress
     :raises subprocess.CalledProcessError: If HandBrake fails
     """
     logging.debug(f"Sending command: {cmd}")
 
-    try:
-        hand_brake_output = subprocess.check_output(
-            cmd,
-            shell=True
-        ).decode("utf-8")
+    output = []
+    with progress.Progress(job.job_id, "handbrake", title=title) as job_progress, \
+            subprocess.Popen(cmd, shell=True, stdout=subprocess.PIPE, text=True, errors="replace") as proc:
+        # HandBrake ends each progress update with \r, text mode splits them into lines
+        for line in proc.stdout:
+            if hb_progress := HANDBRAKE_PROGRESS.search(line):
+                job_progress.update(float(hb_progress.group(2)), stage=f"Encoding: task {hb_progress.group(1)}",
+                                    eta=hb_progress.group(5), cur_fps=hb_progress.group(3),
+                                    avg_fps=hb_progress.group(4))
+            elif line.strip():
+                output.append(line)
+    hand_brake_output = "".join(output)
+    if proc.returncode == 0:
         logging.debug(f"Handbrake exit code: {hand_brake_output}")
         if track:
             track.status = "success"
         return hand_brake_output
-    except subprocess.CalledProcessError as hb_error:
-        if track_number:
-            err = f"Handbrake encoding of title {track_number} failed with code: {hb_error.returncode}" \
-                  f"({hb_error.output})"
-        else:
-            err = f"Call to handbrake failed with code: {hb_error.returncode}({hb_error.output})"
-        logging.error(err)
-        if track:
-            track.status = "fail"
-            track.error = err
-        raise subprocess.CalledProcessError(hb_error.returncode, cmd)
+
+    if track_number:
+        err = f"Handbrake encoding of title {track_number} failed with code: {proc.returncode}" \
+              f"({hand_brake_output})"
+    else:
+        err = f"Call to handbrake failed with code: {proc.returncode}({hand_brake_output})"
+    logging.error(err)
+    if track:
+        track.status = "fail"
+        track.error = err
+    raise subprocess.CalledProcessError(proc.returncode, cmd)
 
 
 def build_handbrake_command(srcpath, filepathname, hb_preset, hb_args, logfile,
@@ -58,7 +73,7 @@ def build_handbrake_command(srcpath, filepathname, hb_preset, hb_args, logfile,
     :param filepathname: Full output path including filename
     :param hb_preset: HandBrake preset to use
     :param hb_args: Additional HandBrake arguments
-    :param logfile: Logfile for HB to redirect output to
+    :param logfile: Logfile for HB to redirect its log (stderr) to, progress on stdout is left to the caller
     :param track_number: Optional track number to encode
     :param main_feature: Whether to use --main-feature flag
     :return: Formatted command string
@@ -77,24 +92,30 @@ def build_handbrake_command(srcpath, filepathname, hb_preset, hb_args, logfile,
         cmd += f"-t {track_number} "
 
     cmd += f"{hb_args} " \
-           f">> {logfile} 2>&1"
+           f"2>> {logfile}"
 
     return cmd
 
 
-def handbrake_sleep_check(job):
-    """Wait until there is a spot to transcode.
+@contextmanager
+def handbrake_sleep_check(job, set_status=True):
+    """Hold a transcode slot for the with block, waiting in the queue until one is free.
 
     If handbrake is used as a ripping utility (the source path is a device),
     this means that the drive is blocked. If we transcode after makemkv, the
     drive associated to the job is ejected at this point.
+
+    set_status=False leaves the job status alone, for a transcoder running while the job is still ripping.
     """
     logging.debug("Handbrake starting.")
-    utils.database_updater({"status": JobState.TRANSCODE_WAITING.value}, job)
+    if set_status:
+        utils.database_updater({"status": JobState.TRANSCODE_WAITING.value}, job)
     # TODO: send a notification that jobs are waiting ?
-    utils.sleep_check_process("HandBrakeCLI", int(cfg.arm_config["MAX_CONCURRENT_TRANSCODES"]))
-    logging.debug(f"Setting job status to '{JobState.TRANSCODE_ACTIVE.value}'")
-    utils.database_updater({"status": JobState.TRANSCODE_ACTIVE.value}, job)
+    with slots.transcode_slots().slot(job.job_id):
+        if set_status:
+            logging.debug(f"Setting job status to '{JobState.TRANSCODE_ACTIVE.value}'")
+            utils.database_updater({"status": JobState.TRANSCODE_ACTIVE.value}, job)
+        yield
 
 
 def handbrake_main_feature(srcpath, basepath, logfile, job):
@@ -106,40 +127,40 @@ def handbrake_main_feature(srcpath, basepath, logfile, job):
     :param job: Disc object\n
     :return: None
     """
-    handbrake_sleep_check(job)
-    logging.info("Starting DVD Movie main_feature processing")
+    with handbrake_sleep_check(job):
+        logging.info("Starting DVD Movie main_feature processing")
 
-    filename = job.title + "." + cfg.arm_config["DEST_EXT"]
-    filepathname = os.path.join(basepath, filename)
-    logging.info(f"Ripping title main_feature to {shlex.quote(filepathname)}")
+        filename = job.title + "." + cfg.arm_config["DEST_EXT"]
+        filepathname = os.path.join(basepath, filename)
+        logging.info(f"Ripping title main_feature to {shlex.quote(filepathname)}")
 
-    get_track_info(srcpath, job)
+        get_track_info(srcpath, job)
 
-    track = job.tracks.filter_by(main_feature=True).first()
-    if track is None:
-        msg = "No main feature found by Handbrake. Turn main_feature to false in arm.yml and try again."
-        logging.error(msg)
-        raise RuntimeError(msg)
+        track = job.tracks.filter_by(main_feature=True).first()
+        if track is None:
+            msg = "No main feature found by Handbrake. Turn main_feature to false in arm.yml and try again."
+            logging.error(msg)
+            raise RuntimeError(msg)
 
-    track.filename = track.orig_filename = filename
-    db.session.commit()
+        track.filename = track.orig_filename = filename
+        db.session.commit()
 
-    hb_args, hb_preset = correct_hb_settings(job)
-    cmd = build_handbrake_command(srcpath, filepathname, hb_preset, hb_args, logfile, main_feature=True)
+        hb_args, hb_preset = correct_hb_settings(job)
+        cmd = build_handbrake_command(srcpath, filepathname, hb_preset, hb_args, logfile, main_feature=True)
 
-    try:
-        run_handbrake_command(cmd, track)
-        logging.info("Handbrake call successful")
-    except subprocess.CalledProcessError:
-        job.errors = track.error
-        job.status = JobState.FAILURE.value
-        db.session.commit()
-        raise
+        try:
+            run_handbrake_command(cmd, job, track, title="Main feature")
+            logging.info("Handbrake call successful")
+        except subprocess.CalledProcessError:
+            job.errors = track.error
+            job.status = JobState.FAILURE.value
+            db.session.commit()
+            raise
 
-    logging.info(PROCESS_COMPLETE)
-    logging.debug(f"\n\r{job.pretty_table()}")
-    track.ripped = True
-    db.session.commit()
+        logging.info(PROCESS_COMPLETE)
+        logging.debug(f"\n\r{job.pretty_table()}")
+        track.ripped = True
+        db.session.commit()
 
 
 def handbrake_all(srcpath, basepath, logfile, job):
@@ -151,54 +172,78 @@ def handbrake_all(srcpath, basepath, logfile, job):
     :param job: Disc object\n
     :return: None
     """
-    handbrake_sleep_check(job)
-    logging.info("Starting BluRay/DVD transcoding - All titles")
-
-    hb_args, hb_preset = correct_hb_settings(job)
-    get_track_info(srcpath, job)
-
-    logging.debug(f"Total number of tracks is {job.no_of_titles}")
-
-    for track in job.tracks:
-        # Don't raise error if we past max titles, skip and continue till HandBrake finishes
-        if int(track.track_number) > job.no_of_titles:
-            continue
-        if track.length < int(cfg.arm_config["MINLENGTH"]):
-            # too short
-            logging.info(f"Track #{track.track_number} of {job.no_of_titles}. "
-                         f"Length ({track.length}) is less than minimum length ({cfg.arm_config['MINLENGTH']}). "
-                         f"Skipping...")
-        elif track.length > int(cfg.arm_config["MAXLENGTH"]):
-            # too long
-            logging.info(f"Track #{track.track_number} of {job.no_of_titles}. "
-                         f"Length ({track.length}) is greater than maximum length ({cfg.arm_config['MAXLENGTH']}). "
-                         f"Skipping...")
-        else:
-            # just right
-            logging.info(f"Processing track #{track.track_number} of {job.no_of_titles}. "
-                         f"Length is {track.length} seconds.")
-
-            track.filename = track.orig_filename = f"title_{track.track_number}.{cfg.arm_config['DEST_EXT']}"
-            filepathname = os.path.join(basepath, track.filename)
-
-            logging.info(f"Transcoding title {track.track_number} to {shlex.quote(filepathname)}")
+    with handbrake_sleep_check(job):
+        logging.info("Starting BluRay/DVD transcoding - All titles")
+
+        hb_args, hb_preset = correct_hb_settings(job)
+        get_track_info(srcpath, job)
+
+        logging.debug(f"Total number of tracks is {job.no_of_titles}")
+
+        titles = []
+        for track in job.tracks:
+            # Don't raise error if we past max titles, skip and continue till HandBrake finishes
+            if int(track.track_number) > job.no_of_titles:
+                continue
+            if track.length < int(cfg.arm_config["MINLENGTH"]):
+                # too short
+                logging.info(f"Track #{track.track_number} of {job.no_of_titles}. "
+                             f"Length ({track.length}) is less than minimum length ({cfg.arm_config['MINLENGTH']}). "
+                             f"Skipping...")
+            elif track.length > int(cfg.arm_config["MAXLENGTH"]):
+                # too long
+                logging.info(f"Track #{track.track_number} of {job.no_of_titles}. "
+                             f"Length ({track.length}) is greater than maximum length ({cfg.arm_config['MAXLENGTH']}). "
+                             f"Skipping...")
+            else:
+                # just right
+                logging.info(f"Processing track #{track.track_number} of {job.no_of_titles}. "
+                             f"Length is {track.length} seconds.")
+                titles.append(track.track_id)
+
+        # Titles encoded at once each get their own HandBrake log
+        transcode_pool.run(job, titles, lambda title_job, track_id, encoders: handbrake_title(
+            title_job, track_id, srcpath, basepath, logfile, hb_args, hb_preset, encoders > 1), srcpath)
+
+        logging.info(PROCESS_COMPLETE)
+        logging.debug(f"\n\r{job.pretty_table()}")
+
+
+def handbrake_title(job, track_id, srcpath, basepath, logfile, hb_args, hb_preset, own_log=False):
+    """
+    Transcode one title of the disc, the caller holds a transcode slot\n\n
+    :param job: Disc object\n
+    :param track_id: id of the Track to transcode\n
+    :param srcpath: Path to source for HB (dvd or files)\n
+    :param basepath: Path where HB will save trancoded files\n
+    :param logfile: Logfile for HB to redirect output to\n
+    :param hb_args: HandBrake arguments from correct_hb_settings\n
+    :param hb_preset: HandBrake preset from correct_hb_settings\n
+    :param own_log: log to a file of its own next to logfile, for titles transcoded at once\n
+    :return: None
+    """
+    track = job.tracks.filter_by(track_id=track_id).one()
+    track.filename = track.orig_filename = f"title_{track.track_number}.{cfg.arm_config['DEST_EXT']}"
+    filepathname = os.path.join(basepath, track.filename)
 
-            db.session.commit()
+    logging.info(f"Transcoding title {track.track_number} to {shlex.quote(filepathname)}")
 
-            cmd = build_handbrake_command(srcpath, filepathname, hb_preset, hb_args, logfile,
-                                          track_number=track.track_number)
+    db.session.commit()
 
-            try:
-                run_handbrake_command(cmd, track, track.track_number)
-            except subprocess.CalledProcessError:
-                db.session.commit()
-                raise
+    if own_log:
+        logfile = transcode_pool.title_logfile(logfile, f"title_{track.track_number}")
+    cmd = build_handbrake_command(srcpath, filepathname, hb_preset, hb_args, logfile,
+                                  track_number=track.track_number)
 
-            track.ripped = True
-            db.session.commit()
+    try:
+        run_handbrake_command(cmd, job, track, track.track_number,
+                              title=f"Track {track.track_number}/{job.no_of_titles}")
+    except subprocess.CalledProcessError:
+        db.session.commit()
+        raise
 
-    logging.info(PROCESS_COMPLETE)
-    logging.debug(f"\n\r{job.pretty_table()}")
+    track.ripped = True
+    db.session.commit()
 
 
 def correct_hb_settings(job):
@@ -228,33 +273,51 @@ def handbrake_mkv(srcpath, basepath, logfile, job):
     :return: None
     """
     # Added to limit number of transcodes
-    handbrake_sleep_check(job)
-    logging.info("Starting Handbrake for MKV files.")
-    hb_args, hb_preset = correct_hb_settings(job)
-
-    # This will fail if the directory raw gets deleted
-    for files in os.listdir(srcpath):
-        srcpathname = os.path.join(srcpath, files)
-        destfile = os.path.splitext(files)[0]
-        # MakeMKV always saves in mkv we need to update the db with the new filename
-        logging.debug(destfile + ".mkv")
-        job_current_track = job.tracks.filter_by(filename=destfile + ".mkv")
-        for track in job_current_track:
-            logging.debug("filename: " + track.filename)
-            track.orig_filename = track.filename
-            track.filename = destfile + "." + cfg.arm_config["DEST_EXT"]
-            logging.debug("UPDATED filename: " + track.filename)
-            db.session.commit()
-        filename = destfile + "." + cfg.arm_config["DEST_EXT"]
-        filepathname = os.path.join(basepath, filename)
+    with handbrake_sleep_check(job):
+        logging.info("Starting Handbrake for MKV files.")
+        hb_args, hb_preset = correct_hb_settings(job)
+
+        # This will fail if the directory raw gets deleted
+        files = [os.path.join(srcpath, name) for name in os.listdir(srcpath)]
+        transcode_pool.run(job, files, lambda file_job, path, encoders: handbrake_mkv_file(
+            path, basepath, logfile, file_job, hb_args, hb_preset, encoders > 1), srcpath)
+
+        logging.info(PROCESS_COMPLETE)
+        logging.debug(f"\n\r{job.pretty_table()}")
 
-        logging.info(f"Transcoding file {shlex.quote(files)} to {shlex.quote(filepathname)}")
 
-        cmd = build_handbrake_command(srcpathname, filepathname, hb_preset, hb_args, logfile)
-        run_handbrake_command(cmd)
+def handbrake_mkv_file(srcpathname, basepath, logfile, job, hb_args, hb_preset, own_log=False):
+    """
+    Transcode one mkv file ripped by MakeMKV, the caller holds the transcode slot\n\n
+    :param srcpathname: Path to the mkv file\n
+    :param basepath: Path where HB will save trancoded files\n
+    :param logfile: Logfile for HB to redirect output to\n
+    :param job: Disc object\n
+    :param hb_args: HandBrake arguments from correct_hb_settings\n
+    :param hb_preset: HandBrake preset from correct_hb_settings\n
+    :param own_log: log to a file of its own next to logfile, for files transcoded at once\n
+    :return: None
+    """
+    files = os.path.basename(srcpathname)
+    destfile = os.path.splitext(files)[0]
+    # MakeMKV always saves in mkv we need to update the db with the new filename
+    logging.debug(destfile + ".mkv")
+    job_current_track = job.tracks.filter_by(filename=destfile + ".mkv")
+    for track in job_current_track:
+        logging.debug("filename: " + track.filename)
+        track.orig_filename = track.filename
+        track.filename = destfile + "." + cfg.arm_config["DEST_EXT"]
+        logging.debug("UPDATED filename: " + track.filename)
+        db.session.commit()
+    filename = destfile + "." + cfg.arm_config["DEST_EXT"]
+    filepathname = os.path.join(basepath, filename)
+
+    logging.info(f"Transcoding file {shlex.quote(files)} to {shlex.quote(filepathname)}")
 
-    logging.info(PROCESS_COMPLETE)
-    logging.debug(f"\n\r{job.pretty_table()}")
+    if own_log:
+        logfile = transcode_pool.title_logfile(logfile, destfile)
+    cmd = build_handbrake_command(srcpathname, filepathname, hb_preset, hb_args, logfile)
+    run_handbrake_command(cmd, job, title=files)
 
 
 def get_track_info(srcpath, job):
@@ -264,12 +327,18 @@ def get_track_info(srcpath, job):
     :param job: Job instance\n
     :return: None
     """
+    # Only a scan of the disc itself can be cached, not of files ripped from it
+    from_disc = srcpath in (job.devpath, job.mountpoint)
+    if from_disc and scan_cache.restore_tracks(job, "handbrake"):
+        return
     logging.info("Using HandBrake to get information on all the tracks on the disc.  This will take a few minutes...")
 
     cmd = f'{cfg.arm_config["HANDBRAKE_LOCAL"]} -i {shlex.quote(srcpath)} -t 0 --scan'
     logging.debug(f"Sending command: {cmd}")
     hand_break_output = handbrake_char_encoding(cmd)
 
+    # Tracks are written in one transaction once the scan finishes
+    tracks = utils.TrackBatch(job)
     if hand_break_output is not None:
         t_pattern = re.compile(r'.*\+ title *')
         pattern = re.compile(r'.*duration:.*')
@@ -293,7 +362,7 @@ def get_track_info(srcpath, job):
                     job.no_of_titles = titles
                     db.session.commit()
 
-            main_feature, t_no = title_finder(aspect, fps, job, line, main_feature, seconds, t_no, t_pattern)
+            main_feature, t_no = title_finder(aspect, fps, tracks, line, main_feature, seconds, t_no, t_pattern)
             seconds = seconds_builder(line, pattern, seconds)
             main_feature = is_main_feature(line, main_feature)
 
@@ -304,15 +373,19 @@ def get_track_info(srcpath, job):
     else:
         logging.info("HandBrake unable to get track information")
 
-    utils.put_track(job, t_no, seconds, aspect, fps, main_feature, "HandBrake")
+    tracks.add(t_no, seconds, aspect, fps, main_feature, "HandBrake")
+    tracks.commit()
+    # t_no is still 0 if HandBrake didn't find any titles
+    if from_disc and hand_break_output is not None and t_no != 0:
+        scan_cache.store_tracks(job, "handbrake", tracks)
 
 
-def title_finder(aspect, fps, job, line, main_feature, seconds, t_no, t_pattern):
+def title_finder(aspect, fps, tracks, line, main_feature, seconds, t_no, t_pattern):
     """
 
     :param aspect:
     :param fps:
-    :param job:
+    :param tracks: utils.TrackBatch the finished title is added to
     :param line:
     :param main_feature:
     :param seconds:
@@ -322,7 +395,7 @@ def title_finder(aspect, fps, job, line, main_feature, seconds, t_no, t_pattern)
     """
     if (re.search(t_pattern, line)) is not None:
         if t_no != 0:
-            utils.put_track(job, t_no, seconds, aspect, fps, main_feature, "HandBrake")
+            tracks.add(t_no, seconds, aspect, fps, main_feature, "HandBrake")
 
         main_feature = False
         t_no = line.rsplit(' ', 1)[-1]
@@ -3,25 +3,28 @@
 
 import os
 import logging
-import urllib
 import re
 import datetime
 import unicodedata
 import json
 from ast import literal_eval
+from concurrent.futures import ThreadPoolExecutor
 
 import pydvdid
 import xmltodict
 import arm.config.config as cfg
 from arm.models import Job
 
-from arm.ripper import utils
+from arm.ripper import db_writer, disc_layout, utils, scan_cache
 from arm.ripper.ProcessHandler import arm_subprocess
-from arm.ui import db
+from arm.ui import db, metadata_cache
 
 # flake8: noqa: W605
 from arm.ui import utils as ui_utils
 
+# Title variants searched for at the same time
+METADATA_WORKERS = 4
+
 
 def find_mount(devpath: str) -> str | None:
     """
@@ -66,8 +69,10 @@ def identify(job):
 
     # get_disc_type() checks local files, no need to run unless we can mount
     if mounted:
+        # One listing of the disc root, kept on the job, decides the disc type
+        job.disc_layout = disc_layout.probe(job.mountpoint)
         # Check with the job class to get the correct disc type
-        job.get_disc_type(utils.find_file("HVDVD_TS", job.mountpoint))
+        job.get_disc_type(job.disc_layout)
 
     if job.disctype in ["dvd", "bluray"]:
 
@@ -89,6 +94,9 @@ def identify(job):
                          f"year:{job.year} video_type:{job.video_type} "
                          f"disctype: {job.disctype}")
             logging.debug(f"identify.job.end ---- \n\r{job.pretty_table()}")
+        if mounted:
+            # The disc key needs the files on the disc, later scans use it after the disc is unmounted
+            scan_cache.disc_key(job)
     # No need to warn if we cant unmount
     os.system("umount " + job.devpath)
 
@@ -149,45 +157,22 @@ def identify_bluray(job):
 
 def identify_dvd(job):
     """ Manipulates the DVD title and calls OMDB to try and
-    lookup the title """
+    lookup the title\n
+    The ARM crc64 lookup and the title search run at the same time, while lsdvd scans the disc
+    """
 
     logging.debug(f"\n\r{job.pretty_table()}")
     # Some older DVDs aren't actually labelled
     if not job.label or job.label == "":
         job.label = "not identified"
+    crc64 = None
     try:
         crc64 = pydvdid.compute(str(job.mountpoint))
-        dvd_title = f"{job.label}_{crc64}"
         logging.info(f"DVD CRC64 hash is: {crc64}")
         job.crc_id = str(crc64)
-        urlstring = f"https://1337server.pythonanywhere.com/api/v1/?mode=s&crc64={crc64}"
-        logging.debug(urlstring)
-        dvd_info_xml = urllib.request.urlopen(urlstring).read()
-        arm_api_json = json.loads(dvd_info_xml)
-        logging.debug(f"dvd xml - {arm_api_json}")
-        logging.debug(f"results = {arm_api_json['results']}")
-        if arm_api_json['success']:
-            logging.info("Found crc64 id from online API")
-            logging.info(f"title is {arm_api_json['results']['0']['title']}")
-            args = {
-                'title': arm_api_json['results']['0']['title'],
-                'title_auto': arm_api_json['results']['0']['title'],
-                'year': arm_api_json['results']['0']['year'],
-                'year_auto': arm_api_json['results']['0']['year'],
-                'imdb_id': arm_api_json['results']['0']['imdb_id'],
-                'imdb_id_auto': arm_api_json['results']['0']['imdb_id'],
-                'video_type': arm_api_json['results']['0']['video_type'],
-                'video_type_auto': arm_api_json['results']['0']['video_type'],
-                'poster_url': arm_api_json['results']['0']['poster_img'],
-                'poster_url_auto': arm_api_json['results']['0']['poster_img'],
-                'hasnicetitle': True
-            }
-            utils.database_updater(args, job)
     except Exception as error:
         logging.error(f"Pydvdid failed with the error: {error}")
-        dvd_title = str(job.label)
 
-    logging.debug(f"dvd_title_label: {dvd_title}")
     # in this block we want to strip out any chars that might be bad
     # strip all non-numeric chars and use that for year
     year = re.sub(r"\D", "", str(job.year)) if job.year else None
@@ -198,37 +183,94 @@ def identify_dvd(job):
     dvd_title = re.sub(r"SKU\b", "", dvd_title)
     logging.debug(f"dvd_title SKU$: {dvd_title}")
 
-    # Do we really need metaselector if we have got from ARM online db?
-    try:
-        dvd_info_xml = metadata_selector(job, dvd_title, year)
+    with ThreadPoolExecutor(max_workers=2, thread_name_prefix="identify") as lookups:
+        crc_lookup = lookups.submit(arm_api_lookup, crc64) if crc64 else None
+        title_lookup = lookups.submit(search_variants, title_variants(dvd_title, year))
+        # Track 99 detection, reading the disc while the lookups wait on the network
+        track_count = lsdvd_track_count(job)
+
+        arm_api_result = crc_lookup.result() if crc_lookup is not None else None
+        dvd_info_xml = title_lookup.result()
+    # What both lookups found is written in one transaction
+    with db_writer.batch():
+        if arm_api_result is not None:
+            logging.info("Found crc64 id from online API")
+            logging.info(f"title is {arm_api_result['title']}")
+            args = {
+                'title': arm_api_result['title'],
+                'title_auto': arm_api_result['title'],
+                'year': arm_api_result['year'],
+                'year_auto': arm_api_result['year'],
+                'imdb_id': arm_api_result['imdb_id'],
+                'imdb_id_auto': arm_api_result['imdb_id'],
+                'video_type': arm_api_result['video_type'],
+                'video_type_auto': arm_api_result['video_type'],
+                'poster_url': arm_api_result['poster_img'],
+                'poster_url_auto': arm_api_result['poster_img'],
+                'hasnicetitle': True
+            }
+            utils.database_updater(args, job)
         logging.debug(f"DVD_INFO_XML: {dvd_info_xml}")
-        identify_loop(job, dvd_info_xml, dvd_title, year)
-    except Exception:
-        dvd_info_xml = None
-        logging.debug("Cant connect to online service!")
+        if dvd_info_xml is not None:
+            update_job(job, dvd_info_xml)
     # Failsafe so that we always have a title.
     if job.title is None or job.title == "None":
         job.title = str(job.label)
         job.year = None
 
-    # Track 99 detection
-    # -Oy means output a python dict
-    output = arm_subprocess(["lsdvd", "-Oy", job.devpath])
-    if output:
-        try:
-            # literal_eval only accepts literals so we have to adjust the output slightly
-            tracks = literal_eval(re.sub(r"^.*\{", "{", output)).get("track", [])
-            logging.debug(f"Detected {len(tracks)} tracks")
-            if len(tracks) == 99:
-                job.has_track_99 = True
-                if cfg.arm_config["PREVENT_99"]:
-                    raise utils.RipperException("Track 99 found and PREVENT_99 is enabled")
-        except (SyntaxError, AttributeError) as e:
-            logging.error("Failed to parse lsdvd output", exc_info=e)
+    if track_count is not None:
+        logging.debug(f"Detected {track_count} tracks")
+        if track_count == 99:
+            job.has_track_99 = True
+            if cfg.arm_config["PREVENT_99"]:
+                raise utils.RipperException("Track 99 found and PREVENT_99 is enabled")
 
     return True
 
 
+def arm_api_lookup(crc64):
+    """
+    Look the dvd up in the ARM crc64 database\n
+    :param crc64: crc64 of the dvd
+    :return: dict of the first match (title, year, imdb_id, video_type, poster_img), None if there isn't one
+    """
+    urlstring = f"https://1337server.pythonanywhere.com/api/v1/?mode=s&crc64={crc64}"
+    logging.debug(urlstring)
+    try:
+        arm_api_json = metadata_cache.get_json("armapi", urlstring, crc64,
+                                               found=lambda response: bool(response.get('success')))
+        logging.debug(f"dvd xml - {arm_api_json}")
+        logging.debug(f"results = {arm_api_json['results']}")
+        if arm_api_json['success']:
+            return arm_api_json['results']['0']
+    except Exception as error:
+        logging.error(f"ARM crc64 lookup failed with the error: {error}")
+    return None
+
+
+def lsdvd_track_count(job):
+    """
+    Number of tracks lsdvd finds on the dvd, cached per disc\n
+    :param job: Job instance
+    :return: int number of tracks, None if lsdvd failed
+    """
+    scan = scan_cache.load(job, "lsdvd")
+    if scan is not None:
+        return scan["tracks"]
+    # -Oy means output a python dict
+    output = arm_subprocess(["lsdvd", "-Oy", job.devpath])
+    if not output:
+        return None
+    try:
+        # literal_eval only accepts literals so we have to adjust the output slightly
+        tracks = literal_eval(re.sub(r"^.*\{", "{", output)).get("track", [])
+    except (SyntaxError, AttributeError) as e:
+        logging.error("Failed to parse lsdvd output", exc_info=e)
+        return None
+    scan_cache.store(job, "lsdvd", tracks=len(tracks))
+    return len(tracks)
+
+
 def get_video_details(job):
     """ Clean up title and year.  Get video_type, imdb_id, poster_url from
     omdbapi.com webservice.\n
@@ -298,95 +340,104 @@ def metadata_selector(job, title=None, year=None):
     :param title: this can either be a search string or movie/show title
     :param year: the year of movie/show release
 
+    :return: json/dict object or None
+    """
+    search_results = metadata_search(title, year)
+    if search_results is not None:
+        update_job(job, search_results)
+    return search_results
+
+
+def metadata_search(title=None, year=None):
+    """
+    Search the metadata provider, without updating the job\n
+    :param title: this can either be a search string or movie/show title
+    :param year: the year of movie/show release
     :return: json/dict object or None
     """
     search_results = None
     if cfg.arm_config['METADATA_PROVIDER'].lower() == "tmdb":
         logging.debug("provider tmdb")
         search_results = ui_utils.tmdb_search(title, year)
-        if search_results is not None:
-            update_job(job, search_results)
     elif cfg.arm_config['METADATA_PROVIDER'].lower() == "omdb":
         logging.debug("provider omdb")
         search_results = ui_utils.call_omdb_api(str(title), str(year))
-        if search_results is not None:
-            update_job(job, search_results)
     else:
         logging.debug(cfg.arm_config['METADATA_PROVIDER'])
         logging.debug("unknown provider - doing nothing, saying nothing. Getting Kryten")
     return search_results
 
 
-def identify_loop(job, response, title, year):
+def title_variants(title, year):
     """
-
-    :param job:
-    :param response:
-    :param title:
-    :param year:
+    Title/year pairs to search for, in order of preference\n
+    The title with its year, then the year before (the dvd release often follows the movie release),
+    without the year, then with words taken off the end.\n
+    :param str title: title with words joined by "+"
+    :param year: year of release, may be empty
+    :return: list of (title, year) tuples, year None to search without a year
+
+    >>> title_variants("Serenity+Special+Edition", "2005")  # doctest: +NORMALIZE_WHITESPACE
+    [('Serenity+Special+Edition', '2005'), ('Serenity+Special+Edition', '2004'), ('Serenity+Special+Edition', None),
+     ('Serenity+Special', '2005'), ('Serenity+Special', None), ('Serenity', '2005'), ('Serenity', None)]
     """
-    # handle failures
-    # this is a little kludgy, but it kind of works...
-    logging.debug(f"Response = {response}")
-    if response is None:
-        # try with year first
-        response = try_with_year(job, response, title, year)
-        # try submitting without the year
-        response = try_without_year(job, response, title)
-
-        if response is None:
-            while response is None and title.find("-") > 0:
-                title = title.rsplit('-', 1)[0]
-                logging.debug(f"Trying title: {title}")
-                response = metadata_selector(job, title, year)
-                logging.debug(f"response: {response}")
-
-            # if still fail, then try slicing off the last word in a loop
-            while response is None and title.count('+') > 0:
-                title = title.rsplit('+', 1)[0]
-                logging.debug(f"Trying title: {title}")
-                response = metadata_selector(job, title, year)
-                logging.debug(f"response: {response}")
-                if response is None:
-                    # Still failing - try the words we have without year
-                    logging.debug("Removing year...")
-                    response = metadata_selector(job, title)
-
-
-def try_without_year(job, response, title):
+    variants = []
+    if year:
+        variants += [(title, str(year)), (title, str(int(year) - 1))]
+    variants.append((title, None))
+    while title.find("-") > 0:
+        title = title.rsplit('-', 1)[0]
+        variants.append((title, year))
+    # if still fail, then try slicing off the last word in a loop, with and without the year
+    while title.count('+') > 0:
+        title = title.rsplit('+', 1)[0]
+        variants += [(title, year), (title, None)]
+    return list(dict.fromkeys(variants))
+
+
+def search_variants(variants):
     """
-
-    :param job:
-    :param response:
-    :param title:
-    :return:
+    Search for the title variants METADATA_WORKERS at a time\n
+    The result of the most preferred variant that finds something wins. Once it is known the
+    variants still waiting are cancelled and the ones being searched are left to time out.\n
+    :param list variants: (title, year) tuples from title_variants()
+    :return: json/dict search results or None
     """
-    if response is None:
-        logging.debug("Removing year...")
-        response = metadata_selector(job, title)
-        logging.debug(f"response: {response}")
+    pool = ThreadPoolExecutor(max_workers=METADATA_WORKERS, thread_name_prefix="metadata")
+    try:
+        searches = [pool.submit(search_variant, title, year) for title, year in variants]
+        for search in searches:
+            if (response := search.result()) is not None:
+                return response
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    return None
+
+
+def search_variant(title, year):
+    """metadata_search() for one variant, a failed search counts as not found"""
+    logging.debug(f"Trying title: {title} year: {year}")
+    try:
+        response = metadata_search(title, year)
+    except Exception as error:
+        logging.info(f"Searching for {title} ({year}) failed: {error}")
+        return None
+    logging.debug(f"response for {title} ({year}): {response}")
     return response
 
 
-def try_with_year(job, response, title, year):
+def identify_loop(job, response, title, year):
     """
-
-    :param job:
-    :param response:
-    :param title:
-    :param year:
-    :return:
+    Search for the job's title unless there is already a response, updating the job if it is found\n
+    :param job: Job instance
+    :param response: search results found already, nothing is searched if it isn't None
+    :param str title: title with words joined by "+"
+    :param year: year of release
+    :return: the search results or None
     """
-    # If we have a response don't overwrite it
-    if response is not None:
-        return response
-    if year:
-        response = metadata_selector(job, title, str(year))
-        logging.debug(f"response: {response}")
-    # If we still don't have a response try removing a year off
-    if response is None and year:
-        # This accounts for when
-        # the dvd release date is the year following the movie release date
-        logging.debug("Subtracting 1 year...")
-        response = metadata_selector(job, title, str(int(year) - 1))
+    logging.debug(f"Response = {response}")
+    if response is None:
+        response = search_variants(title_variants(title, year))
+        if response is not None:
+            update_job(job, response)
     return response
@@ -88,7 +88,7 @@ def clean_up_logs(logpath, loglife):
             continue
         for filename in os.listdir(log_dir):
             fullname = os.path.join(log_dir, filename)
-            if fullname.endswith(".log") and os.stat(fullname).st_mtime < now - loglife * 86400:
+            if fullname.endswith((".log", ".json")) and os.stat(fullname).st_mtime < now - loglife * 86400:
                 logging.info(f"Deleting log file: {filename}")
                 os.remove(fullname)
     return True
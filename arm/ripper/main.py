@@ -27,8 +27,8 @@ import arm.config.config as cfg  # noqa E402
 from arm.models.config import Config  # noqa: E402
 from arm.models.job import Job, JobState  # noqa: E402
 from arm.models.system_drives import SystemDrives  # noqa: E402
-from arm.ripper import (arm_ripper, identify, logger,  # noqa: E402
-                        music_brainz, utils)
+from arm.ripper import (arm_ripper, db_writer, identify, logger,  # noqa: E402
+                        music_brainz, notifier, utils)
 from arm.ripper.ARMInfo import ARMInfo  # noqa E402
 from arm.ui import app, constants, db  # noqa E402
 from arm.ui.settings import DriveUtils as drive_utils  # noqa E402
@@ -36,6 +36,8 @@ from arm.ui.settings import DriveUtils as drive_utils  # noqa E402
 job: Optional[Job] = None
 args: Optional[Namespace] = None
 log_file: Optional[str] = None
+# Collected once per process, the ripper daemon fills this in before starting any jobs
+arm_info: Optional[ARMInfo] = None
 
 
 def entry():
@@ -152,10 +154,15 @@ def main():
         logging.critical("Couldn't identify the disc type. Exiting without any action.")
 
 
-def setup():
+def setup(arguments):
+    """
+    Set up logging, the drive and the job for the disc in arguments.devpath\n
+    :param arguments: parsed arguments, see entry()
+    """
     global job
     global args
     global log_file
+    global arm_info
 
     def signal_handler(_signal, _frame_type):
         raise utils.RipperException("Received SIGTERM")
@@ -164,8 +171,7 @@ def setup():
     # run and the program exits immediately, potentially leaving the database in an invalid state.
     signal(SIGTERM, signal_handler)
 
-    # Get arguments from arg parser
-    args = entry()
+    args = arguments
     devpath = f"/dev/{args.devpath}"
     # Setup base logger - will log to <log directory>/arm.log, syslog & stdout
     # This will catch any permission errors
@@ -193,9 +199,12 @@ def setup():
     log_file = logger.setup_job_log(job)
 
     # Capture and report the ARM Info
-    arminfo = ARMInfo(cfg.arm_config["INSTALLPATH"], cfg.arm_config['DBFILE'])
-    job.arm_version = arminfo.arm_version
-    arminfo.get_values()
+    if arm_info is None:
+        arm_info = ARMInfo(cfg.arm_config["INSTALLPATH"], cfg.arm_config['DBFILE'])
+    else:
+        arm_info.get_db_version()
+    job.arm_version = arm_info.arm_version
+    arm_info.get_values()
 
     # Sometimes drives trigger twice this stops multi runs from 1 udev trigger
     utils.duplicate_run_check(devpath)
@@ -204,22 +213,17 @@ def setup():
     # Set job status and start time
     job.status = JobState.IDLE.value
     job.start_time = datetime.datetime.now()
-    utils.database_adder(job)
-    # Sleep to lower chances of db locked - unlikely to be needed
-    time.sleep(1)
-    # Associate the job with the drive in the database
-    drive_utils.update_drive_job(job)
-    # Add the job.config to db
-    config = Config(cfg.arm_config, job_id=job.job_id)  # noqa: F811
     # Check if the drive mode is set to manual, and load to the job config for later use
     logging.debug(f"drive_mode: {drive.drive_mode}")
-    if drive.drive_mode == 'manual':
-        job.manual_mode = True
-        db.session.commit()
-    else:
-        job.manual_mode = False
-        db.session.commit()
-    utils.database_adder(config)
+    job.manual_mode = drive.drive_mode == 'manual'
+    # Committed on its own, the drive and the config need its job_id
+    utils.database_adder(job)
+    with db_writer.batch():
+        # Associate the job with the drive in the database
+        drive_utils.update_drive_job(job)
+        # Add the job.config to db
+        config = Config(cfg.arm_config, job_id=job.job_id)  # noqa: F811
+        utils.database_adder(config)
 
     try:
         # Delete old log files
@@ -234,10 +238,16 @@ def setup():
     log_udev_params(devpath)
 
 
-if __name__ == "__main__":
+def run(arguments):
+    """
+    Run a full ARM job for one disc and finalise it in the database\n
+    Used both when started from udev directly and by the ripper daemon for each disc\n
+    :param arguments: parsed arguments, see entry()
+    """
+    global job
     job = None
     try:
-        setup()
+        setup(arguments)
         main()
     except Exception as error:
         logging.critical("A fatal error has occurred and ARM is exiting.")
@@ -267,11 +277,20 @@ if __name__ == "__main__":
     else:
         job.status = JobState.SUCCESS.value
     finally:
-        if job:
-            job.eject()  # each job stores its eject status, so it is safe to call.
-            job.stop_time = datetime.datetime.now()
-            job_length = job.stop_time - job.start_time if job.start_time else 0
-            minutes, seconds = divmod(job_length.seconds + job_length.days * 86400, 60)
-            hours, minutes = divmod(minutes, 60)
-            job.job_length = f'{hours:d}:{minutes:02d}:{seconds:02d}'
-        db.session.commit()
+        try:
+            if job:
+                job.eject()  # each job stores its eject status, so it is safe to call.
+                job.stop_time = datetime.datetime.now()
+                job_length = job.stop_time - job.start_time if job.start_time else 0
+                minutes, seconds = divmod(job_length.seconds + job_length.days * 86400, 60)
+                hours, minutes = divmod(minutes, 60)
+                job.job_length = f'{hours:d}:{minutes:02d}:{seconds:02d}'
+            db.session.commit()
+            db_writer.log_metrics()
+        finally:
+            # Daemon workers end with os._exit, which skips atexit, so send the queued notifications now
+            notifier.flush()
+
+
+if __name__ == "__main__":
+    run(entry())
@@ -16,12 +16,12 @@ import os
 import shlex
 import shutil
 import subprocess
-from time import sleep, time
+from time import sleep
 
 import arm.config.config as cfg
 from arm.models import SystemDrives, Track
 from arm.models.job import JobState
-from arm.ripper import utils
+from arm.ripper import utils, slots, progress, scan_cache
 from arm.ripper.utils import notify
 from arm.ui import db
 
@@ -72,6 +72,14 @@ class OutputType(enum.Flag):
     """Progress Bar Total Progress on Title"""
 
 
+PROGRESS_TYPES = OutputType.PRGV | OutputType.PRGC | OutputType.PRGT
+"""Output Types sent to the job progress instead of the caller"""
+PROGRESS_OPTION = "--progress=-same"
+"""makemkvcon option to write progress messages to stdout along with the other messages"""
+OUTPUT_TYPES = dict(OutputType.__members__)
+"""Output Types by the name makemkvcon writes before the colon"""
+
+
 class DriveVisible(enum.IntEnum):
     """
     Definitions of `DriveInformation.visible` colon of the OutputType.DRV.
@@ -187,7 +195,7 @@ class TrackID(enum.IntEnum):
     FILENAME = 27
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class MakeMKVMessage:
     """
     Message output
@@ -211,7 +219,7 @@ class MakeMKVMessage:
         self.count = int(self.count)
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class MakeMKVErrorMessage(MakeMKVMessage):
     """Error Message"""
     error: str
@@ -223,7 +231,7 @@ class MakeMKVErrorMessage(MakeMKVMessage):
         self.sprintf = self.sprintf[2:]
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class Titles:
     """
     Disc information output messages
@@ -237,7 +245,7 @@ class Titles:
         self.count = int(self.count)
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class CInfo:
     """
     Disc Information
@@ -257,7 +265,7 @@ class CInfo:
         self.code = int(self.code)
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class TInfo(CInfo):
     """
     Title Information
@@ -268,11 +276,12 @@ class TInfo(CInfo):
     """Title ID"""
 
     def __post_init__(self):
-        super().__post_init__()
+        # super() without arguments doesn't work in slots dataclasses before python 3.14
+        CInfo.__post_init__(self)
         self.tid = int(self.tid)
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class SInfo(TInfo):
     """
     Stream Information
@@ -283,11 +292,11 @@ class SInfo(TInfo):
     sid: int
 
     def __post_init__(self):
-        super().__post_init__()
+        TInfo.__post_init__(self)
         self.sid = int(self.sid)
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class ProgressBarValues:
     """
     Progress bar values for current and total progress
@@ -307,7 +316,7 @@ class ProgressBarValues:
         self.maximum = int(self.maximum)
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class ProgressBarTitle:
     """
     Progress Bar Information
@@ -324,7 +333,7 @@ class ProgressBarTitle:
         self.oid = int(self.oid)
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class ProgressBarCurrent(ProgressBarTitle):
     """
     Current progress title
@@ -333,7 +342,7 @@ class ProgressBarCurrent(ProgressBarTitle):
     """
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class ProgressBarTotal(ProgressBarTitle):
     """
     Total progress title
@@ -342,7 +351,7 @@ class ProgressBarTotal(ProgressBarTitle):
     """
 
 
-@dataclasses.dataclass(order=True)
+@dataclasses.dataclass(order=True, slots=True)
 class DriveInformation:
     """
     Basic Optical Drive Information from MakeMKV Drive Scan Messages
@@ -374,7 +383,7 @@ class DriveInformation:
         self.index = int(self.index)
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class Drive(DriveInformation):
     """
     Extended MakeMKV Drive Information (with medium information)
@@ -393,7 +402,7 @@ class Drive(DriveInformation):
     """Medium is BD"""
 
     def __post_init__(self):
-        super().__post_init__()
+        DriveInformation.__post_init__(self)
         drive_type = DriveType(self.flags)
         if drive_type == DriveType.CD:
             self.media_cd = True
@@ -511,14 +520,24 @@ def parse_content(content, num_header, num_message):
     return itertools.chain(header[:-1], (x.strip('"') for x in message))
 
 
-def parse_line(line):
-    """Parse MakeMkv Output Line to DataClasses"""
-    if ":" not in line:
+def parse_line(line, select=None):
+    """
+    Parse MakeMkv Output Line to DataClasses
+
+    Parameters:
+        line (str): makemkvcon stdout line
+        select (OutputType): only build the dataclass for these types (default: all)
+    Returns:
+        tuple: the OutputType and its dataclass, None if the type isn't selected
+    """
+    msg_type, colon, content = line.partition(":")
+    if not colon:
         raise MakeMkvParserError("No Message Type Detected")
-    msg_type, content = line.split(":", maxsplit=1)
-    if msg_type not in OutputType.__members__:
+    if msg_type not in OUTPUT_TYPES:
         raise MakeMkvParserError(f"Cannot parse '{msg_type}':'{content}'")
-    msg_type = OutputType[msg_type]
+    msg_type = OUTPUT_TYPES[msg_type]
+    if select is not None and msg_type not in select:
+        return msg_type, None
     if msg_type == OutputType.MSG:
         temp = parse_content(content, 3, -1)
         data = MakeMKVMessage(*itertools.islice(temp, 4), list(temp))
@@ -594,26 +613,21 @@ def makemkv_info(job, select=None, index=9999, options=None):
         raise TypeError(options)
     # 1MB cache size to get info on the specified disc(s)
     info_options = ["info", "--cache=1"] + options + [f"disc:{index:d}", f"--minlength={job.config.MINLENGTH}"]
-    wait_time = job.config.MANUAL_WAIT_TIME
-    max_processes = cfg.arm_config["MAX_CONCURRENT_MAKEMKVINFO"]
+    slot_scheduler = slots.makemkvinfo_slots()
     job.status = JobState.VIDEO_WAITING.value
     db.session.commit()
-    utils.sleep_check_process("makemkvcon", max_processes, sleep=(10, wait_time, 10))
-    job.status = JobState.VIDEO_INFO.value
-    db.session.commit()
     try:
-        yield from run(info_options, select)
+        with slot_scheduler.slot(job.job_id):
+            job.status = JobState.VIDEO_INFO.value
+            db.session.commit()
+            yield from run(info_options, select)
     finally:
         logging.info("MakeMKV info exits.")
         job.status = JobState.VIDEO_WAITING.value
         db.session.commit()
-        if max_processes:
-            logging.info(f"Penalty {wait_time}s")
-            # makemkvcon info tends to crash makemkvcon backup|mkv
-            # give other processes time to use this function.
-            sleep(wait_time)
-        # sleep here until all processes finish (hopefully)
-        utils.sleep_check_process("makemkvcon", max_processes, sleep=wait_time)
+        # makemkvcon info tends to crash makemkvcon backup|mkv
+        # let the info calls queued behind this one finish before we start ripping
+        slot_scheduler.wait_for_free_slot(job.job_id)
         job.status = JobState.VIDEO_RIPPING.value
         db.session.commit()
 
@@ -645,21 +659,23 @@ def makemkv_backup(job, rawpath):
     cmd += shlex.split(job.config.MKV_ARGS)
     cmd += [
         f"--minlength={job.config.MINLENGTH}",
-        f"--progress={progress_log(job)}",
+        PROGRESS_OPTION,
         f"disc:{job.drive.mdisc:d}",
         rawpath,
     ]
     logging.info("Backing up disc")
-    collections.deque(run(cmd, OutputType.MSG), maxlen=0)
+    with progress.Progress(job.job_id, "makemkv", title="Backup") as job_progress:
+        collections.deque(run(cmd, OutputType.MSG, job_progress), maxlen=0)
 
 
-def makemkv_mkv(job, rawpath):
+def makemkv_mkv(job, rawpath, on_ripped=None):
     """
     Rip Blu-ray without enhanced protection or dvd disc
 
     Parameters:
         job: arm.models.job.Job
         rawpath:
+        on_ripped: called with the paths of the files of each title when titles are ripped one at a time
     """
     # Get drive mode for the current drive
     mode = utils.get_drive_mode(job.devpath)
@@ -681,7 +697,7 @@ def makemkv_mkv(job, rawpath):
             # Response from user provided, process requested tracks
             job.status = JobState.VIDEO_RIPPING.value
             db.session.commit()
-            process_single_tracks(job, rawpath, mode)
+            process_single_tracks(job, rawpath, mode, on_ripped)
         else:
             # Notify User: no action was taken
             title = "ARM is Sad - Job Abandoned"
@@ -697,24 +713,27 @@ def makemkv_mkv(job, rawpath):
         ]
         cmd += shlex.split(job.config.MKV_ARGS)
         cmd += [
-            f"--progress={progress_log(job)}",
+            PROGRESS_OPTION,
             f"dev:{job.devpath}",
             "all",
             rawpath,
             f"--minlength={job.config.MINLENGTH}",
         ]
         logging.info("Process all tracks from disc.")
-        collections.deque(run(cmd, OutputType.MSG), maxlen=0)
+        with progress.Progress(job.job_id, "makemkv", title="All tracks") as job_progress:
+            collections.deque(run(cmd, OutputType.MSG, job_progress), maxlen=0)
     else:
-        process_single_tracks(job, rawpath, 'auto')
+        process_single_tracks(job, rawpath, 'auto', on_ripped)
 
 
-def makemkv(job):
+def makemkv(job, on_ripped=None):
     """
     Rip Blu-rays/DVDs with MakeMKV
 
     Parameters:
         job: arm.models.job.Job
+        on_ripped: called with the paths of the files of each title as soon as it is ripped,
+            only when titles are ripped one at a time
     Returns:
         str: path to ripped files.
     """
@@ -753,7 +772,7 @@ def makemkv(job):
         makemkv_backup(job, rawpath)
     # Rip BluRay or DVD
     elif job.config.RIPMETHOD == "mkv" or job.disctype == "dvd":
-        makemkv_mkv(job, rawpath)
+        makemkv_mkv(job, rawpath, on_ripped)
     else:
         logging.info("I'm confused what to do....  Passing on MakeMKV")
     job.eject()
@@ -777,7 +796,7 @@ def rip_mainfeature(job, track, rawpath):
     ]
     cmd += shlex.split(job.config.MKV_ARGS)
     cmd += [
-        f"--progress={progress_log(job)}",
+        PROGRESS_OPTION,
         f"dev:{job.devpath}",
         track.track_number,
         rawpath,
@@ -785,10 +804,11 @@ def rip_mainfeature(job, track, rawpath):
     ]
     logging.info("Ripping main feature")
     # Possibly update db to say track was ripped
-    collections.deque(run(cmd, OutputType.MSG), maxlen=0)
+    with progress.Progress(job.job_id, "makemkv", title=f"Track {track.track_number}") as job_progress:
+        collections.deque(run(cmd, OutputType.MSG, job_progress), maxlen=0)
 
 
-def process_single_tracks(job, rawpath, mode: str):
+def process_single_tracks(job, rawpath, mode: str, on_ripped=None):
     """
     Process single tracks by MakeMKV one at a time
 
@@ -796,6 +816,7 @@ def process_single_tracks(job, rawpath, mode: str):
         job: arm.models.job.Job
         rawpath:
         mode: drive mode (auto or manual)
+        on_ripped: called with the paths of the new files after each track is ripped
     """
     # process one track at a time based on track length
     if mode == 'auto':
@@ -826,32 +847,25 @@ def process_single_tracks(job, rawpath, mode: str):
                      f"Length is {track.length} seconds.")
         filepathname = os.path.join(rawpath, track.filename)
         logging.info(f"Ripping title {track.track_number} to {shlex.quote(filepathname)}")
-        logfile_base = progress_log(job)
         cmd = [
             "mkv",
         ]
         cmd += shlex.split(job.config.MKV_ARGS)
         cmd += [
             f"--minlength={job.config.MINLENGTH}",
-            f"--progress={logfile_base}",
+            PROGRESS_OPTION,
             f"dev:{job.devpath}",
             track.track_number,
             rawpath,
         ]
-        # Create a batch info file so the web gui can know when this process started, which track, and how many tracks
-        logging.debug(f"Saving batch position info for job {job.job_id}: "
-                      f"BINF:{int(time())},{process_index},{len(tracks_to_process)},0000"
-                      )
-        batch_info_file = logfile_base+".batchinfo"
-        if not os.path.exists(batch_info_file):
-            with open(batch_info_file, 'w') as f:
-                f.write(f"BINF:{int(time())},{process_index},{len(tracks_to_process)},0000")
-        else:
-            with open(batch_info_file, 'a') as f:
-                f.write(f"\nBINF:{int(time())},{process_index},{len(tracks_to_process)},0000")
-
         logging.debug("Starting to rip single track.")
-        collections.deque(run(cmd, OutputType.MSG), maxlen=0)
+        ripped_before = set(os.listdir(rawpath))
+        # The web gui shows which track of how many is being ripped, and the ETA for this track
+        with progress.Progress(job.job_id, "makemkv",
+                               title=f"Track {process_index}/{len(tracks_to_process)}") as job_progress:
+            collections.deque(run(cmd, OutputType.MSG, job_progress), maxlen=0)
+        if on_ripped is not None:
+            on_ripped([os.path.join(rawpath, name) for name in sorted(set(os.listdir(rawpath)) - ripped_before)])
         process_index += 1
 
 
@@ -910,26 +924,6 @@ def prep_mkv():
         raise UpdateKeyRunTimeError(err.returncode, cmd, output=err.stdout.decode("utf-8"))
 
 
-def progress_log(job):
-    """
-    Retrieve the path to the progress log file
-
-    The file path is expected like this by the frontend.
-
-    ToDo: move to Job() class since this is mainly a db wrapper. Then allow the
-          front end to pick up the same method.
-
-    Parameters:
-        job: arm.models.job.Job
-    Returns:
-        str: log file
-
-    """
-    logfile = os.path.join(job.config.LOGPATH, "progress", f"{job.job_id:d}.log")
-    logging.debug(f"logging progress to '{logfile}'")
-    return shlex.quote(logfile)
-
-
 class TrackInfoProcessor:
     """
     Processes MakeMKV track info messages to update Track class.
@@ -948,6 +942,8 @@ class TrackInfoProcessor:
         self.stream_type = None
         self.chapters = 0
         self.filesize = 0
+        # Tracks are written in one transaction once the scan finishes
+        self.tracks = utils.TrackBatch(job)
 
     def process_messages(self):
         output_types = (
@@ -958,11 +954,12 @@ class TrackInfoProcessor:
         )
         options = []  # add relevant options here if needed
 
-        for message in makemkv_info(self.job, select=output_types, index=self.index, options=options):
-            self._process_message(message)
+        with self.tracks:
+            for message in makemkv_info(self.job, select=output_types, index=self.index, options=options):
+                self._process_message(message)
 
-        # Add the last track if exists
-        self._add_track()
+            # Add the last track if exists
+            self._add_track()
 
     def _process_message(self, message):
         if isinstance(message, (TInfo, SInfo)):
@@ -1010,8 +1007,7 @@ class TrackInfoProcessor:
     def _add_track(self):
         if self.track_id is None:
             return
-        utils.put_track(
-            self.job,
+        self.tracks.add(
             self.track_id,
             self.seconds,
             self.aspect,
@@ -1044,8 +1040,15 @@ def get_track_info(index, job):
     .. note:: For help with MakeMKV codes:
     https://github.com/automatic-ripping-machine/automatic-ripping-machine/wiki/MakeMKV-Codes
     """
+    scanner = f"makemkv-{job.config.MINLENGTH}"
+    if scan_cache.restore_tracks(job, scanner):
+        # as after makemkv info, don't start ripping while other info calls are running
+        slots.makemkvinfo_slots().wait_for_free_slot(job.job_id)
+        utils.database_updater({"status": JobState.VIDEO_RIPPING.value}, job)
+        return
     processor = TrackInfoProcessor(job, index)
     processor.process_messages()
+    scan_cache.store_tracks(job, scanner, processor.tracks)
 
 
 def convert_to_seconds(hms_value):
@@ -1174,13 +1177,14 @@ class MakeMKVOutputChecker:
         return self.data
 
 
-def run(options, select):
+def run(options, select, job_progress=None):
     """
     Run makemkv with input cli options and yield selected messages
 
     Parameters:
         options (list): makemkvcon cli options
         select (OutputType): output Message Type(s)
+        job_progress (progress.Progress): publishes the progress messages, needs PROGRESS_OPTION in options
     Yields:
         dataclasses of selected type
     Raises:
@@ -1203,29 +1207,60 @@ def run(options, select):
     logging.debug(f"command: '{' '.join(cmd)}'")
     with subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True) as proc:
         logging.debug(f"PID {proc.pid}: command: '{' '.join(cmd)}'")
-        for line in proc.stdout:
-            line = line.rstrip(os.linesep)
-            logging.debug(line)  # Maybe write the raw output to a separate log
-            if proc.returncode:
-                buffer.append(line)
-                continue
-            try:
-                msg_type, data = parse_line(line)
-            except MakeMkvParserError as err:
-                logging.warning(err)
-                buffer.append(line)
-                continue
-            logging.debug(data)
-            if msg_type in select:
-                yield data
+        yield from parse_output(proc.stdout, select, job_progress=job_progress, unparsed=buffer)
     if proc.returncode:
         raise MakeMkvRuntimeError(proc.returncode, cmd, output=os.linesep.join(buffer))
-    if buffer and proc.returncode:
-        logging.warning(f"Cannot parse {len(buffer)} lines: {os.linesep.join(buffer)}")
-        raise MakeMkvRuntimeError(proc.returncode, cmd, output=os.linesep.join(buffer))
     logging.info("MakeMKV exits gracefully.")
 
 
+def parse_output(lines, select, job_progress=None, unparsed=None):
+    """
+    Parse makemkvcon robot output and yield selected messages
+
+    Only the lines of selected types are parsed into dataclasses. Messages are
+    always parsed, so errors are checked and logged. Progress values, thousands of
+    lines on a backup, are split without building a dataclass and only when
+    there is a job progress to publish them to.
+
+    Parameters:
+        lines (iterable): makemkvcon stdout lines
+        select (OutputType): output Message Type(s)
+        job_progress (progress.Progress): publishes the progress messages
+        unparsed (list): collects the lines that cannot be parsed
+    Yields:
+        dataclasses of selected type
+    """
+    select &= ~PROGRESS_TYPES
+    wanted = select | OutputType.MSG
+    if job_progress is not None:
+        wanted |= OutputType.PRGC
+    debug = logging.getLogger().isEnabledFor(logging.DEBUG)
+    stage = None
+    for line in lines:
+        line = line.rstrip(os.linesep)
+        if line.startswith("PRGV:"):
+            if job_progress is not None:
+                current, _, maximum = line[5:].split(",")
+                if maximum != "0":
+                    job_progress.update(100 * int(current) / int(maximum), stage=stage)
+            continue
+        if debug and not line.startswith("PRG"):
+            logging.debug(line)  # Maybe write the raw output to a separate log
+        try:
+            msg_type, data = parse_line(line, wanted)
+        except MakeMkvParserError as err:
+            logging.warning(err)
+            if unparsed is not None:
+                unparsed.append(line)
+            continue
+        if data is None:
+            continue
+        if msg_type == OutputType.PRGC and job_progress is not None:
+            stage = data.name
+        if msg_type in select:
+            yield data
+
+
 def manual_wait(job) -> bool:
     """
     Pause execution to allow for user interaction and monitor job readiness.
@@ -8,6 +8,7 @@ import werkzeug
 from discid import read, Disc
 
 import arm.config.config as cfg
+from arm.ripper import musicbrainz_cache
 from arm.ripper import utils as u
 
 
@@ -83,6 +84,8 @@ def get_disc_info(job, discid: str) -> str:
 
     This function contacts the MusicBrainz web service with a given disc ID
     to fetch associated release metadata such as artist credits and recordings.
+    The lookup is cached by `musicbrainz_cache`, so the disc isn't asked for again
+    after `get_title()` has looked it up.
 
     Parameters
     ----------
@@ -105,7 +108,7 @@ def get_disc_info(job, discid: str) -> str:
 
     # Get CD info from musicbrainz and catch any errors
     try:
-        disc_info = mb.get_releases_by_discid(discid, includes=['artist-credits', 'recordings'])
+        disc_info = musicbrainz_cache.releases_by_discid(discid)
         logging.debug(f"discid: [{discid}]")
         # Debugging, will dump the entire xml/json data from musicbrainz
         # logging.debug(f"disc_info: {disc_info}")
@@ -296,6 +299,8 @@ def get_title(discid: str, job) -> str:
     -----
     Avoid using logging in this function prior to the `setup_logging()` call,
     as it may interfere with ARM’s logger initialization.
+    The lookup is made through `musicbrainz_cache` with the includes `get_disc_info()`
+    needs, so ripping the disc later reuses it.
     """
 
     # Tell musicbrainz what your app is, and how to contact you
@@ -303,7 +308,7 @@ def get_title(discid: str, job) -> str:
     # at http://wiki.musicbrainz.org/XML_Web_Service/Rate_Limiting )
     mb.set_useragent("arm", version=str(job.arm_version), contact="https://github.com/automatic-ripping-machine")
     try:
-        disc_info = mb.get_releases_by_discid(discid, includes=['artist-credits'])
+        disc_info = musicbrainz_cache.releases_by_discid(discid)
         logging.debug(f"disc_info: {disc_info}")
         logging.debug(f"discid = {discid}")
         if 'disc' in disc_info:
@@ -379,7 +384,7 @@ def get_cd_art(job, disc_info: str) -> bool:
                 # 400: Releaseid is not a valid UUID
                 # 404: No release exists with an MBID of releaseid
                 # 503: Ratelimit exceeded
-                artlist = mb.get_image_list(first_release_with_artwork['id'])
+                artlist = musicbrainz_cache.image_list(first_release_with_artwork['id'])
                 logging.debug(f"artlist: {artlist}")
 
                 for image in artlist["images"]:
@@ -424,23 +429,24 @@ def process_tracks(job, mb_track_list: dict, is_stub=False):
     -----
     - Tracks with missing or invalid lengths will be logged but still processed.
     - A default title like "Untitled track X" will be used if no title is found in stub mode.
-    - Each processed track is stored using `u.put_track()`.
+    - The processed tracks are stored in one transaction using `u.TrackBatch`.
     """
-    for (idx, track) in enumerate(mb_track_list):
-        track_leng = 0
-        try:
+    with u.TrackBatch(job) as tracks:
+        for (idx, track) in enumerate(mb_track_list):
+            track_leng = 0
+            try:
+                if is_stub:
+                    track_leng = int(track['length'])
+                else:
+                    track_leng = int(track['recording']['length'])
+            except ValueError:
+                logging.error("Failed to find track length")
+            trackno = track.get('number', idx + 1)
             if is_stub:
-                track_leng = int(track['length'])
+                title = track.get('title', f"Untitled track {trackno}")
             else:
-                track_leng = int(track['recording']['length'])
-        except ValueError:
-            logging.error("Failed to find track length")
-        trackno = track.get('number', idx + 1)
-        if is_stub:
-            title = track.get('title', f"Untitled track {trackno}")
-        else:
-            title = track['recording']['title']
-        u.put_track(job, trackno, track_leng, "n/a", 0.1, False, "ABCDE", title)
+                title = track['recording']['title']
+            tracks.add(trackno, track_leng, "n/a", 0.1, False, "ABCDE", title)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,177 @@
+"""
+MusicBrainz lookups shared by all the ripper processes
+
+An audio cd is looked up when its log is set up (music_brainz.get_title) and again when it is
+ripped (music_brainz.main), and several drives may be ripping cds at once while MusicBrainz
+only allows about one request a second. Every lookup goes through here:
+
+- the releases of a disc id and the cover art of a release are kept in
+  LOGPATH/musicbrainz_cache, a disc is only asked for once
+- requests wait for a token from a bucket shared through a file by every process, so
+  together they stay within the rate limit instead of getting 503s
+- a lookup already being made by another thread or process is waited for, the second
+  caller gets the result from the cache rather than asking again
+"""
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import time
+
+import musicbrainzngs as mb
+
+import arm.config.config as cfg
+
+# Everything ARM uses from a disc lookup, get_title and get_disc_info share one request
+RELEASE_INCLUDES = ['artist-credits', 'recordings']
+# Seconds a lookup is kept, and a lookup that found nothing
+CACHE_TTL = 30 * 24 * 3600
+NEGATIVE_TTL = 3600
+# MusicBrainz rate limit, shared by all the ripper processes
+REQUESTS_PER_SECOND = 1.0
+BURST = 1
+# Lookups hash to one of this many lock files, so the same lookup is only made once at a time
+LOCK_STRIPES = 16
+# Lookups kept in the cache, the least recently used are removed
+MAX_ENTRIES = 512
+
+
+def enabled():
+    """True if lookups should be cached"""
+    return bool(cfg.arm_config.get("MUSICBRAINZ_CACHE", True))
+
+
+def cache_path():
+    """Folder the lookups, rate limit and locks are kept in"""
+    return os.path.join(cfg.arm_config['LOGPATH'], "musicbrainz_cache")
+
+
+def releases_by_discid(discid):
+    """
+    Releases of a disc, mb.get_releases_by_discid() with RELEASE_INCLUDES\n
+    :param discid: disc id (str or discid.Disc)
+    :return: dict from MusicBrainz, empty if the disc isn't known
+    :raises mb.WebServiceError: if MusicBrainz can't be reached
+    """
+    return lookup(f"discid-{discid}", lambda: mb.get_releases_by_discid(discid, includes=RELEASE_INCLUDES), {})
+
+
+def image_list(release_id):
+    """
+    Cover art of a release, mb.get_image_list()\n
+    :param str release_id: MusicBrainz release id
+    :return: dict from the Cover Art Archive, "images" is empty if the release has none
+    :raises mb.WebServiceError: if the Cover Art Archive can't be reached
+    """
+    return lookup(f"release-{release_id}", lambda: mb.get_image_list(release_id), {"images": []}, limited=False)
+
+
+def lookup(key, fetch, not_found, limited=True):
+    """
+    Cached result of fetch, making the request if no process has cached it\n
+    :param str key: key of the lookup
+    :param fetch: callable making the request
+    :param not_found: result when MusicBrainz answers 404, it is cached for NEGATIVE_TTL
+    :param bool limited: the request counts against the MusicBrainz rate limit
+    :return: result of fetch
+    """
+    if not enabled():
+        return _fetch(fetch, not_found, limited)[0]
+    if (cached := _load(key)) is not None:
+        return cached
+    os.makedirs(cache_path(), exist_ok=True)
+    with open(_lock_path(key), "a") as lock_file:
+        # Another thread or process may be making the same lookup, wait for it to be cached
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        if (cached := _load(key)) is not None:
+            return cached
+        result, ttl = _fetch(fetch, not_found, limited)
+        _store(key, result, ttl)
+    return result
+
+
+def _fetch(fetch, not_found, limited):
+    """Make the request, returns the result and how long to keep it"""
+    if limited:
+        wait_for_token()
+    try:
+        return fetch(), CACHE_TTL
+    except mb.ResponseError as error:
+        if getattr(error.cause, "code", None) != 404:
+            raise
+        logging.debug(f"MusicBrainz has nothing for this lookup: {error}")
+        return not_found, NEGATIVE_TTL
+
+
+def wait_for_token():
+    """Wait until a MusicBrainz request is allowed, the bucket is shared by all the ripper processes"""
+    os.makedirs(cache_path(), exist_ok=True)
+    bucket_fd = os.open(os.path.join(cache_path(), "ratelimit"), os.O_RDWR | os.O_CREAT, 0o664)
+    with os.fdopen(bucket_fd, "r+") as bucket:
+        fcntl.flock(bucket, fcntl.LOCK_EX)
+        now = time.time()
+        try:
+            tokens, updated = (float(value) for value in bucket.read().split())
+        except ValueError:
+            tokens, updated = BURST, now
+        # Take the token now, a negative balance is how long until it is ours
+        tokens = min(BURST, tokens + max(0.0, now - updated) * REQUESTS_PER_SECOND) - 1
+        bucket.seek(0)
+        bucket.truncate()
+        bucket.write(f"{tokens} {now}")
+    if tokens < 0:
+        logging.debug(f"Waiting {-tokens / REQUESTS_PER_SECOND:.1f}s for the MusicBrainz rate limit")
+        time.sleep(-tokens / REQUESTS_PER_SECOND)
+
+
+def _entry_path(key):
+    return os.path.join(cache_path(), f"{key}.json")
+
+
+def _lock_path(key):
+    stripe = int(hashlib.sha1(key.encode()).hexdigest(), 16) % LOCK_STRIPES
+    return os.path.join(cache_path(), f"lookup{stripe}.lock")
+
+
+def _load(key):
+    """Cached result for key, None if it isn't cached or has expired"""
+    path = _entry_path(key)
+    try:
+        with open(path, "r") as entry_file:
+            entry = json.load(entry_file)
+    except (OSError, ValueError):
+        return None
+    if entry.get("expires", 0) < time.time():
+        return None
+    logging.info(f"Using the cached MusicBrainz lookup {key}")
+    # mark as recently used
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return entry["result"]
+
+
+def _store(key, result, ttl):
+    """Cache a result, a lookup that isn't cached is only made again next time"""
+    path = _entry_path(key)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w") as entry_file:
+            json.dump({"expires": time.time() + ttl, "result": result}, entry_file)
+        os.replace(tmp_path, path)
+        _prune()
+    except (OSError, TypeError, ValueError) as error:
+        logging.debug(f"Couldn't cache the MusicBrainz lookup {key}: {error}")
+
+
+def _prune():
+    """Remove the least recently used lookups over MAX_ENTRIES"""
+    with os.scandir(cache_path()) as entries:
+        lookups = sorted((entry.stat().st_mtime, entry.path) for entry in entries if entry.name.endswith(".json"))
+    for _, path in lookups[:max(0, len(lookups) - MAX_ENTRIES)]:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
@@ -0,0 +1,199 @@
+"""
+Notifications sent in the background
+
+utils.notify() saves a notification for the ui and queues it here. A worker thread runs
+BASH_SCRIPT and sends it to the apprise services, so ripping never waits on a slow webhook.
+
+- The Apprise object with every configured service (Pushbullet, IFTTT, Pushover and JSON_URL
+  from arm.yaml and the services in the APPRISE yaml) is built once, and only built again
+  when those settings or the apprise yaml change.
+- Messages queued within COALESCE_SECONDS of each other are sent together, the bodies of
+  messages with the same title are joined into one and repeated bodies are dropped.
+- A service that fails is tried again up to RETRIES times, waiting longer each time.
+  The services that were sent the message aren't sent it again.
+- Messages still queued when the process exits are sent first, for up to FLUSH_TIMEOUT seconds.
+  atexit only covers a normal exit, processes that end with os._exit (the daemon's forked
+  workers) call flush() themselves.
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+
+import apprise
+
+import arm.config.config as cfg
+from arm.ripper import apprise_bulk
+from arm.ripper.ProcessHandler import arm_subprocess
+
+# Messages queued this close together are sent as one batch
+COALESCE_SECONDS = 2
+# Times a failed service is tried again, the first wait is BACKOFF_SECONDS and doubles each time
+RETRIES = 3
+BACKOFF_SECONDS = 5
+# Seconds to keep sending queued messages when the process exits
+FLUSH_TIMEOUT = 60
+# arm.yaml settings the apprise services are built from
+SERVICE_SETTINGS = ("PB_KEY", "IFTTT_KEY", "IFTTT_EVENT", "PO_USER_KEY", "PO_APP_KEY", "JSON_URL", "APPRISE")
+
+_messages = queue.Queue()
+_worker = None
+_worker_lock = threading.Lock()
+# The Apprise object and the settings it was built from
+_apprise = None
+_apprise_settings = None
+
+
+def _after_fork():
+    """
+    Start a forked child (a daemon worker) with its own queue and worker\n
+    The queue's waiters are copied from the parent, a put() would wake its worker thread,
+    which doesn't exist in the child, and not the child's.
+    """
+    global _messages, _worker, _worker_lock
+    _messages = queue.Queue()
+    _worker = None
+    _worker_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+def send(title, body):
+    """
+    Queue a notification for the worker thread\n
+    :param str title: title of the notification
+    :param str body: body of the notification
+    """
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            atexit.register(flush)
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_run, name="notifier", daemon=True)
+            _worker.start()
+    _messages.put((title, body))
+
+
+def flush(timeout=FLUSH_TIMEOUT):
+    """
+    Wait for the queued notifications to be sent\n
+    :param timeout: seconds to wait at most
+    :return: True if they were all sent
+    """
+    deadline = time.monotonic() + timeout
+    with _messages.all_tasks_done:
+        while _messages.unfinished_tasks:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                logging.warning(f"{_messages.unfinished_tasks} notifications were not sent")
+                return False
+            _messages.all_tasks_done.wait(remaining)
+    return True
+
+
+def coalesce(messages):
+    r"""
+    Join messages with the same title, in the order they were queued\n
+    :param list messages: (title, body) tuples
+    :return: list of (title, body) tuples, one per title
+
+    >>> coalesce([("ARM", "Rip done"), ("Other", "Eject"), ("ARM", "Rip done"), ("ARM", "Transcode done")])
+    [('ARM', 'Rip done\nTranscode done'), ('Other', 'Eject')]
+    """
+    bodies = {}
+    for title, body in messages:
+        bodies.setdefault(title, {})[body] = None
+    return [(title, "\n".join(title_bodies)) for title, title_bodies in bodies.items()]
+
+
+def _run():
+    """Worker thread, sends the queued messages a batch at a time"""
+    while True:
+        batch = [_messages.get()]
+        deadline = time.monotonic() + COALESCE_SECONDS
+        while (remaining := deadline - time.monotonic()) > 0:
+            try:
+                batch.append(_messages.get(timeout=remaining))
+            except queue.Empty:
+                break
+        try:
+            for title, body in coalesce(batch):
+                _deliver(title, body)
+        except Exception as error:  # noqa: E722
+            logging.error(f"Failed sending notifications. error:{error}. Continuing processing...")
+        finally:
+            for _ in batch:
+                _messages.task_done()
+
+
+def _deliver(title, body):
+    """Run the bash script and send to every apprise service, trying failed services again"""
+    if cfg.arm_config["BASH_SCRIPT"] != "":
+        # bash notifications use subprocess instead of apprise.
+        arm_subprocess(["/usr/bin/env", "bash", cfg.arm_config["BASH_SCRIPT"], title, body])
+
+    services = list(apprise_services())
+    for attempt in range(RETRIES + 1):
+        if attempt:
+            time.sleep(BACKOFF_SECONDS * 2 ** (attempt - 1))
+        services = [service for service in services if not _notify(service, title, body)]
+        if not services:
+            return
+    for service in services:
+        logging.error(f"Failed sending {service.service_name} notification after {RETRIES + 1} tries: {title}")
+
+
+def _notify(service, title, body):
+    """Send to one apprise service, True if it was sent"""
+    try:
+        if service.notify(body=body, title=title):
+            logging.debug(f"Sent apprise to {service.service_name} was successful")
+            return True
+    except Exception as error:  # noqa: E722
+        logging.debug(f"Sending {service.service_name} notification failed: {error}")
+    return False
+
+
+def apprise_services():
+    """
+    Apprise object with every configured service, built again when the settings change\n
+    :return: apprise.Apprise, iterating it gives the services
+    """
+    global _apprise, _apprise_settings
+    settings = tuple(cfg.arm_config.get(key, "") for key in SERVICE_SETTINGS)
+    try:
+        settings += (os.stat(cfg.arm_config["APPRISE"]).st_mtime_ns,) if cfg.arm_config["APPRISE"] != "" else ()
+    except OSError:
+        pass
+    if _apprise is None or settings != _apprise_settings:
+        _apprise = _build_apprise()
+        _apprise_settings = settings
+        logging.debug(f"Built apprise with {len(_apprise)} services")
+    return _apprise
+
+
+def _build_apprise():
+    """Apprise object with the services set in arm.yaml and the APPRISE yaml"""
+    apobj = apprise.Apprise()
+    if cfg.arm_config["PB_KEY"] != "":
+        apobj.add('pbul://' + str(cfg.arm_config["PB_KEY"]))
+    if cfg.arm_config["IFTTT_KEY"] != "":
+        apobj.add('ifttt://' + str(cfg.arm_config["IFTTT_KEY"]) + "@" + str(cfg.arm_config["IFTTT_EVENT"]))
+    if cfg.arm_config["PO_USER_KEY"] != "":
+        apobj.add('pover://' + str(cfg.arm_config["PO_USER_KEY"]) + "@" + str(cfg.arm_config["PO_APP_KEY"]))
+    if cfg.arm_config["JSON_URL"] != "":
+        apobj.add(str(cfg.arm_config["JSON_URL"]).replace("http://", "json://").replace("https://", "jsons://"))
+
+    # Bulk send notifications, using the config set on the ripper config page
+    if cfg.arm_config["APPRISE"] != "":
+        try:
+            for url in apprise_bulk.apprise_urls(cfg.arm_config["APPRISE"]):
+                if not apobj.add(url):
+                    logging.error(f"Couldn't add apprise service {url.split('://', 1)[0]}")
+            logging.debug(f"apprise-config: {cfg.arm_config['APPRISE']}")
+        except Exception as error:  # noqa: E722
+            logging.error(f"Failed loading apprise notifications. {error}")
+    return apobj
@@ -0,0 +1,142 @@
+"""
+Setting the mode and owner of ripped files
+
+Used by the ripper (SET_MEDIA_PERMISSIONS) and by the UI's fix permissions action. Folders are
+read with os.scandir, WORKERS of them at a time, and only the files and folders whose mode or
+owner is wrong are changed, so running it again over a library that is already right only
+costs the stat of each file. It returns counts rather than logging every file.
+"""
+import os
+import stat
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# Folders read at the same time, most of the time is waiting on the filesystem (often a NAS)
+WORKERS = 4
+
+
+class PermissionCounts:
+    """
+    What fix_tree did
+    """
+
+    def __init__(self):
+        self.checked = 0
+        self.changed = 0
+        self.failed = 0
+        # the first error, e.g. "/media/Movie/Movie.mkv: [Errno 1] Operation not permitted"
+        self.error = None
+
+    def add(self, other):
+        """Add the counts of other to these"""
+        self.checked += other.checked
+        self.changed += other.changed
+        self.failed += other.failed
+        self.error = self.error or other.error
+
+    def __str__(self):
+        return f"{self.changed} of {self.checked} changed, {self.failed} failed"
+
+
+def fix_tree(root, mode=None, uid=-1, gid=-1, only=None, workers=WORKERS):
+    """
+    Set the mode and owner of a folder and everything in it\n
+    Symlinks are left alone.
+    :param str root: folder to fix
+    :param int mode: permission bits, e.g. 0o777, None to leave them
+    :param int uid: owner, -1 to leave it
+    :param int gid: group, -1 to leave it
+    :param only: paths under root to fix (folders with everything in them) along with the folders
+                 between them and root, None for everything under root. Ones that don't exist are skipped
+    :param int workers: folders read at the same time
+    :return: PermissionCounts
+    """
+    counts = PermissionCounts()
+    if only is None:
+        paths = [root]
+    else:
+        paths = list(only)
+        for folder in sorted(_folders_between(root, paths)):
+            _fix_path(folder, mode, uid, gid, counts)
+        paths = [path for path in paths if os.path.lexists(path)]
+    directories = [path for path in paths if _fix_path(path, mode, uid, gid, counts)]
+    if not directories:
+        return counts
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="permissions") as pool:
+        pending = {pool.submit(_fix_directory, directory, mode, uid, gid) for directory in directories}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                directory_counts, subdirectories = future.result()
+                counts.add(directory_counts)
+                pending |= {pool.submit(_fix_directory, subdirectory, mode, uid, gid)
+                            for subdirectory in subdirectories}
+    return counts
+
+
+def _folders_between(root, paths):
+    """root and the folders between it and each of paths"""
+    root = os.path.abspath(root)
+    folders = {root}
+    for path in paths:
+        folder = os.path.dirname(os.path.abspath(path))
+        while folder not in folders and os.path.commonpath([root, folder]) == root:
+            folders.add(folder)
+            folder = os.path.dirname(folder)
+    return folders
+
+
+def _fix_path(path, mode, uid, gid, counts):
+    """Fix one path given by name, True if it is a folder"""
+    try:
+        path_stat = os.stat(path, follow_symlinks=False)
+    except OSError as error:
+        _failed(counts, path, error)
+        return False
+    if stat.S_ISLNK(path_stat.st_mode):
+        return False
+    _fix(path, path_stat, mode, uid, gid, counts)
+    return stat.S_ISDIR(path_stat.st_mode)
+
+
+def _fix_directory(directory, mode, uid, gid):
+    """Fix what is in a folder, returns its counts and the folders in it"""
+    counts = PermissionCounts()
+    subdirectories = []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_symlink():
+                        continue
+                    entry_stat = entry.stat(follow_symlinks=False)
+                except OSError as error:
+                    _failed(counts, entry.path, error)
+                    continue
+                _fix(entry.path, entry_stat, mode, uid, gid, counts)
+                if stat.S_ISDIR(entry_stat.st_mode):
+                    subdirectories.append(entry.path)
+    except OSError as error:
+        _failed(counts, directory, error)
+    return counts, subdirectories
+
+
+def _fix(path, path_stat, mode, uid, gid, counts):
+    """Change the mode and owner of path if they aren't already right"""
+    counts.checked += 1
+    try:
+        changed = False
+        if mode is not None and stat.S_IMODE(path_stat.st_mode) != mode:
+            os.chmod(path, mode)
+            changed = True
+        if (uid != -1 and path_stat.st_uid != uid) or (gid != -1 and path_stat.st_gid != gid):
+            os.chown(path, uid, gid)
+            changed = True
+        counts.changed += changed
+    except OSError as error:
+        _failed(counts, path, error)
+
+
+def _failed(counts, path, error):
+    counts.failed += 1
+    if counts.error is None:
+        counts.error = f"{path}: {error}"
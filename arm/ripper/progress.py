@@ -0,0 +1,133 @@
+"""
+Job progress shared between the ripper and the UI
+
+The ripper publishes small status fields for a job (e.g. tracks found during a disc scan)
+to LOGPATH/progress/<job_id>.json, the UI reads them back without touching the database.
+Files are replaced atomically so a reader never sees a half written file.
+
+Ripping and transcoding progress (percent, stage, fps, ETA and current title) is published
+the same way by a Progress, so the UI doesn't have to scrape it out of the tool's output.
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+import arm.config.config as cfg
+
+# Fast changing fields (percent, fps) are written at most this often, in seconds
+PUBLISH_INTERVAL = 1.0
+
+# Fields published so far by this process, keyed by job id
+_published = {}
+# When each job's file was last written
+_written = {}
+
+
+def status_file(job_id):
+    """Path to the progress file for a job"""
+    return os.path.join(cfg.arm_config['LOGPATH'], "progress", f"{job_id}.json")
+
+
+def publish(job_id, throttle=False, **fields):
+    """
+    Merge fields into the job's progress file\n
+    :param job_id: id of the job
+    :param bool throttle: only write the file if it hasn't been written in the last PUBLISH_INTERVAL,
+     the fields are still kept and written with the next publish
+    :param fields: values to publish, must be json serializable
+    """
+    status = _published.setdefault(job_id, {})
+    status.update(fields)
+    now = time.monotonic()
+    if throttle and now - _written.get(job_id, 0) < PUBLISH_INTERVAL:
+        return
+    _written[job_id] = now
+    path = status_file(job_id)
+    # the ripper and a transcoder thread (transcode_pipeline) can publish for the same job at once
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "w") as status_file_handle:
+            json.dump(status, status_file_handle)
+        os.replace(tmp_path, path)
+    except OSError as error:
+        # Progress is only informational, never fail a job because of it
+        logging.debug(f"Couldn't write progress file {path}: {error}")
+
+
+def read(job_id):
+    """
+    Read the progress a job has published\n
+    :param job_id: id of the job
+    :return: dict of fields, empty if nothing has been published
+    """
+    try:
+        with open(status_file(job_id), "r") as status_file_handle:
+            return json.load(status_file_handle)
+    except (OSError, ValueError):
+        return {}
+
+
+class Progress:
+    """
+    Progress of one ripping or transcoding run for a job, use as a context manager\n
+    Publishes source (makemkv/handbrake/ffmpeg), title, stage, progress, progress_round, eta,
+    cur_fps and avg_fps. The ETA is estimated from the time since the run started when the tool doesn't give one.
+    """
+
+    def __init__(self, job_id, source, title=None):
+        """
+        :param job_id: id of the job
+        :param str source: tool doing the work
+        :param str title: the title being worked on, e.g. "Track 2/5"
+        """
+        self.job_id = job_id
+        self.source = source
+        self.started = time.time()
+        publish(job_id, source=source, title=title, stage="Starting", progress="0.00", progress_round=0,
+                eta="Unknown", cur_fps=0, avg_fps=0)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.finish()
+        return False
+
+    def update(self, percent, stage=None, eta=None, cur_fps=None, avg_fps=None):
+        """
+        Publish the current progress, written at most every PUBLISH_INTERVAL\n
+        :param float percent: 0-100
+        :param str stage: what the tool is doing
+        :param str eta: time remaining, estimated if not given
+        :param cur_fps: current frames per second
+        :param avg_fps: average frames per second
+        """
+        percent = max(0.0, min(100.0, float(percent)))
+        fields = {
+            # set again, another run of the same job (e.g. titles transcoded in parallel) may have finished
+            "source": self.source,
+            "progress": f"{percent:.2f}",
+            "progress_round": int(percent),
+            "eta": eta or self.eta(percent),
+        }
+        if stage is not None:
+            fields["stage"] = stage
+        if cur_fps is not None:
+            fields["cur_fps"] = cur_fps
+        if avg_fps is not None:
+            fields["avg_fps"] = avg_fps
+        publish(self.job_id, throttle=True, **fields)
+
+    def eta(self, percent):
+        """Time remaining if the rest goes as fast as it has so far, formatted like HandBrake's"""
+        if percent <= 0:
+            return "Unknown"
+        elapsed = time.time() - self.started
+        remaining = int(elapsed * 100 / percent - elapsed)
+        return time.strftime("%Hh%Mm%Ss", time.gmtime(remaining))
+
+    def finish(self):
+        """Write the last update and mark the run as done"""
+        publish(self.job_id, source=None)
@@ -0,0 +1,165 @@
+"""
+Disc scan results cached per disc
+
+Scanning the titles of a disc (makemkvcon info, HandBrake --scan, lsdvd) reads the whole disc
+and takes minutes. The parsed results are kept in LOGPATH/scan_cache/<disc key>.json so a later
+stage of the same job, or the same disc inserted again, registers the titles without a rescan.
+
+A disc is keyed by its DVD CRC64 (pydvdid) when there is one, otherwise by a hash of its label
+and the names and sizes of the files in its DVD/Blu-ray structure. The key has to be taken
+while the disc is mounted, identify does that and it is remembered for the rest of the job.
+"""
+import hashlib
+import json
+import logging
+import os
+
+import arm.config.config as cfg
+from arm.ripper import utils
+
+# Discs kept in the cache, the least recently used are removed
+MAX_DISCS = 256
+# Folders whose files identify a disc that has no CRC64
+STRUCTURE_FOLDERS = ("VIDEO_TS", "video_ts", "BDMV", "BDMV/PLAYLIST", "BDMV/CLIPINF", "BDMV/STREAM")
+
+# Disc key of each job, keyed by job id
+_keys = {}
+
+
+def enabled():
+    """True if scans should be cached"""
+    return bool(cfg.arm_config.get("DISC_SCAN_CACHE", True))
+
+
+def cache_path():
+    """Folder the scans are cached in"""
+    return os.path.join(cfg.arm_config['LOGPATH'], "scan_cache")
+
+
+def disc_key(job):
+    """
+    Key of the job's disc, remembered once it has been worked out\n
+    :param job: Job instance
+    :return: str key, None if the disc can't be identified (e.g. not mounted)
+    """
+    if job.job_id in _keys:
+        return _keys[job.job_id]
+    key = None
+    if job.disctype == "dvd" and job.crc_id:
+        key = f"crc64-{job.crc_id}"
+    elif job.mountpoint and os.path.isdir(job.mountpoint):
+        key = _fingerprint(job.mountpoint, job.label)
+    if key is not None:
+        _keys[job.job_id] = key
+    return key
+
+
+def _fingerprint(mountpoint, label):
+    """Hash of the disc label and the names and sizes of its structure files, None if it has none"""
+    digest = hashlib.sha1(str(label).encode())
+    found = False
+    for folder in STRUCTURE_FOLDERS:
+        try:
+            with os.scandir(os.path.join(mountpoint, folder)) as entries:
+                files = sorted((entry.name, entry.stat().st_size) for entry in entries if entry.is_file())
+        except OSError:
+            continue
+        found = found or bool(files)
+        digest.update(f"{folder}:{files}".encode())
+    return f"disc-{digest.hexdigest()}" if found else None
+
+
+def _entry_path(key):
+    return os.path.join(cache_path(), f"{key}.json")
+
+
+def load(job, scanner):
+    """
+    Cached result of a scan of the job's disc\n
+    :param job: Job instance
+    :param str scanner: name of the scan, e.g. "handbrake"
+    :return: dict stored for the scan, None if it hasn't been cached
+    """
+    if not enabled() or (key := disc_key(job)) is None:
+        return None
+    path = _entry_path(key)
+    try:
+        with open(path, "r") as entry_file:
+            scan = json.load(entry_file).get(scanner)
+    except (OSError, ValueError):
+        return None
+    if scan is not None:
+        logging.info(f"Using the cached {scanner} scan of disc {key}")
+        # mark as recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+    return scan
+
+
+def store(job, scanner, **scan):
+    """
+    Cache the result of a scan of the job's disc\n
+    :param job: Job instance
+    :param str scanner: name of the scan
+    :param scan: values to cache, must be json serializable
+    """
+    if not enabled() or (key := disc_key(job)) is None:
+        return
+    path = _entry_path(key)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(cache_path(), exist_ok=True)
+        try:
+            with open(path, "r") as entry_file:
+                scans = json.load(entry_file)
+        except (OSError, ValueError):
+            scans = {}
+        scans[scanner] = scan
+        with open(tmp_path, "w") as entry_file:
+            json.dump(scans, entry_file)
+        os.replace(tmp_path, path)
+        _prune()
+    except OSError as error:
+        # A scan that isn't cached is only done again next time
+        logging.debug(f"Couldn't cache the {scanner} scan to {path}: {error}")
+
+
+def _prune():
+    """Remove the least recently used discs over MAX_DISCS"""
+    with os.scandir(cache_path()) as entries:
+        discs = sorted((entry.stat().st_mtime, entry.path) for entry in entries if entry.name.endswith(".json"))
+    for _, path in discs[:max(0, len(discs) - MAX_DISCS)]:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+def store_tracks(job, scanner, tracks):
+    """
+    Cache the titles a scan has registered for the job\n
+    :param job: Job instance
+    :param str scanner: name of the scan
+    :param tracks: the utils.TrackBatch the scan added its tracks to
+    """
+    if tracks.scanned:
+        store(job, scanner, no_of_titles=job.no_of_titles, tracks=tracks.scanned)
+
+
+def restore_tracks(job, scanner):
+    """
+    Register the titles of a cached scan for the job, instead of scanning the disc again\n
+    :param job: Job instance
+    :param str scanner: name of the scan
+    :return: True if the scan was cached and its titles have been added
+    """
+    scan = load(job, scanner)
+    if not scan or not scan.get("tracks"):
+        return False
+    utils.database_updater({"no_of_titles": scan["no_of_titles"]}, job)
+    with utils.TrackBatch(job) as tracks:
+        for track in scan["tracks"]:
+            tracks.add(*track)
+    return True
@@ -0,0 +1,208 @@
+"""
+Cross-process slot scheduler used to limit how many makemkvcon/HandBrake/FFmpeg runs happen at once
+
+Each limited resource (e.g. "transcode") gets a directory under LOGPATH/slots holding
+ - slot<N>.lock - one file per slot, a slot is held with an exclusive flock.
+   The kernel drops the lock if the process dies, so a crashed job can never leak a slot
+ - queue/ - one named pipe (ticket) per waiting job, named <time_ns>-<pid>-<job_id>.
+   Tickets are served in name (arrival) order, only the head of the queue may take a free slot.
+
+Waiters sleep on their own pipe and are woken as soon as a slot is released or the queue moves,
+instead of polling the process list.
+"""
+import errno
+import fcntl
+import logging
+import os
+import select
+import time
+from contextlib import contextmanager
+
+import arm.config.config as cfg
+
+# Longest a waiter sleeps without being woken, only matters if a slot holder was killed with SIGKILL
+WAKE_TIMEOUT = 30
+
+
+def slot_root():
+    """Directory holding the slot and queue files for every resource"""
+    return os.path.join(cfg.arm_config['LOGPATH'], "slots")
+
+
+class SlotScheduler:
+    """
+    FIFO scheduler for a fixed number of slots shared by every ARM process on this machine\n
+    :param str name: name of the limited resource e.g. "transcode"
+    :param int max_slots: number of slots, 0 or less disables the limit
+    :param str root: directory holding the slot files, defaults to LOGPATH/slots
+    """
+
+    def __init__(self, name, max_slots, root=None):
+        self.name = name
+        self.max_slots = int(max_slots)
+        self.path = os.path.join(root or slot_root(), name)
+        self.queue_path = os.path.join(self.path, "queue")
+
+    @contextmanager
+    def slot(self, job_id=None, on_queued=None):
+        """
+        Hold a slot for the duration of the with block\n
+        :param job_id: id of the job waiting, shown in the UI queue
+        :param on_queued: callable(position) run whenever this job's place in the queue changes
+        """
+        if self.max_slots <= 0:
+            yield
+            return
+        slot_fd = self.acquire(job_id, on_queued)
+        try:
+            yield
+        finally:
+            self.release(slot_fd)
+
+    def acquire(self, job_id=None, on_queued=None):
+        """
+        Wait in the queue until a slot is free and take it\n
+        :param job_id: id of the job waiting, shown in the UI queue
+        :param on_queued: callable(position) run whenever this job's place in the queue changes
+        :return: file descriptor holding the slot, pass to release()
+        """
+        os.makedirs(self.queue_path, exist_ok=True)
+        ticket = f"{time.time_ns():020d}-{os.getpid()}-{job_id or 0}"
+        ticket_path = os.path.join(self.queue_path, ticket)
+        os.mkfifo(ticket_path, 0o660)
+        # Opened read/write so the pipe always has a writer and select() only returns when woken
+        wake_fd = os.open(ticket_path, os.O_RDWR | os.O_NONBLOCK)
+        start = time.monotonic()
+        position = None
+        try:
+            while True:
+                tickets = self._tickets()
+                if ticket not in tickets:
+                    # Removed by a clean up in another process, get back in line
+                    os.mkfifo(ticket_path, 0o660)
+                    os.close(wake_fd)
+                    wake_fd = os.open(ticket_path, os.O_RDWR | os.O_NONBLOCK)
+                    continue
+                if tickets.index(ticket) != position:
+                    position = tickets.index(ticket)
+                    logging.info(f"Waiting for a {self.name} slot, position {position + 1} in queue")
+                    if on_queued:
+                        on_queued(position)
+                if position == 0 and (slot_fd := self._try_lock()) is not None:
+                    logging.info(f"Got {self.name} slot after {time.monotonic() - start:.1f}s")
+                    return slot_fd
+                select.select([wake_fd], [], [], WAKE_TIMEOUT)
+                _drain(wake_fd)
+        finally:
+            os.close(wake_fd)
+            _unlink(ticket_path)
+            # The queue moved, let the next job in line try for a slot
+            self._wake_all()
+
+    def release(self, slot_fd):
+        """
+        Give a slot back and wake the queue\n
+        :param slot_fd: file descriptor returned by acquire()
+        """
+        fcntl.flock(slot_fd, fcntl.LOCK_UN)
+        os.close(slot_fd)
+        logging.debug(f"Released {self.name} slot")
+        self._wake_all()
+
+    def try_acquire(self):
+        """
+        Take a free slot without queueing, only if no other job is waiting for one\n
+        :return: file descriptor holding the slot, pass to release(), None if there isn't one to take
+        """
+        if self._tickets():
+            return None
+        os.makedirs(self.path, exist_ok=True)
+        return self._try_lock()
+
+    def wait_for_free_slot(self, job_id=None, on_queued=None):
+        """
+        Wait (in turn) until a slot is free, without keeping it\n
+        :param job_id: id of the job waiting, shown in the UI queue
+        :param on_queued: callable(position) run whenever this job's place in the queue changes
+        """
+        if self.max_slots > 0:
+            self.release(self.acquire(job_id, on_queued))
+
+    def queue_positions(self):
+        """
+        :return: dict of {job_id: position} for every job waiting, position 0 is next in line
+        """
+        return {int(ticket.rsplit("-", 1)[1]): index for index, ticket in enumerate(self._tickets())}
+
+    def _try_lock(self):
+        """Try every slot once, return the fd of the one we locked or None if all are in use"""
+        for index in range(self.max_slots):
+            slot_fd = os.open(os.path.join(self.path, f"slot{index}.lock"), os.O_RDWR | os.O_CREAT, 0o660)
+            try:
+                fcntl.flock(slot_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return slot_fd
+            except BlockingIOError:
+                os.close(slot_fd)
+        return None
+
+    def _tickets(self):
+        """Sorted list of live tickets, tickets left behind by dead processes are removed"""
+        try:
+            names = sorted(os.listdir(self.queue_path))
+        except FileNotFoundError:
+            return []
+        tickets = []
+        for name in names:
+            try:
+                pid = int(name.split("-")[1])
+                os.kill(pid, 0)
+            except (IndexError, ValueError, ProcessLookupError):
+                _unlink(os.path.join(self.queue_path, name))
+                continue
+            except PermissionError:
+                # Process exists but belongs to another user
+                pass
+            tickets.append(name)
+        return tickets
+
+    def _wake_all(self):
+        """Write a byte to every waiting job's pipe"""
+        for ticket in self._tickets():
+            try:
+                wake_fd = os.open(os.path.join(self.queue_path, ticket), os.O_WRONLY | os.O_NONBLOCK)
+            except OSError:
+                # Gone or nobody listening (yet), they check the slots before sleeping
+                continue
+            try:
+                os.write(wake_fd, b".")
+            except OSError as error:
+                if error.errno != errno.EAGAIN:
+                    logging.debug(f"Couldn't wake {ticket}: {error}")
+            finally:
+                os.close(wake_fd)
+
+
+def transcode_slots():
+    """Scheduler shared by HandBrake and FFmpeg, limited by MAX_CONCURRENT_TRANSCODES"""
+    return SlotScheduler("transcode", cfg.arm_config["MAX_CONCURRENT_TRANSCODES"])
+
+
+def makemkvinfo_slots():
+    """Scheduler for makemkvcon info calls, limited by MAX_CONCURRENT_MAKEMKVINFO"""
+    return SlotScheduler("makemkvinfo", cfg.arm_config["MAX_CONCURRENT_MAKEMKVINFO"])
+
+
+def _drain(fd):
+    """Empty a non-blocking pipe"""
+    try:
+        while os.read(fd, 512):
+            pass
+    except BlockingIOError:
+        pass
+
+
+def _unlink(path):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
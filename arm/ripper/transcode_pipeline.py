@@ -0,0 +1,161 @@
+"""
+Transcode titles while MakeMKV is still ripping the rest of the disc
+
+When MakeMKV rips one title at a time, each finished title is handed to a transcoder thread
+straight away instead of waiting for the whole disc. The drive keeps reading the next title
+while HandBrake/FFmpeg encodes the last one, so a job takes about as long as the slower of
+the two rather than both added together.
+
+The transcoder holds one transcode slot for as long as titles keep coming, the same as
+handbrake_mkv/ffmpeg_mkv do for a whole disc. The job status stays with the ripping thread
+(ripping) until MakeMKV is done, finish() then shows the transcoder's state.
+"""
+import logging
+import queue
+import threading
+
+import arm.config.config as cfg
+from arm.models.job import Job, JobState
+from arm.ripper import ffmpeg, handbrake, utils
+from arm.ui import app, db
+
+# Queued after the last title, tells the transcoder to finish
+_DONE = None
+
+
+def wanted(job, use_make_mkv):
+    """
+    Whether titles of this job should be transcoded as they are ripped\n
+    :param job: Job instance
+    :param bool use_make_mkv: the job is ripped with MakeMKV
+    :return: True if the ripped mkv files are transcoded (start_transcode would use handbrake_mkv/ffmpeg_mkv)
+    """
+    return bool(cfg.arm_config.get("RIP_TRANSCODE_PIPELINE", False) and use_make_mkv
+                and job.config.RIPMETHOD == "mkv" and not job.config.SKIP_TRANSCODE)
+
+
+class TranscodePipeline:
+    """
+    Transcodes ripped files in a thread, in the order they are ripped\n
+    Pass ripped() as makemkv's on_ripped and call finish() once MakeMKV is done.
+    """
+
+    def __init__(self, job, logfile, transcode_out_path):
+        """
+        :param job: Job instance
+        :param logfile: job log, HandBrake output is appended to it
+        :param transcode_out_path: where the transcoded files are saved
+        """
+        # the ripping thread's Job, only used from that thread
+        self.job = job
+        self.job_id = job.job_id
+        self.use_ffmpeg = bool(job.config.USE_FFMPEG)
+        self.logfile = logfile
+        self.transcode_out_path = transcode_out_path
+        self.files = queue.Queue()
+        self.thread = None
+        self.error = None
+        self.done = False
+        # set by abort(), the titles still queued aren't transcoded
+        self.stopped = threading.Event()
+        # set once the transcoder holds its transcode slot
+        self.slot_held = threading.Event()
+
+    @property
+    def started(self):
+        """True once a title has been handed over"""
+        return self.thread is not None
+
+    def ripped(self, paths):
+        """
+        Queue the files of a ripped title, starting the transcoder with the first one\n
+        :param list paths: files MakeMKV wrote for the title
+        """
+        if not paths:
+            return
+        if self.thread is None:
+            logging.info("************* Transcoding titles as they are ripped *************")
+            self.thread = threading.Thread(target=self._run, name=f"transcode-{self.job_id}", daemon=True)
+            self.thread.start()
+        for path in paths:
+            self.files.put(path)
+
+    def finish(self):
+        """
+        Wait for the queued titles to be transcoded, called once MakeMKV is done\n
+        :raises: the error the transcoder stopped on
+        """
+        if self.thread is None:
+            return
+        self.files.put(_DONE)
+        # MakeMKV is done, the job status now shows the transcoder waiting for its slot or transcoding
+        if not self.slot_held.is_set():
+            utils.database_updater({"status": JobState.TRANSCODE_WAITING.value}, self.job)
+            while not self.slot_held.wait(1) and self.thread.is_alive():
+                pass
+        if self.slot_held.is_set():
+            utils.database_updater({"status": JobState.TRANSCODE_ACTIVE.value}, self.job)
+        self._join()
+        if self.error is not None:
+            raise self.error
+        utils.database_updater({"status": JobState.IDLE.value}, self.job)
+
+    def abort(self):
+        """
+        Stop the transcoder after the title it is transcoding, when ripping failed\n
+        The titles still queued aren't transcoded, errors of the transcoder are only logged.
+        """
+        if self.thread is None:
+            return
+        self.stopped.set()
+        self.files.put(_DONE)
+        self._join()
+
+    def _join(self):
+        self.thread.join()
+        # Tracks were updated by the transcoder's session
+        db.session.expire_all()
+
+    def _run(self):
+        """Transcoder thread, with its own app context and database session"""
+        with app.app_context():
+            try:
+                job = db.session.get(Job, self.job_id)
+                # the ripping thread owns the job status while MakeMKV runs
+                if self.use_ffmpeg:
+                    with ffmpeg.ffmpeg_sleep_check(job, set_status=False):
+                        self.slot_held.set()
+                        self._transcode(lambda path: ffmpeg.ffmpeg_mkv_file(path, self.transcode_out_path, job))
+                else:
+                    with handbrake.handbrake_sleep_check(job, set_status=False):
+                        self.slot_held.set()
+                        hb_args, hb_preset = handbrake.correct_hb_settings(job)
+                        self._transcode(lambda path: handbrake.handbrake_mkv_file(
+                            path, self.transcode_out_path, self.logfile, job, hb_args, hb_preset))
+            except Exception as error:  # noqa: E722
+                logging.error(f"Transcoding ripped titles failed: {error}")
+                self.error = error
+                # Keep taking files until the last one so finish() returns, they aren't transcoded
+                while not self.done:
+                    self._next()
+            finally:
+                db.session.remove()
+
+    def _next(self):
+        """Wait for the next ripped file, None after the last one"""
+        path = self.files.get()
+        self.done = path is _DONE
+        return path
+
+    def _transcode(self, transcode_file):
+        """Transcode files as they are queued until the last one, or until abort()"""
+        skipped = 0
+        while (path := self._next()) is not _DONE:
+            if self.stopped.is_set():
+                skipped += 1
+                continue
+            logging.info(f"Transcoding ripped title {path}")
+            transcode_file(path)
+        if skipped:
+            logging.info(f"Ripping failed, {skipped} ripped titles weren't transcoded")
+        logging.info("************* Finished transcoding ripped titles *************")
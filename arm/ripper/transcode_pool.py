@@ -0,0 +1,117 @@
+"""
+Transcode several titles of one job at once
+
+handbrake_all/handbrake_mkv/ffmpeg_all/ffmpeg_mkv hand their titles to run(), which encodes
+up to TRANSCODE_WORKERS_PER_JOB of them at the same time. The job's own transcode slot covers
+the first encoder, every extra encoder takes another slot of MAX_CONCURRENT_TRANSCODES, and
+only if one is free with no other job waiting for it, so a job never holds up the queue.
+
+Extra encoders run in threads with their own app context and database session, the titles
+are passed by id and loaded again in the thread. Their slots are taken before any encoder
+starts, so every title is told how many encoders are actually running (e.g. to give each
+its own log), which can be fewer than workers() when the slots are busy.
+"""
+import logging
+import os
+import queue
+import threading
+
+import arm.config.config as cfg
+from arm.models.job import Job
+from arm.ripper import slots
+from arm.ui import app, db
+
+
+def workers(job, srcpath=None):
+    """
+    Number of titles of the job to encode at once\n
+    :param job: Job instance
+    :param srcpath: what is being transcoded, the optical drive is never read by more than one encoder
+    :return: int, at least 1
+    """
+    if srcpath is not None and srcpath in (job.devpath, job.mountpoint):
+        return 1
+    count = max(1, int(cfg.arm_config.get("TRANSCODE_WORKERS_PER_JOB", 1)))
+    max_slots = int(cfg.arm_config["MAX_CONCURRENT_TRANSCODES"])
+    return min(count, max_slots) if max_slots > 0 else count
+
+
+def title_logfile(logfile, name):
+    """
+    Log file for one title when titles are encoded at once, so their output isn't mixed up\n
+    :param logfile: path to the job log
+    :param str name: name of the title, e.g. "title_3"
+    :return: path to the title's log, next to the job log
+    """
+    base, ext = os.path.splitext(logfile)
+    return f"{base}_{name}{ext or '.log'}"
+
+
+def run(job, items, transcode, srcpath=None):
+    """
+    Encode items using up to workers() encoders, the caller holds the job's transcode slot\n
+    No new items are started after one fails, the first error is raised once the running ones end.\n
+    :param job: Job instance of the calling thread
+    :param list items: titles to encode, must be usable in another thread (ids, paths)
+    :param transcode: callable(job, item, encoders), job is the Job instance of the thread running it,
+                      encoders the number of titles being encoded at once
+    :param srcpath: what is being transcoded, see workers()
+    """
+    pending = queue.SimpleQueue()
+    for item in items:
+        pending.put(item)
+    errors = []
+    scheduler = slots.transcode_slots()
+    slot_fds = []
+    for _ in range(min(workers(job, srcpath), len(items)) - 1):
+        slot_fd = None
+        if scheduler.max_slots > 0:
+            slot_fd = scheduler.try_acquire()
+            if slot_fd is None:
+                break
+        slot_fds.append(slot_fd)
+    encoders = len(slot_fds) + 1
+    threads = [threading.Thread(target=_extra_encoder, args=(job.job_id, pending, transcode, errors, encoders,
+                                                             scheduler, slot_fd),
+                                name=f"transcode-{job.job_id}-{index}")
+               for index, slot_fd in enumerate(slot_fds)]
+    for thread in threads:
+        thread.start()
+    if threads:
+        logging.info(f"Encoding {len(items)} titles, {encoders} at a time")
+    _encode(job, pending, transcode, errors, encoders)
+    for thread in threads:
+        thread.join()
+    if threads:
+        # Tracks were updated by the other encoders' sessions
+        db.session.expire_all()
+    if errors:
+        raise errors[0]
+
+
+def _encode(job, pending, transcode, errors, encoders):
+    """Encode items until there are none left or one has failed"""
+    while not errors:
+        try:
+            item = pending.get_nowait()
+        except queue.Empty:
+            return
+        try:
+            transcode(job, item, encoders)
+        except Exception as error:  # noqa: E722
+            errors.append(error)
+
+
+def _extra_encoder(job_id, pending, transcode, errors, encoders, scheduler, slot_fd):
+    """Thread running one more encoder, gives its transcode slot back when done"""
+    try:
+        with app.app_context():
+            try:
+                _encode(db.session.get(Job, job_id), pending, transcode, errors, encoders)
+            finally:
+                db.session.remove()
+    except Exception as error:  # noqa: E722
+        errors.append(error)
+    finally:
+        if slot_fd is not None:
+            scheduler.release(slot_fd)
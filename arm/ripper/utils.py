@@ -6,7 +6,6 @@ import logging
 import subprocess
 import shutil
 import time
-import random
 import re
 from logging import Logger
 from pathlib import Path, PurePath
@@ -14,20 +13,18 @@ from math import ceil
 
 import bcrypt
 import requests
-import apprise
 import psutil
 
 from netifaces import interfaces, ifaddresses, AF_INET
 
 import arm.config.config as cfg
-from arm.ripper.ProcessHandler import arm_subprocess
 from arm.ui import db  # needs to be imported before models
 from arm.models.job import Job, JobState
 from arm.models.notifications import Notifications
 from arm.models.track import Track
 from arm.models.user import User
 from arm.models.system_drives import SystemDrives
-from arm.ripper import apprise_bulk
+from arm.ripper import db_writer, disc_imager, finalizer, notifier, permissions, progress
 
 NOTIFY_TITLE = "ARM notification"
 
@@ -58,37 +55,8 @@ def notify(job, title: str, body: str):
     notification = Notifications(title, body)
     database_adder(notification)
 
-    bash_notify(cfg.arm_config, title, body)
-
-    # Sent to remote sites
-    # Create an Apprise instance
-    apobj = apprise.Apprise()
-    if cfg.arm_config["PB_KEY"] != "":
-        apobj.add('pbul://' + str(cfg.arm_config["PB_KEY"]))
-    if cfg.arm_config["IFTTT_KEY"] != "":
-        apobj.add('ifttt://' + str(cfg.arm_config["IFTTT_KEY"]) + "@" + str(cfg.arm_config["IFTTT_EVENT"]))
-    if cfg.arm_config["PO_USER_KEY"] != "":
-        apobj.add('pover://' + str(cfg.arm_config["PO_USER_KEY"]) + "@" + str(cfg.arm_config["PO_APP_KEY"]))
-    if cfg.arm_config["JSON_URL"] != "":
-        apobj.add(str(cfg.arm_config["JSON_URL"]).replace("http://", "json://").replace("https://", "jsons://"))
-    try:
-        apobj.notify(body, title=title)
-    except Exception as error:  # noqa: E722
-        logging.error(f"Failed sending notifications. error:{error}. Continuing processing...")
-
-    # Bulk send notifications, using the config set on the ripper config page
-    if cfg.arm_config["APPRISE"] != "":
-        try:
-            apprise_bulk.apprise_notify(cfg.arm_config["APPRISE"], title, body)
-            logging.debug(f"apprise-config: {cfg.arm_config['APPRISE']}")
-        except Exception as error:  # noqa: E722
-            logging.error(f"Failed sending apprise notifications. {error}")
-
-
-def bash_notify(cfg, title, body):
-    # bash notifications use subprocess instead of apprise.
-    if cfg['BASH_SCRIPT'] != "":
-        arm_subprocess(["/usr/bin/env", "bash", cfg['BASH_SCRIPT'], title, body])
+    # The bash script and remote sites are sent to in the background, ripping doesn't wait for them
+    notifier.send(title, body)
 
 
 def notify_entry(job):
@@ -119,39 +87,6 @@ def notify_entry(job):
         raise RipperException("Could not determine disc type")
 
 
-def sleep_check_process(process_str, max_processes, sleep=(20, 120, 10)):
-    """
-    New function to check for max_transcode from job.config and force obey limits\n
-    :param str process_str: The process string from arm.yaml
-    :param int max_processes: The user defined limit for maximum transcodes
-    :param (tuple, int) sleep: tuple: (min sleep time, max sleep time, step) or sleep time as int.
-    :return bool: when we have space in the transcode queue
-    """
-    if max_processes <= 0:
-        return False  # sleep limit disabled
-    if isinstance(sleep, int):
-        sleep = (sleep, sleep + 1, 1)
-    if not isinstance(sleep, tuple):
-        raise TypeError(sleep)
-    loop_count = max_processes + 1
-    logging.info(f"Starting sleep check of {process_str}")
-    while loop_count >= max_processes:
-        # The process might disappear during loops, so we need to query the
-        # name upfront.
-        loop_count = sum(
-            1 for proc in psutil.process_iter(['name'])
-            if proc.info.get('name') == process_str
-        )
-        if max_processes > loop_count:
-            break
-        # Try to make each check at different times
-        random_time = random.randrange(*sleep)
-        logging.debug(f"{loop_count} processes running. Sleeping for {random_time}s.")
-        time.sleep(random_time)
-    logging.info(f"Exiting sleep check of {process_str}")
-    return True
-
-
 def convert_job_type(video_type):
     """
     Converts the job_type to the correct sub-folder
@@ -315,6 +250,7 @@ def find_matching_file(expected_file):
 def move_files_main(old_file, new_file, base_path):
     """
     The base function for moving files with logging\n
+    Moved by the finalizer, queued if a finalizer.Batch is open
     :param str old_file: The file to be moved - must include full path
     :param str new_file: Final destination of file - must include full path
     :param str base_path: The base path of the new file - used for logging
@@ -325,7 +261,10 @@ def move_files_main(old_file, new_file, base_path):
         actual_old_file = find_matching_file(old_file)
 
         try:
-            shutil.move(actual_old_file, new_file)
+            finalizer.move(actual_old_file, new_file)
+        except FileExistsError:
+            # queued to be moved there by an earlier call, or written since the check
+            logging.info(f"File: {new_file} already exists.  Not moving.")
         except Exception as error:
             logging.error(f"Unable to move '{actual_old_file}' to '{base_path}' - Error: {error}")
     else:
@@ -409,19 +348,6 @@ def make_dir(path: str, exist_ok: bool = True) -> bool:
         raise RipperException(f"Could not create folder: {path}") from err
 
 
-def find_file(filename, search_path):
-    """
-    Check to see if file exists by searching a directory recursively\n
-    :param filename: filename to look for
-    :param search_path: path to search recursively
-    :return bool:
-    """
-    for dirpath, dirnames, filenames in os.walk(search_path):
-        if filename in filenames:
-            return True
-    return False
-
-
 def find_largest_file(files, mkv_out_path):
     """
     Step through given dir and return the largest file name\n
@@ -479,7 +405,8 @@ def rip_music(job, logfile):
 
 def rip_data(job):
     """
-    Rip data disc using dd on the command line\n
+    Rip data disc to an ISO with disc_imager\n
+    The ISO is written straight into COMPLETED_PATH, or to RAW_PATH and moved when that can't be written to.
     :param job: Current job
     :return: True/False for success/fail
     """
@@ -487,71 +414,80 @@ def rip_data(job):
     if job.label == "" or job.label is None:
         job.label = "data-disc"
     # get filesystem in order
-    raw_path = os.path.join(job.config.RAW_PATH, str(job.label))
-    final_path = os.path.join(job.config.COMPLETED_PATH, convert_job_type(job.video_type))
+    type_path = os.path.join(job.config.COMPLETED_PATH, convert_job_type(job.video_type))
     final_file_name = str(job.label)
-
-    if (make_dir(raw_path)) is False:
-        random_time = str(round(time.time() * 100))
-        raw_path = os.path.join(job.config.RAW_PATH, str(job.label) + "_" + random_time)
-        final_file_name = f"{job.label}_{random_time}"
-        make_dir(raw_path, False)
-
-    final_path = os.path.join(final_path, final_file_name)
-    incomplete_filename = os.path.join(raw_path, str(job.label) + ".part")
-    make_dir(final_path)
+    if os.path.exists(os.path.join(type_path, final_file_name, f"{job.label}.iso")):
+        final_file_name = f"{job.label}_{round(time.time() * 100)}"
+    final_path = os.path.join(type_path, final_file_name)
+    full_final_file = os.path.join(final_path, f"{job.label}.iso")
+    raw_path = None
+    try:
+        make_dir(final_path)
+        image_dir = final_path
+    except RipperException as error:
+        logging.info(f"Can't write to {final_path} ({error}), ripping to RAW_PATH")
+        raw_path = os.path.join(job.config.RAW_PATH, final_file_name)
+        make_dir(raw_path)
+        image_dir = raw_path
+    incomplete_filename = os.path.join(image_dir, str(job.label) + ".part")
     logging.info(f"Ripping data disc to: {incomplete_filename}")
-    # Added from pull 366
-    cmd = f'dd if="{job.devpath}" of="{incomplete_filename}" {cfg.arm_config["DATA_RIP_PARAMETERS"]} 2>> ' \
-          f'{os.path.join(job.config.LOGPATH, job.logfile)}'
-    logging.debug(f"Sending command: {cmd}")
     try:
-        subprocess.check_output(cmd, shell=True).decode("utf-8")
-        full_final_file = os.path.join(final_path, f"{str(job.label)}.iso")
-        logging.info(f"Moving data-disc from '{incomplete_filename}' to '{full_final_file}'")
-        move_files_main(incomplete_filename, full_final_file, final_path)
+        result = disc_imager.image_disc(job.devpath, incomplete_filename, job.job_id, skip_bad_data_sectors())
+        logging.info(f"Data disc imaged, {result.size} bytes, sha256 {result.sha256}")
+        if raw_path is None:
+            os.replace(incomplete_filename, full_final_file)
+        else:
+            logging.info(f"Moving data-disc from '{incomplete_filename}' to '{full_final_file}'")
+            move_files_main(incomplete_filename, full_final_file, final_path)
+        disc_imager.write_checksum(full_final_file, result)
         logging.info("Data rip call successful")
         success = True
-    except subprocess.CalledProcessError as dd_error:
-        err = f"Data rip failed with code: {dd_error.returncode}({dd_error.output})"
+    except OSError as error:
+        err = f"Data rip failed: {error}"
         logging.error(err)
-        os.unlink(incomplete_filename)
+        if os.path.isfile(incomplete_filename):
+            os.unlink(incomplete_filename)
         args = {"status": JobState.FAILURE.value, "errors": err}
         database_updater(args, job)
-    try:
-        logging.info(f"Trying to remove raw_path: '{raw_path}'")
-        shutil.rmtree(raw_path)
-    except OSError as error:
-        logging.error(f"Error: {error.filename} - {error.strerror}.")
+    if raw_path is not None:
+        try:
+            logging.info(f"Trying to remove raw_path: '{raw_path}'")
+            shutil.rmtree(raw_path)
+        except OSError as error:
+            logging.error(f"Error: {error.filename} - {error.strerror}.")
     return success
 
 
-def set_permissions(directory_to_traverse):
+def skip_bad_data_sectors():
     """
+    Whether data discs are imaged past sectors that can't be read\n
+    DATA_RIP_PARAMETERS with "noerror" (the old dd option) still turns it on.
+    :return: bool
+    """
+    return bool(cfg.arm_config.get("DATA_RIP_SKIP_BAD_SECTORS", False)) \
+        or "noerror" in str(cfg.arm_config.get("DATA_RIP_PARAMETERS", ""))
+
 
+def set_permissions(directory_to_traverse, only=None):
+    """
+    Set CHMOD_VALUE on a folder and the files in it, if SET_MEDIA_PERMISSIONS\n
     :param directory_to_traverse: directory to fix permissions
+    :param only: files in it to fix (with the folders leading to them), None for all of them
     :return: False if fails
     """
     if not cfg.arm_config['SET_MEDIA_PERMISSIONS']:
         return False
     try:
         corrected_chmod_value = int(str(cfg.arm_config["CHMOD_VALUE"]), 8)
-        logging.info(f"Setting permissions to: {cfg.arm_config['CHMOD_VALUE']} on: {directory_to_traverse}")
-        os.chmod(directory_to_traverse, corrected_chmod_value)
-
-        for dirpath, l_directories, l_files in os.walk(directory_to_traverse):
-            for cur_dir in l_directories:
-                logging.debug(f"Setting path: {cur_dir} to permissions value: {cfg.arm_config['CHMOD_VALUE']}")
-                os.chmod(os.path.join(dirpath, cur_dir), corrected_chmod_value)
-
-            for cur_file in l_files:
-                logging.debug(f"Setting file: {cur_file} to permissions value: {cfg.arm_config['CHMOD_VALUE']}")
-                os.chmod(os.path.join(dirpath, cur_file), corrected_chmod_value)
-
-        logging.info("Permissions set successfully: True")
-    except Exception as error:
+    except ValueError as error:
         logging.error(f"Permissions setting failed as: {error}")
-    return True
+        return False
+    logging.info(f"Setting permissions to: {cfg.arm_config['CHMOD_VALUE']} on: {directory_to_traverse}")
+    counts = permissions.fix_tree(directory_to_traverse, corrected_chmod_value, only=only)
+    if counts.failed:
+        logging.error(f"Permissions setting failed for {counts.failed} files, first as: {counts.error}")
+    logging.info(f"Permissions set: {counts}")
+    return not counts.failed
 
 
 def try_add_default_user():
@@ -577,10 +513,10 @@ def try_add_default_user():
         logging.error(error)
 
 
-def put_track(job, t_no, seconds, aspect, fps, mainfeature, source, filename="",
-              chapters=0, filesize=0):
+def make_track(job, t_no, seconds, aspect, fps, mainfeature, source, filename="",
+               chapters=0, filesize=0):
     """
-    Put data into a track instance.\n
+    Build a track instance without adding it to the database.\n
     Having this here saves importing the models file everywhere\n
 
     :param job: instance of job class
@@ -593,6 +529,7 @@ def put_track(job, t_no, seconds, aspect, fps, mainfeature, source, filename="",
     :param str filename: filename of track
     :param int chapters: number of chapters in track
     :param int filesize: size of track in bytes
+    :return: Track
     """
 
     logging.debug(
@@ -614,7 +551,54 @@ def put_track(job, t_no, seconds, aspect, fps, mainfeature, source, filename="",
         filesize=filesize
     )
     job_track.ripped = (seconds > int(job.config.MINLENGTH))
-    database_adder(job_track)
+    return job_track
+
+
+def put_track(job, t_no, seconds, aspect, fps, mainfeature, source, filename="",
+              chapters=0, filesize=0):
+    """
+    Put data into a track instance and add it to the database.\n
+    For more than one track use TrackBatch, see make_track() for the parameters
+    """
+    database_adder(make_track(job, t_no, seconds, aspect, fps, mainfeature, source, filename,
+                              chapters, filesize))
+
+
+class TrackBatch:
+    """
+    Collects the tracks found by a disc scan and adds them to the database in one transaction\n
+    Use as a context manager, the tracks are written when the with block exits.
+    While scanning, the number of tracks found is published to the job progress file for the UI.
+    """
+
+    def __init__(self, job):
+        self.job = job
+        self.tracks = []
+        # arguments of every track added, so the scan can be cached (scan_cache)
+        self.scanned = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.commit()
+        return False
+
+    def add(self, t_no, seconds, aspect, fps, mainfeature, source, filename="",
+            chapters=0, filesize=0):
+        """Queue a track, see make_track() for the parameters"""
+        self.scanned.append([t_no, seconds, aspect, fps, mainfeature, source, filename, chapters, filesize])
+        self.tracks.append(make_track(self.job, t_no, seconds, aspect, fps, mainfeature, source, filename,
+                                      chapters, filesize))
+        progress.publish(self.job.job_id, tracks_found=len(self.tracks))
+
+    def commit(self):
+        """Add every queued track to the database"""
+        if not self.tracks:
+            return
+        tracks, self.tracks = self.tracks, []
+        db_writer.commit(lambda: db.session.add_all(tracks))
+        logging.debug(f"successfully written {len(tracks)} tracks to the database")
 
 
 def arm_setup(arm_log: Logger) -> None:
@@ -650,29 +634,17 @@ def database_updater(args, job, wait_time=90):
     you want to change and the value being
     the new value.
     :param job: This is the job object
-    :param int wait_time: Number of times to try(1 sec sleep between try)
+    :param int wait_time: Seconds to keep retrying while the database is locked
     :return: Success
     """
     if not isinstance(args, dict):
         db.session.rollback()
         return False
-    # Loop through our args and try to set any of our job variables
     for (key, value) in args.items():
-        setattr(job, key, value)
         logging.debug(f"ID:{job.job_id} {key}={value}:{type(value)}")
-
-    for i in range(wait_time):  # give up after the users wait period in seconds
-        try:
-            db.session.commit()
-        except Exception as error:
-            if "locked" in str(error):
-                time.sleep(1)
-                logging.debug(f"database is locked - try {i}/{wait_time}")
-            else:
-                logging.debug(f"Error: {error}")
-                raise RuntimeError(str(error)) from error
-    logging.debug("successfully written to the database")
-    return True
+    if success := db_writer.update(job, args, max_wait=wait_time):
+        logging.debug("successfully written to the database")
+    return success
 
 
 def database_adder(obj_class):
@@ -682,21 +654,10 @@ def database_adder(obj_class):
     :param obj_class: Job/Config/Track/ etc
     :return: True if success
     """
-    for i in range(90):  # give up after the users wait period in seconds
-        try:
-            logging.debug(f"Trying to add {type(obj_class).__name__}")
-            db.session.add(obj_class)
-            db.session.commit()
-            break
-        except Exception as error:
-            if "locked" in str(error):
-                time.sleep(1)
-                logging.debug(f"database is locked - try {i}/90")
-            else:
-                logging.error(f"Error: {error}")
-                raise RuntimeError(str(error)) from error
-    logging.debug(f"successfully written {type(obj_class).__name__} to the database")
-    return True
+    logging.debug(f"Trying to add {type(obj_class).__name__}")
+    if success := db_writer.add(obj_class):
+        logging.debug(f"successfully written {type(obj_class).__name__} to the database")
+    return success
 
 
 def clean_old_jobs():
@@ -704,7 +665,7 @@ def clean_old_jobs():
     Check for running jobs - Update failed jobs that are no longer running\n
     :return: None
     """
-    active_jobs = db.session.query(Job).filter(Job.status.notin_(['fail', 'success'])).all()
+    active_jobs = db.session.query(Job).filter(Job.unfinished).all()
     # Clean up abandoned jobs
     for job in active_jobs:
         if psutil.pid_exists(job.pid):
@@ -766,7 +727,7 @@ def duplicate_run_check(dev_path):
     running_jobs = (
         db.session.query(Job)
         .filter(
-            ~Job.finished,
+            Job.unfinished,
             Job.devpath == dev_path,
         )
         .all()
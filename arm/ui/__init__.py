@@ -14,6 +14,7 @@ from arm.ripper.logger import short_format
 from flask_login import LoginManager
 import bcrypt  # noqa: F401
 import arm.config.config as cfg
+from arm.ui import db_engine
 
 sqlitefile = 'sqlite:///' + cfg.arm_config['DBFILE']
 
@@ -50,6 +51,8 @@ login_manager.init_app(app)
 # Set Flask database connection configurations
 app.config['SQLALCHEMY_DATABASE_URI'] = sqlitefile
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# WAL, busy timeout and pool sizing shared by the UI and the ripper processes
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = db_engine.engine_options()
 # We should really generate a key for each system
 app.config['SECRET_KEY'] = "Big secret key"  # TODO: make this random!
 # Set the global Flask Login state, set to True will ignore any @login_required
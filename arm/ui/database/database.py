@@ -13,7 +13,8 @@ from flask_login import LoginManager, login_required  # noqa: F401
 from flask import render_template, request, Blueprint, flash, redirect, session
 
 import arm.ui.utils as ui_utils
-from arm.ui import app, db, constants
+from arm.ui import app, db, constants, pagination
+from arm.models.config import Config
 from arm.models.job import Job
 import arm.config.config as cfg
 from arm.ui.metadata import get_omdb_poster
@@ -24,6 +25,11 @@ route_database = Blueprint('route_database', __name__,
                            template_folder='templates',
                            static_folder='../static')
 
+# Columns databaseview.html shows
+DATABASE_COLUMNS = (Job.job_id, Job.title, Job.title_manual, Job.year, Job.year_auto, Job.poster_url,
+                    Job.video_type, Job.devpath, Job.status, Job.start_time, Job.job_length, Job.logfile)
+DATABASE_CONFIG_COLUMNS = (Config.RIPMETHOD, Config.MAINFEATURE, Config.MINLENGTH, Config.MAXLENGTH)
+
 # This attaches the armui_cfg globally to let the users use any bootswatch skin from cdn
 armui_cfg = ui_utils.arm_db_cfg()
 
@@ -34,24 +40,25 @@ def view_database():
     """
     The main database page
 
-    Outputs every job from the database
-     this can cause serious slow-downs with + 3/4000 entries
+    Outputs every job from the database, a page at a time
+     pages are found by job_id (before/after) so they load as fast with 50000 jobs as with 50
     """
     # regenerate the armui_cfg we don't want old settings
     armui_cfg = ui_utils.arm_db_cfg()
-
-    page = request.args.get('page', 1, type=int)
     app.logger.debug(armui_cfg)
 
     # Check for database file
     if os.path.isfile(cfg.arm_config['DBFILE']):
-        jobs = Job.query.order_by(db.desc(Job.job_id)).paginate(page=page,
-                                                                max_per_page=int(
-                                                                    armui_cfg.database_limit),
-                                                                error_out=False)
+        # Load only what databaseview.html shows, with the configs of the page in one query
+        query = Job.query.options(db.load_only(*DATABASE_COLUMNS),
+                                  db.selectinload(Job.config).load_only(*DATABASE_CONFIG_COLUMNS))
+        jobs = pagination.job_page(query, int(armui_cfg.database_limit),
+                                   before=request.args.get('before', type=int),
+                                   after=request.args.get('after', type=int),
+                                   oldest=request.args.get('oldest', 0, type=int) == 1)
     else:
         app.logger.error('ERROR: /database no database, file doesnt exist')
-        jobs = {}
+        jobs = pagination.empty_page()
 
     session["page_title"] = "Database"
 
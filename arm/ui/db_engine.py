@@ -0,0 +1,66 @@
+"""
+SQLite engine settings for the shared ARM database
+
+The UI (many reader threads) and every ripper process (a few writers) share one database file.
+Every new connection is set up so readers never block writers (WAL) and a busy database
+is waited on inside SQLite instead of failing straight away with "database is locked".
+"""
+import sqlite3
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+import arm.config.config as cfg
+
+# How long SQLite waits for a lock before giving up (milliseconds)
+BUSY_TIMEOUT = 30000
+# Size of the memory map used for reads (bytes)
+MMAP_SIZE = 256 * 1024 * 1024
+# Pool sized for the UI's waitress threads, connections beyond pool_size are opened on demand
+POOL_SIZE = 10
+MAX_OVERFLOW = 40
+
+
+def engine_options():
+    """
+    Options for Flask-SQLAlchemy's SQLALCHEMY_ENGINE_OPTIONS
+    :return: dict
+    """
+    return {
+        "connect_args": {
+            # Seconds, the same wait as busy_timeout for the python sqlite3 driver
+            "timeout": BUSY_TIMEOUT / 1000,
+            # Connections are handed between waitress threads by the pool
+            "check_same_thread": False,
+        },
+        "pool_size": POOL_SIZE,
+        "max_overflow": MAX_OVERFLOW,
+    }
+
+
+def sqlite_pragmas():
+    """
+    PRAGMA statements run on every new connection
+    synchronous=NORMAL is only safe with WAL, so it follows the journal mode
+    :return: list of (pragma, value)
+    """
+    if cfg.arm_config.get("SQLITE_WAL", True):
+        journal = [("journal_mode", "WAL"), ("synchronous", "NORMAL")]
+    else:
+        journal = [("journal_mode", "DELETE"), ("synchronous", "FULL")]
+    return journal + [
+        ("busy_timeout", BUSY_TIMEOUT),
+        ("mmap_size", MMAP_SIZE),
+        ("temp_store", "MEMORY"),
+    ]
+
+
+@event.listens_for(Engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Apply the ARM pragmas to every new SQLite connection, including alembic's"""
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    for pragma, value in sqlite_pragmas():
+        cursor.execute(f"PRAGMA {pragma}={value}")
+    cursor.close()
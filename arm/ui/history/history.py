@@ -9,7 +9,7 @@ from flask_login import LoginManager, login_required  # noqa: F401
 from flask import render_template, request, Blueprint, session
 
 import arm.ui.utils as ui_utils
-from arm.ui import app, db
+from arm.ui import app, db, pagination
 from arm.models.job import Job
 import arm.config.config as cfg
 
@@ -17,6 +17,9 @@ route_history = Blueprint('route_history', __name__,
                           template_folder='templates',
                           static_folder='../static')
 
+# Columns history.html shows
+HISTORY_COLUMNS = (Job.job_id, Job.title, Job.start_time, Job.job_length, Job.status, Job.logfile)
+
 # This attaches the armui_cfg globally to let the users use any bootswatch skin from cdn
 armui_cfg = ui_utils.arm_db_cfg()
 
@@ -30,17 +33,16 @@ def history():
     """
     # regenerate the armui_cfg we don't want old settings
     armui_cfg = ui_utils.arm_db_cfg()
-    page = request.args.get('page', 1, type=int)
     if os.path.isfile(cfg.arm_config['DBFILE']):
         # after roughly 175 entries firefox readermode will break
         # jobs = Job.query.filter_by().limit(175).all()
-        jobs = Job.query.order_by(db.desc(Job.job_id)).paginate(page=page,
-                                                                max_per_page=int(
-                                                                    armui_cfg.database_limit),
-                                                                error_out=False)
+        jobs = pagination.job_page(Job.query.options(db.load_only(*HISTORY_COLUMNS)), int(armui_cfg.database_limit),
+                                   before=request.args.get('before', type=int),
+                                   after=request.args.get('after', type=int),
+                                   oldest=request.args.get('oldest', 0, type=int) == 1)
     else:
         app.logger.error('ERROR: /history database file doesnt exist')
-        jobs = {}
+        jobs = pagination.empty_page()
     app.logger.debug(f"Date format - {cfg.arm_config['DATE_FORMAT']}")
 
     session["page_title"] = "History"
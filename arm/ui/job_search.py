@@ -0,0 +1,114 @@
+"""
+Job search for the /database page
+
+Jobs are searched in job_search, the FTS5 index of the job titles, labels, years, imdb ids,
+video types and track filenames that triggers keep up to date (see migration c81e4b5f2a90).
+Every word of the query has to match the start of a word in one of those columns. The
+newest RANK_LIMIT matches are ranked with bm25, title matches first, and returned a page at
+a time. Only the columns the search results show are read.
+
+Databases without the index (SQLite built without FTS5) are searched with LIKE instead.
+"""
+import re
+
+from sqlalchemy.exc import OperationalError
+
+from arm.ui import app, db
+from arm.models.config import Config
+from arm.models.job import Job
+
+# Results on a page
+PAGE_SIZE = 50
+# bm25 weight of each job_search column:
+# title, title_manual, label, year, imdb_id, video_type, filenames
+WEIGHTS = (10.0, 10.0, 5.0, 2.0, 5.0, 1.0, 1.0)
+# Only this many of the newest matches are ranked, ranking every job (a word in all the
+# track filenames) would take hundreds of milliseconds
+RANK_LIMIT = 1000
+# Columns the search results show (common.js addJobItem)
+RESULT_COLUMNS = (Job.job_id, Job.title, Job.title_manual, Job.year, Job.video_type, Job.devpath, Job.status,
+                  Job.stage, Job.disctype, Job.poster_url, Job.logfile, Job.start_time, Job.job_length)
+RESULT_CONFIG_COLUMNS = (Config.RIPMETHOD, Config.MAINFEATURE, Config.MINLENGTH, Config.MAXLENGTH)
+
+
+def fts_query(text):
+    """
+    FTS5 query matching jobs with every word of text, as a prefix\n
+    :param str text: what the user typed
+    :return: str, empty if text has no words
+
+    >>> fts_query('Star Wars: 1977')
+    '"Star"* "Wars"* "1977"*'
+    >>> fts_query('"Alien" OR *')
+    '"Alien"* "OR"*'
+    >>> fts_query('?!')
+    ''
+    """
+    return " ".join(f'"{word}"*' for word in re.findall(r"\w+", text))
+
+
+def search(text, page=1):
+    """
+    Jobs matching text, best matches first\n
+    :param str text: what the user typed
+    :param int page: page of results, from 1
+    :return: (list of rows with RESULT_COLUMNS and RESULT_CONFIG_COLUMNS, True if there are more results)
+    """
+    query = fts_query(text or "")
+    if not query:
+        return [], False
+    offset = (max(1, page) - 1) * PAGE_SIZE
+    try:
+        job_ids = ranked_job_ids(query, PAGE_SIZE + 1, offset)
+    except OperationalError as error:
+        # no job_search table
+        app.logger.debug(f"Full text search not available, using LIKE: {error}")
+        db.session.rollback()
+        job_ids = like_job_ids(text, PAGE_SIZE + 1, offset)
+    more = len(job_ids) > PAGE_SIZE
+    job_ids = job_ids[:PAGE_SIZE]
+    # plain rows rather than Job objects, one query for the jobs and their configs
+    rows = db.session.execute(
+        db.select(*RESULT_COLUMNS, Config.CONFIG_ID, *RESULT_CONFIG_COLUMNS)
+        .outerjoin(Config, Config.job_id == Job.job_id)
+        .where(Job.job_id.in_(job_ids))
+    ).all()
+    rank = {job_id: position for position, job_id in enumerate(job_ids)}
+    return sorted(rows, key=lambda row: rank[row.job_id]), more
+
+
+def ranked_job_ids(query, limit, offset):
+    """job_ids matching an FTS5 query, the newest RANK_LIMIT matches ranked"""
+    weights = ", ".join(str(weight) for weight in WEIGHTS)
+    rows = db.session.execute(db.text(
+        f"SELECT rowid FROM job_search WHERE job_search MATCH :query AND rowid >= coalesce(("
+        f"  SELECT min(rowid) FROM ("
+        f"    SELECT rowid FROM job_search WHERE job_search MATCH :query ORDER BY rowid DESC LIMIT :rank_limit"
+        f"  )), 0) "
+        f"ORDER BY bm25(job_search, {weights}), rowid DESC LIMIT :limit OFFSET :offset"
+    ), {"query": query, "rank_limit": RANK_LIMIT, "limit": limit, "offset": offset})
+    return [row[0] for row in rows]
+
+
+def like_job_ids(text, limit, offset):
+    """job_ids with every word of text in the title, label or imdb id, newest first"""
+    query = db.session.query(Job.job_id)
+    for word in re.findall(r"\w+", text):
+        pattern = f"%{word}%"
+        query = query.filter(db.or_(Job.title.like(pattern), Job.title_manual.like(pattern),
+                                    Job.label.like(pattern), Job.imdb_id.like(pattern)))
+    return [row[0] for row in query.order_by(Job.job_id.desc()).limit(limit).offset(offset)]
+
+
+def result(row):
+    """
+    What the search page shows of a job\n
+    :param row: row returned by search()
+    :return: dict of str, with the config under 'config'
+    """
+    job_dict = {column.key: str(getattr(row, column.key)) for column in RESULT_COLUMNS}
+    if row.CONFIG_ID is None:
+        job_dict['config'] = "config not found"
+    else:
+        job_dict['config'] = {column.key: str(getattr(row, column.key)) for column in RESULT_CONFIG_COLUMNS}
+    return job_dict
@@ -0,0 +1,148 @@
+"""
+Long-poll stream of the active jobs for the home page
+
+Instead of every browser tab rebuilding the whole joblist on every poll, one snapshot of the
+joblist and unseen notifications is shared by all requests. It is only rebuilt when something
+it is built from has changed on disk (the database and its WAL, published job progress,
+the slot queues, abcde logs) or it is older than SNAPSHOT_MAX_AGE.
+
+Each snapshot has a version. A client sends the last version it has and gets back only the
+job fields that changed since then and any new notifications, or waits until there are some.
+When MAX_WAITING requests are already waiting it is answered straight away with retry_after,
+the seconds to wait before asking again.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import arm.config.config as cfg
+from arm.ripper import slots
+from arm.ui import db, json_api
+
+# Seconds a request waits for a change before answering with nothing new
+WAIT_TIMEOUT = 25
+# Seconds between checks for a change while waiting
+CHECK_INTERVAL = 0.5
+# Rebuild the snapshot at least this often, for anything not seen on disk (e.g. calculated ETAs)
+SNAPSHOT_MAX_AGE = 30
+# Old snapshots kept to send changes against, clients further behind get the whole joblist
+HISTORY = 32
+# Requests allowed to wait at once, the rest are answered straight away so the web server keeps free threads
+MAX_WAITING = 16
+# Seconds a request that couldn't wait is told to wait before asking again
+RETRY_AFTER = 5
+
+
+class JobStream:
+    """
+    Versioned snapshots of the joblist shared by every request
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+        self.waiting = 0
+        # Versions start from the clock so a client's version from before a restart is never reused
+        self.version = int(time.time() * 1000)
+        self.history = OrderedDict()
+        self.jobs = None
+        self.note_ids = set()
+        self.notes = []
+        self.fingerprint = None
+        self.built = 0.0
+
+    def changes(self, since, timeout=WAIT_TIMEOUT):
+        """
+        Job fields and notifications that changed after version since, waiting up to timeout for some\n
+        :param int since: last version the client has, 0 for everything
+        :param float timeout: seconds to wait when nothing has changed
+        :return: dict with version, reset (True when the whole joblist is sent), changed, removed and notes,
+                 and retry_after if nothing has changed and there were too many requests waiting to wait
+        """
+        deadline = time.monotonic() + timeout
+        with self.lock:
+            self._refresh()
+            if self.version != since:
+                return self._changes_since(since)
+            if self.waiting >= MAX_WAITING:
+                return {**self._changes_since(since), "retry_after": RETRY_AFTER}
+            self.waiting += 1
+            try:
+                while self.version == since and (remaining := deadline - time.monotonic()) > 0:
+                    self.changed.wait(min(CHECK_INTERVAL, remaining))
+                    self._refresh()
+            finally:
+                self.waiting -= 1
+            return self._changes_since(since)
+
+    def _refresh(self):
+        """Rebuild the snapshot if anything it is built from has changed, wake the waiters if it differs"""
+        fingerprint = self._fingerprint()
+        if fingerprint == self.fingerprint and time.monotonic() - self.built < SNAPSHOT_MAX_AGE:
+            return
+        try:
+            results = json_api.get_x_jobs("joblist")["results"]
+            notes = json_api.get_notifications()
+        finally:
+            # End the read transaction, so the next rebuild sees new commits and writers aren't held up
+            # (this also drops the progress values get_x_jobs sets on the jobs, they are never saved)
+            db.session.rollback()
+        jobs = {str(job["job_id"]): job for job in results.values()}
+        note_ids = {note["id"] for note in notes}
+        self.fingerprint = fingerprint
+        self.built = time.monotonic()
+        if jobs == self.jobs and note_ids == self.note_ids:
+            return
+        self.version += 1
+        self.jobs, self.notes, self.note_ids = jobs, notes, note_ids
+        self.history[self.version] = (jobs, note_ids)
+        while len(self.history) > HISTORY:
+            self.history.popitem(last=False)
+        self.changed.notify_all()
+
+    def _fingerprint(self):
+        """Modification times and sizes of everything the joblist is built from"""
+        paths = [
+            cfg.arm_config['DBFILE'],
+            cfg.arm_config['DBFILE'] + "-wal",
+            os.path.join(cfg.arm_config['LOGPATH'], "progress"),
+            slots.transcode_slots().queue_path,
+            slots.makemkvinfo_slots().queue_path,
+        ]
+        # abcde progress comes from the job log
+        paths += [os.path.join(cfg.arm_config['LOGPATH'], job["logfile"])
+                  for job in (self.jobs or {}).values() if job.get("disctype") == "music"]
+        fingerprint = []
+        for path in paths:
+            try:
+                stat = os.stat(path)
+                fingerprint.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                fingerprint.append(None)
+        return fingerprint
+
+    def _changes_since(self, since):
+        """Difference between the snapshot at version since and the current one"""
+        previous = self.history.get(since)
+        if previous is None:
+            return {"version": self.version, "reset": True, "changed": dict(self.jobs), "removed": [],
+                    "notes": list(self.notes)}
+        old_jobs, old_note_ids = previous
+        changed = {}
+        for job_id, job in self.jobs.items():
+            old_job = old_jobs.get(job_id)
+            if old_job is None:
+                changed[job_id] = job
+                continue
+            fields = {key: value for key, value in job.items() if old_job.get(key) != value}
+            # fields the job no longer has, e.g. queue_position once it has left the queue
+            fields.update({key: None for key in old_job if key not in job})
+            if fields:
+                changed[job_id] = fields
+        return {"version": self.version, "reset": False, "changed": changed,
+                "removed": [job_id for job_id in old_jobs if job_id not in self.jobs],
+                "notes": [note for note in self.notes if note["id"] not in old_note_ids]}
+
+
+stream = JobStream()
@@ -11,6 +11,7 @@ Covers
 - changeparams [GET]
 - list_titles [GET]
 - json [JSON GET]
+- jobstream [JSON GET]
 """
 
 import json
@@ -19,7 +20,7 @@ from flask import render_template, request, Blueprint, flash, redirect, url_for
 from werkzeug.routing import ValidationError
 
 import arm.ui.utils as ui_utils
-from arm.ui import app, db, constants, json_api
+from arm.ui import app, db, constants, json_api, job_stream
 from arm.models.job import Job, JobState
 from arm.models.notifications import Notifications
 import arm.config.config as cfg
@@ -240,7 +241,7 @@ def rips():
     """
     This no longer works properly because of the 'transcoding' status
     """
-    active_jobs = Job.query.filter_by(~Job.finished)
+    active_jobs = Job.query.filter(Job.unfinished)
     return render_template('activerips.html', jobs=active_jobs)
 
 
@@ -308,6 +309,7 @@ def feed_json():
         valid_data = {
             'j_id': request.args.get('job'),
             'searchq': request.args.get('q'),
+            'search_page': request.args.get('page', 1, type=int),
             'logpath': cfg.arm_config['LOGPATH'],
             'fail': 'fail',
             'success': 'success',
@@ -323,7 +325,7 @@ def feed_json():
             'delete': {'funct': json_api.delete_job, 'args': ('j_id', 'mode')},
             'abandon': {'funct': json_api.abandon_job, 'args': ('j_id',)},
             'full': {'funct': json_api.generate_log, 'args': ('logpath', 'j_id')},
-            'search': {'funct': json_api.search, 'args': ('searchq',)},
+            'search': {'funct': json_api.search, 'args': ('searchq', 'search_page')},
             'getfailed': {
                 'funct': json_api.get_x_jobs,
                 'args': (JobState.FAILURE.value,),
@@ -337,7 +339,8 @@ def feed_json():
             'send_item': {'funct': ui_utils.send_to_remote_db, 'args': ('j_id',)},
             'change_job_params': {'funct': json_api.change_job_params, 'args': ('config_id',)},
             'read_notification': {'funct': json_api.read_notification, 'args': ('notify_id',)},
-            'notify_timeout': {'funct': json_api.get_notify_timeout, 'args': ('notify_timeout',)}
+            'notify_timeout': {'funct': json_api.get_notify_timeout, 'args': ('notify_timeout',)},
+            'metadata_cache': {'funct': json_api.get_metadata_cache_stats, 'args': ()},
         }
     else:
         valid_data = {
@@ -356,3 +359,27 @@ def feed_json():
     return app.response_class(response=json.dumps(return_json, indent=4, sort_keys=True),
                               status=200,
                               mimetype=constants.JSON_TYPE)
+
+
+@route_jobs.route('/jobstream', methods=['GET'])
+def feed_job_stream():
+    """
+    Long-poll for the home page joblist
+    Returns the job fields and new notifications since version `since` (0 for everything),
+    waiting up to `timeout` seconds if nothing has changed
+    Like the joblist, this is available without logging in
+    """
+    since = request.args.get('since', default=0, type=int)
+    timeout = min(request.args.get('timeout', default=job_stream.WAIT_TIMEOUT, type=float), job_stream.WAIT_TIMEOUT)
+    return_json = job_stream.stream.changes(since, timeout)
+    return_json.update({
+        'mode': 'jobstream',
+        'success': True,
+        'arm_name': cfg.arm_config['ARM_NAME'],
+        'authenticated': ui_utils.authenticated_state(),
+    })
+    response = app.response_class(response=json.dumps(return_json, separators=(',', ':')),
+                                  status=200,
+                                  mimetype=constants.JSON_TYPE)
+    response.headers['Cache-Control'] = 'no-store'
+    return response
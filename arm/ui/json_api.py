@@ -6,12 +6,11 @@ import os
 import subprocess
 import re
 import html
-from collections import deque
 from pathlib import Path
 import datetime
 import psutil
 from flask import request
-from time import time, strftime, gmtime
+from time import monotonic
 
 import arm.config.config as cfg
 from arm.models.config import Config
@@ -19,11 +18,23 @@ from arm.models.job import Job, JobState, JOB_STATUS_FINISHED
 from arm.models.notifications import Notifications
 from arm.models.track import Track
 from arm.models.ui_settings import UISettings
-from arm.ui import app, db
+from arm.ripper import progress, slots
+from arm.ui import app, db, job_search, log_tail, metadata_cache, pagination
 from arm.ui.forms import ChangeParamsForm
 from arm.ui.utils import job_id_validator, database_updater, authenticated_state
 from arm.ui.settings import DriveUtils as drive_utils # noqa E402
 
+# abcde progress is read from its log, keyed by name for log_tail
+AUDIO_PATTERNS = {
+    "track": re.compile(r"\(track([^[]+)"),
+}
+# Job attributes set while reading progress, restored from the cache along with the json fields
+PROGRESS_ATTRIBUTES = ("stage", "progress", "progress_round", "eta")
+# Polls from several browser tabs within this many seconds share one read of the abcde log
+PROGRESS_CACHE_SECONDS = 2
+# job_id: (expires, job status, json fields, job attributes)
+_progress_cache = {}
+
 
 def get_notifications():
     """Get all current notifications"""
@@ -42,18 +53,24 @@ def get_x_jobs(job_status):
     """
     success = False
     if job_status == "joblist":
-        jobs = db.session.query(Job).filter(~Job.finished).all()
+        jobs = db.session.query(Job).filter(Job.unfinished).all()
     elif JobState(job_status) in JOB_STATUS_FINISHED:
         jobs = Job.query.filter_by(status=job_status)
     else:
         raise ValueError(f"{job_status} is not a valid option")
 
     job_results = {}
+    queue_positions = get_queue_positions() if job_status == "joblist" else {}
     i = 0
     for j in jobs:
         job_results[i] = {}
         job_log = os.path.join(cfg.arm_config['LOGPATH'], str(j.logfile))
-        process_logfile(job_log, j, job_results[i])
+        job_progress = progress.read(j.job_id) if job_status == "joblist" else {}
+        process_logfile(job_log, j, job_results[i], job_progress)
+        if j.job_id in queue_positions:
+            job_results[i]['queue_position'] = queue_positions[j.job_id]
+        if tracks_found := job_progress.get('tracks_found'):
+            job_results[i]['tracks_found'] = tracks_found
         try:
             job_results[i]['config'] = j.config.get_d()
         except AttributeError:
@@ -78,22 +95,33 @@ def get_x_jobs(job_status):
             "authenticated": authenticated}
 
 
-def process_logfile(logfile, job, job_results):
+def get_queue_positions():
+    """
+    Get the place of every job waiting for a makemkv info or transcode slot\n
+    :return: dict of {job_id: position}, 1 is next in line
     """
-        Decide if we need to process HandBrake or MakeMKV
+    positions = {}
+    for scheduler in (slots.makemkvinfo_slots(), slots.transcode_slots()):
+        for job_id, position in scheduler.queue_positions().items():
+            positions[job_id] = position + 1
+    return positions
+
+
+def process_logfile(logfile, job, job_results, job_progress=None):
+    """
+        Decide if we need to show MakeMKV/HandBrake/FFmpeg progress or process the abcde log
         :param logfile: the logfile for parsing
         :param job: the Job class
         :param job_results: the {} of
+        :param job_progress: the job's published progress, read if not given
         :return: should be dict for the json api
     """
     app.logger.debug(f"Disc Type: {job.disctype}, Status: {job.status}")
-    if job.disctype in {"dvd", "bluray"}:
-        if job.status == JobState.VIDEO_RIPPING.value:
-            app.logger.debug("using mkv - " + logfile)
-            return process_makemkv_logfile(job, job_results)
-        if job.status == JobState.TRANSCODE_ACTIVE.value:
-            app.logger.debug("using handbrake")
-            return process_handbrake_logfile(logfile, job, job_results)
+    if job.disctype in {"dvd", "bluray"} and \
+            job.status in (JobState.VIDEO_RIPPING.value, JobState.TRANSCODE_ACTIVE.value):
+        if job_progress is None:
+            job_progress = progress.read(job.job_id)
+        return process_progress(job, job_progress, job_results)
     if job.disctype == "music" and job.status == JobState.AUDIO_RIPPING.value:
         app.logger.debug("using audio disc")
         return process_audio_logfile(job.logfile, job, job_results)
@@ -106,164 +134,32 @@ def percentage(part, whole):
     return percent
 
 
-def find_last_regex_match(pattern, iterable):
-    """
-    Find the last matching regex pattern in a given iterable
+def process_progress(job, job_progress, job_results):
     """
-    regex = re.compile(pattern)
-    if isinstance(iterable, (list, tuple, str)):
-        reversed_iterable = reversed(iterable)
-    else:
-        reversed_iterable = reversed(list(iterable))
-    for item in reversed_iterable:
-        retval = regex.search(item)
-        if retval:
-            return retval
-    return None
-
-
-def process_makemkv_logfile(job, job_results):
-    """
-    Process the logfile and find current status and job progress percent\n
-    :return: job_results dict
-    """
-    job_progress_status = None
-    job_stage_index = None
-    batch_log_path = os.path.join(cfg.arm_config['LOGPATH'], 'progress', str(job.job_id)) + '.log.batchinfo'
-    lines = read_log_line(os.path.join(cfg.arm_config['LOGPATH'], 'progress', str(job.job_id)) + '.log')
-    batch_index = read_log_line(batch_log_path)
-    # Correctly get last entry for progress bar
-
-    job_progress_status = find_last_regex_match(r"PRGV:(\d{3,}),(\d+),(\d{3,})", lines)
-    job_stage_index = find_last_regex_match(r"PRGC:(\d+),(\d+),\"([\w -]{2,})\"", lines)
-    job_batch_info = find_last_regex_match(r"BINF:(\d{10}),(\d+),(\d+),(\d+)", batch_index)
-
-    if job_progress_status is not None:
-        app.logger.debug(f"job_progress_status: {job_progress_status}")
-        job.progress = job_results['progress'] = \
-            f"{percentage(job_progress_status.group(1), job_progress_status.group(3)):.2f}"
-        job.progress_round = percentage(job_progress_status.group(1),
-                                        job_progress_status.group(3))
-        # The ETA calc needs the batch-info (BINF) file, but that file is only
-        # written further down, in the `job_stage_index` block. On the first
-        # poll for a job it does not exist yet, so `job_batch_info` is None and
-        # `job_batch_info.group(1)` raises
-        # "'NoneType' object has no attribute 'group'", which 500s the whole
-        # /json endpoint and leaves the Active Rips card blank. Because the
-        # crash happens *before* the code that creates the BINF file, it never
-        # bootstraps and stays broken for the entire rip. Guard it (and the
-        # divide-by-zero when progress is still 0) and report an Unknown ETA
-        # until the batch info is available.
-        if job_batch_info is not None and float(job.progress) > 0:
-            job_start_time = int(job_batch_info.group(1))
-            current_time = int(time())
-            elapsed_time = current_time - job_start_time
-            total_time = int((elapsed_time * 100) / float(job.progress))
-            time_remaining = total_time - elapsed_time
-            app.logger.debug(f"ETA values for job {job.job_id}: Elapsed seconds: {elapsed_time}, "
-                             f"Percent: {job.progress}, "
-                             f"Projected time: {total_time}, "
-                             f"Time remaining: {time_remaining}"
-                             )
-            job.eta = strftime("%Hh%Mm%Ss", gmtime(time_remaining))
-        else:
-            job.eta = "Unknown"
-    else:
-        app.logger.debug(f"Job [{job.job_id}] MakeMKV status not defined - setting progress to 0%")
-        job.progress = job.progress_round = job_results['progress'] = 0
-        job.eta = "Unknown"
-
-    if job_stage_index is not None:
-        try:
-            if job_batch_info.group(4) != job_stage_index.group(1):
-                app.logger.debug(f"Appending new batch position info for job {job.job_id}: "
-                                 f"BINF:{int(time())},"
-                                 f"{job_batch_info.group(2)},"
-                                 f"{job_batch_info.group(3)},"
-                                 f"{job_stage_index.group(1)}"
-                                 )
-                with open(batch_log_path, 'a') as f:
-                    f.write(f"\nBINF:{int(time())},"
-                            f"{job_batch_info.group(2)},"
-                            f"{job_batch_info.group(3)},"
-                            f"{job_stage_index.group(1)}"
-                            )
-            app.logger.debug(f"job_stage_index: {job_stage_index}")
-            current_index = f"Track {job_batch_info.group(2)}/{job_batch_info.group(3)}<br>{job_stage_index.group(3)}"
-            job.stage = job_results['stage'] = current_index
-            db.session.commit()
-        except Exception as error:
-            job.stage = f"Unknown -  {error}"
-
-    return job_results
-
-
-def process_handbrake_logfile(logfile, job, job_results):
-    """
-    process a logfile looking for HandBrake or FFMPEG progress
-    :param logfile: the logfile for parsing
+    Show the progress published by the ripper for MakeMKV, HandBrake or FFmpeg
     :param job: the Job class
+    :param job_progress: the job's published progress
     :param job_results: the {} of
     :return: should be dict for the json api
     """
-    job_status = None
-    job_status_index = None
-    ffmpeg_job_status = None
-    lines = read_log_line(logfile)
-    for line in lines:
-        # This correctly get the very last ETA and % for HandBrake
-        hb_search = re.search(r"Encoding: task (\d of \d), (\d{1,3}\.\d{2}) %.*?"
-                              r"\((\d+\.\d+) fps, avg (\d+\.\d+) fps, ETA ([\dhms]*?)\)(?!\\rEncod)", str(line))
-        if hb_search:
-            job_status = hb_search
-
-        hb_index_search = re.search(r"Processing track #(\d{1,2}) of (\d{1,2})"
-                                    r"(?!.*Processing track #)", str(line))
-        if hb_index_search:
-            job_status_index = hb_index_search
-
-        # Check for FFMPEG status
-        ffmpeg_search = re.search(r"ARM: .* - (\d{1,3}\.\d{2})%", str(line))
-        if ffmpeg_search:
-            ffmpeg_job_status = ffmpeg_search
-
-    # Check ARM can read the Handbrake library and get a status
-    if job_status is not None:
-        app.logger.debug(job_status.group())
-        job.stage = job_status.group(1)
-        job.progress = job_status.group(2)
-        job.cur_fps = job_status.group(3)
-        job.avg_fps = job_status.group(4)
-        job.eta = job_status.group(5)
-        job.progress_round = int(float(job.progress))
-    elif ffmpeg_job_status is not None:
-        job.stage = "Transcoding"
-        job.progress = ffmpeg_job_status.group(1)
-        job.eta = "Unknown"
-        job.progress_round = int(float(job.progress))
+    if job_progress.get("source"):
+        stage = job_progress.get("stage") or "Unknown"
+        if title := job_progress.get("title"):
+            stage = f"{title}<br>{stage}"
+        job.stage = stage
+        job.progress = job_progress.get("progress", 0)
+        job.progress_round = job_progress.get("progress_round", 0)
+        job.eta = job_progress.get("eta") or "Unknown"
+        job.cur_fps = job_progress.get("cur_fps") or 0
+        job.avg_fps = job_progress.get("avg_fps") or 0
     else:
-        app.logger.debug(f"Job [{job.job_id}] handbrake/ffmpeg status not defined - setting progress to 0%")
+        app.logger.debug(f"Job [{job.job_id}] no progress published - setting progress to 0%")
         job.stage = "Unknown"
-        job.progress = job.progress_round = 0
+        job.progress = job.progress_round = job.cur_fps = job.avg_fps = 0
         job.eta = "Unknown"
 
-    job_results['stage'] = job.stage
-    job_results['progress'] = job.progress
-    job_results['eta'] = job.eta
-    job_results['cur_fps'] = getattr(job, 'cur_fps', 0)
-    job_results['avg_fps'] = getattr(job, 'avg_fps', 0)
-    job_results['progress_round'] = int(float(job_results['progress']))
-
-    if job_status_index:
-        try:
-            current_index = int(job_status_index.group(1))
-            job.stage = job_results['stage'] = f"{job.stage} - {current_index}/{job.no_of_titles}"
-        except Exception as error:
-            app.logger.debug(f"Problem finding the current track {error}")
-            job.stage = f"{job.stage} - %0%/%0%"
-    else:
-        app.logger.debug("Cant find index")
-
+    for key in ("stage", "progress", "progress_round", "eta", "cur_fps", "avg_fps"):
+        job_results[key] = getattr(job, key)
     return job_results
 
 
@@ -275,23 +171,35 @@ def process_audio_logfile(logfile, job, job_results):
     :param job_results:
     :return:
     """
-    # \((track[^[]+)(?!track)
-    line = read_all_log_lines(os.path.join(cfg.arm_config["LOGPATH"], logfile))
-    for one_line in line:
-        job_stage_index = re.search(r"\(track([^[]+)", str(one_line))
-        if job_stage_index:
-            try:
-                current_index = f"Track: {job_stage_index.group(1)}/{job.no_of_titles}"
-                job.stage = job_results['stage'] = current_index
-                job.eta = calc_process_time(job.start_time, job_stage_index.group(1), job.no_of_titles)
-                job.progress = round(percentage(job_stage_index.group(1), job.no_of_titles + 1))
-                job.progress_round = round(job.progress)
-            except Exception as error:
-                app.logger.debug("Error processing abcde logfile. Error dump"
-                                 f"-  {error}", exc_info=True)
-                job.stage = "Unknown"
-                job.eta = "Unknown"
-                job.progress = job.progress_round = 0
+    now = monotonic()
+    cached = _progress_cache.get(job.job_id)
+    if cached is not None and cached[0] > now and cached[1] == job.status:
+        _, _, results, attributes = cached
+        job_results.update(results)
+        for key, value in attributes.items():
+            setattr(job, key, value)
+        return job_results
+
+    job_stage_index = log_tail.tail(os.path.join(cfg.arm_config["LOGPATH"], logfile), AUDIO_PATTERNS)["track"]
+    if job_stage_index:
+        try:
+            current_index = f"Track: {job_stage_index.group(1)}/{job.no_of_titles}"
+            job.stage = job_results['stage'] = current_index
+            job.eta = calc_process_time(job.start_time, job_stage_index.group(1), job.no_of_titles)
+            job.progress = round(percentage(job_stage_index.group(1), job.no_of_titles + 1))
+            job.progress_round = round(job.progress)
+        except Exception as error:
+            app.logger.debug("Error processing abcde logfile. Error dump"
+                             f"-  {error}", exc_info=True)
+            job.stage = "Unknown"
+            job.eta = "Unknown"
+            job.progress = job.progress_round = 0
+
+    if len(_progress_cache) > log_tail.MAX_TAILS:
+        for job_id in [job_id for job_id, entry in _progress_cache.items() if entry[0] <= now]:
+            _progress_cache.pop(job_id, None)
+    attributes = {key: job.__dict__[key] for key in PROGRESS_ATTRIBUTES if key in job.__dict__}
+    _progress_cache[job.job_id] = (now + PROGRESS_CACHE_SECONDS, job.status, dict(job_results), attributes)
     return job_results
 
 
@@ -309,52 +217,17 @@ def calc_process_time(starttime, cur_iter, max_iter):
     return f"{str(test).split('.', maxsplit=1)[0]} - @{finish_time.strftime('%H:%M:%S')}"
 
 
-def read_log_line(log_file: os.PathLike):
+def search(search_query, page=1):
     """
-    :param log_file: path to log file
-    :return: the last 20 lines of the file at ``log_file``
+    Queries ARMui db for the jobs matching the query\n
+    :param str search_query: words to look for in the title, label, year, imdb id, type or track filenames
+    :param int page: page of results
+    :return: json/dict with the results ranked best first
     """
-    try:
-        with open(log_file, encoding="utf8", errors="ignore") as read_log_file:
-            lines = deque(read_log_file, maxlen=100)
-    except OSError:
-        app.logger.debug(f"Error while reading {log_file}, unable to calculate ETA")
-        lines = ["", ""]
-    return lines
-
-
-def read_all_log_lines(log_file):
-    """Try to catch if the logfile gets delete before the job is finished"""
-    try:
-        with open(log_file, encoding="utf8", errors='ignore') as read_log_file:
-            line = read_log_file.readlines()
-    except FileNotFoundError:
-        line = ""
-    return line
-
-
-def search(search_query):
-    """ Queries ARMui db for the movie/show matching the query"""
-    safe_search = re.sub(r'[^a-zA-Z\d]', '', search_query)
-    safe_search = f"%{safe_search}%"
     app.logger.debug('-' * 30)
-
-    posts = db.session.query(Job).filter(Job.title.like(safe_search)).all()
-    search_results = {}
-    i = 0
-    for job in posts:
-        search_results[i] = {}
-        try:
-            search_results[i]['config'] = job.config.get_d()
-        except AttributeError:
-            search_results[i]['config'] = "config not found"
-            app.logger.debug("couldn't get config")
-
-        for key, value in iter(job.get_d().items()):
-            if key != "config":
-                search_results[i][str(key)] = str(value)
-        i += 1
-    return {'success': True, 'mode': 'search', 'results': search_results}
+    jobs, more = job_search.search(search_query, page)
+    search_results = {i: job_search.result(job) for i, job in enumerate(jobs)}
+    return {'success': True, 'mode': 'search', 'results': search_results, 'page': page, 'more': more}
 
 
 def delete_job(job_id, mode):
@@ -416,6 +289,7 @@ def delete_job(job_id, mode):
                                                  f'Job with id: {job_id} was successfully deleted from the database')
                     db.session.add(notification)
                     db.session.commit()
+                    pagination.forget_job_count()
                     app.logger.debug(f"Admin deleting  job {job_id} was successful")
                     json_return = {'success': True, 'job': job_id, 'mode': mode}
     # If we run into problems with the database changes
@@ -592,6 +466,11 @@ def get_notify_timeout(notify_timeout):
     return return_json
 
 
+def get_metadata_cache_stats():
+    """Return how many metadata lookups were answered by the cache"""
+    return {'success': True, 'mode': 'metadata_cache', 'stats': metadata_cache.stats()}
+
+
 def restart_ui():
     app.logger.debug("Arm ui shutdown....")
     shutdown_code = subprocess.check_output(
@@ -0,0 +1,234 @@
+"""
+Following a log for the /logreader stream
+
+A LogFollower sends the whole log and then whatever is appended to it, until the job the
+log belongs to has finished. Between writes it sleeps on an inotify watch of the file, so
+an idle log costs nothing, and where inotify isn't available it checks the file every
+POLL_INTERVAL seconds. The "ARM only" view filters the ARM: lines out of each chunk read
+with one regex rather than a line at a time.
+
+Every follower holds a waitress thread for as long as it runs, so at most LOG_FOLLOWERS
+(arm.yaml) run at once. A tab that was closed on a quiet log is only noticed on the next
+write, so when they are all in use the follower that started first is stopped to make room.
+"""
+import codecs
+import ctypes
+import ctypes.util
+import os
+import re
+import select
+import threading
+import time
+
+import arm.config.config as cfg
+
+# Bytes read from the log at a time
+CHUNK_SIZE = 64 * 1024
+# Seconds between checks for a stop request or the job finishing while the log is quiet
+WAIT_SECONDS = 2
+# Seconds between reads when inotify isn't available
+POLL_INTERVAL = 1
+# Seconds to wait for a free follower, after asking the oldest to stop
+SLOT_TIMEOUT = 5
+# The lines the "ARM only" view shows
+ARM_LINES = re.compile(r"^.*ARM:.*(?:\n|\Z)", re.MULTILINE)
+
+# inotify events that mean the log has changed (sys/inotify.h)
+IN_MODIFY = 0x002
+IN_ATTRIB = 0x004
+IN_CLOSE_WRITE = 0x008
+IN_MOVE_SELF = 0x800
+IN_DELETE_SELF = 0x400
+WATCH_EVENTS = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVE_SELF | IN_DELETE_SELF
+
+_followers = []
+_followers_changed = threading.Condition()
+_libc = None
+
+
+def max_followers():
+    """Number of logs that can be followed at once"""
+    return max(1, int(cfg.arm_config.get("LOG_FOLLOWERS", 10)))
+
+
+class LogFollower:
+    """
+    Iterable of the text of a log, as it is written\n
+    Hand it to the response and it is closed when the stream ends or the client goes away.
+    """
+
+    def __init__(self, path, arm_only=False, finished=None):
+        """
+        :param path: path to the log file
+        :param bool arm_only: only send the lines with ARM: in them
+        :param finished: callable returning True once nothing more will be written to the log,
+                         None to follow until the client goes away
+        """
+        self.path = path
+        self.arm_only = arm_only
+        self.finished = finished
+        self.stop = threading.Event()
+        self._generator = None
+        self._closed = False
+
+    def __iter__(self):
+        if self._generator is None:
+            self._generator = self._follow()
+        return self._generator
+
+    def close(self):
+        """Stop following and free the follower, called by the server when the response ends"""
+        if self._closed:
+            return
+        self._closed = True
+        self.stop.set()
+        if self._generator is not None:
+            self._generator.close()
+        with _followers_changed:
+            if self in _followers:
+                _followers.remove(self)
+            _followers_changed.notify_all()
+
+    def _follow(self):
+        """Send the log, then wait for more until the job has finished"""
+        try:
+            log_file = open(self.path, "rb")
+        except OSError:
+            return
+        watch = Watch(self.path)
+        decoder = codecs.getincrementaldecoder("utf8")(errors="ignore")
+        partial = ""
+        checked = 0.0
+        try:
+            while not self.stop.is_set():
+                data = log_file.read(CHUNK_SIZE)
+                if data:
+                    text = decoder.decode(data)
+                    if self.arm_only:
+                        # only whole lines, the last one may still be being written
+                        text = partial + text
+                        last_break = text.rfind("\n") + 1
+                        text, partial = "".join(ARM_LINES.findall(text, 0, last_break)), text[last_break:]
+                    if text:
+                        yield text
+                    continue
+                # Everything has been read, check before waiting so no write is missed
+                if self.finished is not None and time.monotonic() - checked >= WAIT_SECONDS:
+                    checked = time.monotonic()
+                    if self.finished():
+                        # anything written before it finished, and the last line if it has no line break
+                        rest = decoder.decode(log_file.read(), final=True)
+                        if self.arm_only:
+                            rest = "".join(ARM_LINES.findall(partial + rest))
+                        if rest:
+                            yield rest
+                        return
+                watch.wait(WAIT_SECONDS, self.stop)
+                if self._replaced(log_file):
+                    # truncated or a new file, start again from its beginning
+                    log_file.close()
+                    watch.close()
+                    log_file = open(self.path, "rb")
+                    watch = Watch(self.path)
+                    decoder.reset()
+                    partial = ""
+        except OSError:
+            return
+        finally:
+            log_file.close()
+            watch.close()
+
+    def _replaced(self, log_file):
+        """True if the log was truncated or replaced by another file"""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            # removed, keep what is open
+            return False
+        return stat.st_ino != os.fstat(log_file.fileno()).st_ino or stat.st_size < log_file.tell()
+
+
+def follow(path, arm_only=False, finished=None):
+    """
+    Start following a log, stopping the oldest follower if they are all in use\n
+    :param path: path to the log file
+    :param bool arm_only: only send the lines with ARM: in them
+    :param finished: callable returning True once nothing more will be written to the log
+    :return: LogFollower, None if no follower was free within SLOT_TIMEOUT
+    """
+    follower = LogFollower(path, arm_only, finished)
+    deadline = time.monotonic() + SLOT_TIMEOUT
+    with _followers_changed:
+        while len(_followers) >= max_followers():
+            # most likely a tab that was closed while its log was quiet
+            _followers[0].stop.set()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            _followers_changed.wait(remaining)
+        _followers.append(follower)
+    return follower
+
+
+def active():
+    """Number of logs being followed"""
+    with _followers_changed:
+        return len(_followers)
+
+
+class Watch:
+    """
+    inotify watch of one file, falls back to sleeping POLL_INTERVAL when inotify can't be used
+    """
+
+    def __init__(self, path):
+        self.fd = _inotify_watch(path)
+
+    def wait(self, timeout, stop):
+        """
+        Wait for the file to change\n
+        :param timeout: seconds to wait at most
+        :param threading.Event stop: return early when this is set, it is seen within POLL_INTERVAL
+        """
+        if self.fd is None:
+            stop.wait(min(timeout, POLL_INTERVAL))
+            return
+        deadline = time.monotonic() + timeout
+        while not stop.is_set() and (remaining := deadline - time.monotonic()) > 0:
+            # short waits, so a stop request is seen within POLL_INTERVAL
+            readable, _, _ = select.select([self.fd], [], [], min(remaining, POLL_INTERVAL))
+            if readable:
+                self._drain()
+                return
+
+    def _drain(self):
+        """Discard the queued events, the file is read whatever they were"""
+        try:
+            while os.read(self.fd, 4096):
+                pass
+        except BlockingIOError:
+            pass
+        except OSError:
+            self.close()
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+def _inotify_watch(path):
+    """Non-blocking inotify fd watching path, None if inotify isn't available"""
+    global _libc
+    try:
+        if _libc is None:
+            _libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        fd = _libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    except (OSError, AttributeError):
+        return None
+    if fd < 0:
+        return None
+    if _libc.inotify_add_watch(fd, os.fsencode(path), WATCH_EVENTS) < 0:
+        os.close(fd)
+        return None
+    return fd
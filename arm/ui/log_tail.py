@@ -0,0 +1,120 @@
+"""
+Incremental log following for the job progress shown by the UI
+
+The joblist is polled by every open browser tab, so re-reading each job's log on every poll
+is the hottest path in the UI. A LogTail remembers how far into a log it has read and the last
+match for each of its patterns, so a poll only reads and searches the bytes appended since.
+"""
+import os
+import re
+import threading
+from collections import OrderedDict
+
+# Only the end of a log is read the first time it is followed (bytes)
+INITIAL_READ = 256 * 1024
+# Logs followed at once, the least recently polled are dropped
+MAX_TAILS = 64
+# HandBrake rewrites its progress with \r, treat it as a line break too
+_LINE_BREAK = re.compile(r"\r\n|\r|\n")
+
+_tails = OrderedDict()
+_tails_lock = threading.Lock()
+
+
+class LogTail:
+    """
+    Follows one log file and keeps the last match of each pattern
+    """
+
+    def __init__(self, path, patterns):
+        """
+        :param path: path to the log file
+        :param dict patterns: name and compiled regex to look for
+        """
+        self.path = path
+        self.patterns = patterns
+        self.lock = threading.Lock()
+        self._reset(None)
+
+    def _reset(self, inode):
+        """Start again from the beginning of a new or truncated file"""
+        self.inode = inode
+        self.offset = 0
+        self.partial = b""
+        # set when starting part way into a file, the first line read is incomplete
+        self.skip_line = False
+        self.matches = dict.fromkeys(self.patterns)
+
+    def poll(self):
+        """
+        Read anything appended to the log since the last poll\n
+        :return: dict of pattern name and the last re.Match, None if it hasn't matched (or the log can't be read)
+        """
+        with self.lock:
+            try:
+                with open(self.path, "rb") as log_file:
+                    stat = os.fstat(log_file.fileno())
+                    if stat.st_ino != self.inode or stat.st_size < self.offset:
+                        self._reset(stat.st_ino)
+                        if stat.st_size > INITIAL_READ:
+                            self.offset = stat.st_size - INITIAL_READ
+                            self.skip_line = True
+                    if stat.st_size > self.offset:
+                        log_file.seek(self.offset)
+                        data = log_file.read(stat.st_size - self.offset)
+                        self.offset += len(data)
+                        self._consume(data)
+            except OSError:
+                self._reset(None)
+                return dict(self.matches)
+            return self._current()
+
+    def _consume(self, data):
+        """Search the complete lines in data, keep the unfinished last line for the next poll"""
+        data = self.partial + data
+        if self.skip_line:
+            first_break = re.search(rb"[\r\n]", data)
+            if first_break is None:
+                self.partial = b""
+                return
+            data = data[first_break.end():]
+            self.skip_line = False
+        last_break = max(data.rfind(b"\n"), data.rfind(b"\r"))
+        self.partial = data[last_break + 1:]
+        if last_break < 0:
+            return
+        lines = _LINE_BREAK.split(data[:last_break].decode("utf8", errors="ignore"))
+        for name, regex in self.patterns.items():
+            for line in reversed(lines):
+                if match := regex.search(line):
+                    self.matches[name] = match
+                    break
+
+    def _current(self):
+        """Last matches, including the line still being written"""
+        matches = dict(self.matches)
+        if self.partial:
+            line = self.partial.decode("utf8", errors="ignore")
+            for name, regex in self.patterns.items():
+                if match := regex.search(line):
+                    matches[name] = match
+        return matches
+
+
+def tail(path, patterns):
+    """
+    Poll a log, following it from where the last poll for the same path and patterns stopped\n
+    :param path: path to the log file
+    :param dict patterns: name and compiled regex to look for
+    :return: dict of pattern name and the last re.Match or None
+    """
+    key = (str(path), tuple(patterns))
+    with _tails_lock:
+        log_tail = _tails.get(key)
+        if log_tail is None:
+            log_tail = _tails[key] = LogTail(path, patterns)
+            if len(_tails) > MAX_TAILS:
+                _tails.popitem(last=False)
+        else:
+            _tails.move_to_end(key)
+    return log_tail.poll()
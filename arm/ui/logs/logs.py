@@ -13,7 +13,8 @@ from flask import render_template, request, Blueprint, send_file, session
 from werkzeug.routing import ValidationError
 
 import arm.ui.utils as ui_utils
-from arm.ui import app
+from arm.ui import app, db, log_follow
+from arm.models.job import Job, JOB_STATUS_FINISHED
 import arm.config.config as cfg
 
 route_logs = Blueprint('route_logs', __name__,
@@ -74,16 +75,37 @@ def logreader():
     full_path = os.path.join(log_path, request.args.get('logfile'))
     ui_utils.validate_logfile(request.args.get('logfile'), mode, Path(full_path))
 
-    # Only ARM logs
-    if mode == "armcat":
-        generate = ui_utils.generate_arm_cat(full_path)
-    # Give everything / Tail
-    elif mode == "full":
-        generate = ui_utils.generate_full_log(full_path)
-    elif mode == "download":
+    if mode == "download":
         return send_file(full_path, as_attachment=True)
-    else:
+    # Only ARM logs / Give everything / Tail
+    if mode not in ("armcat", "full"):
         # No mode - error out
         raise ValidationError
 
-    return app.response_class(generate, mimetype='text/plain')
+    follower = log_follow.follow(full_path, arm_only=mode == "armcat",
+                                 finished=job_finished_check(request.args.get('logfile')))
+    if follower is None:
+        app.logger.warning(f"Too many logs are being followed, not following {full_path}")
+        return app.response_class("Too many logs are being followed, close some log pages and reload this one",
+                                  status=503, mimetype='text/plain')
+    return app.response_class(follower, mimetype='text/plain')
+
+
+def job_finished_check(logfile):
+    """
+    Check for the log follower, whether the job writing logfile has finished\n
+    :param str logfile: name of the log in LOGPATH
+    :return: callable returning True once the job has finished, None if no job has this log
+    """
+    job = Job.query.filter_by(logfile=logfile).order_by(Job.job_id.desc()).first()
+    if job is None or job.status in JOB_STATUS_FINISHED:
+        # nothing is writing to it, send what is there
+        return None if job is None else lambda: True
+    job_id = job.job_id
+
+    def finished():
+        # runs while the response is streamed, outside the request
+        with app.app_context():
+            job_now = db.session.get(Job, job_id)
+            return job_now is None or job_now.status in JOB_STATUS_FINISHED
+    return finished
@@ -1,16 +1,25 @@
 """Main file for interacting with omdb and tmdb"""
 import urllib
-import json
 import re
 import requests
 from flask.logging import default_handler  # noqa: F401
 
-from arm.ui import app
+from arm.ui import app, metadata_cache
 import arm.config.config as cfg
 
 TMDB_YEAR_REGEX = r"-\d{0,2}-\d{0,2}"
 
 
+def omdb_found(title_info):
+    """False if an OMDb response is an error or has no results"""
+    return 'Error' not in title_info and title_info.get('Response') != "False"
+
+
+def tmdb_found(search_results):
+    """False if a TMDb search found nothing"""
+    return search_results.get('total_results', 0) > 0
+
+
 def call_omdb_api(title=None, year=None, imdb_id=None, plot="short"):
     """
     Queries OMDbapi.org for title information and parses if it's a movie
@@ -40,13 +49,12 @@ def call_omdb_api(title=None, year=None, imdb_id=None, plot="short"):
         app.logger.debug("no params")
     # connect to omdb and add background key
     try:
-        title_info_json = urllib.request.urlopen(str_url).read()
-        title_info = json.loads(title_info_json.decode())
+        title_info = metadata_cache.get_json("omdb", str_url, title, year, imdb_id, found=omdb_found)
         title_info['background_url'] = None
         app.logger.debug(f"omdb - {title_info}")
         if 'Error' in title_info or title_info['Response'] == "False":
             title_info = None
-    except urllib.error.HTTPError as error:
+    except requests.RequestException as error:
         app.logger.error(f"omdb call failed with error - {error}")
     else:
         app.logger.debug("omdb - call was successful")
@@ -73,18 +81,18 @@ def get_omdb_poster(title=None, year=None, imdb_id=None, plot="short"):
         app.logger.debug("no params")
         return None, None
     try:
-        title_info_json = urllib.request.urlopen(requests.utils.requote_uri(str_url)).read()
+        title_info = metadata_cache.get_json("omdb", requests.utils.requote_uri(str_url), title, year, imdb_id,
+                                             found=omdb_found)
     except Exception as error:
         app.logger.debug(f"Failed to reach OMdb - {error}")
     else:
-        title_info = json.loads(title_info_json.decode())
         # app.logger.debug("omdb - " + str(title_info))
         if 'Error' not in title_info:
             return title_info['Search'][0]['Poster'], title_info['Search'][0]['imdbID']
 
         try:
-            title_info_json2 = urllib.request.urlopen(requests.utils.requote_uri(str_url_2)).read()
-            title_info2 = json.loads(title_info_json2.decode())
+            title_info2 = metadata_cache.get_json("omdb", requests.utils.requote_uri(str_url_2), title, year,
+                                                  found=omdb_found)
             # app.logger.debug("omdb - " + str(title_info2))
             if 'Error' not in title_info2:
                 return title_info2['Poster'], title_info2['imdbID']
@@ -102,7 +110,7 @@ def get_tmdb_poster(search_query=None, year=None):
     :return: dict of search results
     """
     tmdb_api_key = cfg.arm_config['TMDB_API_KEY']
-    search_results, poster_base, response = tmdb_fetch_results(search_query, year, tmdb_api_key)
+    search_results, poster_base = tmdb_fetch_results(search_query, year, tmdb_api_key)
 
     # if status_code is in search_results we know there was an error
     if 'status_code' in search_results:
@@ -116,9 +124,8 @@ def get_tmdb_poster(search_query=None, year=None):
 
     # Search tmdb for tv series
     url = f"https://api.themoviedb.org/3/search/tv?api_key={tmdb_api_key}&query={search_query}"
-    response = requests.get(url)
-    search_results = json.loads(response.text)
-    # app.logger.debug(json.dumps(response.json(), indent=4, sort_keys=True))
+    search_results = metadata_cache.get_json("tmdb", url, search_query, found=tmdb_found)
+    # app.logger.debug(json.dumps(search_results, indent=4, sort_keys=True))
     if search_results['total_results'] > 0:
         app.logger.debug(search_results['total_results'])
         return tmdb_process_poster(search_results, poster_base)
@@ -154,7 +161,7 @@ def tmdb_search(search_query=None, year=None):
     :return: json/dict of search results
     """
     tmdb_api_key = cfg.arm_config['TMDB_API_KEY']
-    search_results, poster_base, response = tmdb_fetch_results(search_query, year, tmdb_api_key)
+    search_results, poster_base = tmdb_fetch_results(search_query, year, tmdb_api_key)
     app.logger.debug(f"Search results - movie - {search_results}")
     if 'status_code' in search_results:
         app.logger.error(f"tmdb_fetch_results failed with error -  {search_results['status_message']}")
@@ -166,8 +173,7 @@ def tmdb_search(search_query=None, year=None):
     # Search for tv series
     app.logger.debug("tmdb_search - movie not found, trying tv series ")
     url = f"https://api.themoviedb.org/3/search/tv?api_key={tmdb_api_key}&query={search_query}"
-    response = requests.get(url)
-    search_results = json.loads(response.text)
+    search_results = metadata_cache.get_json("tmdb", url, search_query, found=tmdb_found)
     if search_results['total_results'] > 0:
         app.logger.debug(search_results['total_results'])
         return tmdb_process_results(poster_base, return_results, search_results, "series")
@@ -215,13 +221,11 @@ def tmdb_get_imdb(tmdb_id):
           f"append_to_response=alternative_titles,credits,images,keywords,releases,reviews,similar,videos,external_ids"
     url_tv = f"https://api.themoviedb.org/3/tv/{tmdb_id}/external_ids?api_key={tmdb_api_key}"
     # Making a get request
-    response = requests.get(url)
-    search_results = json.loads(response.text)
+    search_results = metadata_cache.get_json("tmdb", url, tmdb_id)
     # 'status_code' means id wasn't found
     if 'status_code' in search_results:
         # Try tv series
-        response = requests.get(url_tv)
-        tv_json = json.loads(response.text)
+        tv_json = metadata_cache.get_json("tmdb", url_tv, tmdb_id)
         app.logger.debug(tv_json)
         if 'status_code' not in tv_json:
             return tv_json['imdb_id']
@@ -240,8 +244,8 @@ def tmdb_find(imdb_id):
     poster_size = "original"
     poster_base = f"https://image.tmdb.org/t/p/{poster_size}"
     # Making a get request
-    response = requests.get(url)
-    search_results = json.loads(response.text)
+    search_results = metadata_cache.get_json("tmdb", url, imdb_id=imdb_id, found=lambda results: bool(
+        results.get('movie_results') or results.get('tv_results')))
     # app.logger.debug(f"tmdb_find = {search_results}")
     if len(search_results['movie_results']) > 0:
         # We want to push out everything even if we don't use it right now, it may be used later.
@@ -286,7 +290,7 @@ def tmdb_fetch_results(search_query, year, tmdb_api_key):
     :param str search_query: search query from ARMui
     :param str year: the year of the movie/tv-show
     :param str tmdb_api_key: tmdb API key
-    :return: [search_results dict, poster_img string, requests Response]
+    :return: [search_results dict, poster_img string]
     """
     # https://api.themoviedb.org/3/movie/78?api_key= # base url
     # Additional
@@ -299,6 +303,5 @@ def tmdb_fetch_results(search_query, year, tmdb_api_key):
     # "w92", "w154", "w185", "w342", "w500", "w780", "original"
     poster_size = "original"
     poster_base = f"https://image.tmdb.org/t/p/{poster_size}"
-    response = requests.get(url)
-    return_json = json.loads(response.text)
-    return return_json, poster_base, response
+    return_json = metadata_cache.get_json("tmdb", url, search_query, year, found=tmdb_found)
+    return return_json, poster_base
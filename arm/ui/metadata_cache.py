@@ -0,0 +1,207 @@
+"""
+Cache of metadata lookups (OMDb, TMDb and the ARM crc64 API)
+
+Identifying a disc tries several title/year variants one after the other, and ripping the
+same disc again or searching for a title in the ui repeats the same lookups. Successful
+responses are kept in a SQLite file next to the ARM database, shared by the ripper and the
+ui, for METADATA_CACHE_TTL hours. Lookups that found nothing are kept too, for
+METADATA_CACHE_NEGATIVE_TTL hours, so a variant that didn't match isn't asked again
+straight away. Error responses (anything but 200) are never cached.
+
+The cache holds at most METADATA_CACHE_SIZE lookups, the least recently used are removed.
+All requests go through one requests.Session so connections to each provider are reused.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import arm.config.config as cfg
+
+# Query parameters that are left out of the cache key
+SECRET_PARAMS = ("apikey", "api_key")
+# Seconds to wait for the cache file when another process is writing to it
+LOCK_TIMEOUT = 5
+# Counters kept in the stats table
+COUNTERS = ("hits", "negative_hits", "misses", "stores", "evictions")
+
+_session = None
+_session_lock = threading.Lock()
+_local = threading.local()
+
+
+def session():
+    """Shared requests.Session, keeps connections to the metadata providers open between lookups"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+
+def enabled():
+    """True if lookups should be cached"""
+    return bool(cfg.arm_config.get("METADATA_CACHE", True))
+
+
+def cache_file():
+    """SQLite file the lookups are cached in, next to the ARM database"""
+    return os.path.join(os.path.dirname(cfg.arm_config['DBFILE']), "metadata_cache.db")
+
+
+def _connection():
+    """Connection of this thread to the cache file, created with the tables on first use"""
+    path = cache_file()
+    connection = getattr(_local, "connection", None)
+    if connection is not None and _local.path == path:
+        return connection
+    connection = sqlite3.connect(path, timeout=LOCK_TIMEOUT)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.executescript("""
+        CREATE TABLE IF NOT EXISTS lookup (
+            key TEXT PRIMARY KEY,
+            provider TEXT NOT NULL,
+            query TEXT,
+            year TEXT,
+            imdb_id TEXT,
+            response TEXT NOT NULL,
+            found INTEGER NOT NULL,
+            expires REAL NOT NULL,
+            last_used REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS lookup_last_used ON lookup (last_used);
+        CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+    """)
+    _local.connection = connection
+    _local.path = path
+    return connection
+
+
+def cache_key(provider, url):
+    """
+    Key of a lookup - the provider and the url without its api key\n
+    :param str provider: e.g. "omdb"
+    :param str url: request url
+    :return: str
+    """
+    parts = urlsplit(url)
+    params = [(name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+              if name.lower() not in SECRET_PARAMS]
+    return f"{provider}:{parts.path}?{urlencode(sorted(params))}"
+
+
+def get_json(provider, url, query=None, year=None, imdb_id=None, found=lambda response: True):
+    """
+    GET url and decode its json, from the cache if it has been looked up before\n
+    :param str provider: name of the metadata provider, e.g. "omdb"
+    :param str url: request url
+    :param query: title or id looked up, stored with the lookup
+    :param year: year looked up
+    :param imdb_id: imdb id looked up
+    :param found: callable(response) False if the response means nothing was found,
+                  it is cached for METADATA_CACHE_NEGATIVE_TTL instead of METADATA_CACHE_TTL
+    :return: decoded json, of an error response too
+    :raises requests.RequestException: if the request failed, took over METADATA_TIMEOUT or isn't json
+    """
+    if not enabled():
+        return _fetch(url)[1]
+    key = cache_key(provider, url)
+    try:
+        cached = _load(key)
+    except sqlite3.Error as error:
+        logging.debug(f"Metadata cache unavailable: {error}")
+        return _fetch(url)[1]
+    if cached is not None:
+        return cached
+    success, response = _fetch(url)
+    if not success:
+        return response
+    was_found = bool(found(response))
+    hours = cfg.arm_config.get("METADATA_CACHE_TTL", 720) if was_found \
+        else cfg.arm_config.get("METADATA_CACHE_NEGATIVE_TTL", 24)
+    try:
+        _store(key, provider, query, year, imdb_id, response, was_found, float(hours) * 3600)
+    except sqlite3.Error as error:
+        logging.debug(f"Couldn't cache {key}: {error}")
+    return response
+
+
+def _fetch(url):
+    """GET url, returns whether the response is 200 and its decoded json"""
+    response = session().get(url, timeout=float(cfg.arm_config.get("METADATA_TIMEOUT", 10)))
+    return response.status_code == 200, response.json()
+
+
+def _load(key):
+    """Cached response for key, None if it isn't cached or has expired"""
+    connection = _connection()
+    now = time.time()
+    row = connection.execute("SELECT response, found FROM lookup WHERE key = ? AND expires > ?",
+                             (key, now)).fetchone()
+    with connection:
+        if row is None:
+            _count(connection, "misses")
+            return None
+        connection.execute("UPDATE lookup SET last_used = ? WHERE key = ?", (now, key))
+        _count(connection, "hits" if row[1] else "negative_hits")
+    logging.debug(f"Metadata cache hit - {key}")
+    return json.loads(row[0])
+
+
+def _store(key, provider, query, year, imdb_id, response, found, ttl):
+    """Cache a response and remove the least recently used lookups over METADATA_CACHE_SIZE"""
+    connection = _connection()
+    now = time.time()
+    max_size = int(cfg.arm_config.get("METADATA_CACHE_SIZE", 5000))
+    with connection:
+        connection.execute("INSERT OR REPLACE INTO lookup VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                           (key, provider, None if query is None else str(query),
+                            None if year is None else str(year), None if imdb_id is None else str(imdb_id),
+                            json.dumps(response), int(found), now + ttl, now))
+        _count(connection, "stores")
+        # keep the lookups that haven't expired, most recently used first
+        evicted = connection.execute("""
+            DELETE FROM lookup WHERE key IN (
+                SELECT key FROM lookup ORDER BY expires <= ?, last_used DESC LIMIT -1 OFFSET ?
+            )""", (now, max(1, max_size))).rowcount
+        if evicted > 0:
+            _count(connection, "evictions", evicted)
+
+
+def _count(connection, name, amount=1):
+    connection.execute("INSERT INTO stats VALUES (?, ?) ON CONFLICT (name) DO UPDATE SET value = value + ?",
+                       (name, amount, amount))
+
+
+def stats():
+    """
+    Lookups served by the cache since it was created\n
+    :return: dict of the counters, the number of cached lookups and the hit rate (0-1)
+    """
+    result = dict.fromkeys(COUNTERS, 0)
+    result["entries"] = 0
+    try:
+        connection = _connection()
+        result.update(connection.execute("SELECT name, value FROM stats").fetchall())
+        result["entries"] = connection.execute("SELECT COUNT(*) FROM lookup").fetchone()[0]
+    except sqlite3.Error as error:
+        logging.debug(f"Metadata cache unavailable: {error}")
+    lookups = result["hits"] + result["negative_hits"] + result["misses"]
+    result["hit_rate"] = (result["hits"] + result["negative_hits"]) / lookups if lookups else 0.0
+    return result
+
+
+def clear():
+    """Remove every cached lookup, the counters are kept"""
+    with _connection() as connection:
+        connection.execute("DELETE FROM lookup")
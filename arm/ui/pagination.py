@@ -0,0 +1,103 @@
+"""
+Keyset pagination of the job list, used by the /database and /history pages
+
+Pages are found by job_id rather than page number: the next (older) page is the jobs with
+a job_id below the last one shown, the previous (newer) page the jobs above the first one.
+Each page is one query using the job_id primary key, so it takes the same time however many
+jobs there are, where OFFSET had to step over every newer job and count them all.
+
+The total is counted again only when a job is added or removed, or after COUNT_TTL seconds.
+"""
+import threading
+import time
+
+from arm.ui import db
+from arm.models.job import Job
+
+# Seconds the total number of jobs is kept
+COUNT_TTL = 60
+
+_count_lock = threading.Lock()
+# total, highest job_id when it was counted, when to count again
+_count = {"total": 0, "max_id": None, "expires": 0.0}
+
+
+class JobPage:
+    """
+    One page of jobs, newest first, with the links pagination.html needs
+    """
+    def __init__(self, items, total, has_newer, has_older):
+        self.items = items
+        self.total = total
+        self.has_newer = has_newer
+        self.has_older = has_older
+
+    @property
+    def newer_cursor(self):
+        """job_id to pass as after= for the newer page"""
+        return self.items[0].job_id if self.items else None
+
+    @property
+    def older_cursor(self):
+        """job_id to pass as before= for the older page"""
+        return self.items[-1].job_id if self.items else None
+
+
+def job_page(query, per_page, before=None, after=None, oldest=False):
+    """
+    Page of jobs by job_id\n
+    :param query: Job query, with the loader options the page needs
+    :param int per_page: jobs on a page
+    :param int before: show the jobs older than this job_id
+    :param int after: show the jobs newer than this job_id
+    :param bool oldest: show the oldest jobs
+    :return: JobPage
+    """
+    per_page = max(1, per_page)
+    if after is not None or oldest:
+        # walk up from after (or the first job), then show them newest first
+        newer = query.filter(Job.job_id > after) if after is not None else query
+        jobs = newer.order_by(Job.job_id.asc()).limit(per_page + 1).all()
+        has_newer = len(jobs) > per_page
+        if not has_newer and not oldest:
+            # reached the newest jobs, show a full first page
+            return job_page(query, per_page)
+        jobs = jobs[:per_page][::-1]
+        has_older = not oldest
+    else:
+        older = query.filter(Job.job_id < before) if before is not None else query
+        jobs = older.order_by(Job.job_id.desc()).limit(per_page + 1).all()
+        has_older = len(jobs) > per_page
+        if before is not None and len(jobs) < per_page:
+            # reached the oldest jobs, show a full last page
+            return job_page(query, per_page, oldest=True)
+        jobs = jobs[:per_page]
+        has_newer = before is not None
+    return JobPage(jobs, job_count(), has_newer, has_older)
+
+
+def empty_page():
+    """Page with no jobs, when there is no database"""
+    return JobPage([], 0, False, False)
+
+
+def job_count():
+    """
+    Number of jobs, counted again when a job has been added or COUNT_TTL has passed\n
+    :return: int
+    """
+    # max of the primary key is a single index lookup
+    max_id = db.session.query(db.func.max(Job.job_id)).scalar()
+    with _count_lock:
+        if _count["max_id"] == max_id and time.monotonic() < _count["expires"]:
+            return _count["total"]
+    total = db.session.query(db.func.count(Job.job_id)).scalar()
+    with _count_lock:
+        _count.update(total=total, max_id=max_id, expires=time.monotonic() + COUNT_TTL)
+    return total
+
+
+def forget_job_count():
+    """Count the jobs again on the next page, after jobs were deleted"""
+    with _count_lock:
+        _count["expires"] = 0.0
@@ -14,6 +14,7 @@ import re
 import pyudev
 
 from arm.models import SystemDrives
+from arm.ripper import db_writer
 from arm.ui import app, db
 
 
@@ -367,13 +368,13 @@ def update_drive_job(job):
         logging.warning(f"No drive found in database for {job.devpath}. "
                         "Job will continue but drive association may fail.")
         return
-    drive.new_job(job.job_id)
-    app.logger.debug(f"Updating Drive: ['{drive.serial_id}'|'{drive.mount}']"
-                     f" Current Job: [{drive.job_id_current}]"
-                     f" Previous Job: [{drive.job_id_previous}]")
     try:
-        db.session.commit()
-        logging.debug("Database update with new Job ID to associated drive")
+        # inside the ripper's db_writer.batch() it is committed with the job's config
+        if db_writer.commit(lambda: drive.new_job(job.job_id)):
+            logging.debug("Database update with new Job ID to associated drive")
+        app.logger.debug(f"Updating Drive: ['{drive.serial_id}'|'{drive.mount}']"
+                         f" Current Job: [{drive.job_id_current}]"
+                         f" Previous Job: [{drive.job_id_previous}]")
     except Exception as error:  # noqa: E722
         logging.error(f"Failed to update the database with the associated drive. {error}")
 
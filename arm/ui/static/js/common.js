@@ -122,6 +122,10 @@ function buildMiddleSection(job) {
     x += `<div id="jobId${job.job_id}_devpath"><strong>Device: </strong>${job.devpath}</div>`;
     x += `<div><strong>Status: </strong><img id="jobId${job.job_id}_status" 
                                src="static/img/${job.status}.png" height="20px" alt="${job.status}" title="${job.status}"></div>`;
+    x += `<div id="jobId${job.job_id}_queue"${job.queue_position === undefined ? " style=\"display: none;\"" : ""}>
+                               <strong>Queue: </strong>${job.queue_position}</div>`;
+    x += `<div id="jobId${job.job_id}_tracks_found"${job.tracks_found === undefined ? " style=\"display: none;\"" : ""}>
+                               <strong>Titles found: </strong>${job.tracks_found}</div>`;
     x += `<div id="jobId${job.job_id}_progress_section">${transcodingCheck(job)}</div></div></div>`;
     return x;
 }
@@ -13,7 +13,6 @@ var activeJobs = [];
 
 $(document).ready(function () {
     pushChildServers();
-    refreshJobs();
     activeTab("home");
 
     $("#save-yes").bind("click", function () {
@@ -185,6 +184,20 @@ function updateJobItem(oldJob, job) {
     updateContents($(`#jobId${job.job_id}_year`), job, "Year", job.year);
     updateContents($(`#jobId${job.job_id}_devpath`), job, "Device", job.devpath);
     updateContents($(`#jobId${job.job_id}_video_type`), job, "Type", job.video_type);
+    const queueDiv = $(`#jobId${job.job_id}_queue`);
+    if (job.queue_position === undefined) {
+        queueDiv.hide();
+    } else {
+        queueDiv.show();
+        updateContents(queueDiv, job, "Queue", job.queue_position);
+    }
+    const tracksFoundDiv = $(`#jobId${job.job_id}_tracks_found`);
+    if (job.tracks_found === undefined) {
+        tracksFoundDiv.hide();
+    } else {
+        tracksFoundDiv.show();
+        updateContents(tracksFoundDiv, job, "Titles found", job.tracks_found);
+    }
     updateProgress(job, oldJob);
     updateContents($(`#jobId${job.job_id}_RIPMETHOD`), job, "Rip Method", job.config.RIPMETHOD);
     updateContents($(`#jobId${job.job_id}_MAINFEATURE`), job, "Main Feature", job.config.MAINFEATURE);
@@ -238,6 +251,10 @@ function refreshJobsComplete() {
 function checkActiveJobs(data, serverIndex) {
     // Loop through each active job
     $.each(activeJobs, function (AJIndex) {
+        // Jobs from other servers aren't in this data
+        if (!activeJobs[AJIndex].job_id.startsWith(`${serverIndex}_`)) {
+            return;
+        }
         // Turn off job active and re-enable it later if we find it
         activeJobs[AJIndex].active = false;
         // Loop through each result and search for our active job
@@ -297,28 +314,117 @@ function checkNotifications(data) {
 }
 
 /**
- * Function set as an interval to update all jobs from api
+ * Fetch the full joblist from one server
+ * Used for servers that don't have the job stream
+ * @param serverIndex current server index count (added to the front of job id's)
+ * @param serverUrl the url of the server
  */
-function refreshJobs() {
-    let serverCount = activeServers.length;
-    $.each(activeServers, function (serverIndex, serverUrl) {
-        $.ajax({
-            url: serverUrl + "/json?mode=joblist",
-            type: "get",
-            timeout: 2000,
-            error: function () {
-                --serverCount;
-            },
-            success: function (data) {
-                serverCount = refreshJobsSuccess(data, serverIndex, serverUrl, serverCount);
-            },
-            complete: function (data) {
-                refreshJobsComplete();
-                if(typeof data !== 'undefined' && data.responseJSON) {
-                    checkNotifications(data.responseJSON);
-                }
+function refreshServerJobs(serverIndex, serverUrl) {
+    $.ajax({
+        url: serverUrl + "/json?mode=joblist",
+        type: "get",
+        timeout: 2000,
+        success: function (data) {
+            refreshJobsSuccess(data, serverIndex, serverUrl, 1);
+        },
+        complete: function (data) {
+            refreshJobsComplete();
+            if(typeof data !== 'undefined' && data.responseJSON) {
+                checkNotifications(data.responseJSON);
+            }
+        }
+    });
+}
+
+/**
+ * Apply the changes sent by the job stream to the job cards
+ * @param data returned data from the job stream
+ * @param serverIndex current server index count (added to the front of job id's)
+ * @param serverUrl the url of the server the job is running on
+ */
+function applyJobChanges(data, serverIndex, serverUrl) {
+    const prefix = `${serverIndex}_`;
+    let removed = $.map(data.removed, jobId => prefix + jobId);
+    if (data.reset) {
+        // The whole joblist was sent, anything else from this server has finished
+        removed = removed.concat($.map(activeJobs, job =>
+            job.job_id.startsWith(prefix) && !(job.job_id.substring(prefix.length) in data.changed) ? job.job_id : null));
+    }
+    $.each(removed, function (_index, jobId) {
+        const oldJob = activeJobs.find(e => e.job_id === jobId);
+        if (oldJob) {
+            removeJobItem(oldJob);
+            activeJobs.splice(activeJobs.indexOf(oldJob), 1);
+        }
+    });
+    $.each(data.changed, function (jobId, fields) {
+        const oldJob = activeJobs.find(e => e.job_id === prefix + jobId);
+        const job = Object.assign({}, oldJob, fields);
+        // Fields set to null are ones the job no longer has
+        $.each(fields, function (key, value) {
+            if (value === null) {
+                delete job[key];
             }
         });
+        job.job_id = prefix + jobId;
+        job.ripper = (data.arm_name ? data.arm_name : "");
+        job.server_url = serverUrl;
+        job.active = true;
+        if (oldJob) {
+            activeJobs[activeJobs.indexOf(oldJob)] = job;
+            updateJobItem(oldJob, job);
+        } else {
+            activeJobs.push(job);
+            $("#joblist").append(addJobItem(job, data.authenticated));
+        }
+    });
+}
+
+/**
+ * Follow the job stream of one server, each answer carries only what changed
+ * The server holds the request until something changes, so after a change the next request is sent straight away.
+ * An answer without a change (the wait timed out, or the server had too many requests waiting) is followed
+ * by a pause of retryInterval, or the retry_after the server asked for if longer
+ * @param serverIndex current server index count (added to the front of job id's)
+ * @param serverUrl the url of the server
+ * @param version last version received, 0 for the whole joblist
+ * @param retryInterval milliseconds to wait after an error or an answer without a change
+ */
+function streamJobs(serverIndex, serverUrl, version, retryInterval) {
+    $.ajax({
+        url: `${serverUrl}/jobstream?since=${version}`,
+        type: "get",
+        timeout: 35000,
+        success: function (data) {
+            applyJobChanges(data, serverIndex, serverUrl);
+            refreshJobsComplete();
+            checkNotifications(data);
+            if (data.version === version) {
+                const delay = Math.max(retryInterval, (data.retry_after || 0) * 1000);
+                window.setTimeout(streamJobs, delay, serverIndex, serverUrl, data.version, retryInterval);
+            } else {
+                streamJobs(serverIndex, serverUrl, data.version, retryInterval);
+            }
+        },
+        error: function (xhr) {
+            if (xhr.status === 404) {
+                // Older servers only have the joblist, poll it
+                refreshServerJobs(serverIndex, serverUrl);
+                window.setInterval(refreshServerJobs, retryInterval, serverIndex, serverUrl);
+                return;
+            }
+            window.setTimeout(streamJobs, retryInterval, serverIndex, serverUrl, 0, retryInterval);
+        }
+    });
+}
+
+/**
+ * Start following the jobs of every server
+ * @param retryInterval milliseconds to wait after an error, or between polls of servers without the job stream
+ */
+function startJobStreams(retryInterval) {
+    $.each(activeServers, function (serverIndex, serverUrl) {
+        streamJobs(serverIndex, serverUrl, 0, retryInterval);
     });
 }
 
@@ -11,7 +11,7 @@ import re
 from datetime import datetime
 from pathlib import Path
 from sqlalchemy.exc import SQLAlchemyError
-from time import strftime, localtime, time, sleep
+from time import strftime, localtime, time
 
 import bcrypt
 import requests
@@ -27,6 +27,7 @@ from arm.models.job import Job
 from arm.models.system_info import SystemInfo
 from arm.models.ui_settings import UISettings
 from arm.models.user import User
+from arm.ripper import db_writer, permissions
 from arm.ui import app, db
 from arm.ui.metadata import tmdb_search, get_tmdb_poster, tmdb_find, call_omdb_api
 from arm.ui.settings import DriveUtils
@@ -45,24 +46,11 @@ def database_updater(args, job, wait_time=90):
     :param wait_time: The time to wait in seconds
     :returns : Boolean
     """
-    # Loop through our args and try to set any of our job variables
     for (key, value) in args.items():
-        setattr(job, key, value)
         app.logger.debug(f"Setting {key}: {value}")
-    for i in range(wait_time):  # give up after the users wait period in seconds
-        try:
-            db.session.commit()
-        except Exception as error:
-            if "locked" in str(error):
-                sleep(1)
-                app.logger.debug(f"database is locked - trying in 1 second {i}/{wait_time} - {error}")
-            else:
-                app.logger.debug("Error: " + str(error))
-                db.session.rollback()
-                raise RuntimeError(str(error)) from error
-
-    app.logger.debug("successfully written to the database")
-    return True
+    if success := db_writer.update(job, args, max_wait=wait_time):
+        app.logger.debug("successfully written to the database")
+    return success
 
 
 def check_db_version(install_path, db_file):
@@ -360,43 +348,6 @@ def generate_comments():
     return comments
 
 
-def generate_full_log(full_path):
-    """
-    Gets/tails all lines from log file
-    :param full_path: full path to job logfile
-    :return: None
-    """
-    try:
-        with open(full_path) as read_log_file:
-            while True:
-                yield read_log_file.read()
-                sleep(1)
-    except IOError:
-        try:
-            with open(full_path, encoding="utf8", errors='ignore') as read_log_file:
-                while True:
-                    yield read_log_file.read()
-                    sleep(1)
-        except FileNotFoundError as error:
-            raise FileNotFoundError("Not found with utf8 encoding") from error
-
-
-def generate_arm_cat(full_path):
-    """
-    Read from log file and only output ARM: logs
-    :param full_path: full path to job logfile
-    :return: None
-    """
-    read_log_file = open(full_path)
-    while True:
-        new = read_log_file.readline()
-        if new:
-            if "ARM:" in new:
-                yield new
-            else:
-                sleep(1)
-
-
 def setup_database():
     """
     Try to get the db.User if not we nuke everything
@@ -519,12 +470,6 @@ def fix_permissions(j_id):
     ARM can sometimes have issues with changing the file owner, we can use the fact ARMui is run
     as a service to fix permissions.
     """
-
-    # Use set_media_owner to keep complexity low
-    def set_media_owner(dirpath, cur_dir, uid, gid):
-        if job.config.SET_MEDIA_OWNER:
-            os.chown(os.path.join(dirpath, cur_dir), uid, gid)
-
     # Validate job is valid
     job_id_validator(j_id)
     job = Job.query.get(j_id)
@@ -542,32 +487,24 @@ def fix_permissions(j_id):
         directory_to_traverse = job.path
     # Build return json dict
     return_json = {"success": False, "mode": "fixperms", "folder": str(directory_to_traverse), "path": str(job.path)}
-    # Set defaults as fail-safe
-    uid = 1000
-    gid = 1000
+    # Leave the owner alone unless set media owner is on, 1000 is the fail-safe default
+    uid = gid = -1
     try:
         corrected_chmod_value = int(str(job.config.CHMOD_VALUE), 8)
         app.logger.info(f"Setting permissions to: {job.config.CHMOD_VALUE} on: {directory_to_traverse}")
-        os.chmod(directory_to_traverse, corrected_chmod_value)
         # If set media owner in arm.yaml was true set them as users
-        if job.config.SET_MEDIA_OWNER and job.config.CHOWN_USER and job.config.CHOWN_GROUP:
-            import pwd
-            import grp
-            uid = pwd.getpwnam(job.config.CHOWN_USER).pw_uid
-            gid = grp.getgrnam(job.config.CHOWN_GROUP).gr_gid
-            os.chown(directory_to_traverse, uid, gid)
-        # walk through each folder and file in the final directory
-        for dirpath, l_directories, l_files in os.walk(directory_to_traverse):
-            # Set permissions on each directory
-            for cur_dir in l_directories:
-                app.logger.debug(f"Setting path: {cur_dir} to permissions value: {job.config.CHMOD_VALUE}")
-                os.chmod(os.path.join(dirpath, cur_dir), corrected_chmod_value)
-                set_media_owner(dirpath, cur_dir, uid, gid)
-            # Set permissions on each file
-            for cur_file in l_files:
-                app.logger.debug(f"Setting file: {cur_file} to permissions value: {job.config.CHMOD_VALUE}")
-                os.chmod(os.path.join(dirpath, cur_file), corrected_chmod_value)
-                set_media_owner(dirpath, cur_file, uid, gid)
+        if job.config.SET_MEDIA_OWNER:
+            uid = gid = 1000
+            if job.config.CHOWN_USER and job.config.CHOWN_GROUP:
+                import pwd
+                import grp
+                uid = pwd.getpwnam(job.config.CHOWN_USER).pw_uid
+                gid = grp.getgrnam(job.config.CHOWN_GROUP).gr_gid
+        counts = permissions.fix_tree(directory_to_traverse, corrected_chmod_value, uid, gid)
+        app.logger.info(f"Permissions set on {directory_to_traverse}: {counts}")
+        return_json.update({"checked": counts.checked, "changed": counts.changed, "failed": counts.failed})
+        if counts.failed:
+            raise OSError(counts.error)
         return_json["success"] = True
     except Exception as error:
         app.logger.error(f"Permissions setting failed as: {error}")
@@ -33,4 +33,8 @@ else
 	  echo "$(date) [ARM] Starting ARM for unknown disc type on ${DEVNAME}" >> $ARMLOG
 fi
 cd /home/arm
-python3 /opt/arm/arm/ripper/main.py -d "${DEVNAME}" | logger -t ARM -s
+# Hand the disc to the ARM ripper daemon if it is running, otherwise run a standalone ripper
+if ! python3 /opt/arm/arm/ripper/daemon.py --submit "${DEVNAME}" >> $ARMLOG 2>&1; then
+    echo "$(date) [ARM] Ripper daemon not running; starting a standalone ripper for ${DEVNAME}" >> $ARMLOG
+    python3 /opt/arm/arm/ripper/main.py -d "${DEVNAME}" | logger -t ARM -s
+fi
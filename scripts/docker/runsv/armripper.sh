@@ -0,0 +1,4 @@
+#!/bin/bash
+
+echo "Starting ripper daemon"
+exec /sbin/setuser arm /bin/python3 /opt/arm/arm/ripper/daemon.py
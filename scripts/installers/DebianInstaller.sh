@@ -964,6 +964,10 @@ function CreateAndStartService() {
   systemctl daemon-reload
   systemctl enable armui
   systemctl start armui
+  cp /opt/arm/setup/armripper.service /lib/systemd/system/armripper.service
+  systemctl daemon-reload
+  systemctl enable armripper
+  systemctl start armripper
 }
 
 function LaunchSetup() {
@@ -29,7 +29,14 @@ else
 
 fi
 
-/bin/su -l -c "echo /opt/arm/venv/bin/python3 /opt/arm/arm/ripper/main.py -d ${DEVNAME} | at now" -s /bin/bash ${USER}
+#######################################################################################
+# Hand the disc to the ARM ripper daemon if it is running, otherwise start a standalone ripper
+#######################################################################################
+
+if ! /opt/arm/venv/bin/python3 /opt/arm/arm/ripper/daemon.py --submit "${DEVNAME}" 2>&1 | logger -t ARM -s; then
+	echo "[ARM] Ripper daemon not running; starting a standalone ripper for ${DEVNAME}" | logger -t ARM -s
+	/bin/su -l -c "echo /opt/arm/venv/bin/python3 /opt/arm/arm/ripper/main.py -d ${DEVNAME} | at now" -s /bin/bash ${USER}
+fi
 
 #######################################################################################
 # Check to see if the admin page is running, if not, start it
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Benchmark - SQLite contention between ripper writers and UI readers
+
+Starts --writers ripper-like processes that each update their job row --updates times
+(utils.database_updater) and register a disc scan of tracks (utils.TrackBatch), while
+--readers threads keep polling the joblist the same way the UI's /json endpoint does.
+Each run uses a throwaway database and is done once with SQLITE_WAL on and once off,
+in separate processes so the engine is set up from scratch for each mode.
+
+Reports the time each write took (including retries on a locked database), the time
+db_writer spent backing off, and joblist read latency as percentiles.
+
+Usage:
+    python3 test/benchmark/benchmark_db_contention.py --writers 4 --readers 8 --updates 200
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import yaml
+
+INSTALLPATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+
+def percentiles(samples):
+    """p50/p95/p99/max of a list of seconds, in milliseconds"""
+    samples = sorted(samples)
+    if not samples:
+        return {"p50": 0, "p95": 0, "p99": 0, "max": 0}
+    pick = lambda fraction: samples[min(len(samples) - 1, int(len(samples) * fraction))] * 1000  # noqa: E731
+    return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99), "max": samples[-1] * 1000}
+
+
+def write_config(root, wal):
+    """Write an arm.yaml pointing the database and logs at root"""
+    config_file = os.path.join(root, "arm.yaml")
+    logpath = os.path.join(root, "logs")
+    os.makedirs(os.path.join(logpath, "progress"))
+    with open(config_file, "w") as config:
+        yaml.safe_dump({
+            "INSTALLPATH": INSTALLPATH + "/",
+            "DBFILE": os.path.join(root, "arm.db"),
+            "LOGPATH": logpath + "/",
+            "ABCDE_CONFIG_FILE": os.path.join(INSTALLPATH, "setup", ".abcde.conf"),
+            "APPRISE": "",
+            "LOGLEVEL": "WARNING",
+            "SQLITE_WAL": wal,
+        }, config)
+    return config_file
+
+
+def writer(job_id, args, start, results):
+    """One ripper - lots of small job updates and one bulk track registration"""
+    sys.path.insert(0, INSTALLPATH)
+    from arm.ui import app, db
+    from arm.models.job import Job
+    from arm.ripper import utils, db_writer
+
+    latencies = []
+    with app.app_context():
+        job = db.session.get(Job, job_id)
+        # don't count the arm import, start all the writers together
+        start.wait()
+        for update in range(args.updates):
+            started = time.perf_counter()
+            utils.database_updater({"no_of_titles": update, "errors": f"update {update}"}, job)
+            latencies.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        with utils.TrackBatch(job) as batch:
+            for track in range(args.tracks):
+                batch.add(track, 3600, "16:9", 23.976, False, "MakeMKV", f"title_t{track:02d}.mkv")
+        latencies.append(time.perf_counter() - started)
+    results.put((latencies, db_writer.metrics()))
+
+
+def reader(app, interval, stop, latencies, errors):
+    """One UI thread - keep reading the joblist until told to stop"""
+    from sqlalchemy.exc import OperationalError
+    from arm.ui import db, json_api
+
+    while not stop.is_set():
+        with app.test_request_context("/json?mode=joblist"):
+            started = time.perf_counter()
+            try:
+                json_api.get_x_jobs("joblist")
+                latencies.append(time.perf_counter() - started)
+            except OperationalError:
+                # the UI would return an error page for this poll
+                errors.append(time.perf_counter() - started)
+                db.session.rollback()
+            db.session.remove()
+        stop.wait(interval)
+
+
+def run_mode(args):
+    """Run one benchmark in this process, the database settings are fixed at import time"""
+    import multiprocessing
+
+    with tempfile.TemporaryDirectory() as root:
+        os.environ["ARM_CONFIG_FILE"] = write_config(root, args.wal)
+        sys.path.insert(0, INSTALLPATH)
+        import arm.config.config as cfg
+        from arm.ui import app, db
+        from arm.models.config import Config
+        from arm.models.job import Job
+
+        with app.app_context():
+            db.create_all()
+            journal_mode = db.session.execute(db.text("PRAGMA journal_mode")).scalar()
+            for job_id in range(1, args.writers + 1):
+                db.session.execute(Job.__table__.insert().values(
+                    job_id=job_id, devpath=f"/dev/sr{job_id}", status="active", stage=str(job_id),
+                    logfile=f"benchmark_{job_id}.log", disctype="bluray", title=f"Benchmark {job_id}"))
+                db.session.add(Config(cfg.arm_config, job_id=job_id))
+            db.session.commit()
+            db.session.remove()
+
+        # separate interpreters, like ripper processes started by udev
+        context = multiprocessing.get_context("spawn")
+        results = context.Queue()
+        start = context.Barrier(args.writers + 1)
+        stop = threading.Event()
+        read_latencies = []
+        read_errors = []
+        readers = [threading.Thread(target=reader, args=(app, args.interval, stop, read_latencies, read_errors))
+                   for _ in range(args.readers)]
+        writers = [context.Process(target=writer, args=(job_id, args, start, results))
+                   for job_id in range(1, args.writers + 1)]
+        for process in writers:
+            process.start()
+        start.wait(timeout=args.timeout)
+        started = time.perf_counter()
+        for thread in readers:
+            thread.start()
+        write_results = [results.get(timeout=args.timeout) for _ in writers]
+        wall = time.perf_counter() - started
+        for process in writers:
+            process.join()
+        stop.set()
+        for thread in readers:
+            thread.join()
+
+    write_latencies = [latency for latencies, _ in write_results for latency in latencies]
+    totals = {key: sum(stats[key] for _, stats in write_results) for key in write_results[0][1]}
+    print(json.dumps({
+        "journal_mode": journal_mode,
+        "wall": wall,
+        "write": percentiles(write_latencies),
+        "read": percentiles(read_latencies),
+        "reads": len(read_latencies),
+        "read_errors": len(read_errors),
+        "retries": totals["retries"],
+        "failures": totals["failures"],
+        "lock_wait": totals["lock_wait"],
+    }))
+
+
+def report(result):
+    """Print one line per mode"""
+    write, read = result["write"], result["read"]
+    print(f"{result['journal_mode']:<7} wall {result['wall']:6.2f}s  "
+          f"write p50 {write['p50']:7.1f}ms p95 {write['p95']:7.1f}ms p99 {write['p99']:7.1f}ms "
+          f"max {write['max']:7.1f}ms  locked retries {result['retries']:4d} ({result['lock_wait']:5.2f}s) "
+          f"failed {result['failures']}  |  "
+          f"{result['reads']:5d} reads ({result['read_errors']} locked) "
+          f"p50 {read['p50']:6.1f}ms p95 {read['p95']:6.1f}ms p99 {read['p99']:6.1f}ms max {read['max']:7.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark SQLite contention with and without WAL')
+    parser.add_argument('--writers', type=int, default=4, help='Number of ripper processes writing')
+    parser.add_argument('--readers', type=int, default=8, help='Number of UI threads reading the joblist')
+    parser.add_argument('--updates', type=int, default=200, help='Job updates made by each writer')
+    parser.add_argument('--tracks', type=int, default=50, help='Tracks registered by each writer')
+    parser.add_argument('--interval', type=float, default=0.05, help='Seconds between joblist polls per reader')
+    parser.add_argument('--timeout', type=float, default=600, help='Seconds to wait for each writer')
+    parser.add_argument('--wal', type=lambda value: value.lower() == "true", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.wal is not None:
+        run_mode(args)
+        return
+
+    print(f"{args.writers} writers x {args.updates} updates + {args.tracks} tracks, {args.readers} joblist readers")
+    for wal in (False, True):
+        output = subprocess.run([sys.executable, __file__, "--wal", str(wal), "--writers", str(args.writers),
+                                 "--readers", str(args.readers), "--updates", str(args.updates),
+                                 "--tracks", str(args.tracks), "--interval", str(args.interval),
+                                 "--timeout", str(args.timeout)],
+                                check=True, stdout=subprocess.PIPE, text=True).stdout
+        report(json.loads(output.strip().splitlines()[-1]))
+
+
+if __name__ == "__main__":
+    main()
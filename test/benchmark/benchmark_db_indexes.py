@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Benchmark - job history lookups with and without the query indexes
+
+Seeds a throwaway database with --jobs finished jobs (plus a few active ones), --tracks
+tracks per job, a config per job and some notifications and drives, then times the
+queries of the call sites that look them up. Each query is run --repeat times without
+the indexes of migration a3f9c2d17b64 (and with the NOT IN form of the active jobs filter
+that was used before Job.unfinished), then again with them.
+
+Reports the median latency of each call site before and after, and the SQLite query plan
+(SCAN is a full table scan, SEARCH uses an index).
+
+Usage:
+    python3 test/benchmark/benchmark_db_indexes.py --jobs 50000 --tracks 10 --repeat 20
+"""
+import argparse
+import importlib.util
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+import yaml
+
+INSTALLPATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+MIGRATION = os.path.join(INSTALLPATH, "arm", "migrations", "versions", "a3f9c2d17b64_add_query_indexes.py")
+DRIVES = ["/dev/sr0", "/dev/sr1", "/dev/sr2", "/dev/sr3"]
+BATCH = 10000
+
+
+def write_config(root):
+    """Write an arm.yaml pointing the database and logs at root"""
+    config_file = os.path.join(root, "arm.yaml")
+    logpath = os.path.join(root, "logs")
+    os.makedirs(os.path.join(logpath, "progress"))
+    with open(config_file, "w") as config:
+        yaml.safe_dump({
+            "INSTALLPATH": INSTALLPATH + "/",
+            "DBFILE": os.path.join(root, "arm.db"),
+            "LOGPATH": logpath + "/",
+            "ABCDE_CONFIG_FILE": os.path.join(INSTALLPATH, "setup", ".abcde.conf"),
+            "APPRISE": "",
+            "LOGLEVEL": "WARNING",
+        }, config)
+    return config_file
+
+
+def load_indexes():
+    """(name, table, columns) of the indexes the migration adds"""
+    spec = importlib.util.spec_from_file_location("add_query_indexes", MIGRATION)
+    migration = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(migration)
+    return migration.INDEXES
+
+
+def insert(db, table, rows):
+    """Insert rows in batches"""
+    for start in range(0, len(rows), BATCH):
+        db.session.execute(table.insert(), rows[start:start + BATCH])
+    db.session.commit()
+
+
+def seed(db, args):
+    """Fill the database with years worth of job history"""
+    from arm.models.config import Config
+    from arm.models.job import Job
+    from arm.models.notifications import Notifications
+    from arm.models.system_drives import SystemDrives
+    from arm.models.track import Track
+
+    rng = random.Random(42)
+    jobs = []
+    for job_id in range(1, args.jobs + 1):
+        # the last few jobs are still running
+        status = rng.choice(["success", "success", "success", "fail"]) if job_id <= args.jobs - 4 else "transcoding"
+        jobs.append({"job_id": job_id, "status": status, "devpath": DRIVES[job_id % len(DRIVES)],
+                     "label": f"DISC_{job_id % (args.jobs // 2 or 1)}", "crc_id": f"{rng.getrandbits(64):016x}",
+                     "hasnicetitle": True, "title": f"Title {job_id}", "disctype": "bluray", "stage": str(job_id)})
+    insert(db, Job.__table__, jobs)
+    insert(db, Config.__table__, [{"job_id": job["job_id"]} for job in jobs])
+    insert(db, Track.__table__, [
+        {"job_id": job["job_id"], "track_number": str(track), "length": 600 + track, "main_feature": track == 0,
+         "filename": f"title_t{track:02d}.mkv", "basename": f"title_t{track:02d}.mkv", "ripped": True}
+        for job in jobs for track in range(args.tracks)
+    ])
+    insert(db, Notifications.__table__, [
+        {"seen": number >= 10, "cleared": number >= 10, "title": "ARM notification", "message": f"Job {number}"}
+        for number in range(args.jobs // 10)
+    ])
+    insert(db, SystemDrives.__table__, [
+        {"mount": mount, "serial_id": f"Benchmark Drive {number}", "name": f"Drive {number}", "description": "",
+         "stale": False}
+        for number, mount in enumerate(DRIVES)
+    ])
+    return jobs
+
+
+def call_sites(db, jobs):
+    """(call site, query before, query after) - the same query unless the filter was rewritten"""
+    from arm.models.config import Config
+    from arm.models.job import Job
+    from arm.models.notifications import Notifications
+    from arm.models.system_drives import SystemDrives
+    from arm.models.track import Track
+
+    select = db.select
+    job = jobs[len(jobs) // 2]
+    active_before = select(Job).where(Job.status.notin_(["fail", "success"]))
+    duplicate_before = select(Job).where(~Job.finished, Job.devpath == job["devpath"])
+    sites = [
+        ("home page / joblist / clean_old_jobs", active_before, select(Job).where(Job.unfinished)),
+        ("duplicate_run_check", duplicate_before, select(Job).where(Job.unfinished, Job.devpath == job["devpath"])),
+        ("job_dupe_check", select(Job).filter_by(label=job["label"], status="success"), None),
+        ("search by crc", select(Job).filter_by(crc_id=job["crc_id"], status="success", hasnicetitle=True), None),
+        ("handbrake/ffmpeg track by filename",
+         select(Track).where(Track.job_id == job["job_id"], Track.filename == "title_t03.mkv"), None),
+        ("main feature track", select(Track).where(Track.job_id == job["job_id"], Track.main_feature.is_(True)),
+         None),
+        ("move_files_post ripped tracks", select(Track).where(Track.job_id == job["job_id"], Track.ripped.is_(True)),
+         None),
+        ("job.config", select(Config).filter_by(job_id=job["job_id"]), None),
+        ("unseen notifications", select(Notifications).filter_by(seen=False), None),
+        ("notification count", select(db.func.count()).select_from(Notifications).filter_by(cleared=False), None),
+        ("drive by mount", select(SystemDrives).filter_by(mount="/dev/sr1"), None),
+        ("drive by serial", select(SystemDrives).filter_by(serial_id="Benchmark Drive 1"), None),
+    ]
+    return [(name, before, before if after is None else after) for name, before, after in sites]
+
+
+def time_query(db, statement, repeat):
+    """Median seconds to run statement and fetch every row"""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        db.session.execute(statement).all()
+        samples.append(time.perf_counter() - started)
+        db.session.expunge_all()
+    return statistics.median(samples)
+
+
+def query_plan(db, statement):
+    """SQLite query plan of statement, steps separated by ;"""
+    compiled = statement.compile(db.engine, compile_kwargs={"literal_binds": True})
+    plan = db.session.execute(db.text(f"EXPLAIN QUERY PLAN {compiled}")).all()
+    return "; ".join(row[-1] for row in plan)
+
+
+def set_indexes(db, indexes, present):
+    """Create or drop the migration's indexes"""
+    for name, table, columns in indexes:
+        if present:
+            db.session.execute(db.text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})"))
+        else:
+            db.session.execute(db.text(f"DROP INDEX IF EXISTS {name}"))
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the job history lookups with and without indexes')
+    parser.add_argument('--jobs', type=int, default=50000, help='Number of jobs in the history')
+    parser.add_argument('--tracks', type=int, default=10, help='Tracks per job')
+    parser.add_argument('--repeat', type=int, default=20, help='Times each query is run')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        os.environ["ARM_CONFIG_FILE"] = write_config(root)
+        sys.path.insert(0, INSTALLPATH)
+        from arm.ui import app, db
+
+        indexes = load_indexes()
+        with app.app_context():
+            db.create_all()
+            started = time.perf_counter()
+            jobs = seed(db, args)
+            print(f"Seeded {args.jobs} jobs, {args.jobs * args.tracks} tracks in {time.perf_counter() - started:.1f}s")
+            sites = call_sites(db, jobs)
+
+            results = {}
+            for present in (False, True):
+                set_indexes(db, indexes, present)
+                for name, before, after in sites:
+                    statement = after if present else before
+                    results.setdefault(name, []).append((time_query(db, statement, args.repeat),
+                                                         query_plan(db, statement)))
+
+        print(f"{'call site':<38} {'before':>10} {'after':>10} {'speedup':>8}")
+        for name, ((before, plan_before), (after, plan_after)) in results.items():
+            print(f"{name:<38} {before * 1000:8.2f}ms {after * 1000:8.2f}ms {before / max(after, 1e-9):7.0f}x")
+            print(f"    before: {plan_before}")
+            print(f"    after:  {plan_after}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Benchmark - FFmpeg split encode vs a single ffmpeg process
+
+Generates a synthetic clip of --length seconds (testsrc2 video with chapters every --chapter
+seconds and a sine tone), then transcodes it with ffmpeg.run_transcode_cmd once as one ffmpeg
+process and once with FFMPEG_SPLIT_ENCODE, --workers segments at a time. Reports the wall
+time of each, and checks the joined file has the frame count, audio length and chapters of the
+single encode.
+
+Needs ffmpeg and ffprobe on the PATH.
+
+Usage:
+    python3 test/benchmark/benchmark_ffmpeg_split.py --length 600 --workers 4
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+import yaml
+
+INSTALLPATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+
+def write_config(root, args):
+    """Write an arm.yaml pointing the logs at root"""
+    config_file = os.path.join(root, "arm.yaml")
+    logpath = os.path.join(root, "logs")
+    os.makedirs(os.path.join(logpath, "progress"))
+    with open(config_file, "w") as config:
+        yaml.safe_dump({
+            "INSTALLPATH": INSTALLPATH + "/",
+            "DBFILE": os.path.join(root, "arm.db"),
+            "LOGPATH": logpath + "/",
+            "ABCDE_CONFIG_FILE": os.path.join(INSTALLPATH, "setup", ".abcde.conf"),
+            "APPRISE": "",
+            "LOGLEVEL": "WARNING",
+            "FFMPEG_CLI": "ffmpeg",
+            "FFMPEG_SPLIT_ENCODE": False,
+            "FFMPEG_SPLIT_MIN_LENGTH": 240,
+            "FFMPEG_SPLIT_WORKERS": args.workers,
+        }, config)
+    return config_file
+
+
+def make_clip(root, args):
+    """Synthetic source with chapters, like a title ripped by MakeMKV"""
+    metadata = os.path.join(root, "chapters.txt")
+    with open(metadata, "w") as chapters:
+        chapters.write(";FFMETADATA1\n")
+        for start in range(0, args.length, args.chapter):
+            chapters.write(f"[CHAPTER]\nTIMEBASE=1/1000\nSTART={start * 1000}\n"
+                           f"END={min(start + args.chapter, args.length) * 1000}\n")
+    clip = os.path.join(root, "source.mkv")
+    subprocess.run(["ffmpeg", "-v", "error", "-y",
+                    "-f", "lavfi", "-i", f"testsrc2=size={args.size}:rate=24:duration={args.length}",
+                    "-f", "lavfi", "-i", f"sine=frequency=440:duration={args.length}",
+                    "-i", metadata, "-map", "0", "-map", "1", "-map_metadata", "2",
+                    "-c:v", "libx264", "-preset", "ultrafast", "-crf", "18", "-c:a", "aac", clip], check=True)
+    return clip
+
+
+def probe(path):
+    """Duration in seconds, video frame count, audio length in seconds and number of chapters of path"""
+    output = subprocess.check_output(["ffprobe", "-v", "error", "-count_packets", "-show_chapters",
+                                      "-show_entries", "format=duration:stream=codec_type,nb_read_packets",
+                                      "-of", "json", path])
+    result = json.loads(output)
+    streams = {stream["codec_type"]: stream for stream in result["streams"]}
+    audio = subprocess.check_output(["ffprobe", "-v", "error", "-select_streams", "a:0", "-show_entries",
+                                     "packet=pts_time,duration_time", "-of", "csv=p=0", path]).decode().split()
+    last_pts, last_duration = audio[-1].strip(",").split(",")[:2] if audio else ("0", "0")
+    return (float(result["format"]["duration"]), int(streams["video"]["nb_read_packets"]),
+            float(last_pts) + float(last_duration), len(result["chapters"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark FFmpeg split encoding against one ffmpeg process')
+    parser.add_argument('--length', type=int, default=600, help='Length of the synthetic clip in seconds')
+    parser.add_argument('--chapter', type=int, default=90, help='Seconds between chapters')
+    parser.add_argument('--size', default="1280x720", help='Video size of the clip')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Segments encoded at once')
+    parser.add_argument('--post-args', default="-map 0 -c:v libx264 -preset medium -crf 22 -c:a aac",
+                        help='FFmpeg arguments after -i')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        os.environ["ARM_CONFIG_FILE"] = write_config(root, args)
+        sys.path.insert(0, INSTALLPATH)
+        import arm.config.config as cfg
+        from arm.ripper import ffmpeg
+
+        clip = make_clip(root, args)
+        job = SimpleNamespace(job_id=1)
+        print(f"{args.length}s {args.size} clip, chapters every {args.chapter}s, {os.cpu_count()} cpus")
+        results = {}
+        for split in (False, True):
+            cfg.arm_config["FFMPEG_SPLIT_ENCODE"] = split
+            out_file = os.path.join(root, f"split_{split}.mkv")
+            started = time.perf_counter()
+            ffmpeg.run_transcode_cmd(clip, out_file, job, "-v error -y", args.post_args)
+            wall = time.perf_counter() - started
+            results[split] = (wall, *probe(out_file))
+            mode = f"split, {args.workers} at a time" if split else "single process"
+            print(f"{mode:<24} wall {wall:7.2f}s  duration {results[split][1]:8.2f}s  frames {results[split][2]}"
+                  f"  audio {results[split][3]:8.2f}s  chapters {results[split][4]}")
+
+    single, split = results[False], results[True]
+    print(f"speedup {single[0] / split[0]:.2f}x, frames {'match' if single[2] == split[2] else 'DIFFER'}, "
+          f"audio {'matches' if abs(single[3] - split[3]) < 0.05 else 'DIFFERS'}, "
+          f"chapters {'match' if single[4] == split[4] else 'DIFFER'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Benchmark - job search with the FTS5 index against the old LIKE scan
+
+Seeds a throwaway database that has the job_search table and triggers of migration
+c81e4b5f2a90 with --jobs jobs with --tracks tracks each (the triggers index them as they
+are inserted, like the ripper's writes). Times json_api.search() for a few queries, and the
+LIKE query it used to run, --repeat times each.
+
+Usage:
+    python3 test/benchmark/benchmark_job_search.py --jobs 100000 --tracks 10 --repeat 20
+"""
+import argparse
+import importlib.util
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+import yaml
+
+INSTALLPATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+MIGRATION = os.path.join(INSTALLPATH, "arm", "migrations", "versions", "c81e4b5f2a90_job_search_fts.py")
+WORDS = ["star", "wars", "lord", "rings", "return", "king", "matrix", "alien", "blade", "runner", "toy", "story",
+         "back", "future", "jaws", "heat", "ghost", "hunter", "night", "day", "planet", "earth", "empire", "strikes"]
+QUERIES = ["star wars", "Blade Runner", "tt0000042", "1984", "title_t07", "empire strikes back", "nomatch"]
+BATCH = 10000
+
+
+def write_config(root):
+    """Write an arm.yaml pointing the database and logs at root"""
+    config_file = os.path.join(root, "arm.yaml")
+    logpath = os.path.join(root, "logs")
+    os.makedirs(os.path.join(logpath, "progress"))
+    with open(config_file, "w") as config:
+        yaml.safe_dump({
+            "INSTALLPATH": INSTALLPATH + "/",
+            "DBFILE": os.path.join(root, "arm.db"),
+            "LOGPATH": logpath + "/",
+            "ABCDE_CONFIG_FILE": os.path.join(INSTALLPATH, "setup", ".abcde.conf"),
+            "APPRISE": "",
+            "LOGLEVEL": "WARNING",
+        }, config)
+    return config_file
+
+
+def load_migration():
+    """The job_search migration module, for its table and trigger statements"""
+    spec = importlib.util.spec_from_file_location("job_search_fts", MIGRATION)
+    migration = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(migration)
+    return migration
+
+
+def seed(db, args):
+    """Insert the jobs, their configs and tracks, the triggers fill job_search"""
+    from arm.models.config import Config
+    from arm.models.job import Job
+    from arm.models.track import Track
+
+    rng = random.Random(42)
+    for start in range(1, args.jobs + 1, BATCH):
+        job_ids = range(start, min(start + BATCH, args.jobs + 1))
+        db.session.execute(Job.__table__.insert(), [
+            {"job_id": job_id, "status": "success", "title": " ".join(rng.sample(WORDS, 3)).title(),
+             "label": f"DISC_{job_id}", "year": str(1950 + job_id % 75), "imdb_id": f"tt{job_id:07d}",
+             "video_type": rng.choice(["movie", "series"])}
+            for job_id in job_ids
+        ])
+        db.session.execute(Config.__table__.insert(), [{"job_id": job_id, "RIPMETHOD": "mkv"} for job_id in job_ids])
+        db.session.execute(Track.__table__.insert(), [
+            {"job_id": job_id, "track_number": str(track), "filename": f"title_t{track:02d}.mkv"}
+            for job_id in job_ids for track in range(args.tracks)
+        ])
+        db.session.commit()
+
+
+def timed(function, repeat):
+    """Median seconds of function() and its last result"""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        value = function()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples), value
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the FTS5 job search against LIKE')
+    parser.add_argument('--jobs', type=int, default=100000, help='Number of jobs in the database')
+    parser.add_argument('--tracks', type=int, default=10, help='Tracks per job')
+    parser.add_argument('--repeat', type=int, default=20, help='Times each search is run')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        os.environ["ARM_CONFIG_FILE"] = write_config(root)
+        sys.path.insert(0, INSTALLPATH)
+        from arm.ui import app, db, json_api
+        from arm.models.job import Job
+
+        migration = load_migration()
+        with app.app_context():
+            db.create_all()
+            # the ui runs the migrations when it creates the database, create it if they didn't
+            if not db.session.execute(db.text("SELECT name FROM sqlite_master WHERE name = 'job_search'")).first():
+                db.session.execute(db.text(migration.CREATE_TABLE))
+                for _, trigger in migration.TRIGGERS:
+                    db.session.execute(db.text(trigger))
+                db.session.commit()
+            started = time.perf_counter()
+            seed(db, args)
+            print(f"Seeded {args.jobs} jobs, {args.jobs * args.tracks} tracks in {time.perf_counter() - started:.1f}s")
+
+            print(f"{'query':<22} {'fts5':>10} {'results':>8} {'like':>10} {'results':>8}")
+            for query in QUERIES:
+                fts, response = timed(lambda: json_api.search(query), args.repeat)
+                # the search before job_search, without serialising the results
+                pattern = "%" + "".join(character for character in query if character.isalnum()) + "%"
+                like, jobs = timed(lambda: db.session.query(Job).filter(Job.title.like(pattern)).all(), args.repeat)
+                db.session.expunge_all()
+                more = "+" if response["more"] else ""
+                print(f"{query:<22} {fts * 1000:8.2f}ms {len(response['results']):>7}{more:1} "
+                      f"{like * 1000:8.2f}ms {len(jobs):>8}")
+
+
+if __name__ == "__main__":
+    main()
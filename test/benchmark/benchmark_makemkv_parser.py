@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Benchmark - parsing makemkvcon robot output
+
+Parses makemkvcon --robot transcripts (files with the stdout of a makemkvcon run
+with --progress=-same) once the way makemkv.run used to, building a dataclass for every
+line, and once with makemkv.parse_output, which only parses the selected types.
+Without transcripts, a disc scan and a Blu-ray backup transcript are generated.
+
+Reports lines per second, the peak memory allocated while parsing (tracemalloc) and
+the number of message dataclasses that were built.
+
+Usage:
+    python3 test/benchmark/benchmark_makemkv_parser.py [--repeat 5] [transcript ...]
+"""
+import argparse
+import collections
+import logging
+import os
+import sys
+import time
+import tracemalloc
+
+INSTALLPATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, INSTALLPATH)
+from arm.ripper import makemkv  # noqa: E402
+from arm.ripper.makemkv import OutputType  # noqa: E402
+
+SCAN = OutputType.MSG | OutputType.CINFO | OutputType.SINFO | OutputType.TCOUNT | OutputType.TINFO
+"""What makemkv_info selects for a disc scan"""
+
+
+def scan_transcript(titles=60):
+    """Output of makemkvcon info on a Blu-ray with many titles"""
+    lines = [f'DRV:{index},256,999,0,"","",""' for index in range(16)]
+    lines.append('MSG:1005,0,1,"MakeMKV v1.17.8 linux(x64-release) started","%1 started","MakeMKV v1.17.8"')
+    lines.append(f"TCOUNT:{titles}")
+    lines += [f'CINFO:{attribute},0,"Disc attribute {attribute}"' for attribute in range(1, 12)]
+    for title in range(titles):
+        lines += [f'TINFO:{title},{attribute},0,"{attribute * 100}"' for attribute in range(1, 30)]
+        for stream in range(20):
+            lines += [f'SINFO:{title},{stream},{attribute},0,"eng"' for attribute in range(1, 25)]
+    return lines
+
+
+def backup_transcript(titles=4, values=20000):
+    """Output of makemkvcon backup with progress on stdout"""
+    lines = ['MSG:1005,0,1,"MakeMKV v1.17.8 linux(x64-release) started","%1 started","MakeMKV v1.17.8"',
+             'PRGT:5018,0,"Saving all titles to MKV files"']
+    for title in range(titles):
+        lines.append(f'PRGC:5017,{title},"Saving to MKV file"')
+        lines.append(f'MSG:3307,0,2,"File 0000{title}.m2ts was added as title #{title}","File %1 was added '
+                     f'as title #%2","0000{title}.m2ts","{title}"')
+        lines += [f"PRGV:{value},{title * values + value},65536" for value in range(values)]
+    lines.append('MSG:5036,0,0,"Backup done","Backup done"')
+    return lines
+
+
+def parse_all(lines, select):
+    """The old run loop, every line parsed to a dataclass and logged"""
+    for line in lines:
+        logging.debug(line)
+        msg_type, data = makemkv.parse_line(line)
+        logging.debug(data)
+        if msg_type in select and msg_type not in makemkv.PROGRESS_TYPES:
+            yield data
+
+
+def measure(parser, lines, select, repeat):
+    """Best lines/second, peak allocated KiB and dataclasses built by a parser over lines"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        collections.deque(parser(lines, select), maxlen=0)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    tracemalloc.start()
+    collections.deque(parser(lines, select), maxlen=0)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    built = 0
+    parse_line = makemkv.parse_line
+
+    def counting_parse_line(*parse_args):
+        nonlocal built
+        msg_type, data = parse_line(*parse_args)
+        built += data is not None
+        return msg_type, data
+
+    makemkv.parse_line = counting_parse_line
+    try:
+        collections.deque(parser(lines, select), maxlen=0)
+    finally:
+        makemkv.parse_line = parse_line
+    return len(lines) / best, peak / 1024, built
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("transcripts", nargs="*", help="files with makemkvcon --robot output")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.transcripts:
+        runs = []
+        for path in args.transcripts:
+            with open(path, "r", errors="ignore") as transcript:
+                lines = transcript.read().splitlines()
+            runs.append((f"{os.path.basename(path)} (scan)", lines, SCAN))
+            runs.append((f"{os.path.basename(path)} (backup)", lines, OutputType.MSG))
+    else:
+        runs = [("disc scan", scan_transcript(), SCAN), ("blu-ray backup", backup_transcript(), OutputType.MSG)]
+
+    print(f"{'transcript':<24} {'parser':<14} {'lines':>8} {'lines/s':>12} {'peak KiB':>10} {'objects':>8}")
+    for name, lines, select in runs:
+        for label, line_parser in (("parse_line", parse_all), ("parse_output", makemkv.parse_output)):
+            rate, peak, built = measure(line_parser, lines, select, args.repeat)
+            print(f"{name:<24} {label:<14} {len(lines):>8} {rate:>12,.0f} {peak:>10.1f} {built:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Benchmark - transcode slot scheduler vs the old sleep/poll loop
+
+Runs a batch of simulated jobs that each need a transcode slot for --duration seconds,
+once with the old behaviour (check for a free slot, sleep a random time between checks)
+and once with the queued SlotScheduler, then reports how long slots sat idle while jobs waited.
+
+The poll intervals are the old 20-120s range scaled down by --scale so the run finishes quickly,
+the duration should be scaled the same way.
+
+Usage:
+    python3 test/benchmark/benchmark_slots.py --jobs 8 --slots 2 --duration 3
+"""
+import argparse
+import fcntl
+import math
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, '/opt/arm')
+from arm.ripper.slots import SlotScheduler  # noqa: E402
+
+
+def polling_job(root, max_slots, duration, poll_range, results):
+    """Old behaviour - check for a free slot, sleep a random time if there isn't one"""
+    queued = time.monotonic()
+    while True:
+        for index in range(max_slots):
+            slot_fd = os.open(os.path.join(root, f"slot{index}.lock"), os.O_RDWR | os.O_CREAT)
+            try:
+                fcntl.flock(slot_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(slot_fd)
+                continue
+            started = time.monotonic()
+            time.sleep(duration)
+            os.close(slot_fd)
+            results.append((queued, started, time.monotonic()))
+            return
+        time.sleep(random.uniform(*poll_range))
+
+
+def scheduled_job(root, max_slots, duration, job_id, results):
+    """New behaviour - wait in the slot queue"""
+    scheduler = SlotScheduler("benchmark", max_slots, root=root)
+    queued = time.monotonic()
+    with scheduler.slot(job_id):
+        started = time.monotonic()
+        time.sleep(duration)
+    results.append((queued, started, time.monotonic()))
+
+
+def run(target, make_args, jobs):
+    """Start all the jobs at once and collect (queued, started, finished) for each"""
+    with multiprocessing.Manager() as manager:
+        results = manager.list()
+        processes = [multiprocessing.Process(target=target, args=make_args(job_id) + (results,))
+                     for job_id in range(1, jobs + 1)]
+        start = time.monotonic()
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        return start, list(results)
+
+
+def report(name, start, results, max_slots, duration):
+    """Print wall time, time lost to idle slots and wait percentiles"""
+    wall = max(finished for _, _, finished in results) - start
+    ideal = math.ceil(len(results) / max_slots) * duration
+    waits = sorted(started - queued for queued, started, _ in results)
+    print(f"{name:<10} wall {wall:7.2f}s  ideal {ideal:6.2f}s  idle gap {wall - ideal:7.2f}s  "
+          f"wait mean {statistics.mean(waits):6.2f}s  p50 {waits[len(waits) // 2]:6.2f}s  max {waits[-1]:6.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the ARM slot scheduler against polling')
+    parser.add_argument('--jobs', type=int, default=8, help='Number of simulated jobs')
+    parser.add_argument('--slots', type=int, default=2, help='MAX_CONCURRENT_TRANSCODES')
+    parser.add_argument('--duration', type=float, default=3.0, help='Seconds each job holds a slot')
+    parser.add_argument('--scale', type=float, default=0.05, help='Scale applied to the old 20-120s poll interval')
+    args = parser.parse_args()
+    poll_range = (20 * args.scale, 120 * args.scale)
+
+    print(f"{args.jobs} jobs, {args.slots} slots, {args.duration}s per job, "
+          f"poll interval {poll_range[0]:.1f}-{poll_range[1]:.1f}s")
+    with tempfile.TemporaryDirectory() as root:
+        start, results = run(polling_job, lambda job_id: (root, args.slots, args.duration, poll_range), args.jobs)
+        report("polling", start, results, args.slots, args.duration)
+    with tempfile.TemporaryDirectory() as root:
+        start, results = run(scheduled_job, lambda job_id: (root, args.slots, args.duration, job_id), args.jobs)
+        report("scheduler", start, results, args.slots, args.duration)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import io
+import sys
+import time
+import unittest
+from unittest.mock import patch
+
+sys.path.insert(0, '/opt/arm')
+from arm.ripper import daemon  # noqa: E402
+
+
+class FakeConnection:
+    """Client connection sending one device name"""
+
+    def __init__(self, devname):
+        self.request = f"{devname}\n"
+        self.reply = b""
+
+    def settimeout(self, timeout):
+        pass
+
+    def makefile(self, mode):
+        return io.StringIO(self.request)
+
+    def sendall(self, data):
+        self.reply += data
+
+
+def copying_worker(devname, syslog, released):
+    """A job that gives the drive back straight away, then keeps copying its files"""
+    released.set()
+    time.sleep(2)
+
+
+def ripping_worker(devname, syslog, released):
+    """A job still ripping the disc"""
+    time.sleep(2)
+
+
+class TestDaemon(unittest.TestCase):
+    def setUp(self):
+        self.workers = {}
+        self.addCleanup(self.stop_workers)
+
+    def stop_workers(self):
+        for worker in self.workers.values():
+            worker.terminate()
+            worker.join()
+
+    def submit(self, devname):
+        connection = FakeConnection(devname)
+        daemon._handle_client(connection, self.workers, False)
+        return connection.reply.decode()
+
+    def test_disc_ignored_while_drive_is_in_use(self):
+        """
+        CHECK a second trigger for a drive whose job is still ripping is ignored
+        """
+        with patch.object(daemon, "_run_worker", ripping_worker):
+            self.assertTrue(self.submit("sr0").startswith("OK started"))
+            self.assertTrue(self.submit("sr0").startswith("OK already running"))
+            self.assertTrue(self.submit("sr1").startswith("OK started"))
+        self.assertEqual(len(self.workers), 2)
+
+    def test_next_disc_starts_once_drive_is_released(self):
+        """
+        CHECK a disc inserted while the last job copies its files starts a new job
+        """
+        with patch.object(daemon, "_run_worker", copying_worker):
+            self.assertTrue(self.submit("sr0").startswith("OK started"))
+            first = next(iter(self.workers.values()))
+            self.assertTrue(first.released.wait(5))
+            self.assertTrue(self.submit("sr0").startswith("OK started"))
+        self.assertEqual(len(self.workers), 2)
+        self.assertTrue(first.is_alive())
+
+
+if __name__ == '__main__':
+    unittest.main()
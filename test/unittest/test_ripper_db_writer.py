@@ -0,0 +1,159 @@
+import sqlite3
+import sys
+import unittest
+from unittest.mock import patch
+
+sys.path.insert(0, '/opt/arm')
+from arm.ripper import db_writer  # noqa: E402
+
+
+class FakeClock:
+    """Stands in for the time module, sleep() moves the clock on instead of waiting"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class TestDbWriter(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.applied = 0
+        self.rollbacks = 0
+        # what each commit does, the last one is repeated
+        self.commits = [None]
+        self.committed = 0
+        for patcher in (patch.object(db_writer, "time", self.clock),
+                        patch.object(db_writer.db.session, "commit", self.commit),
+                        patch.object(db_writer.db.session, "rollback", self.rollback)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.before = db_writer.metrics()
+
+    def commit(self):
+        outcome = self.commits.pop(0) if len(self.commits) > 1 else self.commits[0]
+        if callable(outcome):
+            outcome()
+        elif outcome is not None:
+            raise outcome
+        self.committed += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def operation(self):
+        self.applied += 1
+
+    def metrics(self):
+        """Change of each metric since setUp"""
+        after = db_writer.metrics()
+        return {key: after[key] - self.before[key] for key in after}
+
+    @staticmethod
+    def locked():
+        return sqlite3.OperationalError("database is locked")
+
+    def test_retries_a_locked_database(self):
+        """
+        CHECK a locked commit is rolled back, applied again and retried with a doubling backoff until it succeeds
+        """
+        self.commits = [self.locked(), self.locked(), self.locked(), None]
+        self.assertTrue(db_writer.commit(self.operation))
+        self.assertEqual(self.clock.sleeps, [0.05, 0.1, 0.2])
+        self.assertEqual((self.applied, self.rollbacks, self.committed), (4, 3, 1))
+        metrics = self.metrics()
+        self.assertEqual((metrics["writes"], metrics["commits"], metrics["retries"], metrics["failures"]),
+                         (1, 1, 3, 0))
+        self.assertAlmostEqual(metrics["lock_wait"], 0.35)
+
+    def test_backoff_is_capped(self):
+        """
+        CHECK the backoff doubles up to MAX_BACKOFF and stays there
+        """
+        self.commits = [self.locked()] * 9 + [None]
+        self.assertTrue(db_writer.commit(self.operation))
+        self.assertEqual(self.clock.sleeps, [0.05, 0.1, 0.2, 0.4, 0.8, 1.6, 2.0, 2.0, 2.0])
+
+    def test_gives_up_after_max_wait(self):
+        """
+        CHECK a database that stays locked is given up on once max_wait has passed, nothing is written
+        """
+        self.commits = [self.locked()]
+        self.assertFalse(db_writer.commit(self.operation, max_wait=5))
+        self.assertEqual(self.committed, 0)
+        self.assertEqual(self.rollbacks, len(self.clock.sleeps) + 1)
+        self.assertLess(sum(self.clock.sleeps[:-1]), 5)
+        self.assertGreaterEqual(sum(self.clock.sleeps), 5)
+        metrics = self.metrics()
+        self.assertEqual((metrics["commits"], metrics["retries"], metrics["failures"]),
+                         (0, len(self.clock.sleeps), 1))
+        self.assertAlmostEqual(metrics["lock_wait"], sum(self.clock.sleeps))
+
+    def test_busy_timeout_counts_towards_max_wait(self):
+        """
+        CHECK the time SQLite waits on the lock inside an attempt counts towards max_wait and lock_wait
+        """
+        def busy():
+            self.clock.now += 30
+            raise self.locked()
+        self.commits = [busy]
+        self.assertFalse(db_writer.commit(self.operation, max_wait=45))
+        self.assertEqual(self.clock.sleeps, [0.05])
+        self.assertAlmostEqual(self.metrics()["lock_wait"], 60.05)
+
+    def test_other_errors_are_raised(self):
+        """
+        CHECK an error other than a locked database is raised straight away without retrying
+        """
+        self.commits = [sqlite3.OperationalError("no such table: job")]
+        with self.assertRaises(RuntimeError):
+            db_writer.commit(self.operation)
+        self.assertEqual((self.clock.sleeps, self.rollbacks), ([], 1))
+        self.assertEqual(self.metrics()["failures"], 1)
+
+    def test_batch_commits_once(self):
+        """
+        CHECK writes inside a batch, nested or not, are applied once straight away and committed together at the end
+        """
+        with db_writer.batch():
+            self.assertTrue(db_writer.commit(self.operation))
+            with db_writer.batch():
+                db_writer.commit(self.operation, self.operation)
+            self.assertEqual((self.applied, self.committed), (3, 0))
+        self.assertEqual((self.applied, self.committed), (3, 1))
+        metrics = self.metrics()
+        self.assertEqual((metrics["writes"], metrics["commits"]), (3, 1))
+
+    def test_batch_retries_every_write(self):
+        """
+        CHECK a locked batch commit applies all the batched writes again
+        """
+        self.commits = [self.locked(), None]
+        with db_writer.batch():
+            db_writer.commit(self.operation)
+            db_writer.commit(self.operation)
+        # once when batched, again after the rollback
+        self.assertEqual((self.applied, self.committed, self.rollbacks), (4, 1, 1))
+
+    def test_batch_rolled_back_on_error(self):
+        """
+        CHECK nothing is committed when the with block raises, and later writes are not batched
+        """
+        with self.assertRaises(ValueError):
+            with db_writer.batch():
+                db_writer.commit(self.operation)
+                raise ValueError("rip failed")
+        self.assertEqual((self.committed, self.rollbacks), (0, 1))
+        db_writer.commit(self.operation)
+        self.assertEqual(self.committed, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import hashlib
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+sys.path.insert(0, '/opt/arm')
+from arm.ripper import disc_imager  # noqa: E402
+
+
+class TestDiscImager(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.device = os.path.join(directory.name, "disc")
+        self.image = os.path.join(directory.name, "disc.iso")
+        # a chunk and a half of sectors
+        self.data = os.urandom(disc_imager.CHUNK_SIZE + disc_imager.CHUNK_SIZE // 2)
+        with open(self.device, "wb") as device:
+            device.write(self.data)
+        self.read = os.pread
+        sleep = patch.object(disc_imager.time, "sleep")
+        sleep.start()
+        self.addCleanup(sleep.stop)
+
+    def bad_pread(self, bad_offsets):
+        """os.pread failing for reads that cover any of bad_offsets"""
+        def pread(fd, length, offset):
+            if any(offset <= bad < offset + length for bad in bad_offsets):
+                raise OSError(5, "Input/output error")
+            return self.read(fd, length, offset)
+        return pread
+
+    def test_image_and_checksum(self):
+        """
+        CHECK the image is a copy of the disc and the SHA-256 is written next to it
+        """
+        result = disc_imager.image_disc(self.device, self.image)
+        disc_imager.write_checksum(self.image, result)
+        with open(self.image, "rb") as image:
+            self.assertEqual(image.read(), self.data)
+        self.assertEqual(result.sha256, hashlib.sha256(self.data).hexdigest())
+        self.assertEqual(result.bad_sectors, [])
+        with open(f"{self.image}.sha256") as checksum_file:
+            self.assertEqual(checksum_file.read(), f"{result.sha256}  disc.iso\n")
+        self.assertFalse(os.path.exists(f"{self.image}.badsectors"))
+
+    def test_bad_sectors_skipped_and_mapped(self):
+        """
+        CHECK sectors that can't be read are written as zeros and listed when skip_bad_sectors
+        """
+        sector = disc_imager.SECTOR_SIZE
+        bad = [10 * sector, 11 * sector, 600 * sector]
+        with patch.object(disc_imager.os, "pread", self.bad_pread(bad)):
+            result = disc_imager.image_disc(self.device, self.image, skip_bad_sectors=True)
+        expected = bytearray(self.data)
+        for offset in bad:
+            expected[offset:offset + sector] = bytes(sector)
+        with open(self.image, "rb") as image:
+            self.assertEqual(image.read(), expected)
+        self.assertEqual(result.sha256, hashlib.sha256(expected).hexdigest())
+        self.assertEqual(result.bad_sectors, [(10, 2), (600, 1)])
+
+    def test_bad_sector_fails_without_skip(self):
+        """
+        CHECK imaging stops at a sector that can't be read unless skip_bad_sectors
+        """
+        with patch.object(disc_imager.os, "pread", self.bad_pread([5 * disc_imager.SECTOR_SIZE])):
+            with self.assertRaises(disc_imager.ImagingError):
+                disc_imager.image_disc(self.device, self.image)
+
+
+if __name__ == '__main__':
+    unittest.main()
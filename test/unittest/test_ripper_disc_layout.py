@@ -0,0 +1,60 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+sys.path.insert(0, '/opt/arm')
+from arm.ripper import disc_layout  # noqa: E402
+
+
+class TestDiscLayout(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.mountpoint = directory.name
+
+    def make(self, *paths):
+        for path in paths:
+            full_path = os.path.join(self.mountpoint, path)
+            if path.endswith("/"):
+                os.makedirs(full_path, exist_ok=True)
+            else:
+                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                open(full_path, "w").close()
+
+    def test_kind_from_the_root(self):
+        """
+        CHECK the disc type comes from one read of the root, BDMV isn't walked
+        """
+        self.make("BDMV/STREAM/00000.m2ts", "BDMV/CLIPINF/00000.clpi", "CERTIFICATE/")
+        scandir = os.scandir
+        with patch.object(disc_layout.os, "scandir", side_effect=scandir) as scanned:
+            layout = disc_layout.probe(self.mountpoint)
+        self.assertEqual(scanned.call_count, 1)
+        self.assertEqual((layout.kind, layout.found), ("bluray", "BDMV"))
+
+    def test_audio_ts(self):
+        """
+        CHECK a DVD with an empty AUDIO_TS is a dvd, one with files in AUDIO_TS is data, any case
+        """
+        self.make("audio_ts/", "video_ts/VIDEO_TS.IFO")
+        layout = disc_layout.probe(self.mountpoint)
+        self.assertEqual((layout.kind, layout.found), ("dvd", "video_ts"))
+        self.make("audio_ts/AUDIO_TS.IFO")
+        self.assertEqual(disc_layout.probe(self.mountpoint).kind, "data")
+
+    def test_hddvd_searched_to_a_limited_depth(self):
+        """
+        CHECK HVDVD_TS is found below the root only up to SEARCH_DEPTH, otherwise the disc is data
+        """
+        self.make("DISC/HVDVD_TS/FEATURE.EVO")
+        layout = disc_layout.probe(self.mountpoint)
+        self.assertEqual((layout.kind, layout.found), ("hddvd", os.path.join("DISC", "HVDVD_TS")))
+        with patch.object(disc_layout, "SEARCH_DEPTH", 0):
+            self.assertEqual(disc_layout.probe(self.mountpoint).kind, "data")
+        self.assertIsNone(disc_layout.probe(os.path.join(self.mountpoint, "missing")).found)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+import errno
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+sys.path.insert(0, '/opt/arm')
+from arm.ripper import finalizer, utils  # noqa: E402
+
+
+def cross_device(source, destination):
+    """os.rename as if the files were on different filesystems"""
+    raise OSError(errno.EXDEV, "Invalid cross-device link")
+
+
+class TestFinalizer(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.raw = os.path.join(directory.name, "raw")
+        self.completed = os.path.join(directory.name, "completed")
+        os.makedirs(self.raw)
+        os.makedirs(self.completed)
+        rename = patch.object(finalizer.os, "rename", cross_device)
+        rename.start()
+        self.addCleanup(rename.stop)
+
+    def raw_file(self, name, size):
+        path = os.path.join(self.raw, name)
+        with open(path, "wb") as raw_file:
+            raw_file.write(os.urandom(size))
+        return path
+
+    def assertMoved(self, source, destination, data):
+        self.assertFalse(os.path.exists(source))
+        self.assertFalse(os.path.exists(f"{destination}.part"))
+        with open(destination, "rb") as moved:
+            self.assertEqual(moved.read(), data)
+
+    def test_copied_to_another_filesystem(self):
+        """
+        CHECK a file on another filesystem is copied by the kernel, all of it is counted and the source removed
+        """
+        source = self.raw_file("title_t00.mkv", 3 * 1024 * 1024 + 5)
+        with open(source, "rb") as raw_file:
+            data = raw_file.read()
+        destination = os.path.join(self.completed, "Movie (2000).mkv")
+        copied = []
+        with patch.object(finalizer, "CHUNK_SIZE", 1024 * 1024):
+            method = finalizer.move_file(source, destination, copied.append)
+        self.assertIn(method, ("reflink", "copy_file_range", "sendfile"))
+        self.assertEqual(sum(copied), len(data))
+        self.assertMoved(source, destination, data)
+
+    def test_falls_back_when_copy_file_range_is_unsupported(self):
+        """
+        CHECK sendfile is used when copy_file_range can't copy between the filesystems
+        """
+        source = self.raw_file("title_t01.mkv", 100000)
+        with open(source, "rb") as raw_file:
+            data = raw_file.read()
+        destination = os.path.join(self.completed, "title_t01.mkv")
+        with patch.object(finalizer.fcntl, "ioctl", side_effect=OSError(errno.EOPNOTSUPP, "reflink")), \
+                patch.object(finalizer.os, "copy_file_range", side_effect=OSError(errno.EXDEV, "cross device")):
+            self.assertEqual(finalizer.move_file(source, destination), "sendfile")
+        self.assertMoved(source, destination, data)
+
+    def test_batch_moves_queued_files_and_keeps_a_bad_copy(self):
+        """
+        CHECK files queued on a batch are all moved when it closes, one whose copy doesn't match is left in place
+        """
+        files = {self.raw_file(f"title_t0{number}.mkv", 50000 + number): None for number in range(4)}
+        for source in files:
+            with open(source, "rb") as raw_file:
+                files[source] = raw_file.read()
+        bad = list(files)[2]
+        real_verify = finalizer.verify
+
+        def verify(source, copy):
+            if source == bad:
+                raise finalizer.FinalizeError("doesn't match")
+            real_verify(source, copy)
+        with patch.object(finalizer, "verify", verify), patch.object(finalizer, "workers", return_value=3):
+            with finalizer.Batch() as batch:
+                for source in files:
+                    finalizer.move(source, os.path.join(self.completed, os.path.basename(source)))
+                self.assertEqual(len(batch.moves), 4)
+        for source, data in files.items():
+            destination = os.path.join(self.completed, os.path.basename(source))
+            if source == bad:
+                self.assertTrue(os.path.isfile(source))
+                self.assertFalse(os.path.exists(destination))
+                self.assertFalse(os.path.exists(f"{destination}.part"))
+            else:
+                self.assertMoved(source, destination, data)
+
+    def test_not_moved_over_an_existing_file(self):
+        """
+        CHECK a file is never moved over one already at the destination, both are left as they were
+        """
+        source = self.raw_file("title_t00.mkv", 1000)
+        destination = os.path.join(self.completed, "Movie (2000).mkv")
+        with open(destination, "wb") as existing:
+            existing.write(b"existing")
+        with self.assertRaises(FileExistsError):
+            finalizer.move_file(source, destination)
+        self.assertTrue(os.path.isfile(source))
+        self.assertFalse(os.path.exists(f"{destination}.part"))
+        with open(destination, "rb") as existing:
+            self.assertEqual(existing.read(), b"existing")
+
+    def test_batch_refuses_a_second_file_for_the_same_destination(self):
+        """
+        CHECK two files moved to the same destination in a batch: the first is moved, the second left where it is
+        """
+        first = self.raw_file("a.mkv", 20000)
+        second = self.raw_file("b.mkv", 30000)
+        with open(first, "rb") as raw_file:
+            data = raw_file.read()
+        destination = os.path.join(self.completed, "Movie.mkv")
+        with finalizer.Batch() as batch:
+            with self.assertLogs(level="INFO") as logs:
+                utils.move_files_main(first, destination, self.completed)
+                utils.move_files_main(second, destination, self.completed)
+        self.assertIn(f"File: {destination} already exists.  Not moving.", "\n".join(logs.output))
+        self.assertMoved(first, destination, data)
+        self.assertTrue(os.path.isfile(second))
+        self.assertEqual(batch.moved, [destination])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+import sys
+import time
+import unittest
+from unittest.mock import patch
+
+sys.path.insert(0, '/opt/arm')
+from arm.ripper import identify  # noqa: E402
+
+
+class TestSearchVariants(unittest.TestCase):
+    def test_preferred_variant_wins(self):
+        """
+        CHECK the most preferred variant that finds something wins, even when a later one answers first
+        """
+        def search(title, year):
+            if year == "2005":
+                time.sleep(0.2)
+                return {"Search": [{"Title": title, "Year": year}]}
+            return {"Search": [{"Title": title, "Year": "later"}]}
+        with patch.object(identify, "metadata_search", side_effect=search):
+            started = time.monotonic()
+            result = identify.search_variants([("Serenity", "2005"), ("Serenity", "2004"), ("Serenity", None)])
+        self.assertEqual(result["Search"][0]["Year"], "2005")
+        self.assertLess(time.monotonic() - started, 0.5)
+
+    def test_failed_variant_is_skipped(self):
+        """
+        CHECK a variant whose search fails or times out doesn't stop the others
+        """
+        def search(title, year):
+            if year is not None:
+                raise TimeoutError("read timed out")
+            return {"Search": [{"Title": title}]}
+        with patch.object(identify, "metadata_search", side_effect=search):
+            result = identify.search_variants(identify.title_variants("Serenity", "2005"))
+        self.assertEqual(result, {"Search": [{"Title": "Serenity"}]})
+        with patch.object(identify, "metadata_search", return_value=None):
+            self.assertIsNone(identify.search_variants(identify.title_variants("Serenity+Special", "")))
+
+
+if __name__ == '__main__':
+    unittest.main()
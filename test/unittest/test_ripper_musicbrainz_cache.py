@@ -0,0 +1,77 @@
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+from urllib.error import HTTPError
+
+import musicbrainzngs as mb
+
+sys.path.insert(0, '/opt/arm')
+import arm.config.config as cfg  # noqa: E402
+from arm.ripper import musicbrainz_cache  # noqa: E402
+
+DISC = {"disc": {"id": "abc", "release-list": [{"id": "1", "title": "Album"}]}}
+
+
+class TestMusicBrainzCache(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        config = patch.dict(cfg.arm_config, {"LOGPATH": directory.name, "MUSICBRAINZ_CACHE": True})
+        config.start()
+        self.addCleanup(config.stop)
+        rate = patch.object(musicbrainz_cache, "REQUESTS_PER_SECOND", 1000.0)
+        rate.start()
+        self.addCleanup(rate.stop)
+
+    def test_concurrent_lookups_are_made_once(self):
+        """
+        CHECK lookups of the same disc at the same time make one request, later ones use the cache
+        """
+        calls = []
+
+        def releases(discid, includes):
+            calls.append((discid, includes))
+            time.sleep(0.2)
+            return DISC
+        with patch.object(mb, "get_releases_by_discid", side_effect=releases):
+            threads = [threading.Thread(target=musicbrainz_cache.releases_by_discid, args=("abc",)) for _ in range(3)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(musicbrainz_cache.releases_by_discid("abc"), DISC)
+        self.assertEqual(calls, [("abc", musicbrainz_cache.RELEASE_INCLUDES)])
+
+    def test_unknown_disc_and_errors(self):
+        """
+        CHECK a disc MusicBrainz doesn't know is cached as empty, other errors are raised and not cached
+        """
+        not_found = mb.ResponseError(cause=HTTPError("url", 404, "Not Found", {}, None))
+        with patch.object(mb, "get_releases_by_discid", side_effect=not_found) as releases:
+            self.assertEqual(musicbrainz_cache.releases_by_discid("unknown"), {})
+            self.assertEqual(musicbrainz_cache.releases_by_discid("unknown"), {})
+            self.assertEqual(releases.call_count, 1)
+        unavailable = mb.ResponseError(cause=HTTPError("url", 503, "Service Unavailable", {}, None))
+        with patch.object(mb, "get_releases_by_discid", side_effect=unavailable) as releases:
+            for _ in range(2):
+                with self.assertRaises(mb.WebServiceError):
+                    musicbrainz_cache.releases_by_discid("busy")
+            self.assertEqual(releases.call_count, 2)
+
+    def test_requests_are_rate_limited(self):
+        """
+        CHECK requests wait for a token from the shared bucket
+        """
+        with patch.object(musicbrainz_cache, "REQUESTS_PER_SECOND", 20.0):
+            started = time.monotonic()
+            for _ in range(5):
+                musicbrainz_cache.wait_for_token()
+            # the first token is there already, the other 4 come at 20 a second
+            self.assertGreaterEqual(time.monotonic() - started, 0.19)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import multiprocessing
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+sys.path.insert(0, '/opt/arm')
+import arm.config.config as cfg  # noqa: E402
+from arm.ripper import notifier  # noqa: E402
+
+SETTINGS = {"PB_KEY": "", "IFTTT_KEY": "", "IFTTT_EVENT": "", "PO_USER_KEY": "", "PO_APP_KEY": "",
+            "JSON_URL": "", "APPRISE": "", "BASH_SCRIPT": ""}
+
+
+class TestNotifier(unittest.TestCase):
+    def setUp(self):
+        config = patch.dict(cfg.arm_config, SETTINGS)
+        config.start()
+        self.addCleanup(config.stop)
+
+    def test_burst_is_sent_as_one_message(self):
+        """
+        CHECK messages queued together are sent once per title, in the background
+        """
+        with patch.object(notifier, "_deliver") as deliver, patch.object(notifier, "COALESCE_SECONDS", 0.2):
+            notifier.send("ARM", "Rip done")
+            notifier.send("ARM", "Rip done")
+            notifier.send("ARM", "Transcode done")
+            self.assertTrue(notifier.flush(5))
+        deliver.assert_called_once_with("ARM", "Rip done\nTranscode done")
+
+    def test_only_failed_services_are_retried(self):
+        """
+        CHECK a service that failed is tried again with backoff, the others are only sent to once
+        """
+        working = MagicMock(service_name="Working")
+        working.notify.return_value = True
+        flaky = MagicMock(service_name="Flaky")
+        flaky.notify.side_effect = [False, ConnectionError("timed out"), True]
+        with patch.object(notifier, "apprise_services", return_value=[working, flaky]), \
+                patch.object(notifier, "BACKOFF_SECONDS", 0), patch.object(notifier.time, "sleep") as sleep:
+            notifier._deliver("ARM", "Rip done")
+        self.assertEqual(working.notify.call_count, 1)
+        self.assertEqual(flaky.notify.call_count, 3)
+        self.assertEqual(sleep.call_count, 2)
+
+    def test_apprise_is_built_when_settings_change(self):
+        """
+        CHECK the apprise object is reused until the settings it was built from change
+        """
+        first = notifier.apprise_services()
+        self.assertIs(notifier.apprise_services(), first)
+        with patch.dict(cfg.arm_config, {"JSON_URL": "http://localhost/notify"}):
+            changed = notifier.apprise_services()
+            self.assertIsNot(changed, first)
+            self.assertEqual(len(changed), 1)
+
+    def test_forked_worker_sends_queued_messages(self):
+        """
+        CHECK a job run in a forked daemon worker sends what it queued before the worker exits
+        """
+        from arm.ripper import daemon, main as ripper_main
+
+        with tempfile.TemporaryDirectory() as directory:
+            delivered = os.path.join(directory, "delivered")
+
+            def deliver(title, body):
+                with open(delivered, "a") as delivered_file:
+                    delivered_file.write(f"{title}: {body}\n")
+
+            def run(arguments):
+                notifier.send("ARM", f"{arguments.devpath} processing complete")
+            with patch.object(notifier, "_deliver", deliver), patch.object(ripper_main, "run", run):
+                worker = multiprocessing.get_context("fork").Process(target=daemon._run_worker, args=("sr0", False))
+                worker.start()
+                worker.join(30)
+            self.assertEqual(worker.exitcode, 0)
+            with open(delivered) as delivered_file:
+                self.assertEqual(delivered_file.read(), "ARM: sr0 processing complete\n")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import os
+import stat
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, '/opt/arm')
+from arm.ripper import permissions  # noqa: E402
+
+
+class TestPermissions(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = os.path.join(directory.name, "Movie (2000)")
+        self.files = []
+        for folder in ("", "extras", os.path.join("extras", "featurettes")):
+            os.makedirs(os.path.join(self.root, folder), exist_ok=True)
+            for number in range(3):
+                path = os.path.join(self.root, folder, f"title_t0{number}.mkv")
+                open(path, "w").close()
+                os.chmod(path, 0o600)
+                self.files.append(path)
+        os.symlink(self.files[0], os.path.join(self.root, "link.mkv"))
+        for folder in ("extras", os.path.join("extras", "featurettes")):
+            os.chmod(os.path.join(self.root, folder), 0o700)
+
+    def mode(self, path):
+        return stat.S_IMODE(os.stat(path, follow_symlinks=False).st_mode)
+
+    def test_whole_tree(self):
+        """
+        CHECK every folder and file gets the mode, symlinks are left alone
+        """
+        os.chmod(self.root, 0o777)
+        counts = permissions.fix_tree(self.root, 0o777, workers=2)
+        self.assertEqual((counts.checked, counts.changed, counts.failed), (12, 11, 0))
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            for name in dirnames + filenames:
+                path = os.path.join(dirpath, name)
+                if not os.path.islink(path):
+                    self.assertEqual(self.mode(path), 0o777, path)
+
+    def test_nothing_changed_when_already_right(self):
+        """
+        CHECK a second run only checks, it doesn't change anything
+        """
+        permissions.fix_tree(self.root, 0o755)
+        counts = permissions.fix_tree(self.root, 0o755)
+        self.assertEqual((counts.checked, counts.changed, counts.failed), (12, 0, 0))
+        self.assertIsNone(counts.error)
+
+    def test_only_the_files_of_a_job(self):
+        """
+        CHECK only the given files, the folders leading to them and root are changed
+        """
+        job_file = self.files[-1]
+        counts = permissions.fix_tree(self.root, 0o777, only=[job_file, os.path.join(self.root, "missing.png")])
+        self.assertEqual((counts.checked, counts.failed), (4, 0))
+        self.assertEqual(self.mode(job_file), 0o777)
+        self.assertEqual(self.mode(os.path.join(self.root, "extras", "featurettes")), 0o777)
+        self.assertEqual(self.mode(self.files[-2]), 0o600)
+        self.assertEqual(self.mode(self.files[0]), 0o600)
+
+
+if __name__ == '__main__':
+    unittest.main()
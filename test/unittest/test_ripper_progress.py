@@ -0,0 +1,60 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+sys.path.insert(0, '/opt/arm')
+import arm.config.config as cfg  # noqa: E402
+from arm.ripper import progress  # noqa: E402
+
+
+class TestProgress(unittest.TestCase):
+    def setUp(self):
+        logpath = tempfile.TemporaryDirectory()
+        self.addCleanup(logpath.cleanup)
+        os.makedirs(os.path.join(logpath.name, "progress"))
+        config = patch.dict(cfg.arm_config, {"LOGPATH": logpath.name})
+        config.start()
+        self.addCleanup(config.stop)
+        self.addCleanup(progress._published.clear)
+        self.addCleanup(progress._written.clear)
+
+    def test_run_is_published(self):
+        """
+        CHECK a run publishes its title and progress and is marked done when it ends
+        """
+        with progress.Progress(1, "handbrake", title="Track 2/5") as job_progress:
+            self.assertEqual(progress.read(1)["stage"], "Starting")
+            progress._written.clear()
+            job_progress.update(42.123, stage="Encoding: task 1 of 1", eta="00h01m00s", cur_fps="50.0")
+            status = progress.read(1)
+            self.assertEqual(status["source"], "handbrake")
+            self.assertEqual(status["title"], "Track 2/5")
+            self.assertEqual(status["progress"], "42.12")
+            self.assertEqual(status["progress_round"], 42)
+            self.assertEqual(status["eta"], "00h01m00s")
+        self.assertIsNone(progress.read(1)["source"])
+
+    def test_updates_are_throttled(self):
+        """
+        CHECK updates inside PUBLISH_INTERVAL are kept in memory and written with the next publish
+        """
+        job_progress = progress.Progress(1, "makemkv")
+        job_progress.update(10)
+        self.assertEqual(progress.read(1)["progress"], "0.00")
+        job_progress.finish()
+        self.assertEqual(progress.read(1)["progress"], "10.00")
+
+    def test_eta_estimate(self):
+        """
+        CHECK the ETA is estimated from the elapsed time when the tool doesn't give one
+        """
+        job_progress = progress.Progress(1, "makemkv")
+        job_progress.started -= 60
+        self.assertEqual(job_progress.eta(25), "00h03m00s")
+        self.assertEqual(job_progress.eta(0), "Unknown")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import os
+import sys
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+sys.path.insert(0, '/opt/arm')
+import arm.config.config as cfg  # noqa: E402
+from arm.ripper import scan_cache  # noqa: E402
+
+
+class TestScanCache(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = directory.name
+        config = patch.dict(cfg.arm_config, {"LOGPATH": self.root, "DISC_SCAN_CACHE": True})
+        config.start()
+        self.addCleanup(config.stop)
+        self.addCleanup(scan_cache._keys.clear)
+
+    def make_disc(self, size):
+        """A mounted blu-ray with one playlist"""
+        mountpoint = tempfile.mkdtemp(dir=self.root)
+        os.makedirs(os.path.join(mountpoint, "BDMV", "PLAYLIST"))
+        with open(os.path.join(mountpoint, "BDMV", "PLAYLIST", "00000.mpls"), "wb") as playlist:
+            playlist.write(b"0" * size)
+        return mountpoint
+
+    def test_dvd_is_keyed_by_crc64(self):
+        """
+        CHECK a dvd with a CRC64 uses it as its key and the key is kept for the job
+        """
+        job = SimpleNamespace(job_id=1, disctype="dvd", crc_id="abc123", mountpoint=None, label="DISC")
+        self.assertEqual(scan_cache.disc_key(job), "crc64-abc123")
+        job.crc_id = None
+        self.assertEqual(scan_cache.disc_key(job), "crc64-abc123")
+
+    def test_same_disc_has_same_key(self):
+        """
+        CHECK the same disc inserted again has the same key, a different disc doesn't
+        """
+        first = SimpleNamespace(job_id=1, disctype="bluray", crc_id=None, mountpoint=self.make_disc(10), label="A")
+        again = SimpleNamespace(job_id=2, disctype="bluray", crc_id=None, mountpoint=self.make_disc(10), label="A")
+        other = SimpleNamespace(job_id=3, disctype="bluray", crc_id=None, mountpoint=self.make_disc(11), label="A")
+        self.assertEqual(scan_cache.disc_key(first), scan_cache.disc_key(again))
+        self.assertNotEqual(scan_cache.disc_key(first), scan_cache.disc_key(other))
+        empty = SimpleNamespace(job_id=4, disctype="bluray", crc_id=None, mountpoint=self.root + "/none", label="A")
+        self.assertIsNone(scan_cache.disc_key(empty))
+
+    def test_scans_are_cached_per_disc(self):
+        """
+        CHECK each scan of a disc is stored separately and found again by another job
+        """
+        job = SimpleNamespace(job_id=1, disctype="dvd", crc_id="abc123", mountpoint=None, label="DISC")
+        self.assertIsNone(scan_cache.load(job, "lsdvd"))
+        scan_cache.store(job, "lsdvd", tracks=99)
+        scan_cache.store(job, "handbrake", no_of_titles=1, tracks=[[1, 60, "16:9", "25", True, "HandBrake"]])
+        next_job = SimpleNamespace(job_id=2, disctype="dvd", crc_id="abc123", mountpoint=None, label="DISC")
+        self.assertEqual(scan_cache.load(next_job, "lsdvd"), {"tracks": 99})
+        self.assertEqual(scan_cache.load(next_job, "handbrake")["no_of_titles"], 1)
+        with patch.dict(cfg.arm_config, {"DISC_SCAN_CACHE": False}):
+            self.assertIsNone(scan_cache.load(next_job, "lsdvd"))
+
+
+if __name__ == '__main__':
+    unittest.main()
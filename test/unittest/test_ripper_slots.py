@@ -0,0 +1,85 @@
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+sys.path.insert(0, '/opt/arm')
+from arm.ripper.slots import SlotScheduler  # noqa: E402
+
+
+class TestSlotScheduler(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.root.cleanup)
+
+    def test_disabled_when_no_limit(self):
+        """
+        CHECK a limit of 0 never waits or creates any files
+        """
+        scheduler = SlotScheduler("transcode", 0, root=self.root.name)
+        with scheduler.slot(1):
+            pass
+        self.assertEqual(os.listdir(self.root.name), [])
+
+    def test_slots_are_limited(self):
+        """
+        CHECK only max_slots holders can run at once and a released slot can be taken again
+        """
+        scheduler = SlotScheduler("transcode", 2, root=self.root.name)
+        first = scheduler.acquire(1)
+        second = scheduler.acquire(2)
+        self.assertIsNone(scheduler._try_lock())
+        scheduler.release(first)
+        third = scheduler.acquire(3)
+        scheduler.release(second)
+        scheduler.release(third)
+
+    def test_waiters_are_served_in_order(self):
+        """
+        CHECK queued jobs get the slot in arrival order and are woken as soon as it is released
+        """
+        scheduler = SlotScheduler("transcode", 1, root=self.root.name)
+        order = []
+        positions = {}
+        holder = scheduler.acquire(1)
+
+        def wait(job_id):
+            with scheduler.slot(job_id, on_queued=lambda position: positions.setdefault(job_id, position)):
+                order.append(job_id)
+
+        threads = []
+        for job_id in (2, 3, 4):
+            thread = threading.Thread(target=wait, args=(job_id,))
+            thread.start()
+            threads.append(thread)
+            # wait for the ticket so arrival order is fixed
+            while job_id not in scheduler.queue_positions():
+                time.sleep(0.01)
+
+        self.assertEqual(scheduler.queue_positions(), {2: 0, 3: 1, 4: 2})
+        released = time.monotonic()
+        scheduler.release(holder)
+        for thread in threads:
+            thread.join(timeout=10)
+
+        self.assertEqual(order, [2, 3, 4])
+        self.assertEqual(positions, {2: 0, 3: 1, 4: 2})
+        self.assertLess(time.monotonic() - released, 5)
+        self.assertEqual(scheduler.queue_positions(), {})
+
+    def test_dead_tickets_are_removed(self):
+        """
+        CHECK a ticket left by a process that no longer exists doesn't block the queue
+        """
+        scheduler = SlotScheduler("transcode", 1, root=self.root.name)
+        os.makedirs(scheduler.queue_path)
+        os.mkfifo(os.path.join(scheduler.queue_path, f"{0:020d}-999999999-7"))
+        with scheduler.slot(1):
+            pass
+        self.assertEqual(os.listdir(scheduler.queue_path), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import sys
+import threading
+import unittest
+from contextlib import contextmanager
+from types import SimpleNamespace
+from unittest.mock import patch
+
+sys.path.insert(0, '/opt/arm')
+from arm.ripper import handbrake, transcode_pipeline, utils  # noqa: E402
+
+
+class TestTranscodePipeline(unittest.TestCase):
+    def setUp(self):
+        self.job = SimpleNamespace(job_id=1, config=SimpleNamespace(USE_FFMPEG=False))
+        self.statuses = []
+        self.transcoded = []
+        self.transcoding = threading.Event()
+        self.release = threading.Event()
+        self.slot_statuses = []
+
+        @contextmanager
+        def sleep_check(job, set_status=True):
+            self.slot_statuses.append(set_status)
+            yield
+
+        def transcode(path, *args):
+            self.transcoding.set()
+            self.release.wait(5)
+            self.transcoded.append(path)
+        for patcher in (patch.object(transcode_pipeline.db.session, "get", return_value=self.job),
+                        patch.object(transcode_pipeline.db.session, "remove"),
+                        patch.object(transcode_pipeline.db.session, "expire_all"),
+                        patch.object(handbrake, "handbrake_sleep_check", sleep_check),
+                        patch.object(handbrake, "correct_hb_settings", return_value=("", "")),
+                        patch.object(handbrake, "handbrake_mkv_file", transcode),
+                        patch.object(utils, "database_updater",
+                                     lambda args, job: self.statuses.append(args["status"]))):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def pipeline(self):
+        pipeline = transcode_pipeline.TranscodePipeline(self.job, "job.log", "/home/arm/media/transcode")
+        for path in ("title_t00.mkv", "title_t01.mkv", "title_t02.mkv"):
+            pipeline.ripped([path])
+        self.assertTrue(self.transcoding.wait(5))
+        return pipeline
+
+    def test_finish_transcodes_every_title_and_sets_the_status(self):
+        """
+        CHECK the job status is only set once MakeMKV is done, and every ripped title is transcoded
+        """
+        pipeline = self.pipeline()
+        self.assertEqual(self.statuses, [])
+        self.release.set()
+        pipeline.finish()
+        self.assertEqual(self.transcoded, ["title_t00.mkv", "title_t01.mkv", "title_t02.mkv"])
+        self.assertEqual(self.slot_statuses, [False])
+        self.assertEqual(self.statuses, ["transcoding", "active"])
+
+    def test_abort_stops_after_the_current_title(self):
+        """
+        CHECK when ripping fails the title being transcoded finishes and the queued ones are skipped
+        """
+        pipeline = self.pipeline()
+        # the first title finishes while abort() waits for it
+        threading.Timer(0.2, self.release.set).start()
+        pipeline.abort()
+        self.assertEqual(self.transcoded, ["title_t00.mkv"])
+        self.assertEqual(self.statuses, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
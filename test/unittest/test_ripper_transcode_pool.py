@@ -0,0 +1,92 @@
+import sys
+import threading
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+sys.path.insert(0, '/opt/arm')
+import arm.config.config as cfg  # noqa: E402
+from arm.ripper import transcode_pool  # noqa: E402
+
+
+class TestTranscodePool(unittest.TestCase):
+    job = SimpleNamespace(job_id=1, devpath="/dev/sr0", mountpoint="/mnt/dev/sr0")
+
+    def test_workers_share_of_slots(self):
+        """
+        CHECK a job encodes at most TRANSCODE_WORKERS_PER_JOB titles and never more than there are slots
+        """
+        with patch.dict(cfg.arm_config, {"TRANSCODE_WORKERS_PER_JOB": 4, "MAX_CONCURRENT_TRANSCODES": 0}):
+            self.assertEqual(transcode_pool.workers(self.job, "/home/arm/media/raw/Title"), 4)
+        with patch.dict(cfg.arm_config, {"TRANSCODE_WORKERS_PER_JOB": 4, "MAX_CONCURRENT_TRANSCODES": 2}):
+            self.assertEqual(transcode_pool.workers(self.job, "/home/arm/media/raw/Title"), 2)
+        with patch.dict(cfg.arm_config, {"TRANSCODE_WORKERS_PER_JOB": 0, "MAX_CONCURRENT_TRANSCODES": 2}):
+            self.assertEqual(transcode_pool.workers(self.job), 1)
+
+    def test_disc_is_read_by_one_encoder(self):
+        """
+        CHECK titles read straight from the disc are encoded one at a time
+        """
+        with patch.dict(cfg.arm_config, {"TRANSCODE_WORKERS_PER_JOB": 4, "MAX_CONCURRENT_TRANSCODES": 0}):
+            self.assertEqual(transcode_pool.workers(self.job, "/dev/sr0"), 1)
+            self.assertEqual(transcode_pool.workers(self.job, "/mnt/dev/sr0"), 1)
+
+    def test_single_encoder_runs_in_order(self):
+        """
+        CHECK with one encoder the titles are encoded in order by the calling thread and errors are raised
+        """
+        done = []
+        with patch.dict(cfg.arm_config, {"TRANSCODE_WORKERS_PER_JOB": 1, "MAX_CONCURRENT_TRANSCODES": 0}):
+            transcode_pool.run(self.job, [1, 2, 3], lambda job, item, encoders: done.append((job, item, encoders)))
+            self.assertEqual(done, [(self.job, 1, 1), (self.job, 2, 1), (self.job, 3, 1)])
+
+            def fail(job, item, encoders):
+                raise RuntimeError(item)
+            with self.assertRaises(RuntimeError):
+                transcode_pool.run(self.job, [1, 2], fail)
+
+
+class TestTranscodePoolEncoders(unittest.TestCase):
+    job = SimpleNamespace(job_id=1, devpath="/dev/sr0", mountpoint="/mnt/dev/sr0")
+
+    def setUp(self):
+        # the extra encoder loads the job again in its own session
+        self.thread_job = SimpleNamespace(job_id=1)
+        for patcher in (patch.object(transcode_pool.db.session, "get", return_value=self.thread_job),
+                        patch.object(transcode_pool.db.session, "remove"),
+                        patch.object(transcode_pool.db.session, "expire_all")):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_two_encoders(self):
+        """
+        CHECK two titles are encoded at the same time, one by another thread, and both are told there are two encoders
+        """
+        both_running = threading.Barrier(2, timeout=5)
+        done = []
+
+        def transcode(job, item, encoders):
+            both_running.wait()
+            done.append((job, item, encoders))
+        with patch.dict(cfg.arm_config, {"TRANSCODE_WORKERS_PER_JOB": 2, "MAX_CONCURRENT_TRANSCODES": 0}):
+            transcode_pool.run(self.job, [1, 2], transcode, "/home/arm/media/raw/Title")
+        self.assertCountEqual([item for _, item, _ in done], [1, 2])
+        self.assertCountEqual([job for job, _, _ in done], [self.job, self.thread_job])
+        self.assertEqual([encoders for _, _, encoders in done], [2, 2])
+
+    def test_encoders_started_not_configured(self):
+        """
+        CHECK when no extra slot is free the titles are encoded one at a time and told there is one encoder
+        """
+        scheduler = SimpleNamespace(max_slots=2, try_acquire=lambda: None)
+        done = []
+        with patch.dict(cfg.arm_config, {"TRANSCODE_WORKERS_PER_JOB": 2, "MAX_CONCURRENT_TRANSCODES": 2}), \
+                patch.object(transcode_pool.slots, "transcode_slots", return_value=scheduler):
+            self.assertEqual(transcode_pool.workers(self.job, "/home/arm/media/raw/Title"), 2)
+            transcode_pool.run(self.job, [1, 2], lambda job, item, encoders: done.append((job, item, encoders)),
+                               "/home/arm/media/raw/Title")
+        self.assertEqual(done, [(self.job, 1, 1), (self.job, 2, 1)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,183 @@
+import importlib.util
+import os
+import sys
+import unittest
+from unittest.mock import patch
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+sys.path.insert(0, '/opt/arm')
+from arm.models.job import Job  # noqa: E402
+from arm.models.track import Track  # noqa: E402
+from arm.ui import db, job_search  # noqa: E402
+
+MIGRATION = os.path.join(os.path.dirname(job_search.__file__), "..", "migrations", "versions",
+                         "c81e4b5f2a90_job_search_fts.py")
+
+
+def load_migration():
+    """The job_search migration module, the versions folder isn't a package"""
+    spec = importlib.util.spec_from_file_location("c81e4b5f2a90_job_search_fts", MIGRATION)
+    migration = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(migration)
+    return migration
+
+
+class JobSearchTestCase(unittest.TestCase):
+    # Apply the job_search migration to the database
+    fts = True
+
+    def setUp(self):
+        engine = create_engine("sqlite://", poolclass=StaticPool)
+        self.addCleanup(engine.dispose)
+        db.metadata.create_all(engine)
+        self.session = Session(engine)
+        self.addCleanup(self.session.close)
+        if self.fts:
+            migration = load_migration()
+            self.session.execute(db.text(migration.CREATE_TABLE))
+            for _, trigger in migration.TRIGGERS:
+                self.session.execute(db.text(trigger))
+            self.session.commit()
+        patcher = patch.object(db, "session", self.session)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def add_job(self, title, **columns):
+        """Insert a job, returns its job_id"""
+        job_id = self.session.execute(db.insert(Job).values(title=title, **columns)).inserted_primary_key[0]
+        self.session.commit()
+        return job_id
+
+    def add_track(self, job_id, track_number, filename):
+        """Insert a track of job_id, returns its track_id"""
+        track_id = self.session.execute(db.insert(Track).values(
+            job_id=job_id, track_number=str(track_number), filename=filename)).inserted_primary_key[0]
+        self.session.commit()
+        return track_id
+
+    def found(self, text, page=1):
+        """job_ids search() returns for text, in order"""
+        rows, _ = job_search.search(text, page)
+        return [row.job_id for row in rows]
+
+
+class TestJobSearch(JobSearchTestCase):
+    def test_triggers_follow_jobs(self):
+        """
+        CHECK jobs are found by what they are inserted with and, once updated, by the new values only
+        """
+        job_id = self.add_job("Sneakers", label="SNEAKERS_1992", year="1992")
+        self.assertEqual(self.found("sneakers"), [job_id])
+        self.assertEqual(self.found("1992"), [job_id])
+
+        self.session.execute(db.update(Job).where(Job.job_id == job_id).values(title="Hackers", imdb_id="tt0113243"))
+        self.session.commit()
+        self.assertEqual(self.found("hackers"), [job_id])
+        self.assertEqual(self.found("tt0113243"), [job_id])
+        self.assertEqual(self.found("sneakers"), [job_id], "still in the label")
+        self.assertEqual(self.found("sneakers 1992 hackers"), [job_id])
+
+        self.session.execute(db.update(Job).where(Job.job_id == job_id).values(label="HACKERS_DISC"))
+        self.session.commit()
+        self.assertEqual(self.found("sneakers"), [])
+
+    def test_triggers_follow_tracks(self):
+        """
+        CHECK a job is found by the filenames of its tracks as they are added and renamed
+        """
+        job_id = self.add_job("Heat")
+        other_id = self.add_job("Ronin")
+        track_id = self.add_track(job_id, 0, "title_t00.mkv")
+        self.add_track(job_id, 1, "extras_t01.mkv")
+        self.assertEqual(self.found("title_t00"), [job_id])
+        self.assertEqual(self.found("extras"), [job_id])
+
+        self.session.execute(db.update(Track).where(Track.track_id == track_id).values(filename="Heat (1995).mkv"))
+        self.session.commit()
+        self.assertEqual(self.found("title_t00"), [])
+        self.assertEqual(self.found("heat 1995"), [job_id])
+        self.assertEqual(self.found("extras"), [job_id], "the other track is still there")
+        self.assertEqual(self.found("ronin"), [other_id])
+
+    def test_every_word_as_a_prefix(self):
+        """
+        CHECK every word of the query has to match the start of a word of the job
+        """
+        wars = self.add_job("Star Wars", year="1977")
+        trek = self.add_job("Star Trek", year="1979")
+        self.add_job("Lone Star")
+        self.assertEqual(self.found("sta wa"), [wars])
+        self.assertEqual(self.found("Star: Trek!"), [trek])
+        self.assertEqual(self.found("star 197"), [trek, wars])
+        self.assertEqual(self.found("tar"), [], "only the start of a word")
+        self.assertEqual(self.found("star wars 1979"), [])
+        self.assertEqual(self.found("?!"), [])
+
+    def test_title_matches_rank_first(self):
+        """
+        CHECK a match in the title ranks above newer matches in the label, which rank above ones in the filenames
+        """
+        title_match = self.add_job("Alien", year="1979")
+        label_match = self.add_job("Unknown", label="ALIEN_ANTHOLOGY")
+        filename_match = self.add_job("Featurettes")
+        self.add_track(filename_match, 0, "alien_featurette.mkv")
+        self.add_job("Predator")
+        self.assertEqual(self.found("alien"), [title_match, label_match, filename_match])
+
+    def test_pages(self):
+        """
+        CHECK results come a page at a time, equal matches newest first, with more set on all but the last page
+        """
+        job_ids = [self.add_job("Rocky") for _ in range(5)]
+        self.add_job("Creed")
+        with patch.object(job_search, "PAGE_SIZE", 2):
+            pages = [job_search.search("rocky", page) for page in (1, 2, 3, 4)]
+        self.assertEqual([[row.job_id for row in rows] for rows, _ in pages],
+                         [job_ids[4:2:-1], job_ids[2:0:-1], job_ids[:1], []])
+        self.assertEqual([more for _, more in pages], [True, True, False, False])
+
+    def test_result_columns(self):
+        """
+        CHECK a result has the columns the search page shows and says when the job has no config
+        """
+        self.add_job("Ran", year="1985", video_type="movie", status="success")
+        rows, more = job_search.search("ran")
+        self.assertFalse(more)
+        result = job_search.result(rows[0])
+        self.assertEqual((result["title"], result["year"], result["video_type"]), ("Ran", "1985", "movie"))
+        self.assertEqual(result["config"], "config not found")
+
+
+class TestJobSearchWithoutFts(JobSearchTestCase):
+    fts = False
+
+    def test_like_fallback(self):
+        """
+        CHECK without job_search every word has to be in the title, label or imdb id, newest first
+        """
+        wars = self.add_job("Star Wars")
+        trek = self.add_job("Star Trek", imdb_id="tt0079945")
+        self.add_job("Lone Ranger")
+        self.assertEqual(self.found("star"), [trek, wars])
+        self.assertEqual(self.found("sta wa"), [wars])
+        self.assertEqual(self.found("tar"), [trek, wars], "LIKE matches inside words")
+        self.assertEqual(self.found("tt0079945"), [trek])
+        self.assertEqual(self.found("star ranger"), [])
+
+    def test_like_fallback_pages(self):
+        """
+        CHECK the LIKE search is paged the same way
+        """
+        job_ids = [self.add_job("Rocky") for _ in range(3)]
+        with patch.object(job_search, "PAGE_SIZE", 2):
+            first, more_first = job_search.search("rocky", 1)
+            second, more_second = job_search.search("rocky", 2)
+        self.assertEqual(([row.job_id for row in first], more_first), (job_ids[:0:-1], True))
+        self.assertEqual(([row.job_id for row in second], more_second), (job_ids[:1], False))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import sys
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+sys.path.insert(0, '/opt/arm')
+from arm.ui import job_stream  # noqa: E402
+
+
+class TestJobStream(unittest.TestCase):
+    def setUp(self):
+        self.stream = job_stream.JobStream()
+        self.jobs = {"1": {"job_id": 1, "status": "active"}}
+        self.built = threading.Event()
+        patcher = patch.object(job_stream.JobStream, "_refresh", self.refresh)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def refresh(self):
+        """Stand-in for JobStream._refresh, takes self.jobs as the joblist"""
+        if self.stream.jobs != self.jobs:
+            self.stream.version += 1
+            self.stream.jobs = dict(self.jobs)
+            self.stream.notes, self.stream.note_ids = [], set()
+            self.stream.history[self.stream.version] = (self.stream.jobs, set())
+            self.stream.changed.notify_all()
+        self.built.set()
+
+    def test_waits_for_a_change(self):
+        """
+        CHECK a request for the current version waits for the next change and gets only the changed fields
+        """
+        version = self.stream.changes(0)["version"]
+
+        def ripper():
+            self.built.clear()
+            self.built.wait()
+            time.sleep(0.2)
+            self.jobs = {"1": {"job_id": 1, "status": "transcoding"}}
+        threading.Thread(target=ripper).start()
+        with patch.object(job_stream, "CHECK_INTERVAL", 0.05):
+            changes = self.stream.changes(version, timeout=5)
+        self.assertEqual(changes["version"], version + 1)
+        self.assertEqual(changes["changed"], {"1": {"status": "transcoding"}})
+        self.assertNotIn("retry_after", changes)
+
+    def test_retry_after_when_too_many_are_waiting(self):
+        """
+        CHECK a request that can't wait because MAX_WAITING are waiting is answered with retry_after
+        """
+        version = self.stream.changes(0)["version"]
+        self.stream.waiting = job_stream.MAX_WAITING
+        started = time.monotonic()
+        changes = self.stream.changes(version, timeout=5)
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(changes["retry_after"], job_stream.RETRY_AFTER)
+        self.assertEqual(changes["changed"], {})
+
+    def test_no_retry_after_when_something_changed(self):
+        """
+        CHECK a client behind the current version gets the changes without retry_after, even with MAX_WAITING waiting
+        """
+        self.stream.waiting = job_stream.MAX_WAITING
+        changes = self.stream.changes(0)
+        self.assertTrue(changes["reset"])
+        self.assertNotIn("retry_after", changes)
+
+
+if __name__ == '__main__':
+    unittest.main()
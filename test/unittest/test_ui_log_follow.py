@@ -0,0 +1,72 @@
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+sys.path.insert(0, '/opt/arm')
+from arm.ui import log_follow  # noqa: E402
+
+
+class TestLogFollow(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "1.log")
+        self.write("ARM: Starting\nmakemkv output\n")
+
+    def write(self, text):
+        with open(self.path, "a") as log_file:
+            log_file.write(text)
+
+    def test_appended_lines_until_finished(self):
+        """
+        CHECK lines written while following are sent, and the stream ends once the job has finished
+        """
+        done = threading.Event()
+
+        def ripper():
+            time.sleep(0.3)
+            self.write("ARM: Ripping\nprogress 50%\nARM: Fini")
+            time.sleep(0.3)
+            self.write("shed")
+            done.set()
+        threading.Thread(target=ripper).start()
+        follower = log_follow.follow(self.path, arm_only=True, finished=done.is_set)
+        with patch.object(log_follow, "WAIT_SECONDS", 0.1):
+            text = "".join(follower)
+        follower.close()
+        self.assertEqual(text, "ARM: Starting\nARM: Ripping\nARM: Finished")
+        self.assertEqual(log_follow.active(), 0)
+
+    def test_full_log_of_finished_job(self):
+        """
+        CHECK the whole log of a finished job is sent straight away
+        """
+        follower = log_follow.follow(self.path, finished=lambda: True)
+        self.assertEqual("".join(follower), "ARM: Starting\nmakemkv output\n")
+        follower.close()
+
+    def test_oldest_follower_is_stopped_when_all_are_used(self):
+        """
+        CHECK a new follower stops the one that started first when LOG_FOLLOWERS are running
+        """
+        with patch.object(log_follow, "max_followers", return_value=1):
+            oldest = log_follow.follow(self.path)
+            stream = iter(oldest)
+            next(stream)
+            # the server thread of the first follower, waiting for more
+            thread = threading.Thread(target=lambda: (list(stream), oldest.close()))
+            thread.start()
+            newest = log_follow.follow(self.path)
+            thread.join(5)
+            self.assertFalse(thread.is_alive())
+            self.assertIsNotNone(newest)
+            self.assertEqual(log_follow.active(), 1)
+            newest.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import os
+import re
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, '/opt/arm')
+from arm.ui.log_tail import LogTail  # noqa: E402
+
+PATTERNS = {"progress": re.compile(r"PRGV:(\d+),(\d+),(\d+)")}
+
+
+class TestLogTail(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "1.log")
+
+    def write(self, text, mode="a"):
+        with open(self.path, mode) as log_file:
+            log_file.write(text)
+
+    def test_missing_log(self):
+        """
+        CHECK a log that doesn't exist yet has no matches
+        """
+        self.assertEqual(LogTail(self.path, PATTERNS).poll(), {"progress": None})
+
+    def test_only_appended_lines_are_read(self):
+        """
+        CHECK the last match is kept between polls and only new bytes are read
+        """
+        tail = LogTail(self.path, PATTERNS)
+        self.write("PRGV:1,2,65536\nPRGV:10,20,65536\n")
+        self.assertEqual(tail.poll()["progress"].group(1), "10")
+        offset = tail.offset
+        self.write("PRGC:5020,0,\"Saving\"\n")
+        self.assertEqual(tail.poll()["progress"].group(1), "10")
+        self.write("PRGV:30,40,65536\n")
+        self.assertEqual(tail.poll()["progress"].group(1), "30")
+        self.assertGreater(tail.offset, offset)
+
+    def test_line_being_written(self):
+        """
+        CHECK a line without its line break is matched but finished on the next poll
+        """
+        tail = LogTail(self.path, PATTERNS)
+        self.write("PRGV:1,2,65536\nPRGV:5,")
+        self.assertEqual(tail.poll()["progress"].group(1), "1")
+        self.write("6,65536\rPRGV:7,8,65536")
+        self.assertEqual(tail.poll()["progress"].group(1), "7")
+        self.assertEqual(tail.matches["progress"].group(1), "5")
+
+    def test_replaced_log(self):
+        """
+        CHECK a truncated log is read again from the start
+        """
+        tail = LogTail(self.path, PATTERNS)
+        self.write("PRGV:30,40,65536\nPRGV:31,40,65536\n")
+        tail.poll()
+        self.write("PRGV:2,3,65536\n", mode="w")
+        self.assertEqual(tail.poll()["progress"].group(1), "2")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+sys.path.insert(0, '/opt/arm')
+import arm.config.config as cfg  # noqa: E402
+from arm.ui import metadata_cache  # noqa: E402
+
+OMDB_URL = "https://www.omdbapi.com/?s=Serenity&y=2005&plot=short&r=json&apikey="
+
+
+class TestMetadataCache(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        config = patch.dict(cfg.arm_config, {"DBFILE": os.path.join(directory.name, "arm.db"),
+                                             "METADATA_CACHE": True, "METADATA_CACHE_TTL": 720,
+                                             "METADATA_CACHE_NEGATIVE_TTL": 24, "METADATA_CACHE_SIZE": 5000})
+        config.start()
+        self.addCleanup(config.stop)
+        fetch = patch.object(metadata_cache, "_fetch", return_value=(True, {"Search": [{"Title": "Serenity"}]}))
+        self.fetch = fetch.start()
+        self.addCleanup(fetch.stop)
+
+    def test_lookup_is_cached_without_api_key(self):
+        """
+        CHECK a lookup is only requested once, whatever api key is used
+        """
+        first = metadata_cache.get_json("omdb", OMDB_URL + "one", "Serenity", "2005")
+        again = metadata_cache.get_json("omdb", OMDB_URL + "two", "Serenity", "2005")
+        self.assertEqual(first, again)
+        self.assertEqual(self.fetch.call_count, 1)
+        stats = metadata_cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["entries"]), (1, 1, 1))
+        self.assertEqual(stats["hit_rate"], 0.5)
+
+    def test_negative_and_error_responses(self):
+        """
+        CHECK lookups that found nothing are cached until the negative ttl, error responses aren't cached
+        """
+        self.fetch.return_value = (True, {"Response": "False", "Error": "Movie not found!"})
+        with patch.dict(cfg.arm_config, {"METADATA_CACHE_NEGATIVE_TTL": 0}):
+            metadata_cache.get_json("omdb", OMDB_URL, found=lambda response: 'Error' not in response)
+            metadata_cache.get_json("omdb", OMDB_URL, found=lambda response: 'Error' not in response)
+        self.assertEqual(self.fetch.call_count, 2)
+        metadata_cache.get_json("omdb", OMDB_URL, found=lambda response: 'Error' not in response)
+        metadata_cache.get_json("omdb", OMDB_URL, found=lambda response: 'Error' not in response)
+        self.assertEqual(self.fetch.call_count, 3)
+        self.assertEqual(metadata_cache.stats()["negative_hits"], 1)
+
+        self.fetch.return_value = (False, {"Response": "False", "Error": "Invalid API key!"})
+        metadata_cache.get_json("omdb", OMDB_URL + "&page=2")
+        metadata_cache.get_json("omdb", OMDB_URL + "&page=2")
+        self.assertEqual(self.fetch.call_count, 5)
+
+    def test_least_recently_used_are_evicted(self):
+        """
+        CHECK the cache keeps at most METADATA_CACHE_SIZE lookups, removing the least recently used
+        """
+        with patch.dict(cfg.arm_config, {"METADATA_CACHE_SIZE": 2}):
+            metadata_cache.get_json("tmdb", "https://api.themoviedb.org/3/find/tt1")
+            metadata_cache.get_json("tmdb", "https://api.themoviedb.org/3/find/tt2")
+            metadata_cache.get_json("tmdb", "https://api.themoviedb.org/3/find/tt1")
+            metadata_cache.get_json("tmdb", "https://api.themoviedb.org/3/find/tt3")
+            self.assertEqual(self.fetch.call_count, 3)
+            metadata_cache.get_json("tmdb", "https://api.themoviedb.org/3/find/tt1")
+            self.assertEqual(self.fetch.call_count, 3)
+            metadata_cache.get_json("tmdb", "https://api.themoviedb.org/3/find/tt2")
+            self.assertEqual(self.fetch.call_count, 4)
+        self.assertEqual(metadata_cache.stats()["entries"], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
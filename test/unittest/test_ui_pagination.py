@@ -0,0 +1,105 @@
+import sys
+import time
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+sys.path.insert(0, '/opt/arm')
+from arm.models.job import Job  # noqa: E402
+from arm.ui import db, pagination  # noqa: E402
+
+
+class TestPagination(unittest.TestCase):
+    def setUp(self):
+        engine = create_engine("sqlite://", poolclass=StaticPool)
+        self.addCleanup(engine.dispose)
+        db.metadata.create_all(engine)
+        self.session = Session(engine)
+        self.addCleanup(self.session.close)
+        for patcher in (patch.object(db, "session", self.session),
+                        patch.dict(pagination._count, {"total": 0, "max_id": None, "expires": 0.0})):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        # jobs 1 to 10
+        for number in range(1, 11):
+            self.add_job(f"Job {number}")
+
+    def add_job(self, title):
+        self.session.execute(db.insert(Job).values(title=title))
+        self.session.commit()
+
+    def delete_job(self, job_id):
+        self.session.execute(db.delete(Job).where(Job.job_id == job_id))
+        self.session.commit()
+
+    def page(self, **cursor):
+        """(job_ids, has_newer, has_older) of a page of 3"""
+        page = pagination.job_page(self.session.query(Job), 3, **cursor)
+        return [job.job_id for job in page.items], page.has_newer, page.has_older
+
+    def test_pages(self):
+        """
+        CHECK pages walk from the newest jobs to the oldest and back, each with the links it needs
+        """
+        self.assertEqual(self.page(), ([10, 9, 8], False, True))
+        self.assertEqual(self.page(before=8), ([7, 6, 5], True, True))
+        self.assertEqual(self.page(before=4), ([3, 2, 1], True, False))
+        self.assertEqual(self.page(after=4), ([7, 6, 5], True, True))
+        self.assertEqual(self.page(oldest=True), ([3, 2, 1], True, False))
+        page = pagination.job_page(self.session.query(Job), 3, before=8)
+        self.assertEqual((page.newer_cursor, page.older_cursor, page.total), (7, 5, 10))
+
+    def test_before_past_the_oldest(self):
+        """
+        CHECK a before cursor with fewer than a page of older jobs (or none) shows the full oldest page
+        """
+        self.assertEqual(self.page(before=3), ([3, 2, 1], True, False))
+        self.assertEqual(self.page(before=1), ([3, 2, 1], True, False))
+        self.assertEqual(self.page(before=-5), ([3, 2, 1], True, False))
+
+    def test_after_past_the_newest(self):
+        """
+        CHECK an after cursor with fewer than a page of newer jobs (or none) shows the full first page
+        """
+        self.assertEqual(self.page(after=8), ([10, 9, 8], False, True))
+        self.assertEqual(self.page(after=10), ([10, 9, 8], False, True))
+        self.assertEqual(self.page(after=99), ([10, 9, 8], False, True))
+
+    def test_fewer_jobs_than_a_page(self):
+        """
+        CHECK with fewer jobs than a page every cursor shows them all without links
+        """
+        for job_id in range(3, 11):
+            self.delete_job(job_id)
+        for cursor in ({}, {"before": 2}, {"after": 1}, {"oldest": True}):
+            self.assertEqual(self.page(**cursor), ([2, 1], False, False), cursor)
+
+    def test_count_cache(self):
+        """
+        CHECK the total is kept until the newest job_id changes, COUNT_TTL passes or forget_job_count() is called
+        """
+        self.assertEqual(pagination.job_count(), 10)
+        # removing an older job leaves the newest job_id as it was, the cached total is used
+        self.delete_job(5)
+        self.assertEqual(pagination.job_count(), 10)
+        pagination.forget_job_count()
+        self.assertEqual(pagination.job_count(), 9)
+
+        self.add_job("Job 11")
+        self.assertEqual(pagination.job_count(), 10)
+        self.delete_job(11)
+        self.assertEqual(pagination.job_count(), 9)
+
+        self.delete_job(4)
+        self.assertEqual(pagination.job_count(), 9)
+        later = time.monotonic() + pagination.COUNT_TTL + 1
+        with patch.object(pagination, "time", SimpleNamespace(monotonic=lambda: later)):
+            self.assertEqual(pagination.job_count(), 8)
+
+
+if __name__ == '__main__':
+    unittest.main()